@@ -23,7 +23,11 @@ from app.schemas.library import (
     CategoryCreate, Category,
     TagCreate, Tag
 )
-from app.services import AdminService, is_admin, ADMIN_IDS, send_telegram_notification
+from app.services import (
+    AdminService, is_admin, ADMIN_IDS, send_telegram_notification,
+    catalog_cache, on_material_saved, on_material_deleted, is_own_cover_url, SearchService,
+    principal_cache
+)
 from app.schemas.user_schemas import (
     UserCard, UserSearchResult, UserSearchResponse,
     UserShort, SubscriptionInfo, LoyaltyInfo, ReferralInfo,
@@ -114,6 +118,8 @@ def create_material(
             )
         db.commit()
     
+    on_material_saved(db, db_material)
+    
     return db_material
 
 
@@ -155,6 +161,8 @@ def update_material(
     
     # Обновляем поля
     update_data = material.model_dump(exclude_unset=True)
+    if is_own_cover_url(update_data.get('cover_image')):
+        update_data.pop('cover_image')  # обложка не менялась
     for field, value in update_data.items():
         if field != "tag_ids":
             setattr(db_material, field, value)
@@ -180,6 +188,8 @@ def update_material(
             )
         db.commit()
     
+    on_material_saved(db, db_material)
+    
     return db_material
 
 
@@ -202,6 +212,8 @@ def delete_material(
     db.delete(db_material)
     db.commit()
     
+    on_material_deleted(db, material_id)
+    
     return {"message": "Материал удалён", "id": material_id}
 
 
@@ -220,6 +232,8 @@ def publish_material(
     )
     db.commit()
     
+    catalog_cache.refresh_material(db, material_id)
+    
     return {"message": "Материал опубликован", "id": material_id}
 
 
@@ -238,6 +252,8 @@ def unpublish_material(
     )
     db.commit()
     
+    catalog_cache.refresh_material(db, material_id)
+    
     return {"message": "Материал снят с публикации", "id": material_id}
 
 
@@ -292,6 +308,9 @@ def update_category(
     db.commit()
     db.refresh(db_category)
     
+    # Категории встроены в элементы каталога
+    catalog_cache.invalidate()
+    
     return db_category
 
 
@@ -320,6 +339,8 @@ def delete_category(
     )
     db.commit()
     
+    catalog_cache.invalidate()
+    
     return {"message": "Категория удалена", "id": category_id}
 
 
@@ -366,9 +387,18 @@ def delete_tag(
 ):
     """Удалить тег"""
     
+    # Материалы тега — чтобы убрать его название из поискового индекса
+    material_ids = db.execute(
+        select(materials_tags.c.material_id).where(materials_tags.c.tag_id == tag_id)
+    ).scalars().all()
+    
+    db.execute(delete(materials_tags).where(materials_tags.c.tag_id == tag_id))
     db.execute(delete(LibraryTag).where(LibraryTag.id == tag_id))
     db.commit()
     
+    SearchService(db).index_materials(material_ids)
+    catalog_cache.invalidate()
+    
     return {"message": "Тег удалён", "id": tag_id}
 
 
@@ -462,17 +492,15 @@ def search_users(
         SELECT 
             u.id, u.telegram_id, u.username, u.first_name, u.last_name,
             u.created_at, u.current_loyalty_level,
-            CASE WHEN s.id IS NOT NULL AND s.end_date > datetime('now') AND s.is_active = 1 
-                 THEN 1 ELSE 0 END as has_subscription
+            COALESCE(a.active_until > datetime('now'), 0) as has_subscription
         FROM users u
-        LEFT JOIN subscriptions s ON u.id = s.user_id
+        LEFT JOIN user_active_subscriptions a ON a.user_id = u.id
         WHERE 
             u.telegram_id = :telegram_id
             OR u.username LIKE :pattern
             OR u.first_name LIKE :pattern
             OR u.last_name LIKE :pattern
             OR u.phone LIKE :pattern
-        GROUP BY u.id
         ORDER BY u.created_at DESC
         LIMIT :limit
     """
@@ -686,22 +714,28 @@ def get_subscriptions_list(
     """Список подписок с фильтрами"""
     from sqlalchemy import text
     
-    if filter == "active":
-        where = "s.is_active = 1 AND s.end_date > datetime('now')"
-    elif filter == "expiring":
-        where = "s.is_active = 1 AND s.end_date > datetime('now') AND s.end_date < datetime('now', '+7 days')"
-    elif filter == "expired":
-        where = "s.is_active = 1 AND s.end_date < datetime('now')"
+    # Активные и истекающие — диапазон по индексу user_active_subscriptions.active_until
+    if filter in ("active", "expiring"):
+        source = """
+            user_active_subscriptions a
+            JOIN subscriptions s ON s.id = a.subscription_id
+            JOIN users u ON a.user_id = u.id
+        """
+        end_date = "a.active_until"
+        where = "a.active_until > datetime('now')"
+        if filter == "expiring":
+            where += " AND a.active_until < datetime('now', '+7 days')"
     else:
-        where = "1=1"
+        source = "subscriptions s JOIN users u ON s.user_id = u.id"
+        end_date = "s.end_date"
+        where = "s.is_active = 1 AND s.end_date < datetime('now')" if filter == "expired" else "1=1"
     
     sql = f"""
         SELECT u.telegram_id, u.username, u.first_name, u.is_recurring_active,
-               s.end_date, s.price, julianday(s.end_date) - julianday('now') as days_left
-        FROM subscriptions s
-        JOIN users u ON s.user_id = u.id
+               {end_date} as end_date, s.price, julianday({end_date}) - julianday('now') as days_left
+        FROM {source}
         WHERE {where}
-        ORDER BY s.end_date ASC
+        ORDER BY {end_date} ASC
         LIMIT :limit
     """
     result = db.execute(text(sql), {"limit": limit})
@@ -828,12 +862,12 @@ def get_bot_stats(
     
     # Активные подписки
     stats["active_subscriptions"] = db.execute(text(
-        "SELECT COUNT(*) FROM subscriptions WHERE is_active = 1 AND end_date > datetime('now')"
+        "SELECT COUNT(*) FROM user_active_subscriptions WHERE active_until > datetime('now')"
     )).scalar()
     
     # Истекающие за 7 дней
     stats["expiring_soon"] = db.execute(text(
-        "SELECT COUNT(*) FROM subscriptions WHERE is_active = 1 AND end_date > datetime('now') AND end_date < datetime('now', '+7 days')"
+        "SELECT COUNT(*) FROM user_active_subscriptions WHERE active_until > datetime('now') AND active_until < datetime('now', '+7 days')"
     )).scalar()
     
     # С автопродлением
@@ -874,7 +908,7 @@ async def extend_subscription(
         raise HTTPException(status_code=404, detail="Пользователь не найден")
     
     sub_result = db.execute(text(
-        "SELECT id, end_date FROM subscriptions WHERE user_id = :uid AND is_active = 1 ORDER BY end_date DESC LIMIT 1"
+        "SELECT subscription_id AS id, active_until AS end_date FROM user_active_subscriptions WHERE user_id = :uid"
     ), {"uid": user_row.id})
     sub_row = sub_result.fetchone()
     if not sub_row:
@@ -887,6 +921,7 @@ async def extend_subscription(
     
     db.execute(text("UPDATE subscriptions SET end_date = :end WHERE id = :id"), {"end": new_end, "id": sub_row.id})
     db.commit()
+    principal_cache.invalidate(telegram_id)
     
     from app.services import send_telegram_notification, NotificationTemplates
     await send_telegram_notification(telegram_id, NotificationTemplates.subscription_extended(request.days), "subscription_extended")
@@ -939,6 +974,7 @@ async def set_loyalty_level(
     old_level = row.current_loyalty_level
     db.execute(text("UPDATE users SET current_loyalty_level = :lvl WHERE id = :id"), {"lvl": request.level, "id": row.id})
     db.commit()
+    principal_cache.invalidate(telegram_id)
     
     if request.level != 'none' and request.level != old_level:
         from app.services import send_telegram_notification, NotificationTemplates
@@ -9,11 +9,12 @@ from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.config import settings
-from app.schemas import TelegramAuthData, TokenResponse, UserInfo, SubscriptionStatus, LoyaltyInfo, ReferralInfo, PaymentItem, PaymentHistory, UserSettings, CreatePaymentRequest, CreatePaymentResponse
-from app.utils.auth import verify_telegram_auth, create_access_token
+from app.schemas import TelegramAuthData, TokenResponse, RefreshRequest, RefreshResponse, UserInfo, SubscriptionStatus, LoyaltyInfo, ReferralInfo, PaymentItem, PaymentHistory, UserSettings, CreatePaymentRequest, CreatePaymentResponse
+from app.utils.auth import verify_telegram_auth
 from app.api.dependencies import get_current_user, get_current_user_with_subscription
+from app.services import principal_cache, load_claims, issue_tokens, refresh_tokens, get_active_subscription
 
 
 router = APIRouter(prefix="/auth", tags=["Авторизация"])
@@ -50,13 +51,11 @@ def get_dev_token(
     
     user_id, tg_id, first_name, username = user_result
     
-    # Создаём токен
-    access_token = create_access_token(
-        data={"telegram_id": tg_id}
-    )
+    # Создаём пару токенов (как при входе через Telegram)
+    tokens = issue_tokens(load_claims(db, tg_id))
     
     return {
-        "access_token": access_token,
+        **tokens,
         "token_type": "bearer",
         "user": {
             "telegram_id": tg_id,
@@ -125,28 +124,15 @@ def telegram_login(
         }
     )
     db.commit()
+    principal_cache.invalidate(auth_data.id)
     if auth_data.photo_url:
         print(f"📸 Updated photo_url for user {telegram_id}")
     
     # Проверяем активную подписку
-    subscription_result = db.execute(
-        text("""
-        SELECT 
-            s.id,
-            s.is_active,
-            s.end_date
-        FROM subscriptions s
-        WHERE s.user_id = :user_id
-          AND s.is_active = 1
-          AND s.end_date > datetime('now')
-        ORDER BY s.end_date DESC
-        LIMIT 1
-        """),
-        {"user_id": user_id}
-    ).fetchone()
+    subscription = get_active_subscription(db, user_id)
     
-    has_active_subscription = subscription_result is not None
-    subscription_end = subscription_result[2] if subscription_result else None
+    has_active_subscription = subscription is not None
+    subscription_end = subscription["end_date"] if subscription else None
     
     # ИЗМЕНЕНО: Пускаем пользователя даже без подписки
     # Доступ к библиотеке ограничивается на фронтенде
@@ -155,13 +141,13 @@ def telegram_login(
     else:
         print(f"⚠️ User {first_name} ({telegram_id}) logged in WITHOUT subscription (profile only)")
     
-    # Создаём JWT токен
-    access_token = create_access_token(
-        data={"telegram_id": telegram_id}
-    )
+    # Создаём пару JWT: access с claims (пользователь, версия, подписка) + refresh
+    tokens = issue_tokens(load_claims(db, telegram_id))
     
     return TokenResponse(
-        access_token=access_token,
+        access_token=tokens["access_token"],
+        refresh_token=tokens["refresh_token"],
+        expires_in=tokens["expires_in"],
         token_type="bearer",
         user=UserInfo(
             telegram_id=telegram_id,
@@ -174,6 +160,19 @@ def telegram_login(
     )
 
 
+@router.post("/refresh", response_model=RefreshResponse)
+def refresh_token(
+    request: RefreshRequest,
+    db: Session = Depends(get_read_db)
+):
+    """
+    Обменять refresh-токен на новую пару токенов
+    
+    Claims (имя, подписка) перечитываются из БД; после force-logout — 401
+    """
+    return RefreshResponse(**refresh_tokens(db, request.refresh_token))
+
+
 @router.get("/me", response_model=UserInfo)
 def get_current_user_info(
     current_user: dict = Depends(get_current_user),
@@ -183,24 +182,10 @@ def get_current_user_info(
     Получить информацию о текущем пользователе
     """
     # Проверяем активную подписку
-    subscription_result = db.execute(
-        text("""
-        SELECT 
-            s.id,
-            s.is_active,
-            s.end_date
-        FROM subscriptions s
-        WHERE s.user_id = :user_id
-          AND s.is_active = 1
-          AND s.end_date > datetime('now')
-        ORDER BY s.end_date DESC
-        LIMIT 1
-        """),
-        {"user_id": current_user["user_id"]}
-    ).fetchone()
+    subscription = get_active_subscription(db, current_user["user_id"])
     
-    has_active_subscription = subscription_result is not None
-    subscription_end = subscription_result[2] if subscription_result else None
+    has_active_subscription = subscription is not None
+    subscription_end = subscription["end_date"] if subscription else None
     
     return UserInfo(
         telegram_id=current_user["telegram_id"],
@@ -223,19 +208,7 @@ def check_subscription(
     Проверить статус подписки текущего пользователя
     """
     # Проверяем активную подписку
-    subscription_result = db.execute(
-        text("""
-        SELECT 
-            s.end_date
-        FROM subscriptions s
-        WHERE s.user_id = :user_id
-          AND s.is_active = 1
-          AND s.end_date > datetime('now')
-        ORDER BY s.end_date DESC
-        LIMIT 1
-        """),
-        {"user_id": current_user["user_id"]}
-    ).fetchone()
+    subscription = get_active_subscription(db, current_user["user_id"])
     
     # Вычисляем days_in_club — сумма дней всех активных подписок
     days_in_club = 0
@@ -255,7 +228,10 @@ def check_subscription(
             end = datetime.now()
         days_in_club += max(0, (end - start).days)
     
-    if not subscription_result:
+    # Фронтенд вызывает проверку после оплаты — следующий запрос перечитает подписку
+    principal_cache.invalidate_subscription(current_user["telegram_id"])
+    
+    if not subscription:
         return SubscriptionStatus(
             has_active_subscription=False,
             subscription_end=None,
@@ -263,7 +239,7 @@ def check_subscription(
             days_in_club=days_in_club
         )
     
-    end_date_str = subscription_result[0]
+    end_date_str = subscription["end_date"]
     end_date = datetime.fromisoformat(end_date_str)
     days_left = (end_date - datetime.now()).days
     
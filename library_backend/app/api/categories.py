@@ -8,7 +8,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from sqlalchemy import select
 
-from app.database import get_db
+from app.database import get_read_db
 from app.schemas import Category, Tag
 from app.models.library_models import LibraryCategory, LibraryTag
 from app.api.dependencies import get_current_user_with_subscription
@@ -20,7 +20,7 @@ router = APIRouter(tags=["Категории и теги"])
 @router.get("/categories", response_model=List[Category])
 def get_categories(
     current_user: dict = Depends(get_current_user_with_subscription),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Получить список всех категорий
@@ -38,7 +38,7 @@ def get_categories(
 def get_category(
     category_id: int,
     current_user: dict = Depends(get_current_user_with_subscription),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Получить информацию о категории
@@ -62,7 +62,7 @@ def get_category(
 def get_tags(
     category: str = None,
     current_user: dict = Depends(get_current_user_with_subscription),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Получить список всех тегов
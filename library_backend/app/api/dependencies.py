@@ -2,27 +2,42 @@
 Dependencies для FastAPI endpoints
 """
 
+import logging
 from typing import Optional
 from datetime import datetime
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, text
 
-from app.database import get_db
-from app.utils.auth import decode_access_token
+from app.database import get_async_read_db
+from app.services import principal_cache, principal_from_claims, active_subscription_sql
+from app.utils.auth import ACCESS_TOKEN, REFRESH_TOKEN, decode_access_token
+
+logger = logging.getLogger(__name__)
 
 
 # Security scheme для JWT
 security = HTTPBearer()
 
 
-def get_current_user(
+async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ) -> dict:
     payload = decode_access_token(credentials.credentials)
+    
+    # Access-токен с claims — пользователь и подписка берутся из токена без БД
+    if payload.get("typ") == ACCESS_TOKEN:
+        return principal_from_claims(payload)
+    if payload.get("typ") == REFRESH_TOKEN:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Невалидный токен"
+        )
+    
+    # Старый токен ({"telegram_id"}) — пользователь из кэша или БД
     telegram_id = payload.get("telegram_id")
     
     if not telegram_id:
@@ -31,18 +46,38 @@ def get_current_user(
             detail="Невалидный токен"
         )
     
-    result = db.execute(
-        text("SELECT id, telegram_id, first_name, username, photo_url, current_loyalty_level, admin_group FROM users WHERE telegram_id = :tg_id"),
-        {"tg_id": telegram_id}
-    ).fetchone()
+    user = await load_user(db, telegram_id)
     
-    if not result:
+    if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Пользователь не найден"
         )
     
-    return {
+    return user
+
+
+async def load_user(db: AsyncSession, telegram_id: int) -> Optional[dict]:
+    """
+    Пользователь по telegram_id: из кэша (TTL) или из БД с записью в кэш.
+    Общий для get_current_user и авторизации WebSocket.
+    
+    Returns:
+        None, если пользователя нет
+    """
+    cached = principal_cache.get_user(telegram_id)
+    if cached is not None:
+        return cached
+    
+    result = (await db.execute(
+        text("SELECT id, telegram_id, first_name, username, photo_url, current_loyalty_level, admin_group FROM users WHERE telegram_id = :tg_id"),
+        {"tg_id": telegram_id}
+    )).fetchone()
+    
+    if not result:
+        return None
+    
+    user = {
         "user_id": result[0],
         "telegram_id": result[1],
         "first_name": result[2],
@@ -51,34 +86,30 @@ def get_current_user(
         "loyalty_level": result[5] or "none",
         "admin_group": result[6]
     }
+    principal_cache.put_user(telegram_id, user)
+    
+    return user
 
 
-def get_current_user_with_subscription(
+async def get_current_user_with_subscription(
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ) -> dict:
-    print(f"🔍 Checking subscription for user_id={current_user['user_id']}")
-    
-    result = db.execute(
-        text("""
-        SELECT 
-            s.id,
-            s.is_active,
-            s.end_date
-        FROM subscriptions s
-        WHERE s.user_id = :user_id
-          AND s.is_active = 1
-          AND s.end_date > datetime('now')
-        ORDER BY s.end_date DESC
-        LIMIT 1
-        """),
-        {"user_id": current_user["user_id"]}
-    ).fetchone()
+    if "subscription" in current_user:
+        return current_user
+    
+    subscription = principal_cache.get_subscription(current_user["telegram_id"])
+    if subscription is not None:
+        current_user["subscription"] = subscription
+        return current_user
     
-    print(f"🔍 Subscription result: {result}")
+    result = (await db.execute(
+        text(active_subscription_sql()),
+        {"user_id": current_user["user_id"]}
+    )).fetchone()
     
     if not result:
-        print(f"❌ No active subscription for user_id={current_user['user_id']}")
+        logger.info(f"No active subscription for user_id={current_user['user_id']}")
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="У вас нет активной подписки MomsClub"
@@ -89,18 +120,19 @@ def get_current_user_with_subscription(
         "is_active": bool(result[1]),
         "end_date": result[2]
     }
+    principal_cache.put_subscription(current_user["telegram_id"], current_user["subscription"])
     
     return current_user
 
 
-def get_optional_user(
+async def get_optional_user(
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False)),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ) -> Optional[dict]:
     if not credentials:
         return None
     
     try:
-        return get_current_user(credentials, db)
+        return await get_current_user(credentials, db)
     except HTTPException:
         return None
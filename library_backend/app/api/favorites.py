@@ -6,12 +6,14 @@ from typing import List
 
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, desc, text
 
-from app.database import get_db
+from app.database import get_read_db, get_async_read_db, get_async_db
 from app.schemas import Favorite, MaterialListItem
 from app.models.library_models import LibraryFavorite, LibraryView, LibraryMaterial
 from app.api.dependencies import get_current_user_with_subscription
+from app.services import add_cover_url, adjust_favorites_count
 
 
 router = APIRouter(tags=["Избранное и история"])
@@ -22,31 +24,34 @@ router = APIRouter(tags=["Избранное и история"])
 # ============================================
 
 @router.get("/favorites", response_model=List[MaterialListItem])
-def get_favorites(
+async def get_favorites(
     current_user: dict = Depends(get_current_user_with_subscription),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """
     Получить список избранных материалов пользователя
     
     Требуется активная подписка
     """
-    favorites = db.execute(
-        select(LibraryFavorite)
-        .where(LibraryFavorite.user_id == current_user["user_id"])
+    materials = (await db.execute(
+        select(LibraryMaterial)
+        .options(*LibraryMaterial.list_load_options())
+        .join(LibraryFavorite, LibraryFavorite.material_id == LibraryMaterial.id)
+        .where(
+            LibraryFavorite.user_id == current_user["user_id"],
+            LibraryMaterial.is_published == True
+        )
         .order_by(desc(LibraryFavorite.created_at))
-    ).scalars().all()
-    
-    materials = [fav.material for fav in favorites if fav.material and fav.material.is_published]
+    )).scalars().all()
     
-    return [MaterialListItem.model_validate(m) for m in materials]
+    return [add_cover_url(m.to_list_dict()) for m in materials]
 
 
 @router.post("/favorites/{material_id}")
-def add_to_favorites(
+async def add_to_favorites(
     material_id: int,
     current_user: dict = Depends(get_current_user_with_subscription),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Добавить материал в избранное
@@ -54,9 +59,9 @@ def add_to_favorites(
     Требуется активная подписка
     """
     # Проверяем, что материал существует
-    material = db.execute(
-        select(LibraryMaterial).where(LibraryMaterial.id == material_id)
-    ).scalar_one_or_none()
+    material = (await db.execute(
+        select(LibraryMaterial.id).where(LibraryMaterial.id == material_id)
+    )).scalar_one_or_none()
     
     if not material:
         raise HTTPException(
@@ -65,12 +70,12 @@ def add_to_favorites(
         )
     
     # Проверяем, не добавлен ли уже
-    existing = db.execute(
-        select(LibraryFavorite).where(
+    existing = (await db.execute(
+        select(LibraryFavorite.id).where(
             LibraryFavorite.user_id == current_user["user_id"],
             LibraryFavorite.material_id == material_id
         )
-    ).scalar_one_or_none()
+    )).scalar_one_or_none()
     
     if existing:
         return {"status": "ok", "message": "Материал уже в избранном"}
@@ -81,35 +86,36 @@ def add_to_favorites(
         material_id=material_id
     )
     db.add(favorite)
+    await db.run_sync(adjust_favorites_count, material_id, +1)
     
     # Логируем действие
-    db.execute(
+    await db.execute(
         text("INSERT INTO activity_log (user_id, action_type, material_id) VALUES (:user_id, 'favorite_add', :material_id)"),
         {"user_id": current_user["user_id"], "material_id": material_id}
     )
     
-    db.commit()
+    await db.commit()
     
     return {"status": "ok", "message": "Материал добавлен в избранное"}
 
 
 @router.delete("/favorites/{material_id}")
-def remove_from_favorites(
+async def remove_from_favorites(
     material_id: int,
     current_user: dict = Depends(get_current_user_with_subscription),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Удалить материал из избранного
     
     Требуется активная подписка
     """
-    favorite = db.execute(
+    favorite = (await db.execute(
         select(LibraryFavorite).where(
             LibraryFavorite.user_id == current_user["user_id"],
             LibraryFavorite.material_id == material_id
         )
-    ).scalar_one_or_none()
+    )).scalar_one_or_none()
     
     if not favorite:
         raise HTTPException(
@@ -117,36 +123,37 @@ def remove_from_favorites(
             detail="Материал не найден в избранном"
         )
     
-    db.delete(favorite)
+    await db.delete(favorite)
+    await db.run_sync(adjust_favorites_count, favorite.material_id, -1)
     
     # Логируем удаление
-    db.execute(
+    await db.execute(
         text("INSERT INTO activity_log (user_id, action_type, material_id) VALUES (:user_id, 'favorite_remove', :material_id)"),
         {"user_id": current_user["user_id"], "material_id": material_id}
     )
     
-    db.commit()
+    await db.commit()
     
     return {"status": "ok", "message": "Материал удалён из избранного"}
 
 
 @router.get("/favorites/check/{material_id}")
-def check_favorite(
+async def check_favorite(
     material_id: int,
     current_user: dict = Depends(get_current_user_with_subscription),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """
     Проверить, находится ли материал в избранном
     
     Требуется активная подписка
     """
-    favorite = db.execute(
+    favorite = (await db.execute(
         select(LibraryFavorite).where(
             LibraryFavorite.user_id == current_user["user_id"],
             LibraryFavorite.material_id == material_id
         )
-    ).scalar_one_or_none()
+    )).scalar_one_or_none()
     
     return {"is_favorite": favorite is not None}
 
@@ -159,7 +166,7 @@ def check_favorite(
 def get_history(
     limit: int = Query(50, ge=1, le=100, description="Количество материалов"),
     current_user: dict = Depends(get_current_user_with_subscription),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Получить историю просмотров пользователя
@@ -168,18 +175,25 @@ def get_history(
     """
     # Получаем последние просмотры (уникальные материалы)
     views = db.execute(
-        select(LibraryView)
+        select(LibraryView.material_id)
         .where(LibraryView.user_id == current_user["user_id"])
         .order_by(desc(LibraryView.viewed_at))
         .limit(limit)
     ).scalars().all()
     
-    # Получаем уникальные материалы (сохраняя порядок)
-    seen_ids = set()
-    materials = []
-    for view in views:
-        if view.material_id not in seen_ids and view.material and view.material.is_published:
-            seen_ids.add(view.material_id)
-            materials.append(view.material)
+    # Уникальные id, сохраняя порядок
+    material_ids = list(dict.fromkeys(views))
+    if not material_ids:
+        return []
+    
+    materials = db.execute(
+        select(LibraryMaterial)
+        .options(*LibraryMaterial.list_load_options())
+        .where(
+            LibraryMaterial.id.in_(material_ids),
+            LibraryMaterial.is_published == True
+        )
+    ).scalars().all()
+    materials_by_id = {m.id: m for m in materials}
     
-    return [MaterialListItem.model_validate(m) for m in materials]
+    return [add_cover_url(materials_by_id[mid].to_list_dict()) for mid in material_ids if mid in materials_by_id]
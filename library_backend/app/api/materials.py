@@ -8,9 +8,10 @@ from datetime import datetime
 import asyncio
 from fastapi import APIRouter, Depends, HTTPException, status, Query, BackgroundTasks
 from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, or_, text, distinct
 
-from app.database import get_db
+from app.database import get_db, get_read_db, get_async_read_db, get_async_db
 from app.schemas import Material, MaterialListItem, MaterialCreate, MaterialUpdate, PaginatedResponse
 from app.models.library_models import LibraryMaterial, LibraryCategory, LibraryView
 from app.api.dependencies import get_current_user_with_subscription, get_current_user
@@ -19,10 +20,18 @@ from app.api.push import send_push_notification_sync
 # Импорты из сервисного слоя
 from app.services import (
     MaterialService, 
-    RecommendationService,
+    CoverStorage,
+    recommendation_store,
     add_cover_url, 
     check_admin, 
     log_admin_action,
+    on_material_saved,
+    on_material_deleted,
+    InvalidCursor,
+    is_own_cover_url,
+    adjust_favorites_count,
+    view_ingest,
+    ViewIngestOverloaded,
     ADMIN_IDS
 )
 
@@ -31,9 +40,9 @@ router = APIRouter(prefix="/materials", tags=["Материалы"])
 
 
 @router.get("", response_model=PaginatedResponse)
-def get_materials(
+async def get_materials(
     # Фильтры
-    search: Optional[str] = Query(None, description="Поиск по названию и описанию"),
+    search: Optional[str] = Query(None, description="Полнотекстовый поиск (название, описание, текст, теги)"),
     category_id: Optional[int] = Query(None, description="ID категории"),
     format: Optional[str] = Query(None, description="Формат материала"),
     level: Optional[str] = Query(None, description="Уровень сложности"),
@@ -45,42 +54,47 @@ def get_materials(
     # Пагинация
     page: int = Query(1, ge=1, description="Номер страницы"),
     page_size: int = Query(50, ge=1, le=200, description="Размер страницы"),
+    cursor: Optional[str] = Query(None, description="Курсор для бесконечной ленты: пустая строка — первая страница, далее next_cursor"),
+    with_total: bool = Query(False, description="Считать total в курсорном режиме не только на первой странице"),
     
     # Сортировка
-    sort: str = Query("created_desc", description="Сортировка"),
+    sort: str = Query("created_desc", description="Сортировка (при поиске по умолчанию — по релевантности)"),
     
     # Зависимости
     current_user: dict = Depends(get_current_user_with_subscription),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    """Получить список материалов с фильтрацией и пагинацией"""
-    service = MaterialService(db)
-    result = service.get_materials(
-        search=search,
-        category_id=category_id,
-        format=format,
-        level=level,
-        topic=topic,
-        niche=niche,
-        is_featured=is_featured,
-        include_drafts=include_drafts,
-        is_admin=check_admin(current_user),
-        page=page,
-        page_size=page_size,
-        sort=sort
-    )
+    """Получить список материалов с фильтрацией и пагинацией (page или cursor)"""
+    try:
+        result = await db.run_sync(lambda session: MaterialService(session).get_materials(
+            search=search,
+            category_id=category_id,
+            format=format,
+            level=level,
+            topic=topic,
+            niche=niche,
+            is_featured=is_featured,
+            include_drafts=include_drafts,
+            is_admin=check_admin(current_user),
+            page=page,
+            page_size=page_size,
+            sort=sort,
+            cursor=cursor,
+            with_total=with_total
+        ))
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return PaginatedResponse(**result)
 
 
 @router.get("/{material_id}", response_model=Material)
-def get_material(
+async def get_material(
     material_id: int,
     current_user: dict = Depends(get_current_user_with_subscription),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Получить полную информацию о материале"""
-    service = MaterialService(db)
-    material = service.get_material_by_id(material_id)
+    material = await db.run_sync(lambda session: MaterialService(session).get_material_by_id(material_id))
     
     if not material:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Материал не найден")
@@ -88,28 +102,34 @@ def get_material(
     return material
 
 
-@router.post("/{material_id}/view")
-def record_view(
+@router.post("/{material_id}/view", status_code=status.HTTP_202_ACCEPTED)
+async def record_view(
     material_id: int,
     duration_seconds: Optional[int] = None,
-    current_user: dict = Depends(get_current_user_with_subscription),
-    db: Session = Depends(get_db)
+    current_user: dict = Depends(get_current_user_with_subscription)
 ):
-    """Записать просмотр материала"""
-    service = MaterialService(db)
-    success = service.record_view(material_id, current_user["user_id"], duration_seconds)
-    
-    if not success:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Материал не найден")
+    """
+    Записать просмотр материала.
+    Просмотр ставится в очередь и попадает в БД пачкой (обычно в течение VIEW_FLUSH_INTERVAL_MS);
+    просмотры несуществующих материалов отбрасываются при записи.
+    """
+    try:
+        view_ingest.enqueue(material_id, current_user["user_id"], duration_seconds)
+    except ViewIngestOverloaded:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Сервер перегружен, повторите позже",
+            headers={"Retry-After": "1"}
+        )
     
-    return {"status": "ok", "message": "Просмотр записан"}
+    return {"status": "ok", "message": "Просмотр принят"}
 
 
 @router.get("/featured/list", response_model=List[MaterialListItem])
 def get_featured_materials(
     limit: int = Query(10, ge=1, le=50, description="Количество материалов"),
     current_user: dict = Depends(get_current_user_with_subscription),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Получить список избранных материалов (Выбор Полины)"""
     service = MaterialService(db)
@@ -120,35 +140,47 @@ def get_featured_materials(
 def get_popular_materials(
     limit: int = Query(10, ge=1, le=50, description="Количество материалов"),
     current_user: dict = Depends(get_current_user_with_subscription),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Получить список популярных материалов"""
     service = MaterialService(db)
     return service.get_popular(limit)
 
 
+@router.get("/trending/list", response_model=List[MaterialListItem])
+def get_trending_materials(
+    limit: int = Query(10, ge=1, le=50, description="Количество материалов"),
+    current_user: dict = Depends(get_current_user_with_subscription),
+    db: Session = Depends(get_read_db)
+):
+    """Получить материалы, которые сейчас смотрят (просмотры с затуханием)"""
+    service = MaterialService(db)
+    return service.get_trending(limit)
+
+
 # ============== ИЗБРАННОЕ И ИСТОРИЯ ==============
 
 @router.get("/favorites/my", response_model=List[MaterialListItem])
-def get_my_favorites(
+async def get_my_favorites(
     current_user: dict = Depends(get_current_user_with_subscription),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Получить мои избранные материалы"""
     from app.models.library_models import LibraryFavorite
     
-    materials = db.execute(
+    materials = (await db.execute(
         select(LibraryMaterial)
+        .options(*LibraryMaterial.list_load_options())
         .join(LibraryFavorite, LibraryFavorite.material_id == LibraryMaterial.id)
         .where(
             LibraryFavorite.user_id == current_user["user_id"],
             LibraryMaterial.is_published == True
         )
         .order_by(LibraryFavorite.created_at.desc())
-    ).scalars().all()
+    )).scalars().all()
     
-    # Оптимизация: добавляем cover_url, убираем base64
-    return [add_cover_url(m.to_dict()) for m in materials]
+    # Оптимизация: только колонки списка, cover_url вместо base64
+    return [add_cover_url(m.to_list_dict()) for m in materials]
 
 
 @router.post("/{material_id}/favorite")
@@ -156,32 +188,31 @@ async def add_to_favorites(
     material_id: int,
     background_tasks: BackgroundTasks,
     current_user: dict = Depends(get_current_user_with_subscription),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Добавить материал в избранное"""
     from app.models.library_models import LibraryFavorite
     from app.api.websocket import broadcast_new_activity
     
-    # Проверяем материал
-    material = db.execute(
-        select(LibraryMaterial).where(LibraryMaterial.id == material_id)
-    ).scalar_one_or_none()
+    # Проверяем материал (заодно берём иконку категории)
+    material = (await db.execute(
+        select(LibraryMaterial.id, LibraryMaterial.title, LibraryCategory.icon)
+        .outerjoin(LibraryCategory, LibraryCategory.id == LibraryMaterial.category_id)
+        .where(LibraryMaterial.id == material_id)
+    )).one_or_none()
     
     if not material:
         raise HTTPException(status_code=404, detail="Материал не найден")
     
-    # Получаем категорию для иконки
-    category_icon = "📄"
-    if material.category:
-        category_icon = material.category.icon or "📄"
+    category_icon = material.icon or "📄"
     
     # Проверяем, не добавлен ли уже
-    existing = db.execute(
-        select(LibraryFavorite).where(
+    existing = (await db.execute(
+        select(LibraryFavorite.id).where(
             LibraryFavorite.user_id == current_user["user_id"],
             LibraryFavorite.material_id == material_id
         )
-    ).scalar_one_or_none()
+    )).scalar_one_or_none()
     
     if existing:
         return {"status": "ok", "message": "Уже в избранном", "is_favorite": True}
@@ -191,14 +222,15 @@ async def add_to_favorites(
         material_id=material_id
     )
     db.add(favorite)
+    await db.run_sync(adjust_favorites_count, material_id, +1)
     
     # Логируем действие
-    db.execute(
+    await db.execute(
         text("INSERT INTO activity_log (user_id, action_type, material_id) VALUES (:user_id, 'favorite_add', :material_id)"),
         {"user_id": current_user["user_id"], "material_id": material_id}
     )
     
-    db.commit()
+    await db.commit()
     
     # Отправляем событие через WebSocket
     activity_data = {
@@ -225,41 +257,43 @@ async def add_to_favorites(
 async def remove_from_favorites(
     material_id: int,
     current_user: dict = Depends(get_current_user_with_subscription),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Удалить материал из избранного"""
     from app.models.library_models import LibraryFavorite
     from app.api.websocket import broadcast_new_activity
     
     # Получаем материал для данных
-    material = db.execute(
-        select(LibraryMaterial).where(LibraryMaterial.id == material_id)
-    ).scalar_one_or_none()
+    material = (await db.execute(
+        select(LibraryMaterial.title, LibraryCategory.icon)
+        .outerjoin(LibraryCategory, LibraryCategory.id == LibraryMaterial.category_id)
+        .where(LibraryMaterial.id == material_id)
+    )).one_or_none()
     
     category_icon = "📄"
     material_title = "Материал"
     if material:
         material_title = material.title
-        if material.category:
-            category_icon = material.category.icon or "📄"
+        category_icon = material.icon or "📄"
     
-    favorite = db.execute(
+    favorite = (await db.execute(
         select(LibraryFavorite).where(
             LibraryFavorite.user_id == current_user["user_id"],
             LibraryFavorite.material_id == material_id
         )
-    ).scalar_one_or_none()
+    )).scalar_one_or_none()
     
     if favorite:
-        db.delete(favorite)
+        await db.delete(favorite)
+        await db.run_sync(adjust_favorites_count, material_id, -1)
         
         # Логируем удаление
-        db.execute(
+        await db.execute(
             text("INSERT INTO activity_log (user_id, action_type, material_id) VALUES (:user_id, 'favorite_remove', :material_id)"),
             {"user_id": current_user["user_id"], "material_id": material_id}
         )
         
-        db.commit()
+        await db.commit()
         
         # Отправляем событие через WebSocket
         activity_data = {
@@ -286,7 +320,7 @@ async def remove_from_favorites(
 def get_my_history(
     limit: int = Query(20, ge=1, le=100),
     current_user: dict = Depends(get_current_user_with_subscription),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Получить историю просмотров (уникальные материалы)"""
     # Берём последние уникальные просмотры
@@ -311,6 +345,7 @@ def get_my_history(
     
     materials = db.execute(
         select(LibraryMaterial)
+        .options(*LibraryMaterial.list_load_options())
         .where(
             LibraryMaterial.id.in_(material_ids),
             LibraryMaterial.is_published == True
@@ -321,14 +356,14 @@ def get_my_history(
     materials_dict = {m.id: m for m in materials}
     result = [materials_dict[mid] for mid in material_ids if mid in materials_dict]
     
-    # Оптимизация: добавляем cover_url, убираем base64
-    return [add_cover_url(m.to_dict()) for m in result]
+    # Оптимизация: только колонки списка, cover_url вместо base64
+    return [add_cover_url(m.to_list_dict()) for m in result]
 
 
 @router.get("/stats/my")
 def get_my_stats(
     current_user: dict = Depends(get_current_user_with_subscription),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Получить статистику пользователя"""
     from app.models.library_models import LibraryFavorite
@@ -415,6 +450,8 @@ def create_material(
         db.commit()
         db.refresh(material)
     
+    on_material_saved(db, material)
+    
     # Логируем действие и рассылаем через WebSocket
     log_admin_action(db, current_user, 'create', 'material', material.id, material.title, background_tasks)
     
@@ -450,6 +487,8 @@ def update_material(
     
     # Определяем тип действия
     update_data = data.model_dump(exclude_unset=True)
+    if is_own_cover_url(update_data.get('cover_image')):
+        update_data.pop('cover_image')  # обложка не менялась
     old_published = material.is_published
     
     print(f"🔄 UPDATE material {material_id}")
@@ -488,6 +527,8 @@ def update_material(
     ).scalar_one()
     print(f"   After reload - categories: {[c.id for c in material.categories]}")
     
+    on_material_saved(db, material)
+    
     # Логируем действие
     if 'is_published' in update_data and update_data['is_published'] != old_published:
         action = 'publish' if material.is_published else 'unpublish'
@@ -522,6 +563,8 @@ def delete_material(
     db.delete(material)
     db.commit()
     
+    on_material_deleted(db, material_id_for_log)
+    
     # Логируем действие
     log_admin_action(db, current_user, 'delete', 'material', material_id_for_log, material_title, background_tasks)
     
@@ -631,56 +674,89 @@ def get_recommendations(
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
-    """Персональные рекомендации на основе просмотров пользователя"""
-    service = RecommendationService(db)
-    return service.get_recommendations(current_user["user_id"], limit)
+    """
+    Персональные рекомендации на основе просмотров пользователя.
+    Отдаются из хранилища (пересчёт в фоне), generated_at — когда посчитаны.
+    """
+    return recommendation_store.get(db, current_user["user_id"], limit)
 
 
 # ============================================
 # ЭНДПОИНТ ДЛЯ ОБЛОЖКИ (оптимизация загрузки)
 # ============================================
 
-from fastapi.responses import Response, RedirectResponse
-import base64
+from fastapi import Request
+from fastapi.responses import RedirectResponse
+from app.services.cover_storage import (
+    cover_path, file_response, negotiate_thumbnail_format, pick_thumbnail_width
+)
+from app.utils.images import IMAGE_FORMATS
 
 @router.get("/{material_id}/cover")
 def get_material_cover(
     material_id: int,
+    request: Request,
+    v: Optional[str] = None,
+    w: Optional[int] = Query(None, ge=16, le=4096, description="Ширина миниатюры в px"),
     db: Session = Depends(get_db)
 ):
     """
-    Получить обложку материала как изображение.
-    Возвращает бинарные данные картинки вместо base64.
-    Кэшируется браузером на 1 год.
+    Получить обложку материала как изображение из хранилища.
+    Поддерживает ETag/Last-Modified (304). С параметром ?v=<хэш> кэшируется браузером навсегда.
+    С ?w= отдаёт миниатюру в лучшем формате из Accept (AVIF/WebP/JPEG).
     """
-    material = db.query(LibraryMaterial).filter(LibraryMaterial.id == material_id).first()
+    row = db.execute(
+        select(LibraryMaterial.cover_hash, LibraryMaterial.cover_image)
+        .where(LibraryMaterial.id == material_id)
+    ).first()
     
-    if not material:
+    if not row:
         raise HTTPException(status_code=404, detail="Материал не найден")
     
-    if not material.cover_image:
-        raise HTTPException(status_code=404, detail="У материала нет обложки")
+    cover_hash, cover_image = row
     
-    cover = material.cover_image
+    # Если это внешний URL — делаем редирект
+    if not cover_hash and cover_image and (cover_image.startswith('http://') or cover_image.startswith('https://')):
+        return RedirectResponse(url=cover_image, status_code=302)
     
-    # Если это base64 data URL
-    if cover.startswith('data:'):
-        try:
-            # Формат: data:image/jpeg;base64,/9j/4AAQ...
-            header, data = cover.split(',', 1)
-            mime_type = header.split(':')[1].split(';')[0]
-            image_data = base64.b64decode(data)
-            return Response(
-                content=image_data, 
-                media_type=mime_type,
-                headers={"Cache-Control": "public, max-age=31536000"}  # Кэш на 1 год
-            )
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Ошибка обработки изображения: {str(e)}")
+    storage = CoverStorage(db)
     
-    # Если это внешний URL — делаем редирект
-    if cover.startswith('http://') or cover.startswith('https://'):
-        return RedirectResponse(url=cover, status_code=302)
+    # Старый base64 в строке — выносим в хранилище при первом запросе
+    if not cover_hash and cover_image and cover_image.startswith('data:'):
+        cover_hash = storage.migrate_material(material_id)
+        if not cover_hash:
+            raise HTTPException(status_code=500, detail="Ошибка обработки изображения")
+        on_material_saved(db, db.get(LibraryMaterial, material_id))
+    
+    if not cover_hash:
+        raise HTTPException(status_code=404, detail="У материала нет обложки")
     
-    # Неизвестный формат
-    raise HTTPException(status_code=400, detail="Неподдерживаемый формат обложки")
+    cover = storage.get(cover_hash)
+    path = cover_path(cover.hash, cover.mime_type) if cover else None
+    if path is None or not path.exists():
+        raise HTTPException(status_code=404, detail="Файл обложки не найден")
+    
+    # Версионированный URL неизменяем, без версии — просим браузер перепроверять
+    immutable = bool(v) and cover.hash.startswith(v)
+    max_age = 31536000 if immutable else 0
+    
+    if w is not None:
+        fmt = negotiate_thumbnail_format(request.headers.get("accept"))
+        thumbnail = storage.get_thumbnail(cover, pick_thumbnail_width(w), fmt)
+        if thumbnail is not None:
+            mime_type = IMAGE_FORMATS[fmt][1]
+            return file_response(
+                request, cover_path(thumbnail.hash, mime_type), mime_type,
+                etag=thumbnail.hash,
+                last_modified=thumbnail.created_at,
+                max_age=max_age,
+                vary="Accept"
+            )
+    
+    return file_response(
+        request, path, cover.mime_type,
+        etag=cover.hash,
+        last_modified=cover.created_at,
+        max_age=max_age,
+        vary="Accept" if w is not None else None
+    )
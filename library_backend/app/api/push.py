@@ -12,6 +12,7 @@ import os
 
 from app.database import get_db, Base, engine
 from app.api.dependencies import get_current_user
+from app.services import principal_cache, revocations
 
 router = APIRouter(prefix="/push", tags=["push"])
 
@@ -327,18 +328,19 @@ def get_analytics(
         ORDER BY day
     """)).fetchall()
     
-    # Топ-5 материалов за неделю
+    # Топ-5 материалов за неделю (окно 7 дней в library_material_stats сдвигается сверкой раз в сутки)
     top_materials = db.execute(text("""
-        SELECT m.id, m.title, COUNT(v.id) as views
-        FROM library_materials m
-        LEFT JOIN library_views v ON v.material_id = m.id AND v.viewed_at >= DATE('now', '-7 days')
-        GROUP BY m.id
-        ORDER BY views DESC
+        /* full-scan */
+        SELECT m.id, m.title, s.views_7d as views
+        FROM library_material_stats s
+        JOIN library_materials m ON m.id = s.material_id
+        ORDER BY s.views_7d DESC
         LIMIT 5
     """)).fetchall()
     
     # Среднее время просмотра (если есть duration_seconds)
     avg_duration = db.execute(text("""
+        /* full-scan */
         SELECT AVG(duration_seconds) FROM library_views WHERE duration_seconds > 0
     """)).scalar() or 0
     
@@ -406,8 +408,13 @@ def force_logout_user(
     
     result = db.execute(text("UPDATE users SET token_version = COALESCE(token_version, 1) + 1 WHERE telegram_id = :tid"), {"tid": telegram_id})
     db.commit()
+    principal_cache.invalidate(telegram_id)
     
     if result.rowcount == 0:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
     
+    # Access-токены со старой версией перестают приниматься сразу, refresh — сверяется с БД
+    token_version = db.execute(text("SELECT token_version FROM users WHERE telegram_id = :tid"), {"tid": telegram_id}).scalar()
+    revocations.revoke(telegram_id, token_version)
+    
     return {"success": True, "message": "Пользователь разлогинен"}
@@ -1,19 +1,70 @@
 """
 WebSocket для отслеживания онлайн пользователей
 С Redis pub/sub для синхронизации между workers
+
+Темы рассылки (?topics=a,b — подмножество доступных странице, по умолчанию — набор страницы):
+- presence — снимки и дельты онлайн-списков (admin)
+- presence_count — только {"type": "presence_count", "library_count", "admin_count"},
+  не чаще раза за окно WS_COALESCE_MS (library; admin может запросить)
+- activity — new_activity (admin)
+- admin_actions — admin_action (admin)
+У каждой темы свой Redis-канал (presence_count берёт числа из последней дельты окна),
+соединения сгруппированы по набору тем: кадр собирается один раз на группу.
+
+Протокол присутствия (тема presence):
+- при подключении — снимок {"type": "presence_snapshot", "seq", "data": {"library": [...], "admin": [...]},
+  "library_count", "admin_count"}; он же приходит раз в PRESENCE_SNAPSHOT_INTERVAL_SECONDS и в ответ на "sync"
+- дальше только изменения {"type": "presence_delta", "seq", "op": "join" | "leave", "page",
+  "user" (join) | "telegram_id" (leave), "library_count", "admin_count"}
+- seq общий для всех workers и растёт на 1 с каждым изменением: дельты с seq не больше,
+  чем у снимка, уже учтены в нём; пропуск номера — клиент шлёт "sync"
+
+Redis:
+- presence:{page}:members — sorted set telegram_id -> время последнего heartbeat (ZCARD — счётчик без списка)
+- presence:{page}:conns — hash telegram_id -> число открытых соединений (вкладки, workers)
+- presence:profiles — hash "page:telegram_id" -> JSON профиля (читается только для снимков)
+- presence:seq — номер последнего изменения
+Состояние меняют Lua-скрипты: запись, seq и PUBLISH выполняются атомарно,
+поэтому дельты доходят до всех workers в порядке seq.
+
+Рассылка: события из Redis копятся WS_COALESCE_MS и уходят группе одним кадром
+{"type": "batch", "events": [...]} (одно событие — как есть). У каждого соединения своя
+очередь на WS_SEND_QUEUE_SIZE кадров и задача-писатель: рассылка только кладёт кадр в очереди,
+медленный клиент (очередь полна или кадр не ушёл за WS_SEND_TIMEOUT_SECONDS) отключается
+с кодом 1013 и переподключается.
+
+Формат кадров (?format=): json — текстовые кадры (по умолчанию; сервер кодирует строку в UTF-8
+для каждого сокета отдельно), bin — тот же JSON бинарными кадрами, msgpack — бинарный msgpack
+(нужен пакет msgpack). Кадр рассылки (Frame) кодируется один раз на формат, и все сокеты
+получают один и тот же буфер; "pong" всегда текстом.
+
+Подключение не ходит в БД синхронно: профиль берётся из claims access-токена, для старых
+токенов — из principal_cache (общего с get_current_user) или через aiosqlite.
+Счётчики подключений worker'а — GET /api/ws/metrics (только админам).
 """
 
 import json
 import asyncio
 import os
-from typing import Dict
+import time
+from collections import Counter, deque
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple, Union
 from datetime import datetime
 
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
-from jose import jwt, JWTError
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect, Query
 import redis.asyncio as redis
 
+from app.api.admin import require_admin
+from app.api.dependencies import load_user
 from app.config import settings
+from app.database import AsyncReadSessionLocal
+from app.services import is_admin, principal_cache, principal_from_claims
+from app.utils.auth import ACCESS_TOKEN, REFRESH_TOKEN, verify_token
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - зависит от окружения
+    msgpack = None
 
 
 router = APIRouter(tags=["WebSocket"])
@@ -21,61 +72,414 @@ router = APIRouter(tags=["WebSocket"])
 # Redis URL
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
 
+PAGES = ("library", "admin")
+
 # Redis ключи
-REDIS_ONLINE_USERS_KEY = "presence:online_users"
-REDIS_CHANNEL = "presence:broadcast"
+REDIS_PROFILES_KEY = "presence:profiles"
+REDIS_SEQ_KEY = "presence:seq"
+REDIS_DELTA_CHANNEL = "presence:deltas"
+REDIS_ACTIVITY_CHANNEL = "presence:activity"
+REDIS_ADMIN_ACTIONS_CHANNEL = "presence:admin_actions"
+
+# Redis-канал -> тема
+CHANNEL_TOPICS = {
+    REDIS_DELTA_CHANNEL: "presence",
+    REDIS_ACTIVITY_CHANNEL: "activity",
+    REDIS_ADMIN_ACTIONS_CHANNEL: "admin_actions",
+}
+# Темы, доступные странице, и темы по умолчанию
+PAGE_TOPICS = {
+    "library": frozenset({"presence_count"}),
+    "admin": frozenset({"presence", "presence_count", "activity", "admin_actions"}),
+}
+DEFAULT_TOPICS = {
+    "library": frozenset({"presence_count"}),
+    "admin": frozenset({"presence", "activity", "admin_actions"}),
+}
+
+
+def parse_topics(page: str, topics: Optional[str]) -> FrozenSet[str]:
+    """Темы соединения: из ?topics= (недоступные странице отбрасываются) или по умолчанию"""
+    if topics is None:
+        return DEFAULT_TOPICS[page]
+    return frozenset(topic.strip() for topic in topics.split(",")) & PAGE_TOPICS[page]
+
+
+def _members_key(page: str) -> str:
+    return f"presence:{page}:members"
+
+
+def _conns_key(page: str) -> str:
+    return f"presence:{page}:conns"
+
+
+# Общая часть скриптов.
+# KEYS: members страницы, conns страницы, profiles, seq, members library, members admin
+# ARGV: канал дельт, страница, telegram_id, ...
+_LUA_COMMON = """
+local function publish(event)
+    event.type = 'presence_delta'
+    event.page = ARGV[2]
+    event.seq = redis.call('INCR', KEYS[4])
+    event.library_count = redis.call('ZCARD', KEYS[5])
+    event.admin_count = redis.call('ZCARD', KEYS[6])
+    redis.call('PUBLISH', ARGV[1], cjson.encode(event))
+    return event.seq
+end
+
+local function add_member(member, profile, now)
+    redis.call('ZADD', KEYS[1], now, member)
+    redis.call('HSET', KEYS[3], ARGV[2] .. ':' .. member, profile)
+    return publish({op = 'join', user = cjson.decode(profile)})
+end
+
+local function remove_member(member)
+    redis.call('HDEL', KEYS[2], member)
+    redis.call('HDEL', KEYS[3], ARGV[2] .. ':' .. member)
+    if redis.call('ZREM', KEYS[1], member) == 0 then
+        return 0
+    end
+    return publish({op = 'leave', telegram_id = tonumber(member)})
+end
+"""
+
+# ARGV[4]: профиль JSON, ARGV[5]: время
+_JOIN_LUA = _LUA_COMMON + """
+if redis.call('HINCRBY', KEYS[2], ARGV[3], 1) > 1 then
+    redis.call('ZADD', KEYS[1], ARGV[5], ARGV[3])
+    return 0
+end
+return add_member(ARGV[3], ARGV[4], ARGV[5])
+"""
+
+_LEAVE_LUA = _LUA_COMMON + """
+if redis.call('HINCRBY', KEYS[2], ARGV[3], -1) > 0 then
+    return 0
+end
+return remove_member(ARGV[3])
+"""
+
+# Heartbeat. ARGV[4]: профиль JSON, ARGV[5]: время, ARGV[6]: число соединений в этом worker'е
+_TOUCH_LUA = _LUA_COMMON + """
+if redis.call('ZSCORE', KEYS[1], ARGV[3]) then
+    redis.call('ZADD', KEYS[1], ARGV[5], ARGV[3])
+    return 0
+end
+-- Запись сняли как устаревшую, а соединение живо — возвращаем
+redis.call('HSET', KEYS[2], ARGV[3], ARGV[6])
+return add_member(ARGV[3], ARGV[4], ARGV[5])
+"""
+
+# ARGV[3] здесь — граница: снимаются все, чей heartbeat старше
+_PRUNE_LUA = _LUA_COMMON + """
+local stale = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[3])
+for _, member in ipairs(stale) do
+    remove_member(member)
+end
+return #stale
+"""
+
+
+FRAME_FORMATS = ("json", "bin", "msgpack")
+
+
+class ConnectMetrics:
+    """Подключения этого worker'а: частота за последнюю минуту, исходы, источник профиля, время авторизации"""
+    
+    WINDOW_SECONDS = 60
+    
+    def __init__(self):
+        self.counters: Counter = Counter()
+        self._connects: deque = deque()  # time.monotonic() попыток подключения за окно
+        self._auth_ms: deque = deque(maxlen=1000)
+    
+    def attempt(self):
+        now = time.monotonic()
+        self.counters["attempts"] += 1
+        self._connects.append(now)
+        self._trim(now)
+    
+    def record(self, name: str):
+        self.counters[name] += 1
+    
+    def auth_time(self, seconds: float):
+        self._auth_ms.append(seconds * 1000)
+    
+    def _trim(self, now: float):
+        while self._connects and self._connects[0] < now - self.WINDOW_SECONDS:
+            self._connects.popleft()
+    
+    def snapshot(self) -> dict:
+        self._trim(time.monotonic())
+        auth_ms = sorted(self._auth_ms)
+        return {
+            "connects_last_minute": len(self._connects),
+            "connects_per_second": round(len(self._connects) / self.WINDOW_SECONDS, 2),
+            "counters": dict(self.counters),
+            "auth_ms": {
+                "p50": round(auth_ms[len(auth_ms) // 2], 3),
+                "p95": round(auth_ms[min(len(auth_ms) - 1, int(len(auth_ms) * 0.95))], 3),
+                "max": round(auth_ms[-1], 3),
+            } if auth_ms else {},
+        }
+
+
+connect_metrics = ConnectMetrics()
+
+
+class Frame:
+    """Кадр рассылки: кодируется один раз на формат, все сокеты получают один объект"""
+    
+    __slots__ = ("text", "_utf8", "_msgpack")
+    
+    def __init__(self, text: str):
+        self.text = text
+        self._utf8: Optional[bytes] = None
+        self._msgpack: Optional[bytes] = None
+    
+    def encoded(self, frame_format: str) -> Union[str, bytes]:
+        """Данные кадра в формате соединения (str — текстовый кадр, bytes — бинарный)"""
+        if frame_format == "bin":
+            if self._utf8 is None:
+                self._utf8 = self.text.encode("utf-8")
+            return self._utf8
+        if frame_format == "msgpack":
+            if self._msgpack is None:
+                self._msgpack = msgpack.packb(json.loads(self.text))
+            return self._msgpack
+        return self.text
+
+
+def frame_format_supported(frame_format: str) -> bool:
+    return frame_format in FRAME_FORMATS and (frame_format != "msgpack" or msgpack is not None)
+
+
+class ClientConnection:
+    """WebSocket с очередью отправки: кадры пишет отдельная задача, рассылка не ждёт клиента"""
+    
+    def __init__(
+        self,
+        websocket: WebSocket,
+        page: str,
+        user_id: int,
+        topics: FrozenSet[str],
+        frame_format: str = "json"
+    ):
+        self.websocket = websocket
+        self.page = page
+        self.user_id = user_id
+        self.topics = topics
+        self.frame_format = frame_format
+        self.closed = False
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=settings.WS_SEND_QUEUE_SIZE)
+        self._writer = asyncio.create_task(self._write())
+    
+    def send(self, frame: Union[Frame, str]) -> bool:
+        """
+        Поставить кадр в очередь (False — соединение закрыто или отключено как медленное).
+        str уходит текстом как есть (ответы вроде "pong"), Frame — в формате соединения.
+        """
+        if self.closed:
+            return False
+        try:
+            self._queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            self.evict("send queue full")
+            return False
+        return True
+    
+    async def _write(self):
+        try:
+            # Проверка closed, а не только отмена: wait_for может проглотить cancel(),
+            # пришедший в момент завершения отправки
+            while not self.closed:
+                frame = await self._queue.get()
+                data = frame.encoded(self.frame_format) if isinstance(frame, Frame) else frame
+                if isinstance(data, bytes):
+                    sending = self.websocket.send_bytes(data)
+                else:
+                    sending = self.websocket.send_text(data)
+                await asyncio.wait_for(sending, settings.WS_SEND_TIMEOUT_SECONDS)
+        except asyncio.CancelledError:
+            pass
+        except asyncio.TimeoutError:
+            self.evict("send timeout")
+        except Exception:
+            # Соединение закрыто — из Redis его снимет disconnect
+            self.closed = True
+    
+    def evict(self, reason: str):
+        """Отключить медленного клиента (обработчик соединения получит disconnect)"""
+        if self.closed:
+            return
+        self.closed = True
+        print(f"🐢 Slow WebSocket client {self.user_id} ({self.page}) evicted: {reason}")
+        connect_metrics.record("evicted")
+        self._writer.cancel()
+        asyncio.create_task(self._close(code=1013, reason="Slow consumer"))
+    
+    async def _close(self, code: int, reason: str):
+        try:
+            await self.websocket.close(code=code, reason=reason)
+        except Exception:
+            pass
+    
+    def stop(self):
+        """Остановить писателя (соединение уже закрыто)"""
+        self.closed = True
+        self._writer.cancel()
 
 
 class ConnectionManager:
     """Менеджер WebSocket соединений с Redis для синхронизации между workers"""
     
     def __init__(self):
-        # Локальные WebSocket соединения этого worker'а
-        self.local_connections: Dict[str, Dict[int, WebSocket]] = {
-            "library": {},
-            "admin": {}
-        }
+        # Локальные WebSocket соединения этого worker'а (у пользователя может быть несколько вкладок)
+        self.local_connections: Dict[str, Dict[int, Set[ClientConnection]]] = {page: {} for page in PAGES}
+        # Профили локальных пользователей (page, telegram_id) -> JSON — для heartbeat
+        self._profiles: Dict[Tuple[str, int], str] = {}
         self.redis: redis.Redis = None
         self.pubsub = None
         self._listener_task = None
+        self._maintenance_task = None
+        # Локальные соединения по набору тем (кадр рассылки собирается один раз на набор)
+        self._audiences: Dict[FrozenSet[str], Set[ClientConnection]] = {}
+        # События из Redis, ждущие отправки одним кадром: (тема, JSON)
+        self._pending: List[Tuple[str, str]] = []
+        self._flush_task = None
     
     async def init_redis(self):
         """Инициализация Redis соединения"""
         if not self.redis:
             self.redis = redis.from_url(REDIS_URL, decode_responses=True)
+            self._join_script = self.redis.register_script(_JOIN_LUA)
+            self._leave_script = self.redis.register_script(_LEAVE_LUA)
+            self._touch_script = self.redis.register_script(_TOUCH_LUA)
+            self._prune_script = self.redis.register_script(_PRUNE_LUA)
             self.pubsub = self.redis.pubsub()
-            await self.pubsub.subscribe(REDIS_CHANNEL)
-            # Запускаем слушатель в фоне
+            await self.pubsub.subscribe(*CHANNEL_TOPICS)
+            # Запускаем слушатель и обслуживание в фоне
             self._listener_task = asyncio.create_task(self._listen_redis())
+            self._maintenance_task = asyncio.create_task(self._maintain())
             print(f"🔴 Redis connected for WebSocket presence")
     
     async def _listen_redis(self):
-        """Слушаем Redis канал для получения обновлений от других workers"""
+        """Слушаем Redis каналы для получения обновлений от других workers"""
         try:
             async for message in self.pubsub.listen():
                 if message["type"] == "message":
-                    await self._handle_redis_message(message["data"])
+                    topic = CHANNEL_TOPICS.get(message["channel"])
+                    if topic:
+                        self._enqueue(topic, message["data"])
         except asyncio.CancelledError:
             pass
         except Exception as e:
             print(f"Redis listener error: {e}")
     
-    async def _handle_redis_message(self, data: str):
-        """Обработка сообщения из Redis — рассылаем всем локальным соединениям"""
-        # Рассылаем всем локальным WebSocket соединениям
-        for page in ["library", "admin"]:
-            disconnected = []
-            for user_id, ws in list(self.local_connections[page].items()):
-                try:
-                    await ws.send_text(data)
-                except Exception:
-                    disconnected.append(user_id)
-            
-            for user_id in disconnected:
-                if user_id in self.local_connections[page]:
-                    del self.local_connections[page][user_id]
+    def _subscribed(self, topic: str) -> bool:
+        return any(topic in topics for topics in self._audiences)
+    
+    def _enqueue(self, topic: str, data: str):
+        """Отложить событие до отправки пачкой (раз в WS_COALESCE_MS)"""
+        # Дельты нужны и подписчикам presence_count — числа берутся из них
+        if not (self._subscribed(topic) or (topic == "presence" and self._subscribed("presence_count"))):
+            return
+        self._pending.append((topic, data))
+        if settings.WS_COALESCE_MS <= 0:
+            self._flush()
+        elif self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
     
-    async def connect(self, websocket: WebSocket, user_data: dict, page: str):
+    async def _flush_later(self):
+        try:
+            await asyncio.sleep(settings.WS_COALESCE_MS / 1000)
+        finally:
+            self._flush_task = None
+        self._flush()
+    
+    def _flush(self):
+        """Разослать накопленные события: каждой группе соединений — только её темы, одним кадром"""
+        pending, self._pending = self._pending, []
+        count_frame = None
+        for topics, connections in list(self._audiences.items()):
+            events = [data for topic, data in pending if topic in topics]
+            if "presence_count" in topics and "presence" not in topics:
+                if count_frame is None:
+                    count_frame = self._count_frame(pending)
+                if count_frame:
+                    events.append(count_frame)
+            if len(events) == 1:
+                self._fan_out(connections, Frame(events[0]))
+            elif events:
+                # События уже JSON — склеиваем без повторного разбора
+                self._fan_out(connections, Frame('{"type": "batch", "events": [' + ", ".join(events) + "]}"))
+    
+    @staticmethod
+    def _count_frame(pending: List[Tuple[str, str]]) -> str:
+        """Кадр presence_count по последней дельте окна ("" — дельт не было)"""
+        for topic, data in reversed(pending):
+            if topic == "presence":
+                delta = json.loads(data)
+                return json.dumps({
+                    "type": "presence_count",
+                    "library_count": delta["library_count"],
+                    "admin_count": delta["admin_count"]
+                })
+        return ""
+    
+    def _fan_out(self, connections, frame: Frame):
+        """Поставить кадр в очереди соединений (без ожидания отправки; кодируется один раз на формат)"""
+        for connection in list(connections):
+            connection.send(frame)
+    
+    def _topic_connections(self, topic: str):
+        for topics, connections in self._audiences.items():
+            if topic in topics:
+                yield from connections
+    
+    def _script_keys(self, page: str) -> list:
+        return [
+            _members_key(page), _conns_key(page), REDIS_PROFILES_KEY, REDIS_SEQ_KEY,
+            _members_key("library"), _members_key("admin"),
+        ]
+    
+    async def _maintain(self):
+        """
+        Раз в PRESENCE_SNAPSHOT_INTERVAL_SECONDS: heartbeat своих пользователей,
+        снятие тех, чей worker пропал, и снимок локальным соединениям админки
+        """
+        interval = max(settings.PRESENCE_SNAPSHOT_INTERVAL_SECONDS, 1)
+        while True:
+            try:
+                await asyncio.sleep(interval)
+                now = time.time()
+                for (page, user_id), profile in list(self._profiles.items()):
+                    connections = self.local_connections[page].get(user_id)
+                    if connections:
+                        await self._touch_script(
+                            keys=self._script_keys(page),
+                            args=[REDIS_DELTA_CHANNEL, page, user_id, profile, now, len(connections)]
+                        )
+                for page in PAGES:
+                    await self._prune_script(
+                        keys=self._script_keys(page),
+                        args=[REDIS_DELTA_CHANNEL, page, now - settings.PRESENCE_STALE_SECONDS]
+                    )
+                if self._subscribed("presence"):
+                    self._fan_out(self._topic_connections("presence"), Frame(await self.snapshot_message()))
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                print(f"Presence maintenance error: {e}")
+    
+    async def connect(
+        self,
+        websocket: WebSocket,
+        user_data: dict,
+        page: str,
+        topics: FrozenSet[str],
+        frame_format: str = "json"
+    ) -> ClientConnection:
         """Подключение пользователя"""
         await self.init_redis()
         await websocket.accept()
@@ -84,10 +488,11 @@ class ConnectionManager:
         print(f"🟢 User {user_data['first_name']} ({user_id}) connected to {page}")
         
         # Сохраняем локальное соединение
-        self.local_connections[page][user_id] = websocket
+        connection = ClientConnection(websocket, page, user_id, topics, frame_format)
+        self.local_connections[page].setdefault(user_id, set()).add(connection)
+        self._audiences.setdefault(topics, set()).add(connection)
         
-        # Сохраняем в Redis (глобальное состояние)
-        user_key = f"{page}:{user_id}"
+        # Сохраняем в Redis (глобальное состояние); дельта join уходит только при первом соединении
         user_info = {
             "telegram_id": user_data["telegram_id"],
             "first_name": user_data["first_name"],
@@ -96,62 +501,113 @@ class ConnectionManager:
             "admin_group": user_data.get("admin_group"),
             "connected_at": datetime.now().isoformat()
         }
-        await self.redis.hset(REDIS_ONLINE_USERS_KEY, user_key, json.dumps(user_info, ensure_ascii=False))
-        
-        # Рассылаем обновление всем через Redis
-        await self.broadcast_online_users()
+        profile = self._profiles.setdefault((page, user_id), json.dumps(user_info, ensure_ascii=False))
+        joined = False
+        try:
+            await self._join_script(
+                keys=self._script_keys(page),
+                args=[REDIS_DELTA_CHANNEL, page, user_id, profile, time.time()]
+            )
+            joined = True
+            
+            if "presence" in topics:
+                await self.send_snapshot(connection)
+            elif "presence_count" in topics:
+                connection.send(Frame(json.dumps({"type": "presence_count", **await self.get_online_counts()})))
+        except Exception:
+            # Обработчик соединения ещё не дошёл до своего finally — снимаем регистрацию здесь
+            self._forget(connection)
+            if joined:
+                try:
+                    await self._leave_script(keys=self._script_keys(page), args=[REDIS_DELTA_CHANNEL, page, user_id])
+                except Exception as e:
+                    print(f"Presence leave error: {e}")
+            raise
+        return connection
     
-    async def disconnect(self, user_id: int, page: str):
+    async def disconnect(self, connection: ClientConnection):
         """Отключение пользователя"""
-        # Удаляем локальное соединение
-        if user_id in self.local_connections[page]:
-            del self.local_connections[page][user_id]
+        self._forget(connection)
         
-        # Удаляем из Redis
+        # Уменьшаем счётчик соединений в Redis; дельта leave — когда он дошёл до нуля
         if self.redis:
-            user_key = f"{page}:{user_id}"
-            await self.redis.hdel(REDIS_ONLINE_USERS_KEY, user_key)
+            await self._leave_script(
+                keys=self._script_keys(connection.page),
+                args=[REDIS_DELTA_CHANNEL, connection.page, connection.user_id]
+            )
+    
+    def _forget(self, connection: ClientConnection):
+        """Остановить писателя и убрать соединение из локальных рассылок"""
+        page, user_id = connection.page, connection.user_id
+        connection.stop()
         
-        # Рассылаем обновление всем
-        await self.broadcast_online_users()
+        # Удаляем локальное соединение
+        audience = self._audiences.get(connection.topics)
+        if audience is not None:
+            audience.discard(connection)
+            if not audience:
+                del self._audiences[connection.topics]
+        
+        connections = self.local_connections[page].get(user_id)
+        if connections is not None:
+            connections.discard(connection)
+            if not connections:
+                del self.local_connections[page][user_id]
+                self._profiles.pop((page, user_id), None)
     
-    async def get_online_users(self) -> dict:
-        """Получить список онлайн пользователей из Redis"""
-        result = {"library": [], "admin": []}
+    async def get_snapshot(self) -> Tuple[int, dict]:
+        """(seq, {"library": [...], "admin": [...]}) — согласованный снимок из Redis"""
+        result = {page: [] for page in PAGES}
         
         if not self.redis:
-            return result
+            return 0, result
         
-        all_users = await self.redis.hgetall(REDIS_ONLINE_USERS_KEY)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.get(REDIS_SEQ_KEY)
+            pipe.hgetall(REDIS_PROFILES_KEY)
+            seq, profiles = await pipe.execute()
         
-        for key, value in all_users.items():
+        for key, value in profiles.items():
             page = key.split(":")[0]
             if page in result:
                 try:
-                    user_data = json.loads(value)
-                    result[page].append(user_data)
+                    result[page].append(json.loads(value))
                 except json.JSONDecodeError:
                     pass
+        for users in result.values():
+            users.sort(key=lambda user: user.get("connected_at") or "")
         
-        return result
+        return int(seq or 0), result
     
-    async def broadcast_online_users(self):
-        """Рассылка списка онлайн пользователей через Redis pub/sub"""
+    async def get_online_users(self) -> dict:
+        """Получить список онлайн пользователей из Redis"""
+        _, online_users = await self.get_snapshot()
+        return online_users
+    
+    async def get_online_counts(self) -> Dict[str, int]:
+        """Число онлайн по страницам (ZCARD, без чтения списков)"""
         if not self.redis:
-            return
+            return {f"{page}_count": 0 for page in PAGES}
         
-        online_users = await self.get_online_users()
-        message = json.dumps({
-            "type": "online_users",
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for page in PAGES:
+                pipe.zcard(_members_key(page))
+            counts = await pipe.execute()
+        return {f"{page}_count": count for page, count in zip(PAGES, counts)}
+    
+    async def snapshot_message(self) -> str:
+        seq, online_users = await self.get_snapshot()
+        return json.dumps({
+            "type": "presence_snapshot",
+            "seq": seq,
             "data": online_users,
             "library_count": len(online_users["library"]),
             "admin_count": len(online_users["admin"])
         }, ensure_ascii=False)
-        
-        print(f"📡 Broadcasting: {len(online_users['library'])} library + {len(online_users['admin'])} admin users")
-        
-        # Публикуем в Redis канал — все workers получат это сообщение
-        await self.redis.publish(REDIS_CHANNEL, message)
+    
+    async def send_snapshot(self, connection: ClientConnection):
+        """Полный снимок одному соединению (подключение или запрос "sync")"""
+        connection.send(Frame(await self.snapshot_message()))
 
     async def broadcast_activity(self, activity_data: dict):
         """Рассылка события активности через Redis"""
@@ -163,7 +619,7 @@ class ConnectionManager:
             "data": activity_data
         }, ensure_ascii=False)
         
-        await self.redis.publish(REDIS_CHANNEL, message)
+        await self.redis.publish(REDIS_ACTIVITY_CHANNEL, message)
     
     async def broadcast_admin_action(self, action_data: dict):
         """Рассылка действия админа через Redis"""
@@ -176,7 +632,7 @@ class ConnectionManager:
         }, ensure_ascii=False)
         
         print(f"📡 Broadcasting admin action: {action_data.get('action')} by {action_data.get('admin_name')}")
-        await self.redis.publish(REDIS_CHANNEL, message)
+        await self.redis.publish(REDIS_ADMIN_ACTIONS_CHANNEL, message)
 
 
 # Глобальный менеджер
@@ -194,67 +650,107 @@ async def broadcast_admin_action(action: dict):
 
 
 def decode_token(token: str) -> dict:
-    """Декодировать JWT токен"""
-    try:
-        payload = jwt.decode(
-            token,
-            settings.SECRET_KEY,
-            algorithms=[settings.ALGORITHM]
-        )
-        return payload
-    except JWTError:
-        return None
+    """Декодировать JWT токен (None — невалидный)"""
+    return verify_token(token)
+
+
+async def load_presence_user(payload: dict) -> Optional[dict]:
+    """
+    Профиль для присутствия без синхронных запросов к БД:
+    access-токен — из claims, старый токен — из principal_cache или через aiosqlite.
+    
+    Returns:
+        None, если пользователя нет
+    Raises:
+        HTTPException 401: сессия отозвана (force-logout)
+    """
+    if payload.get("typ") == ACCESS_TOKEN:
+        connect_metrics.record("profile_from_token")
+        return principal_from_claims(payload)
+    
+    telegram_id = payload["telegram_id"]
+    cached = principal_cache.get_user(telegram_id)
+    if cached is not None:
+        connect_metrics.record("profile_cache_hit")
+        return cached
+    
+    connect_metrics.record("profile_db")
+    async with AsyncReadSessionLocal() as db:
+        return await load_user(db, telegram_id)
+
+
+def can_watch_admin(telegram_id: int, user: dict) -> bool:
+    """Админ по ADMIN_IDS (как require_admin) или участник группы админов"""
+    return is_admin(telegram_id) or bool(user.get("admin_group"))
+
+
+async def reject(websocket: WebSocket, code: int, reason: str, metric: str):
+    connect_metrics.record(f"rejected_{metric}")
+    await websocket.close(code=code, reason=reason)
 
 
 @router.websocket("/ws/presence")
 async def websocket_presence(
     websocket: WebSocket,
     token: str = Query(...),
-    page: str = Query(default="library")
+    page: str = Query(default="library"),
+    topics: Optional[str] = Query(default=None),
+    frame_format: str = Query(default="json", alias="format")
 ):
     """
     WebSocket для отслеживания присутствия пользователей
     
     Query params:
     - token: JWT токен
-    - page: "library" или "admin"
+    - page: "library" или "admin" (только админам, иначе закрытие с кодом 4003)
+    - topics: темы через запятую (по умолчанию — все темы страницы)
+    - format: "json" (текстовые кадры), "bin" (JSON бинарными кадрами) или "msgpack"
+    
+    Сообщения клиента: "ping" (ответ "pong"), "sync" (админка: прислать снимок заново)
     """
+    connect_metrics.attempt()
+    if page not in PAGES:
+        await reject(websocket, 4000, "Unknown page", "bad_request")
+        return
+    if not frame_format_supported(frame_format):
+        await reject(websocket, 4000, "Unsupported format", "bad_request")
+        return
+    
     # Проверяем токен
     payload = decode_token(token)
-    if not payload:
-        await websocket.close(code=4001, reason="Invalid token")
+    # Refresh-токен годится только для /api/auth/refresh, как и в REST (get_current_user)
+    if not payload or not payload.get("telegram_id") or payload.get("typ") == REFRESH_TOKEN:
+        await reject(websocket, 4001, "Invalid token", "invalid_token")
         return
+    telegram_id = payload["telegram_id"]
     
-    telegram_id = payload.get("telegram_id")
-    if not telegram_id:
-        await websocket.close(code=4001, reason="Invalid token")
+    started = time.perf_counter()
+    try:
+        user = await load_presence_user(payload)
+    except HTTPException:
+        await reject(websocket, 4001, "Session revoked", "revoked")
         return
+    connect_metrics.auth_time(time.perf_counter() - started)
     
-    # Получаем данные пользователя из БД (упрощённо через токен)
-    # В реальности нужно запросить из БД
-    from app.database import get_db
-    from sqlalchemy import text
-    
-    db = next(get_db())
-    result = db.execute(
-        text("SELECT telegram_id, first_name, username, photo_url, admin_group FROM users WHERE telegram_id = :tg_id"),
-        {"tg_id": telegram_id}
-    ).fetchone()
-    
-    if not result:
-        await websocket.close(code=4004, reason="User not found")
+    if not user:
+        await reject(websocket, 4004, "User not found", "user_not_found")
+        return
+    # Страница админки (списки онлайн с фото, действия админов) — только админам, не по ?page=
+    if page == "admin" and not can_watch_admin(telegram_id, user):
+        await reject(websocket, 4003, "Forbidden", "forbidden")
         return
     
     user_data = {
-        "telegram_id": result[0],
-        "first_name": result[1],
-        "username": result[2],
-        "photo_url": result[3],
-        "admin_group": result[4]
+        "telegram_id": telegram_id,
+        "first_name": user["first_name"],
+        "username": user["username"],
+        "photo_url": user["photo_url"],
+        "admin_group": user["admin_group"]
     }
     
     # Подключаем
-    await manager.connect(websocket, user_data, page)
+    connection = await manager.connect(websocket, user_data, page, parse_topics(page, topics), frame_format)
+    connect_metrics.record("accepted")
     
     try:
         while True:
@@ -262,17 +758,40 @@ async def websocket_presence(
             data = await websocket.receive_text()
             
             if data == "ping":
-                await websocket.send_text("pong")
+                connection.send("pong")
+            elif data == "sync" and "presence" in connection.topics:
+                # Клиент заметил пропуск seq
+                await manager.send_snapshot(connection)
     
     except WebSocketDisconnect:
-        await manager.disconnect(telegram_id, page)
+        pass
     except Exception as e:
         print(f"WebSocket error: {e}")
-        await manager.disconnect(telegram_id, page)
+    finally:
+        connect_metrics.record("disconnects")
+        await manager.disconnect(connection)
 
 
 @router.get("/api/online-users")
-async def get_online_users_endpoint():
-    """REST endpoint для получения онлайн пользователей"""
+async def get_online_users_endpoint(counts_only: bool = Query(default=False)):
+    """
+    REST endpoint для получения онлайн пользователей
+    
+    counts_only=true — только {"library_count", "admin_count"} (без чтения списков)
+    """
     await manager.init_redis()
+    if counts_only:
+        return await manager.get_online_counts()
     return await manager.get_online_users()
+
+
+@router.get("/api/ws/metrics")
+async def get_ws_metrics_endpoint(admin: dict = Depends(require_admin)):
+    """Подключения WebSocket этого worker'а (у каждого worker'а свои счётчики, только админам)"""
+    return {
+        **connect_metrics.snapshot(),
+        "open_connections": {
+            page: sum(len(connections) for connections in manager.local_connections[page].values())
+            for page in PAGES
+        },
+    }
@@ -21,11 +21,42 @@ class Settings:
         "DATABASE_URL",
         f"sqlite:///{BASE_DIR.parent}/momsclub.db"  # Для локальной разработки
     )
+    # Та же БД через асинхронный драйвер (по умолчанию sqlite:// -> sqlite+aiosqlite://)
+    ASYNC_DATABASE_URL: str = os.getenv(
+        "ASYNC_DATABASE_URL",
+        DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    )
+    # БД для эндпоинтов только на чтение (реплика); пусто — тот же файл SQLite в режиме read-only
+    READ_DATABASE_URL: str = os.getenv("READ_DATABASE_URL", "")
+    
+    # Профиль SQLite: PRAGMA на каждое новое соединение
+    DB_JOURNAL_MODE: str = os.getenv("DB_JOURNAL_MODE", "WAL")  # WAL: читатели не ждут писателей (бота)
+    DB_SYNCHRONOUS: str = os.getenv("DB_SYNCHRONOUS", "NORMAL")
+    DB_BUSY_TIMEOUT_MS: int = int(os.getenv("DB_BUSY_TIMEOUT_MS", 5000))
+    DB_CACHE_SIZE_KB: int = int(os.getenv("DB_CACHE_SIZE_KB", 32768))  # на соединение
+    DB_MMAP_SIZE_MB: int = int(os.getenv("DB_MMAP_SIZE_MB", 256))
+    DB_TEMP_STORE: str = os.getenv("DB_TEMP_STORE", "MEMORY")
+    
+    # Пулы соединений (отдельно для записи и для чтения; у sync и async движков свои пулы)
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", 5))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", 5))
+    DB_READ_POOL_SIZE: int = int(os.getenv("DB_READ_POOL_SIZE", 16))
+    DB_READ_MAX_OVERFLOW: int = int(os.getenv("DB_READ_MAX_OVERFLOW", 16))
+    DB_POOL_TIMEOUT_SECONDS: int = int(os.getenv("DB_POOL_TIMEOUT_SECONDS", 30))
     
     # JWT
     SECRET_KEY: str = os.getenv("SECRET_KEY", "dev-secret-key-change-in-production")
     ALGORITHM: str = "HS256"
-    ACCESS_TOKEN_EXPIRE_DAYS: int = 7  # Токен живёт 7 дней
+    ACCESS_TOKEN_EXPIRE_DAYS: int = 7  # Токен живёт 7 дней (старые токены без claims и dev-token)
+    # Пара токенов от /auth/telegram: короткий access с claims + refresh для /auth/refresh
+    ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 15))
+    REFRESH_TOKEN_EXPIRE_DAYS: int = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", 30))
+    # Проверка JWT: "jose" (python-jose) или "hmac" (hashlib, только HS*); LRU проверенных токенов
+    JWT_BACKEND: str = os.getenv("JWT_BACKEND", "jose")
+    JWT_CACHE_SIZE: int = int(os.getenv("JWT_CACHE_SIZE", 10000))
+    # Кэш пользователя и подписки в auth-зависимостях (сек., на worker); 0 — выключить
+    AUTH_CACHE_TTL_SECONDS: int = int(os.getenv("AUTH_CACHE_TTL_SECONDS", 60))
+    AUTH_CACHE_MAX_ENTRIES: int = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", 10000))
     
     # Telegram
     TELEGRAM_BOT_TOKEN: str = os.getenv("TELEGRAM_BOT_TOKEN", "")
@@ -45,6 +76,74 @@ class Settings:
     UPLOAD_DIR: Path = Path(os.getenv("UPLOAD_DIR", f"{BASE_DIR}/uploads"))
     MAX_UPLOAD_SIZE: int = int(os.getenv("MAX_UPLOAD_SIZE", 10485760))  # 10MB
     
+    # Хранилище обложек: файлы по sha256 содержимого
+    COVERS_DIR: Path = Path(os.getenv("COVERS_DIR", f"{UPLOAD_DIR}/covers"))
+    # Префикс internal-location в nginx для X-Accel-Redirect (пусто — отдаём файл сами)
+    COVERS_ACCEL_REDIRECT_PREFIX: str = os.getenv("COVERS_ACCEL_REDIRECT_PREFIX", "")
+    # Миниатюры обложек (?w=): допустимые ширины, процессы-кодировщики, таймаут
+    COVER_THUMBNAIL_WIDTHS: list = sorted(
+        int(w) for w in os.getenv("COVER_THUMBNAIL_WIDTHS", "160,320,480,640,960").split(",")
+    )
+    COVER_THUMBNAIL_WORKERS: int = int(os.getenv("COVER_THUMBNAIL_WORKERS", 2))
+    COVER_THUMBNAIL_TIMEOUT_SECONDS: int = int(os.getenv("COVER_THUMBNAIL_TIMEOUT_SECONDS", 20))
+    
+    # Кэш каталога в памяти (сек.) — страховка для счётчиков просмотров/лайков
+    # и синхронизации между workers; изменения из админки применяются сразу
+    CATALOG_CACHE_TTL_SECONDS: int = int(os.getenv("CATALOG_CACHE_TTL_SECONDS", 60))
+    
+    # Сверка денормализованных счётчиков (лайки, материалы в категориях), сек.; 0 — выключить
+    COUNTERS_RECONCILE_INTERVAL_SECONDS: int = int(os.getenv("COUNTERS_RECONCILE_INTERVAL_SECONDS", 3600))
+    # Сверка user_active_subscriptions с subscriptions (таблицу держат триггеры), сек.; 0 — выключить
+    ACTIVE_SUBSCRIPTIONS_RECONCILE_INTERVAL_SECONDS: int = int(os.getenv("ACTIVE_SUBSCRIPTIONS_RECONCILE_INTERVAL_SECONDS", 3600))
+    
+    # Запись всех уникальных SQL-запросов API в JSONL (для tools/check_query_plans.py --capture)
+    SQL_CAPTURE_PATH: str = os.getenv("SQL_CAPTURE_PATH", "")
+    
+    # Просмотры материалов: очередь в памяти + журнал на диске, запись в БД пачками
+    VIEW_JOURNAL_DIR: Path = Path(os.getenv("VIEW_JOURNAL_DIR", f"{BASE_DIR}/data/view_journal"))
+    VIEW_JOURNAL_FSYNC: bool = os.getenv("VIEW_JOURNAL_FSYNC", "False").lower() == "true"
+    VIEW_FLUSH_INTERVAL_MS: int = int(os.getenv("VIEW_FLUSH_INTERVAL_MS", 500))
+    VIEW_FLUSH_BATCH_SIZE: int = int(os.getenv("VIEW_FLUSH_BATCH_SIZE", 500))
+    # Больше просмотров в очереди (БД не успевает) — отвечаем 503 с Retry-After
+    VIEW_QUEUE_MAX: int = int(os.getenv("VIEW_QUEUE_MAX", 20000))
+    
+    # Рекомендации: модель item-item по просмотрам (numpy/scipy), пересборка (сек.; 0 — SQL без модели)
+    RECOMMENDATIONS_MODEL_INTERVAL_SECONDS: int = int(os.getenv("RECOMMENDATIONS_MODEL_INTERVAL_SECONDS", 900))
+    # Сколько похожих материалов хранить для каждого материала
+    RECOMMENDATIONS_NEIGHBORS: int = int(os.getenv("RECOMMENDATIONS_NEIGHBORS", 50))
+    # Общая копия модели для workers (строит один, остальные читают файл); пусто — каждый строит сам
+    RECOMMENDATIONS_MODEL_PATH: str = os.getenv("RECOMMENDATIONS_MODEL_PATH", f"{BASE_DIR}/data/item_similarity.npz")
+    # Готовые рекомендации пользователей: LRU в процессе + таблица library_recommendations
+    RECOMMENDATIONS_CACHE_MAX_ENTRIES: int = int(os.getenv("RECOMMENDATIONS_CACHE_MAX_ENTRIES", 10000))
+    # Через сколько секунд запись LRU перечитывается из таблицы (её обновляют и другие workers)
+    RECOMMENDATIONS_CACHE_TTL_SECONDS: int = int(os.getenv("RECOMMENDATIONS_CACHE_TTL_SECONDS", 60))
+    # Старше — отдаём как есть и пересчитываем в фоне
+    RECOMMENDATIONS_MAX_AGE_SECONDS: int = int(os.getenv("RECOMMENDATIONS_MAX_AGE_SECONDS", 21600))
+    # Фоновый пересчёт пользователей с новыми просмотрами (сек.)
+    RECOMMENDATIONS_REFRESH_INTERVAL_SECONDS: int = int(os.getenv("RECOMMENDATIONS_REFRESH_INTERVAL_SECONDS", 60))
+    # False — не хранить в БД (только LRU процесса)
+    RECOMMENDATIONS_PERSIST: bool = os.getenv("RECOMMENDATIONS_PERSIST", "True").lower() == "true"
+    
+    # Сверка поискового индекса FTS5 с library_materials (сек.); 0 — выключить
+    SEARCH_INDEX_RECONCILE_INTERVAL_SECONDS: int = int(os.getenv("SEARCH_INDEX_RECONCILE_INTERVAL_SECONDS", 86400))
+    
+    # Статистика популярности (library_material_stats): сверка с просмотрами и сдвиг окон 7/30 дней (сек.)
+    MATERIAL_STATS_RECONCILE_INTERVAL_SECONDS: int = int(os.getenv("MATERIAL_STATS_RECONCILE_INTERVAL_SECONDS", 86400))
+    # Период полураспада просмотра в trending (часы)
+    TRENDING_HALF_LIFE_HOURS: float = float(os.getenv("TRENDING_HALF_LIFE_HOURS", 24))
+    
+    # Присутствие (WebSocket): раз в N секунд heartbeat своих соединений в Redis, чистка ушедших
+    # и полный снимок онлайн-списка админке (между снимками — только дельты join/leave)
+    PRESENCE_SNAPSHOT_INTERVAL_SECONDS: int = int(os.getenv("PRESENCE_SNAPSHOT_INTERVAL_SECONDS", 60))
+    # Пользователь без heartbeat дольше N секунд считается ушедшим (worker упал, не сняв его); больше интервала выше
+    PRESENCE_STALE_SECONDS: int = int(os.getenv("PRESENCE_STALE_SECONDS", 180))
+    # Кадров в очереди отправки одного WebSocket; переполнение — клиент отключается как медленный
+    WS_SEND_QUEUE_SIZE: int = int(os.getenv("WS_SEND_QUEUE_SIZE", 256))
+    # Отправка одного кадра дольше N секунд — тоже отключение
+    WS_SEND_TIMEOUT_SECONDS: float = float(os.getenv("WS_SEND_TIMEOUT_SECONDS", 10))
+    # События рассылок за окно в N мс уходят одним кадром {"type": "batch", "events": [...]} (0 — сразу)
+    WS_COALESCE_MS: int = int(os.getenv("WS_COALESCE_MS", 500))
+    
     # Режим разработки
     DEBUG: bool = os.getenv("DEBUG", "False").lower() == "true"
     
@@ -56,6 +155,7 @@ class Settings:
     def __init__(self):
         # Создать директорию для загрузок, если не существует
         self.UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+        self.COVERS_DIR.mkdir(parents=True, exist_ok=True)
 
 
 # Создаём экземпляр настроек
@@ -2,23 +2,115 @@
 Подключение к базе данных и сессии
 """
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, make_url, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from typing import Generator
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from typing import AsyncGenerator, Generator, List
 
 from app.config import settings
 
+
+def _is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def _read_only_url(url: str) -> str:
+    """URL того же файла SQLite, открытого только на чтение (file:...?mode=ro)"""
+    parsed = make_url(url)
+    if not _is_sqlite(url) or not parsed.database or parsed.database == ":memory:":
+        return url
+    return parsed.set(
+        database=f"file:{parsed.database}",
+        query={**parsed.query, "mode": "ro", "uri": "true"}
+    ).render_as_string(hide_password=False)
+
+
+def sqlite_pragmas(read_only: bool = False) -> List[str]:
+    """PRAGMA профиля из настроек (journal_mode и synchronous — только для пишущих соединений)"""
+    pragmas = [
+        f"busy_timeout = {settings.DB_BUSY_TIMEOUT_MS}",
+        f"cache_size = -{settings.DB_CACHE_SIZE_KB}",
+        f"mmap_size = {settings.DB_MMAP_SIZE_MB * 1024 * 1024}",
+        f"temp_store = {settings.DB_TEMP_STORE}",
+    ]
+    if read_only:
+        pragmas.append("query_only = 1")
+    else:
+        pragmas.insert(0, f"journal_mode = {settings.DB_JOURNAL_MODE}")
+        pragmas.append(f"synchronous = {settings.DB_SYNCHRONOUS}")
+    return pragmas
+
+
+def _apply_sqlite_profile(sync_engine: Engine, read_only: bool) -> None:
+    pragmas = sqlite_pragmas(read_only)
+
+    @event.listens_for(sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(f"PRAGMA {pragma}")
+        cursor.close()
+
+
+def _pool_options(read_only: bool) -> dict:
+    return {
+        "pool_size": settings.DB_READ_POOL_SIZE if read_only else settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_READ_MAX_OVERFLOW if read_only else settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+    }
+
+
+def _make_engine(url: str, read_only: bool = False) -> Engine:
+    sqlite = _is_sqlite(url)
+    engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False} if sqlite else {},
+        echo=settings.DEBUG,  # Логировать SQL запросы в режиме отладки
+        **_pool_options(read_only)
+    )
+    if sqlite:
+        _apply_sqlite_profile(engine, read_only)
+    return engine
+
+
+def _make_async_engine(url: str, read_only: bool = False) -> AsyncEngine:
+    # Для файлов SQLite aiosqlite по умолчанию берёт NullPool (новое соединение на сессию)
+    engine = create_async_engine(
+        url,
+        echo=settings.DEBUG,
+        poolclass=AsyncAdaptedQueuePool,
+        **_pool_options(read_only)
+    )
+    if _is_sqlite(url):
+        _apply_sqlite_profile(engine.sync_engine, read_only)
+    return engine
+
+
+READ_DATABASE_URL = settings.READ_DATABASE_URL or _read_only_url(settings.DATABASE_URL)
+
 # Создаём движок БД
-engine = create_engine(
-    settings.DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {},
-    echo=settings.DEBUG  # Логировать SQL запросы в режиме отладки
-)
+engine = _make_engine(settings.DATABASE_URL)
 
 # Создаём фабрику сессий
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Движок только на чтение: свой пул, читатели не ждут соединений пишущих запросов
+read_engine = _make_engine(READ_DATABASE_URL, read_only=True)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+# Асинхронный движок (aiosqlite) для async-роутов: запросы не занимают потоки threadpool
+async_engine = _make_async_engine(settings.ASYNC_DATABASE_URL)
+async_read_engine = _make_async_engine(
+    READ_DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1), read_only=True
+)
+
+# expire_on_commit=False: после commit атрибуты объектов читаются без ленивой загрузки
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+AsyncReadSessionLocal = async_sessionmaker(async_read_engine, autoflush=False, expire_on_commit=False)
+
 # Base для моделей (если не импортируется из бота)
 Base = declarative_base()
 
@@ -39,6 +131,66 @@ def get_db() -> Generator[Session, None, None]:
         db.close()
 
 
+def get_read_db() -> Generator[Session, None, None]:
+    """Dependency для эндпоинтов только на чтение (пул read_engine)"""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Dependency для async endpoints (AsyncSession).
+    Синхронный код сервисов вызывается через await db.run_sync(lambda session: ...)
+    
+    Использование:
+        @app.get("/materials")
+        async def get_materials(db: AsyncSession = Depends(get_async_db)):
+            ...
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def get_async_read_db() -> AsyncGenerator[AsyncSession, None]:
+    """Async-dependency для эндпоинтов только на чтение (пул async_read_engine)"""
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+
+async def dispose_engines() -> None:
+    """Закрыть пулы соединений (при shutdown)"""
+    await async_engine.dispose()
+    await async_read_engine.dispose()
+    engine.dispose()
+    read_engine.dispose()
+
+
+def add_column_if_missing(table: str, column: str, ddl: str) -> bool:
+    """
+    Добавить колонку в существующую таблицу (ALTER TABLE ... ADD COLUMN), если её нет.
+    ddl — определение колонки без имени, например "INTEGER NOT NULL DEFAULT 0".
+    Returns:
+        True, если колонка была добавлена
+    """
+    if column in [c["name"] for c in inspect(engine).get_columns(table)]:
+        return False
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+    return True
+
+
+def missing_columns(table: str, columns: List[str]) -> List[str]:
+    """Колонки из columns, которых нет в таблице (без DDL; нет самой таблицы — все)"""
+    inspector = inspect(engine)
+    if table not in inspector.get_table_names():
+        return list(columns)
+    existing = {c["name"] for c in inspector.get_columns(table)}
+    return [column for column in columns if column not in existing]
+
+
 def init_db():
     """
     Инициализация БД: создание всех таблиц
@@ -5,8 +5,12 @@ from .library_models import (
     LibraryTag,
     LibraryMaterial,
     LibraryAttachment,
+    LibraryCover,
+    LibraryCoverThumbnail,
     LibraryFavorite,
     LibraryView,
+    LibraryRecommendation,
+    LibraryMaterialStats,
     AdminActivityLog,
     materials_tags,
     materials_categories
@@ -17,8 +21,12 @@ __all__ = [
     'LibraryTag',
     'LibraryMaterial',
     'LibraryAttachment',
+    'LibraryCover',
+    'LibraryCoverThumbnail',
     'LibraryFavorite',
     'LibraryView',
+    'LibraryRecommendation',
+    'LibraryMaterialStats',
     'AdminActivityLog',
     'materials_tags',
     'materials_categories',
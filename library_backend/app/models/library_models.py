@@ -4,10 +4,10 @@ SQLAlchemy модели для LibriMomsClub
 """
 
 from sqlalchemy import (
-    Column, Integer, String, Text, Boolean, 
-    ForeignKey, DateTime, Table, UniqueConstraint
+    Column, Integer, String, Text, Boolean, Float,
+    ForeignKey, DateTime, Table, UniqueConstraint, or_
 )
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, column_property, defer, selectinload
 from sqlalchemy.sql import func
 from datetime import datetime
 
@@ -57,6 +57,7 @@ class LibraryCategory(Base):
     icon = Column(String)  # emoji
     position = Column(Integer, default=0)
     created_at = Column(DateTime, default=func.now())
+    materials_count = Column(Integer, nullable=False, default=0, server_default='0')  # см. services/counters.py
     
     # Relationships
     materials = relationship('LibraryMaterial', secondary='materials_categories', back_populates='categories')
@@ -73,7 +74,7 @@ class LibraryCategory(Base):
             'icon': self.icon,
             'position': self.position,
             'created_at': self.created_at.isoformat() if self.created_at else None,
-            'materials_count': len(self.materials) if self.materials else 0
+            'materials_count': self.materials_count or 0
         }
 
 
@@ -130,7 +131,8 @@ class LibraryMaterial(Base):
     
     # Мета-данные
     author = Column(String)
-    cover_image = Column(String)
+    cover_image = Column(String)  # внешний URL (или base64 data URL до выноса в хранилище)
+    cover_hash = Column(String, ForeignKey('library_covers.hash'), nullable=True)  # обложка в хранилище
     is_published = Column(Boolean, default=True)
     is_featured = Column(Boolean, default=False)  # "Выбор Полины"
     
@@ -140,6 +142,10 @@ class LibraryMaterial(Base):
     
     # Статистика
     views = Column(Integer, default=0)
+    favorites_count = Column(Integer, nullable=False, default=0, server_default='0')  # см. services/counters.py
+    
+    # Есть ли обложка — вычисляется в SQL, без чтения самой cover_image
+    has_cover = column_property(or_(cover_hash.isnot(None), cover_image.isnot(None)))
     
     # Relationships
     category = relationship('LibraryCategory', foreign_keys=[category_id])  # Deprecated
@@ -152,7 +158,22 @@ class LibraryMaterial(Base):
     def __repr__(self):
         return f"<LibraryMaterial(id={self.id}, title='{self.title}', format='{self.format}')>"
     
-    def to_dict(self, include_content=False):
+    @classmethod
+    def list_load_options(cls):
+        """
+        Опции загрузки для списков: тяжёлые content и cover_image не читаются
+        (обращение к ним — ошибка), связи для to_list_dict — одним запросом на связь.
+        """
+        return (
+            defer(cls.content, raiseload=True),
+            defer(cls.cover_image, raiseload=True),
+            selectinload(cls.category),
+            selectinload(cls.categories),
+            selectinload(cls.tags),
+        )
+    
+    def to_list_dict(self):
+        """Краткое представление для списков (без content, cover_image и вложений)"""
         # Новое: массив категорий
         categories_list = [cat.to_dict() for cat in self.categories] if self.categories else []
         
@@ -160,7 +181,7 @@ class LibraryMaterial(Base):
         first_category_id = categories_list[0]['id'] if categories_list else self.category_id
         first_category = categories_list[0] if categories_list else (self.category.to_dict() if self.category else None)
         
-        data = {
+        return {
             'id': self.id,
             'title': self.title,
             'description': self.description,
@@ -176,16 +197,22 @@ class LibraryMaterial(Base):
             'niche': self.niche,
             'viral_score': self.viral_score,
             'author': self.author,
-            'cover_image': self.cover_image,
+            'cover_image': None,
+            'cover_hash': self.cover_hash,
+            'has_cover': bool(self.has_cover),
             'is_published': self.is_published,
             'is_featured': self.is_featured,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
             'views': self.views,
             'tags': [tag.to_dict() for tag in self.tags] if self.tags else [],
-            'attachments': [att.to_dict() for att in self.attachments] if self.attachments else [],
-            'favorites_count': len(self.favorites) if self.favorites else 0
+            'favorites_count': self.favorites_count or 0
         }
+    
+    def to_dict(self, include_content=False):
+        data = self.to_list_dict()
+        data['cover_image'] = self.cover_image
+        data['attachments'] = [att.to_dict() for att in self.attachments] if self.attachments else []
         
         if include_content:
             data['content'] = self.content
@@ -226,6 +253,48 @@ class LibraryAttachment(Base):
         }
 
 
+# ============================================
+# МОДЕЛЬ: Обложка (content-addressed хранилище)
+# ============================================
+
+class LibraryCover(Base):
+    __tablename__ = 'library_covers'
+    
+    hash = Column(String, primary_key=True)  # sha256 содержимого, он же имя файла
+    mime_type = Column(String, nullable=False)
+    file_size = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=func.now())
+    
+    # Relationships
+    thumbnails = relationship('LibraryCoverThumbnail', back_populates='cover', cascade='all, delete-orphan')
+    
+    def __repr__(self):
+        return f"<LibraryCover(hash='{self.hash[:12]}', mime_type='{self.mime_type}')>"
+
+
+# ============================================
+# МОДЕЛЬ: Миниатюра обложки
+# ============================================
+
+class LibraryCoverThumbnail(Base):
+    __tablename__ = 'library_cover_thumbnails'
+    __table_args__ = (UniqueConstraint('cover_hash', 'width', 'format', name='uq_cover_width_format'),)
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    cover_hash = Column(String, ForeignKey('library_covers.hash', ondelete='CASCADE'), nullable=False)
+    width = Column(Integer, nullable=False)
+    format = Column(String, nullable=False)  # 'jpeg', 'webp', 'avif'
+    hash = Column(String, nullable=False)  # sha256 файла миниатюры
+    file_size = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=func.now())
+    
+    # Relationships
+    cover = relationship('LibraryCover', back_populates='thumbnails')
+    
+    def __repr__(self):
+        return f"<LibraryCoverThumbnail(cover='{self.cover_hash[:12]}', width={self.width}, format='{self.format}')>"
+
+
 # ============================================
 # МОДЕЛЬ: Избранное
 # ============================================
@@ -284,6 +353,47 @@ class LibraryView(Base):
         }
 
 
+# ============================================
+# МОДЕЛЬ: Готовые рекомендации пользователя
+# ============================================
+
+class LibraryRecommendation(Base):
+    __tablename__ = 'library_recommendations'
+    
+    user_id = Column(Integer, primary_key=True)  # ID пользователя из таблицы users
+    payload = Column(Text, nullable=False)  # JSON ответа /materials/feed/recommendations
+    generated_at = Column(String, nullable=False)  # ISO 8601 (UTC)
+    view_watermark = Column(Integer, nullable=False, default=0)  # max(library_views.id) на момент расчёта
+    
+    def __repr__(self):
+        return f"<LibraryRecommendation(user_id={self.user_id}, generated_at='{self.generated_at}')>"
+
+
+# ============================================
+# МОДЕЛЬ: Статистика популярности материала
+# ============================================
+
+class LibraryMaterialStats(Base):
+    """
+    Счётчики популярности материала (app/services/material_stats.py).
+    Обновляются при записи просмотров и избранного, окна 7/30 дней и trending
+    сверяются с library_views раз в сутки.
+    """
+    __tablename__ = 'library_material_stats'
+    
+    material_id = Column(Integer, ForeignKey('library_materials.id', ondelete='CASCADE'), primary_key=True)
+    views_total = Column(Integer, nullable=False, default=0)
+    unique_viewers = Column(Integer, nullable=False, default=0)
+    views_7d = Column(Integer, nullable=False, default=0)
+    views_30d = Column(Integer, nullable=False, default=0)
+    favorites = Column(Integer, nullable=False, default=0)
+    # log2(Σ 2^((viewed_at - эпоха) / период полураспада)) — сортируется без пересчёта затухания
+    trending_score = Column(Float, index=True)
+    
+    def __repr__(self):
+        return f"<LibraryMaterialStats(material_id={self.material_id}, views_total={self.views_total})>"
+
+
 # ============================================
 # МОДЕЛЬ: Лог активности админов
 # ============================================
@@ -1,6 +1,6 @@
 """Pydantic схемы"""
 
-from .auth import TelegramAuthData, TokenResponse, UserInfo, SubscriptionStatus, LoyaltyInfo, ReferralInfo, PaymentItem, PaymentHistory, UserSettings, CreatePaymentRequest, CreatePaymentResponse
+from .auth import TelegramAuthData, TokenResponse, RefreshRequest, RefreshResponse, UserInfo, SubscriptionStatus, LoyaltyInfo, ReferralInfo, PaymentItem, PaymentHistory, UserSettings, CreatePaymentRequest, CreatePaymentResponse
 from .library import (
     Category, CategoryCreate, CategoryUpdate,
     Tag, TagCreate,
@@ -15,6 +15,8 @@ __all__ = [
     # Auth
     'TelegramAuthData',
     'TokenResponse',
+    'RefreshRequest',
+    'RefreshResponse',
     'UserInfo',
     'SubscriptionStatus',
     'LoyaltyInfo',
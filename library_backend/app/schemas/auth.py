@@ -36,9 +36,24 @@ class TokenResponse(BaseModel):
     """Ответ с токеном"""
     access_token: str
     token_type: str = "bearer"
+    refresh_token: Optional[str] = None  # для /auth/refresh
+    expires_in: Optional[int] = None  # время жизни access_token, сек.
     user: UserInfo
 
 
+class RefreshRequest(BaseModel):
+    """Запрос новой пары токенов"""
+    refresh_token: str
+
+
+class RefreshResponse(BaseModel):
+    """Новая пара токенов"""
+    access_token: str
+    refresh_token: str
+    token_type: str = "bearer"
+    expires_in: int
+
+
 class SubscriptionStatus(BaseModel):
     """Статус подписки"""
     has_active_subscription: bool
@@ -162,6 +162,7 @@ class MaterialListItem(BaseModel):
     viral_score: Optional[int] = None
     cover_image: Optional[str] = None
     cover_url: Optional[str] = None  # URL для оптимизированной загрузки обложки
+    has_cover: bool = False
     is_featured: bool
     is_published: bool = True
     views: int
@@ -250,7 +251,8 @@ class MaterialFilters(BaseModel):
 class PaginatedResponse(BaseModel):
     """Пагинированный ответ"""
     items: List[MaterialListItem]
-    total: int
+    total: Optional[int] = None  # в курсорном режиме — только на первой странице или with_total
     page: int
     page_size: int
-    total_pages: int
+    total_pages: Optional[int] = None
+    next_cursor: Optional[str] = None  # курсор следующей страницы (None — конец ленты)
@@ -8,10 +8,26 @@ from .material_service import (
     add_cover_url,
     check_admin,
     log_admin_action,
+    on_material_saved,
+    on_material_deleted,
     ADMIN_IDS,
     API_BASE_URL,
 )
 
+from .search_service import SearchService, check_search_index, ensure_search_index, reconcile_search_index
+from .catalog_cache import catalog_cache
+from .pagination import InvalidCursor
+from .indexes import check_indexes, ensure_indexes
+from .material_stats import check_material_stats, ensure_material_stats, reconcile_material_stats, trending_material_ids
+from .counters import adjust_favorites_count, recount_category_materials, reconcile_counters, check_counter_columns, ensure_counter_columns
+from .cover_storage import CoverStorage, check_cover_storage, ensure_cover_storage, is_own_cover_url
+from .view_ingest import view_ingest, ViewIngestOverloaded
+from .principal_cache import principal_cache
+from .active_subscriptions import check_active_subscriptions, ensure_active_subscriptions, reconcile_active_subscriptions, get_active_subscription, active_subscription_sql
+from .token_service import issue_tokens, load_claims, refresh_tokens, principal_from_claims, revocations
+from .item_similarity import item_similarity
+from .content_scorer import content_scorer
 from .recommendation_service import RecommendationService
+from .recommendation_store import recommendation_store, check_recommendation_store, ensure_recommendation_store
 from .admin_service import AdminService, is_admin
 from .notification_service import send_telegram_notification, NotificationTemplates
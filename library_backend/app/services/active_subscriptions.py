@@ -0,0 +1,175 @@
+"""
+Проекция активных подписок: user_active_subscriptions(user_id, subscription_id, active_until).
+
+Одна строка на пользователя с активной (is_active = 1) подпиской: active_until — самый
+поздний end_date, subscription_id — подписка с этим end_date. Проверка «есть ли подписка»
+становится поиском по первичному ключу (active_until > datetime('now')), а счётчики
+и «истекает за 7 дней» в админке — диапазоном по индексу active_until.
+
+Таблицу поддерживают триггеры на subscriptions, поэтому изменения из бота видны сразу.
+Таблицу, индексы и триггеры создаёт только миграция (migrations/add_active_subscriptions.py):
+subscriptions принадлежит боту, и DDL из API при каждом старте не нужен. API при старте
+и при сверке лишь проверяет их (check_active_subscriptions) и предупреждает в логе.
+reconcile_active_subscriptions периодически сверяет проекцию с subscriptions.
+"""
+
+import logging
+from typing import Dict, List, Optional
+
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import Session
+
+from app.database import engine
+
+logger = logging.getLogger(__name__)
+
+TABLE = "user_active_subscriptions"
+
+# Пересчёт строки пользователя {uid} (NEW.user_id / OLD.user_id в триггерах)
+_REFRESH_USER_SQL = f"""
+    DELETE FROM {TABLE} WHERE user_id = {{uid}};
+    INSERT INTO {TABLE} (user_id, subscription_id, active_until)
+    SELECT user_id, id, MAX(end_date) FROM subscriptions
+    WHERE user_id = {{uid}} AND is_active = 1 AND end_date IS NOT NULL
+    GROUP BY user_id;
+"""
+
+_DDL = [
+    f"""
+    CREATE TABLE IF NOT EXISTS {TABLE} (
+        user_id INTEGER PRIMARY KEY,
+        subscription_id INTEGER NOT NULL,
+        active_until DATETIME NOT NULL
+    )
+    """,
+    f"CREATE INDEX IF NOT EXISTS idx_{TABLE}_active_until ON {TABLE} (active_until)",
+    "CREATE INDEX IF NOT EXISTS idx_subscriptions_user_active ON subscriptions (user_id, is_active, end_date)",
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_subscriptions_active_insert
+    AFTER INSERT ON subscriptions
+    BEGIN
+        {_REFRESH_USER_SQL.format(uid="NEW.user_id")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_subscriptions_active_update
+    AFTER UPDATE OF user_id, is_active, end_date ON subscriptions
+    BEGIN
+        {_REFRESH_USER_SQL.format(uid="OLD.user_id")}
+        {_REFRESH_USER_SQL.format(uid="NEW.user_id")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_subscriptions_active_delete
+    AFTER DELETE ON subscriptions
+    BEGIN
+        {_REFRESH_USER_SQL.format(uid="OLD.user_id")}
+    END
+    """,
+]
+
+# Объекты схемы из _DDL (проверяются при старте без DDL)
+_SCHEMA_OBJECTS = [
+    ("table", TABLE),
+    ("index", f"idx_{TABLE}_active_until"),
+    ("index", "idx_subscriptions_user_active"),
+    ("trigger", "trg_subscriptions_active_insert"),
+    ("trigger", "trg_subscriptions_active_update"),
+    ("trigger", "trg_subscriptions_active_delete"),
+]
+
+# Что должно быть в проекции по данным subscriptions
+_EXPECTED_SQL = """
+    SELECT user_id, id AS subscription_id, MAX(end_date) AS active_until
+    FROM subscriptions
+    WHERE is_active = 1 AND end_date IS NOT NULL AND user_id IS NOT NULL
+    GROUP BY user_id
+"""
+
+
+def check_active_subscriptions() -> List[str]:
+    """
+    Проверить таблицу проекции, индексы и триггеры без DDL (при старте API и перед сверкой).
+    Returns:
+        имена недостающих объектов (пусто — всё на месте)
+    """
+    with engine.connect() as conn:
+        existing = set(conn.execute(text("SELECT type, name FROM sqlite_master")).all())
+    missing = [name for kind, name in _SCHEMA_OBJECTS if (kind, name) not in existing]
+    if missing:
+        logger.warning(
+            f"Active subscription projection is incomplete, missing: {', '.join(missing)} "
+            f"(run python migrations/add_active_subscriptions.py)"
+        )
+    return missing
+
+
+def ensure_active_subscriptions() -> bool:
+    """
+    Создать таблицу, индексы и триггеры, если их нет (таблицу subscriptions создаёт бот).
+    Новую таблицу сразу заполняем по subscriptions. Вызывается из миграции.
+    Returns:
+        True, если таблица проекции была создана
+    """
+    if "subscriptions" not in inspect(engine).get_table_names():
+        logger.warning("subscriptions table not found, active subscription projection skipped")
+        return False
+
+    created = TABLE not in inspect(engine).get_table_names()
+    with engine.begin() as conn:
+        for statement in _DDL:
+            conn.execute(text(statement))
+        if created:
+            conn.execute(text(f"INSERT INTO {TABLE} (user_id, subscription_id, active_until) {_EXPECTED_SQL}"))
+    if created:
+        logger.info("Active subscription projection created")
+    return created
+
+
+def reconcile_active_subscriptions(db: Session) -> Dict[str, int]:
+    """
+    Сверить проекцию с subscriptions и исправить расхождения (с commit).
+    Без таблицы проекции (миграция не запускалась) сверка пропускается.
+    Returns:
+        сколько строк пользователей было исправлено
+    """
+    if TABLE in check_active_subscriptions():
+        return {"rows": 0}
+
+    fixed = db.execute(text(f"""
+        /* full-scan */
+        SELECT COUNT(*) FROM (
+            SELECT * FROM ({_EXPECTED_SQL})
+            EXCEPT SELECT user_id, subscription_id, active_until FROM {TABLE}
+            UNION ALL
+            SELECT * FROM (
+                SELECT user_id, subscription_id, active_until FROM {TABLE}
+                EXCEPT SELECT * FROM ({_EXPECTED_SQL})
+            )
+        )
+    """)).scalar()
+    if fixed:
+        db.execute(text(f"DELETE FROM {TABLE}"))
+        db.execute(text(f"INSERT INTO {TABLE} (user_id, subscription_id, active_until) {_EXPECTED_SQL}"))
+    db.commit()
+
+    if fixed:
+        logger.info(f"Active subscriptions reconciled: rows={fixed}")
+    return {"rows": fixed}
+
+
+def active_subscription_sql(user_param: str = ":user_id") -> str:
+    """SELECT id, is_active, end_date активной подписки пользователя — поиск по первичному ключу"""
+    return f"""
+        SELECT subscription_id, 1, active_until
+        FROM {TABLE}
+        WHERE user_id = {user_param} AND active_until > datetime('now')
+    """
+
+
+def get_active_subscription(db: Session, user_id: int) -> Optional[dict]:
+    """Активная подписка пользователя: {"id", "is_active", "end_date"} или None"""
+    row = db.execute(text(active_subscription_sql()), {"user_id": user_id}).fetchone()
+    if not row:
+        return None
+    return {"id": row[0], "is_active": True, "end_date": row[2]}
@@ -10,6 +10,8 @@ from sqlalchemy import select, func
 from app.models.library_models import (
     LibraryMaterial, LibraryCategory, LibraryView, LibraryFavorite
 )
+from app.services.search_service import SearchService
+from app.services.material_service import add_cover_url
 
 logger = logging.getLogger(__name__)
 
@@ -78,7 +80,7 @@ class AdminService:
         search: str = None
     ):
         """Получить список материалов для админки"""
-        query = select(LibraryMaterial).order_by(LibraryMaterial.created_at.desc())
+        query = select(LibraryMaterial).options(*LibraryMaterial.list_load_options())
         
         if category_id:
             query = query.where(LibraryMaterial.category_id == category_id)
@@ -86,10 +88,15 @@ class AdminService:
         if is_published is not None:
             query = query.where(LibraryMaterial.is_published == is_published)
         
-        if search:
-            query = query.where(LibraryMaterial.title.ilike(f"%{search}%"))
+        fts = SearchService(self.db).match_subquery(search) if search else None
+        if fts is not None:
+            query = query.join(fts, fts.c.material_id == LibraryMaterial.id).order_by(fts.c.rank)
+        else:
+            if search:
+                query = query.where(LibraryMaterial.title.ilike(f"%{search}%"))
+            query = query.order_by(LibraryMaterial.created_at.desc())
         
         query = query.offset((page - 1) * limit).limit(limit)
         
-        result = self.db.execute(query)
-        return result.scalars().all()
+        materials = self.db.execute(query).scalars().all()
+        return [add_cover_url(m.to_list_dict()) for m in materials]
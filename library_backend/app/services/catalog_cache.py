@@ -0,0 +1,265 @@
+"""
+Кэш каталога опубликованных материалов в памяти процесса.
+Снимок уже сериализован в форму элемента списка и пересобирается
+(или точечно патчится) при изменениях материалов в админке.
+"""
+
+import logging
+import threading
+import time
+from bisect import bisect_left
+from math import ceil
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.library_models import LibraryMaterial
+from app.services.material_stats import views_totals
+from app.services.pagination import SORT_FIELDS, decode_cursor, encode_cursor, is_after, sort_value
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogSnapshot:
+    """Неизменяемый снимок каталога: элементы списка и готовые порядки сортировки"""
+
+    def __init__(self, version: int, entries: Dict[int, Dict[str, Any]]):
+        self.version = version
+        self.built_at = time.monotonic()
+        # id -> {"item": dict для ответа, "raw": поля для фильтрации/сортировки}
+        self.entries = entries
+        # sort -> список ключей (значение сортировки, id) в порядке выдачи
+        self.orders = self._build_orders()
+
+    def _build_orders(self) -> Dict[str, List[tuple]]:
+        orders = {"id": [(mid, mid) for mid in sorted(self.entries)]}
+        for sort, (field, descending) in SORT_FIELDS.items():
+            if field not in ("created_at", "views", "title"):
+                continue
+            keys = [(sort_value(field, e["raw"][field]), mid) for mid, e in self.entries.items()]
+            orders[sort] = sorted(keys, reverse=descending)
+        return orders
+
+    def ordered(self, sort: str, cursor: Optional[tuple] = None) -> Iterable[tuple]:
+        """Пары (ключ, entry) в порядке сортировки, начиная сразу после курсора"""
+        keys = self.orders.get(sort, self.orders["id"])
+        start = 0
+        if cursor is not None:
+            descending = SORT_FIELDS[sort][1]
+            start = bisect_left(range(len(keys)), True, key=lambda i: is_after(*keys[i], cursor, descending))
+        return ((keys[i], self.entries[keys[i][1]]) for i in range(start, len(keys)))
+
+
+class CatalogCache:
+    """
+    Версионированный кэш опубликованных материалов.
+
+    Чтение не ходит в БД. Снимок пересобирается при первом обращении,
+    по TTL (счётчики просмотров/лайков) и патчится при записи из админки.
+    """
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._version = 0
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    # ---------- построение ----------
+
+    @staticmethod
+    def _load_query():
+        return select(LibraryMaterial).options(*LibraryMaterial.list_load_options())
+
+    @staticmethod
+    def _serialize(material: LibraryMaterial, views_total: int) -> Dict[str, Any]:
+        from app.services.material_service import add_cover_url
+
+        return {
+            "item": add_cover_url(material.to_list_dict()),
+            "raw": {
+                "category_id": material.category_id,  # старое поле, по нему фильтрует API
+                "format": material.format,
+                "level": material.level,
+                "topic": material.topic,
+                "niche": material.niche,
+                "is_featured": bool(material.is_featured),
+                "created_at": material.created_at,
+                "views": views_total,  # сортировка views_desc — по library_material_stats
+                "title": material.title,
+            },
+        }
+
+    def _build(self, db: Session, version: int) -> CatalogSnapshot:
+        started = time.perf_counter()
+        materials = db.execute(
+            self._load_query().where(LibraryMaterial.is_published == True)
+        ).scalars().all()
+        views = views_totals(db)
+        snapshot = CatalogSnapshot(version, {m.id: self._serialize(m, views.get(m.id, 0)) for m in materials})
+        logger.info(
+            f"Catalog snapshot v{snapshot.version}: {len(materials)} materials "
+            f"({(time.perf_counter() - started) * 1000:.1f} ms)"
+        )
+        return snapshot
+
+    def get_snapshot(self, db: Session) -> CatalogSnapshot:
+        """Текущий снимок (строится при необходимости)"""
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - snapshot.built_at < self.ttl_seconds:
+            return snapshot
+        # Не ждём блокировку: из async-роутов (AsyncSession.run_sync) сборка идёт в потоке
+        # event loop, и ожидание соседней сборки в том же loop — взаимоблокировка.
+        # Пока другой запрос пересобирает снимок, отдаём устаревший.
+        # Версия меняется только под блокировкой при публикации снимка: разовая сборка
+        # без блокировки идёт с текущей версией и не сбрасывает кэши, привязанные к ней.
+        if not self._lock.acquire(blocking=False):
+            if snapshot is not None:
+                return snapshot
+            return self._build(db, self._version)
+        try:
+            snapshot = self._snapshot
+            if snapshot is None or time.monotonic() - snapshot.built_at >= self.ttl_seconds:
+                snapshot = self._build(db, self._version + 1)
+                self._snapshot = snapshot
+                self._version = snapshot.version
+            return snapshot
+        finally:
+            self._lock.release()
+
+    # ---------- инвалидация ----------
+
+    def invalidate(self) -> None:
+        """Сбросить снимок целиком (например, при изменении категорий или тегов)"""
+        with self._lock:
+            self._snapshot = None
+            self._version += 1
+
+    def refresh_material(self, db: Session, material_id: int) -> None:
+        """Точечно обновить материал в снимке после commit"""
+        with self._lock:
+            if self._snapshot is None:
+                return
+            material = db.execute(
+                self._load_query().where(LibraryMaterial.id == material_id)
+            ).scalar_one_or_none()
+            entries = dict(self._snapshot.entries)
+            if material is not None and material.is_published:
+                views = views_totals(db, [material_id])
+                entries[material_id] = self._serialize(material, views.get(material_id, 0))
+            else:
+                entries.pop(material_id, None)
+            self._version += 1
+            patched = CatalogSnapshot(self._version, entries)
+            patched.built_at = self._snapshot.built_at  # TTL считаем от полной сборки
+            self._snapshot = patched
+
+    def remove_material(self, material_id: int) -> None:
+        """Убрать удалённый материал из снимка"""
+        with self._lock:
+            if self._snapshot is None or material_id not in self._snapshot.entries:
+                return
+            entries = dict(self._snapshot.entries)
+            entries.pop(material_id)
+            self._version += 1
+            patched = CatalogSnapshot(self._version, entries)
+            patched.built_at = self._snapshot.built_at
+            self._snapshot = patched
+
+    # ---------- чтение ----------
+
+    def list_materials(
+        self,
+        db: Session,
+        category_id: Optional[int] = None,
+        format: Optional[str] = None,
+        level: Optional[str] = None,
+        topic: Optional[str] = None,
+        niche: Optional[str] = None,
+        is_featured: Optional[bool] = None,
+        page: int = 1,
+        page_size: int = 50,
+        sort: str = "created_desc",
+        cursor: Optional[str] = None,
+        with_total: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Фильтрация, сортировка и пагинация в памяти (тот же формат, что у get_materials).
+        cursor=None — обычная постраничная выдача, иначе — keyset от курсора.
+        """
+        filters = [
+            (key, value) for key, value in (
+                ("category_id", category_id or None),
+                ("format", format or None),
+                ("level", level or None),
+                ("topic", topic or None),
+                ("niche", niche or None),
+                ("is_featured", is_featured),
+            ) if value is not None
+        ]
+
+        def matches(entry) -> bool:
+            return all(entry["raw"][key] == value for key, value in filters)
+
+        snapshot = self.get_snapshot(db)
+
+        if cursor is None:
+            matched = [entry["item"] for _, entry in snapshot.ordered(sort) if matches(entry)]
+            total = len(matched)
+            offset = (page - 1) * page_size
+            return {
+                "items": matched[offset:offset + page_size],
+                "total": total,
+                "page": page,
+                "page_size": page_size,
+                "total_pages": ceil(total / page_size) if total > 0 else 0
+            }
+
+        # Как в MaterialService: в snapshot.orders есть служебный порядок "id", курсора для него нет
+        if sort not in SORT_FIELDS or sort == "relevance":
+            sort = "created_desc"
+        position = decode_cursor(cursor, sort)
+        page_keys, items = [], []
+        for key, entry in snapshot.ordered(sort, position):
+            if matches(entry):
+                page_keys.append(key)
+                items.append(entry["item"])
+                if len(items) > page_size:
+                    break
+
+        next_cursor = None
+        if len(items) > page_size:
+            items = items[:page_size]
+            next_cursor = encode_cursor(sort, *page_keys[page_size - 1])
+
+        total = None
+        if with_total or position is None:
+            total = sum(1 for entry in snapshot.entries.values() if matches(entry))
+        return {
+            "items": items,
+            "total": total,
+            "page": page,
+            "page_size": page_size,
+            "total_pages": (ceil(total / page_size) if total > 0 else 0) if total is not None else None,
+            "next_cursor": next_cursor
+        }
+
+    def top(self, db: Session, sort: str, limit: int, featured_only: bool = False) -> List[dict]:
+        """Первые limit материалов в заданном порядке"""
+        result = []
+        for _, entry in self.get_snapshot(db).ordered(sort):
+            if featured_only and not entry["raw"]["is_featured"]:
+                continue
+            result.append(entry["item"])
+            if len(result) >= limit:
+                break
+        return result
+
+
+# Глобальный кэш каталога (на процесс)
+catalog_cache = CatalogCache(ttl_seconds=settings.CATALOG_CACHE_TTL_SECONDS)
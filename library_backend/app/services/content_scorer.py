@@ -0,0 +1,181 @@
+"""
+Content-based рекомендации по признакам материалов.
+
+Для каждой версии снимка каталога (catalog_cache) строится матрица материалы × признаки:
+категории (materials_categories, а без них — старое category_id), теги, format, level,
+topic, niche. Признаки взвешены по IDF (редкий тег говорит о материале больше, чем
+частый формат), строки нормированы.
+
+Профиль пользователя — сумма строк просмотренных материалов с весом по числу просмотров
+и суммарному duration_seconds; кандидаты ранжируются одним умножением матрицы на профиль
+(косинусная близость), без запросов к БД.
+
+numpy — необязательная зависимость: без неё RecommendationService подбирает материалы
+из тех же категорий SQL-запросом.
+"""
+
+import logging
+import math
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.services.catalog_cache import CatalogSnapshot, catalog_cache
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - зависит от окружения
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# Поля материала, которые становятся признаками «поле:значение»
+ATTRIBUTE_FIELDS = ("format", "level", "topic", "niche")
+
+
+def material_features(item: dict) -> List[str]:
+    """Признаки материала по элементу снимка каталога"""
+    category_ids = item.get("category_ids") or ([item["category_id"]] if item.get("category_id") else [])
+    features = [f"category:{cid}" for cid in category_ids]
+    features += [f"tag:{tag['id']}" for tag in item.get("tags") or []]
+    features += [f"{field}:{item[field]}" for field in ATTRIBUTE_FIELDS if item.get(field)]
+    return features
+
+
+def view_weight(views: int, duration_seconds: int) -> float:
+    """
+    Вес материала в профиле: открытие без просмотра — 1, дальше растёт
+    логарифмически от просмотров и минут (10 минут ≈ 3.6, час ≈ 5.9).
+    """
+    return math.log2(1 + views + (duration_seconds or 0) / 60)
+
+
+class ContentFeatures:
+    """Нормированная матрица признаков материалов одной версии каталога"""
+
+    def __init__(self, version: int, material_ids, matrix, features: List[str]):
+        self.version = version
+        self.material_ids = material_ids  # номер строки -> material_id
+        self.rows: Dict[int, int] = {int(mid): row for row, mid in enumerate(material_ids)}
+        self.matrix = matrix
+        self.features = features
+
+    def recommend(
+        self,
+        weights: Dict[int, float],
+        exclude: Iterable[int],
+        limit: int
+    ) -> List[Tuple[int, float]]:
+        """
+        Материалы, близкие к профилю {material_id: вес}, кроме exclude:
+        [(material_id, score)] по убыванию score
+        """
+        rows = [self.rows[mid] for mid in weights if mid in self.rows]
+        if not rows or limit <= 0:
+            return []
+
+        row_weights = np.array([weights[int(self.material_ids[row])] for row in rows], dtype=np.float32)
+        profile = row_weights @ self.matrix[rows]
+        norm = np.linalg.norm(profile)
+        if norm == 0:
+            return []
+
+        scores = self.matrix @ (profile / norm)
+        excluded = [self.rows[mid] for mid in exclude if mid in self.rows]
+        scores[excluded] = 0.0
+
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(int(self.material_ids[row]), float(scores[row])) for row in candidates]
+
+
+def build_features(snapshot: CatalogSnapshot) -> Optional[ContentFeatures]:
+    """Матрица признаков по снимку каталога (None — каталог пуст)"""
+    if not snapshot.entries:
+        return None
+
+    material_ids = np.fromiter(sorted(snapshot.entries), dtype=np.int64)
+    vocabulary: Dict[str, int] = {}
+    rows, columns = [], []
+    for row, mid in enumerate(material_ids):
+        for feature in set(material_features(snapshot.entries[int(mid)]["item"])):
+            rows.append(row)
+            columns.append(vocabulary.setdefault(feature, len(vocabulary)))
+
+    matrix = np.zeros((len(material_ids), max(len(vocabulary), 1)), dtype=np.float32)
+    matrix[rows, columns] = 1.0
+
+    # IDF: признак, который есть у всех, почти ничего не добавляет к близости
+    document_frequency = matrix.sum(axis=0)
+    matrix *= (np.log((1 + len(material_ids)) / (1 + document_frequency)) + 1).astype(np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix /= np.where(norms > 0, norms, 1.0)
+
+    features = [None] * len(vocabulary)
+    for feature, column in vocabulary.items():
+        features[column] = feature
+    return ContentFeatures(snapshot.version, material_ids, matrix, features)
+
+
+class ContentScorer:
+    """Матрица признаков текущей версии каталога; пересобирается при смене версии"""
+
+    def __init__(self):
+        self._features: Optional[ContentFeatures] = None
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return np is not None
+
+    def features(self, db: Session) -> Optional[ContentFeatures]:
+        """Матрица для текущего снимка каталога (строится при первом обращении после смены версии)"""
+        snapshot = catalog_cache.get_snapshot(db)
+        features = self._features
+        if features is not None and features.version == snapshot.version:
+            return features
+        with self._lock:
+            features = self._features
+            if features is None or features.version != snapshot.version:
+                started = time.perf_counter()
+                features = build_features(snapshot)
+                self._features = features
+                if features is not None:
+                    logger.info(
+                        f"Content features v{snapshot.version}: materials={len(features.material_ids)} "
+                        f"features={len(features.features)} in {(time.perf_counter() - started) * 1000:.1f}ms"
+                    )
+            return features
+
+    def recommend(
+        self,
+        db: Session,
+        history: Sequence[Tuple[int, int, int]],
+        exclude: Iterable[int],
+        limit: int
+    ) -> List[dict]:
+        """
+        Элементы снимка каталога, похожие по содержанию на историю
+        [(material_id, просмотров, duration_seconds)]
+        """
+        features = self.features(db)
+        if features is None:
+            return []
+        weights: Dict[int, float] = {}
+        for material_id, views, duration_seconds in history:
+            weights[material_id] = weights.get(material_id, 0.0) + view_weight(views, duration_seconds)
+
+        entries = catalog_cache.get_snapshot(db).entries
+        return [
+            entries[mid]["item"]
+            for mid, _ in features.recommend(weights, exclude, limit)
+            if mid in entries
+        ]
+
+
+# Глобальный скорер (на процесс)
+content_scorer = ContentScorer()
@@ -0,0 +1,120 @@
+"""
+Денормализованные счётчики: library_materials.favorites_count и library_categories.materials_count.
+Обновляются в тех же транзакциях, что и избранное/привязка категорий,
+и периодически сверяются с исходными таблицами (reconcile_counters).
+Колонки добавляет только миграция (migrations/add_counters.py); API при старте их проверяет.
+"""
+
+import logging
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.database import add_column_if_missing, missing_columns
+from app.services.material_stats import adjust_material_favorites
+
+logger = logging.getLogger(__name__)
+
+
+# (таблица, колонка, определение)
+COUNTER_COLUMNS = [
+    ("library_materials", "favorites_count", "INTEGER NOT NULL DEFAULT 0"),
+    ("library_categories", "materials_count", "INTEGER NOT NULL DEFAULT 0"),
+]
+
+
+def check_counter_columns() -> List[str]:
+    """
+    Проверить колонки счётчиков без DDL (при старте API).
+    Returns:
+        недостающие колонки "таблица.колонка"
+    """
+    missing = [
+        f"{table}.{column}"
+        for table, column, _ in COUNTER_COLUMNS
+        if missing_columns(table, [column])
+    ]
+    if missing:
+        logger.warning(f"Counter columns missing: {', '.join(missing)} (run python migrations/add_counters.py)")
+    return missing
+
+
+def ensure_counter_columns() -> None:
+    """Добавить колонки счётчиков, если их нет (из миграции; значения заполнит reconcile_counters)"""
+    added = False
+    for table, column, ddl in COUNTER_COLUMNS:
+        added |= add_column_if_missing(table, column, ddl)
+    if added:
+        logger.info("Counter columns added")
+
+
+def adjust_favorites_count(db: Session, material_id: int, delta: int) -> None:
+    """
+    Изменить счётчик лайков материала и library_material_stats
+    (без commit — в транзакции добавления/удаления избранного)
+    """
+    db.execute(
+        text("""
+            UPDATE library_materials
+            SET favorites_count = MAX(COALESCE(favorites_count, 0) + :delta, 0)
+            WHERE id = :material_id
+        """),
+        {"delta": delta, "material_id": material_id}
+    )
+    adjust_material_favorites(db, material_id, delta)
+
+
+def recount_category_materials(db: Session, category_ids: Optional[Iterable[int]] = None) -> None:
+    """
+    Пересчитать materials_count категорий (без commit).
+    Категорий немного, поэтому после изменения привязок пересчитываем их целиком.
+    """
+    query = """
+        UPDATE library_categories
+        SET materials_count = (
+            SELECT COUNT(*) FROM materials_categories mc
+            WHERE mc.category_id = library_categories.id
+        )
+    """
+    params = {}
+    if category_ids is not None:
+        ids = list(category_ids)
+        if not ids:
+            return
+        params = {f"cat{i}": cid for i, cid in enumerate(ids)}
+        query += f" WHERE id IN ({','.join(':' + key for key in params)})"
+    db.execute(text(query), params)
+
+
+def reconcile_counters(db: Session) -> Dict[str, int]:
+    """
+    Пересчитать все счётчики по исходным таблицам (с commit).
+    Returns:
+        сколько строк было исправлено
+    """
+    favorites_fixed = db.execute(text("""
+        /* full-scan */
+        UPDATE library_materials
+        SET favorites_count = (
+            SELECT COUNT(*) FROM library_favorites f WHERE f.material_id = library_materials.id
+        )
+        WHERE favorites_count IS NOT (
+            SELECT COUNT(*) FROM library_favorites f WHERE f.material_id = library_materials.id
+        )
+    """)).rowcount
+    categories_fixed = db.execute(text("""
+        /* full-scan */
+        UPDATE library_categories
+        SET materials_count = (
+            SELECT COUNT(*) FROM materials_categories mc WHERE mc.category_id = library_categories.id
+        )
+        WHERE materials_count IS NOT (
+            SELECT COUNT(*) FROM materials_categories mc WHERE mc.category_id = library_categories.id
+        )
+    """)).rowcount
+    db.commit()
+
+    if favorites_fixed or categories_fixed:
+        logger.info(f"Counters reconciled: materials={favorites_fixed}, categories={categories_fixed}")
+    return {"materials": favorites_fixed, "categories": categories_fixed}
@@ -0,0 +1,324 @@
+"""
+Хранилище обложек материалов.
+Картинки лежат на диске под именем sha256 содержимого (COVERS_DIR/ab/abcdef....jpg),
+в БД — только хэш. Одинаковые обложки хранятся один раз, файлы неизменяемы,
+поэтому их можно кэшировать навсегда и отдавать через sendfile.
+Таблицы и колонку cover_hash создаёт только миграция (migrations/add_cover_storage.py);
+API при старте их проверяет (check_cover_storage).
+"""
+
+import base64
+import binascii
+import hashlib
+import logging
+import os
+import re
+import multiprocessing
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timezone
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import List, Optional
+
+from fastapi.responses import FileResponse, Response
+from sqlalchemy import inspect, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import add_column_if_missing, engine, missing_columns
+from app.models.library_models import LibraryCover, LibraryCoverThumbnail, LibraryMaterial
+from app.utils.images import IMAGE_FORMATS, format_supported, render_thumbnail
+
+logger = logging.getLogger(__name__)
+
+# Расширения файлов по MIME-типу
+COVER_EXTENSIONS = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/webp": ".webp",
+    "image/avif": ".avif",
+    "image/gif": ".gif",
+}
+
+# Ссылка на собственный эндпоинт обложки (приходит из админки при редактировании)
+_OWN_COVER_URL = re.compile(r"/materials/\d+/cover(\?|$)")
+
+
+# Пул процессов для кодирования миниатюр (создаётся при первой миниатюре)
+_thumbnail_pool: Optional[ProcessPoolExecutor] = None
+_thumbnail_pool_lock = threading.Lock()
+
+
+class InvalidCover(ValueError):
+    """Обложку не удалось разобрать"""
+
+
+def is_own_cover_url(value: Optional[str]) -> bool:
+    """Ссылка на наш же /materials/{id}/cover (админка прислала обложку без изменений)"""
+    return bool(value) and _OWN_COVER_URL.search(value) is not None
+
+
+def check_cover_storage() -> List[str]:
+    """
+    Проверить таблицы хранилища и колонку cover_hash без DDL (при старте API).
+    Returns:
+        имена недостающих таблиц/колонок
+    """
+    tables = set(inspect(engine).get_table_names())
+    missing = [
+        table for table in (LibraryCover.__tablename__, LibraryCoverThumbnail.__tablename__)
+        if table not in tables
+    ]
+    missing += [f"library_materials.{column}" for column in missing_columns("library_materials", ["cover_hash"])]
+    if missing:
+        logger.warning(f"Cover storage schema missing: {', '.join(missing)} (run python migrations/add_cover_storage.py)")
+    return missing
+
+
+def ensure_cover_storage() -> None:
+    """Создать таблицы хранилища и колонку library_materials.cover_hash, если их нет (из миграции)"""
+    LibraryCover.__table__.create(bind=engine, checkfirst=True)
+    LibraryCoverThumbnail.__table__.create(bind=engine, checkfirst=True)
+
+    if add_column_if_missing("library_materials", "cover_hash", "VARCHAR REFERENCES library_covers(hash)"):
+        logger.info("Added library_materials.cover_hash")
+
+
+def get_thumbnail_pool() -> ProcessPoolExecutor:
+    global _thumbnail_pool
+    with _thumbnail_pool_lock:
+        if _thumbnail_pool is None:
+            # spawn: воркеры не наследуют потоки и соединения процесса API
+            _thumbnail_pool = ProcessPoolExecutor(
+                max_workers=settings.COVER_THUMBNAIL_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _thumbnail_pool
+
+
+def shutdown_thumbnail_pool() -> None:
+    global _thumbnail_pool
+    with _thumbnail_pool_lock:
+        if _thumbnail_pool is not None:
+            _thumbnail_pool.shutdown(wait=False, cancel_futures=True)
+            _thumbnail_pool = None
+
+
+def pick_thumbnail_width(requested: int) -> int:
+    """Ближайшая сверху ширина из COVER_THUMBNAIL_WIDTHS (ограничивает число вариантов на диске)"""
+    widths = settings.COVER_THUMBNAIL_WIDTHS
+    for width in widths:
+        if width >= requested:
+            return width
+    return widths[-1]
+
+
+def negotiate_thumbnail_format(accept: Optional[str]) -> str:
+    """Лучший формат, который принимает браузер: avif → webp → jpeg"""
+    accept = (accept or "").lower()
+    for fmt in ("avif", "webp"):
+        if f"image/{fmt}" in accept and format_supported(fmt):
+            return fmt
+    return "jpeg"
+
+
+def parse_data_url(data_url: str) -> tuple:
+    """
+    Разбирает base64 data URL обложки.
+    Returns:
+        (mime_type, bytes)
+    Raises:
+        InvalidCover: если это не base64-картинка поддерживаемого типа
+    """
+    try:
+        header, data = data_url.split(",", 1)
+        mime_type = header.split(":")[1].split(";")[0].lower()
+        image_data = base64.b64decode(data, validate=False)
+    except (ValueError, IndexError, binascii.Error):
+        raise InvalidCover("Невалидный data URL обложки")
+    if mime_type == "image/jpg":
+        mime_type = "image/jpeg"
+    if mime_type not in COVER_EXTENSIONS or not image_data:
+        raise InvalidCover(f"Неподдерживаемый формат обложки: {mime_type}")
+    return mime_type, image_data
+
+
+def cover_path(file_hash: str, mime_type: str) -> Path:
+    """Путь к файлу в хранилище"""
+    return settings.COVERS_DIR / file_hash[:2] / f"{file_hash}{COVER_EXTENSIONS.get(mime_type, '')}"
+
+
+def write_blob(file_hash: str, mime_type: str, data: bytes) -> Path:
+    """Атомарно записать файл (повторная запись того же хэша — no-op)"""
+    path = cover_path(file_hash, mime_type)
+    if path.exists():
+        return path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(tmp_name, 0o644)
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+    return path
+
+
+def file_response(
+    request, path: Path, mime_type: str, etag: str, last_modified, max_age: int, vary: Optional[str] = None
+) -> Response:
+    """
+    Ответ с файлом из хранилища с поддержкой условных запросов (304).
+    При настроенном COVERS_ACCEL_REDIRECT_PREFIX файл отдаёт nginx (sendfile),
+    иначе — FileResponse.
+    """
+    etag = f'"{etag}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={max_age}" + (", immutable" if max_age >= 31536000 else ""),
+    }
+    if vary:
+        headers["Vary"] = vary
+    if last_modified is not None:
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)  # в БД — UTC без зоны
+        headers["Last-Modified"] = formatdate(last_modified.timestamp(), usegmt=True)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+            return Response(status_code=304, headers=headers)
+    elif last_modified is not None and request.headers.get("if-modified-since"):
+        try:
+            since = parsedate_to_datetime(request.headers["if-modified-since"])
+            if int(last_modified.timestamp()) <= int(since.timestamp()):
+                return Response(status_code=304, headers=headers)
+        except (TypeError, ValueError):
+            pass
+
+    if settings.COVERS_ACCEL_REDIRECT_PREFIX:
+        relative = path.relative_to(settings.COVERS_DIR).as_posix()
+        headers["X-Accel-Redirect"] = settings.COVERS_ACCEL_REDIRECT_PREFIX.rstrip("/") + "/" + relative
+        return Response(media_type=mime_type, headers=headers)
+
+    return FileResponse(path, media_type=mime_type, headers=headers)
+
+
+class CoverStorage:
+    """Сервис хранилища обложек"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def store(self, mime_type: str, data: bytes) -> LibraryCover:
+        """Сохранить картинку (файл + строка library_covers), вернуть запись. Без commit."""
+        file_hash = hashlib.sha256(data).hexdigest()
+        write_blob(file_hash, mime_type, data)
+
+        cover = self.db.get(LibraryCover, file_hash)
+        if cover is None:
+            cover = LibraryCover(hash=file_hash, mime_type=mime_type, file_size=len(data))
+            self.db.add(cover)
+            self.db.flush()
+        return cover
+
+    def get(self, file_hash: str) -> Optional[LibraryCover]:
+        return self.db.get(LibraryCover, file_hash)
+
+    def assign(self, material: LibraryMaterial) -> bool:
+        """
+        Нормализовать обложку материала после записи из админки. Без commit.
+        - data URL → файл в хранилище, cover_hash, cover_image очищается
+        - внешний URL → cover_image, cover_hash сбрасывается
+        - пустая строка → обложка удалена
+        Returns:
+            True, если материал изменён
+        """
+        cover = material.cover_image
+        if cover is None:
+            return False
+
+        if cover.startswith("data:"):
+            stored = self.store(*parse_data_url(cover))
+            material.cover_hash = stored.hash
+            material.cover_image = None
+        elif cover.startswith("http://") or cover.startswith("https://"):
+            if material.cover_hash is None:
+                return False
+            material.cover_hash = None
+        elif cover == "":
+            material.cover_image = None
+            material.cover_hash = None
+        else:
+            return False
+        return True
+
+    def migrate_material(self, material_id: int) -> Optional[str]:
+        """
+        Вынести legacy data URL материала в хранилище (с commit).
+        Returns:
+            хэш обложки или None
+        """
+        material = self.db.execute(
+            select(LibraryMaterial).where(LibraryMaterial.id == material_id)
+        ).scalar_one_or_none()
+        if material is None or not (material.cover_image or "").startswith("data:"):
+            return material.cover_hash if material else None
+        try:
+            self.assign(material)
+            self.db.commit()
+        except InvalidCover as e:
+            self.db.rollback()
+            logger.warning(f"Material {material_id}: cover not migrated: {e}")
+            return None
+        return material.cover_hash
+
+    def get_thumbnail(self, cover: LibraryCover, width: int, fmt: str) -> Optional[LibraryCoverThumbnail]:
+        """
+        Миниатюра обложки (ширина из COVER_THUMBNAIL_WIDTHS, формат из IMAGE_FORMATS).
+        Создаётся при первом запросе в пуле процессов, дальше берётся с диска. С commit.
+        Returns:
+            запись миниатюры или None, если её не удалось построить (отдаём оригинал)
+        """
+        query = select(LibraryCoverThumbnail).where(
+            LibraryCoverThumbnail.cover_hash == cover.hash,
+            LibraryCoverThumbnail.width == width,
+            LibraryCoverThumbnail.format == fmt
+        )
+        thumbnail = self.db.execute(query).scalar_one_or_none()
+        mime_type = IMAGE_FORMATS[fmt][1]
+        if thumbnail is not None and cover_path(thumbnail.hash, mime_type).exists():
+            return thumbnail
+
+        if not format_supported(fmt):
+            return None
+        try:
+            data = get_thumbnail_pool().submit(
+                render_thumbnail, str(cover_path(cover.hash, cover.mime_type)), width, fmt
+            ).result(timeout=settings.COVER_THUMBNAIL_TIMEOUT_SECONDS)
+        except Exception as e:
+            logger.warning(f"Thumbnail {cover.hash[:12]} {width}/{fmt} failed: {e!r}")
+            return None
+
+        file_hash = hashlib.sha256(data).hexdigest()
+        write_blob(file_hash, mime_type, data)
+        if thumbnail is not None:
+            # Файл пропал с диска — перезаписали, хэш тот же
+            return thumbnail
+
+        thumbnail = LibraryCoverThumbnail(
+            cover_hash=cover.hash, width=width, format=fmt, hash=file_hash, file_size=len(data)
+        )
+        self.db.add(thumbnail)
+        try:
+            self.db.commit()
+        except IntegrityError:
+            # Параллельный запрос успел создать ту же миниатюру
+            self.db.rollback()
+            thumbnail = self.db.execute(query).scalar_one_or_none()
+        return thumbnail
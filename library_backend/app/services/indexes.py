@@ -0,0 +1,133 @@
+"""
+Вторичные индексы под горячие запросы API.
+
+Составные индексы покрывают фильтр + сортировку (история и избранное пользователя,
+уведомления, ленты активности, выборки опубликованных материалов), поэтому такие запросы
+читают только свои строки по индексу, без прохода по таблице и без сортировки.
+Одноколоночные индексы из 001_create_library_tables.sql, которые стали префиксами
+составных, удаляются — они только замедляют запись.
+
+Индексы создаёт только миграция (migrations/add_hot_indexes.py): таблицы бота API
+не принадлежат, и DDL из нескольких worker'ов при старте не нужен. При старте
+check_indexes лишь предупреждает в логе о недостающих индексах.
+
+Проверка планов: tools/check_query_plans.py.
+"""
+
+import logging
+from typing import List, Tuple
+
+from sqlalchemy import inspect, text
+
+from app.database import engine
+
+logger = logging.getLogger(__name__)
+
+# (имя, таблица, колонки)
+HOT_INDEXES: List[Tuple[str, str, str]] = [
+    # История пользователя, рекомендации, последние просмотры
+    ("idx_views_user_viewed", "library_views", "user_id, viewed_at, material_id"),
+    # Просмотры материала (счётчики, топ за период)
+    ("idx_views_material_viewed", "library_views", "material_id, viewed_at"),
+    # Лента просмотров и аналитика по дням
+    ("idx_views_viewed", "library_views", "viewed_at, material_id"),
+    # Избранное пользователя по дате добавления
+    ("idx_favorites_user_created", "library_favorites", "user_id, created_at, material_id"),
+    # Непрочитанные уведомления и список уведомлений пользователя
+    ("idx_notifications_user_unread", "library_notifications", "user_id, is_read, created_at"),
+    ("idx_notifications_user_created", "library_notifications", "user_id, created_at"),
+    # Лента активности
+    ("idx_activity_log_created", "activity_log", "created_at"),
+    # Опубликованные материалы: новые, популярные, избранные
+    ("idx_materials_published_created", "library_materials", "is_published, created_at"),
+    ("idx_materials_published_views", "library_materials", "is_published, views"),
+    ("idx_materials_published_featured", "library_materials", "is_published, is_featured, created_at"),
+    # Из 001_create_library_tables.sql / add_admin_activity_log.py — для БД, созданных без них;
+    # подписки на push ищутся по пользователю
+    ("idx_materials_created", "library_materials", "created_at"),
+    ("idx_attachments_material", "library_attachments", "material_id"),
+    ("idx_favorites_material", "library_favorites", "material_id"),
+    ("idx_admin_activity_created_at", "admin_activity_log", "created_at"),
+    ("idx_push_subscriptions_user", "push_subscriptions", "user_id"),
+    # Таблицы бота, которые читает API: рефералы, платежи, статистика в админке
+    ("idx_users_referrer", "users", "referrer_id"),
+    ("idx_users_recurring", "users", "is_recurring_active"),
+    ("idx_payment_logs_user_created", "payment_logs", "user_id, created_at"),
+    ("idx_payment_logs_status_created", "payment_logs", "status, created_at"),
+    ("idx_withdrawal_requests_status_created", "withdrawal_requests", "status, created_at"),
+]
+
+# Покрыты составными индексами выше
+SUPERSEDED_INDEXES: List[str] = [
+    "idx_views_user",
+    "idx_views_material",
+    "idx_views_date",
+    "idx_favorites_user",
+    "idx_materials_published",
+]
+
+
+def _missing_indexes(inspector) -> List[Tuple[str, str, str]]:
+    """Индексы из HOT_INDEXES, которых нет в БД (таблицы, которых нет, пропускаются)"""
+    tables = set(inspector.get_table_names())
+    existing = {
+        index["name"]
+        for table in tables
+        for index in inspector.get_indexes(table)
+    }
+    return [
+        (name, table, columns)
+        for name, table, columns in HOT_INDEXES
+        if table in tables and name not in existing
+    ]
+
+
+def check_indexes() -> List[str]:
+    """
+    Проверка при старте, без DDL: предупредить о недостающих индексах.
+    Returns:
+        имена недостающих индексов
+    """
+    missing = [name for name, _, _ in _missing_indexes(inspect(engine))]
+    if missing:
+        logger.warning(
+            f"Missing hot-query indexes: {', '.join(missing)} "
+            f"(run python migrations/add_hot_indexes.py)"
+        )
+    return missing
+
+
+def ensure_indexes(analyze: bool = False) -> List[str]:
+    """
+    Создать недостающие индексы (если колонки нет — например, в таблицах бота, — индекс пропускается)
+    и удалить устаревшие. analyze=True — обновить статистику планировщика (ANALYZE).
+    Вызывается из migrations/add_hot_indexes.py.
+    Returns:
+        имена созданных индексов
+    """
+    inspector = inspect(engine)
+    existing = {
+        index["name"]
+        for table in inspector.get_table_names()
+        for index in inspector.get_indexes(table)
+    }
+
+    created = []
+    with engine.begin() as conn:
+        for name, table, columns in _missing_indexes(inspector):
+            table_columns = {column["name"] for column in inspector.get_columns(table)}
+            missing = [column for column in columns.split(", ") if column not in table_columns]
+            if missing:
+                logger.warning(f"Index {name} skipped: {table} has no {', '.join(missing)}")
+                continue
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+            created.append(name)
+        for name in SUPERSEDED_INDEXES:
+            if name in existing:
+                conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        if analyze:
+            conn.execute(text("ANALYZE"))
+
+    if created:
+        logger.info(f"Indexes created: {', '.join(created)}")
+    return created
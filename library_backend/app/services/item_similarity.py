@@ -0,0 +1,270 @@
+"""
+Модель «похожие материалы» (item-item) для рекомендаций.
+
+Раз в RECOMMENDATIONS_MODEL_INTERVAL_SECONDS по library_views строится матрица
+пользователь × материал (1 — смотрел), из неё косинусная близость материалов
+по совместным просмотрам: sim(i, j) = |U_i ∩ U_j| / sqrt(|U_i| · |U_j|).
+У каждого материала остаются RECOMMENDATIONS_NEIGHBORS самых близких соседей.
+
+Онлайн-рекомендация — сумма строк матрицы по недавно просмотренным материалам
+и top-k по получившемуся вектору, без запросов к library_views.
+Модель живёт в памяти каждого worker и заменяется целиком после пересборки.
+
+Строит модель один worker: под файловой блокировкой он пишет её в
+RECOMMENDATIONS_MODEL_PATH (.npz, атомарной заменой), остальные workers только
+загружают свежий файл. Пустой RECOMMENDATIONS_MODEL_PATH — каждый worker строит сам.
+Если просмотров нет, в файл пишется пустая модель (с built_at) — увидев её,
+workers сбрасывают и свою.
+
+numpy/scipy — необязательные зависимости: без них модель не строится и
+RecommendationService работает через SQL, как раньше.
+"""
+
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.config import settings
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # pragma: no cover - зависит от окружения
+    np = None
+    sparse = None
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - не POSIX: каждый worker строит модель сам
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Пар пользователь-материал за одно чтение из курсора
+FETCH_BATCH = 50_000
+
+
+class ItemSimilarityModel:
+    """Top-K соседей каждого материала (CSR-матрица материалы × материалы)"""
+
+    def __init__(self, material_ids, similarity, built_at: float, pairs: int):
+        self.material_ids = material_ids  # номер столбца -> material_id
+        self.columns: Dict[int, int] = {int(mid): col for col, mid in enumerate(material_ids)}
+        self.similarity = similarity
+        self.built_at = built_at
+        self.pairs = pairs  # пар пользователь-материал в выборке
+
+    @property
+    def empty(self) -> bool:
+        return len(self.material_ids) == 0
+
+    def recommend(self, viewed_ids: Iterable[int], exclude: Iterable[int], limit: int) -> List[Tuple[int, float]]:
+        """
+        Материалы, похожие на viewed_ids, кроме exclude: [(material_id, score)] по убыванию score
+        """
+        rows = [self.columns[mid] for mid in viewed_ids if mid in self.columns]
+        if not rows or limit <= 0:
+            return []
+
+        scores = np.asarray(self.similarity[rows].sum(axis=0)).ravel()
+        excluded = [self.columns[mid] for mid in exclude if mid in self.columns]
+        scores[excluded] = 0.0
+
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(int(self.material_ids[col]), float(scores[col])) for col in candidates]
+
+
+def _top_k_rows(matrix, k: int):
+    """Оставить в каждой строке CSR-матрицы k наибольших значений"""
+    matrix = matrix.tocsr()
+    indptr, indices, data = [0], [], []
+    for row in range(matrix.shape[0]):
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        row_data = matrix.data[start:end]
+        row_indices = matrix.indices[start:end]
+        if len(row_data) > k:
+            keep = np.argpartition(-row_data, k - 1)[:k]
+            row_data, row_indices = row_data[keep], row_indices[keep]
+        data.append(row_data)
+        indices.append(row_indices)
+        indptr.append(indptr[-1] + len(row_data))
+    return sparse.csr_matrix(
+        (np.concatenate(data), np.concatenate(indices), indptr),
+        shape=matrix.shape
+    )
+
+
+def _load_pairs(db: Session):
+    """Уникальные пары (user_id, material_id) из library_views -> массив N×2, читается пачками"""
+    result = db.execute(
+        text("/* full-scan */ SELECT DISTINCT user_id, material_id FROM library_views")
+        .execution_options(yield_per=FETCH_BATCH)
+    )
+    chunks = [
+        # Row → numpy через fromiter: np.asarray по списку Row на порядок медленнее
+        np.fromiter((value for row in batch for value in row), dtype=np.int64, count=2 * len(batch))
+        for batch in result.partitions()
+    ]
+    if not chunks:
+        return np.empty((0, 2), dtype=np.int64)
+    return np.concatenate(chunks).reshape(-1, 2)
+
+
+def build_model(db: Session, neighbors: int) -> Optional[ItemSimilarityModel]:
+    """Построить модель по library_views (None — нет просмотров)"""
+    pairs = _load_pairs(db)
+    if not len(pairs):
+        return None
+
+    _, user_rows = np.unique(pairs[:, 0], return_inverse=True)
+    material_ids, item_cols = np.unique(pairs[:, 1], return_inverse=True)
+
+    # пользователь × материал (пары уникальны — значения 1), затем совместные просмотры материал × материал
+    views = sparse.csr_matrix(
+        (np.ones(len(pairs), dtype=np.float32), (user_rows, item_cols)),
+        shape=(user_rows.max() + 1, len(material_ids))
+    )
+    del pairs, user_rows, item_cols
+    cooccurrence = (views.T @ views).tocsr()
+
+    # косинус: делим на sqrt(число зрителей) обоих материалов
+    inv_norm = sparse.diags(1.0 / np.sqrt(cooccurrence.diagonal()))
+    similarity = (inv_norm @ cooccurrence @ inv_norm).tocsr()
+    similarity.setdiag(0)
+    similarity.eliminate_zeros()
+
+    return ItemSimilarityModel(
+        material_ids=material_ids,
+        similarity=_top_k_rows(similarity, neighbors),
+        built_at=time.time(),
+        pairs=views.nnz,
+    )
+
+
+def empty_model() -> ItemSimilarityModel:
+    """Пустая модель для общего файла: просмотров нет, workers сбрасывают свою модель"""
+    return ItemSimilarityModel(
+        material_ids=np.empty(0, dtype=np.int64),
+        similarity=sparse.csr_matrix((0, 0), dtype=np.float32),
+        built_at=time.time(),
+        pairs=0,
+    )
+
+
+def save_model(model: ItemSimilarityModel, path: Path) -> None:
+    """Записать модель в .npz (через временный файл и os.replace — читатели не видят недописанный)"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.stem}.{os.getpid()}.tmp.npz")
+    similarity = model.similarity
+    np.savez(
+        tmp,
+        material_ids=model.material_ids,
+        data=similarity.data,
+        indices=similarity.indices,
+        indptr=similarity.indptr,
+        shape=np.array(similarity.shape),
+        built_at=np.array(model.built_at),
+        pairs=np.array(model.pairs),
+    )
+    os.replace(tmp, path)
+
+
+def load_model(path: Path) -> Optional[ItemSimilarityModel]:
+    """Прочитать модель из .npz (None — файла нет)"""
+    try:
+        with np.load(path) as saved:
+            return ItemSimilarityModel(
+                material_ids=saved["material_ids"],
+                similarity=sparse.csr_matrix(
+                    (saved["data"], saved["indices"], saved["indptr"]), shape=tuple(saved["shape"])
+                ),
+                built_at=float(saved["built_at"]),
+                pairs=int(saved["pairs"]),
+            )
+    except FileNotFoundError:
+        return None
+
+
+class ItemSimilarity:
+    """Текущая модель процесса; пересобирается периодической задачей"""
+
+    def __init__(self, neighbors: int, interval_seconds: int, shared_path: str = ""):
+        self.neighbors = neighbors
+        self.interval_seconds = interval_seconds
+        self.shared_path = Path(shared_path) if shared_path and fcntl is not None else None
+        self.model: Optional[ItemSimilarityModel] = None
+
+    @property
+    def available(self) -> bool:
+        return np is not None
+
+    def _shared_is_fresh(self) -> bool:
+        try:
+            return time.time() - self.shared_path.stat().st_mtime < self.interval_seconds
+        except FileNotFoundError:
+            return False
+
+    def _load_shared(self) -> Optional[ItemSimilarityModel]:
+        """Взять модель из общего файла, если она новее текущей (пустая — сбросить текущую)"""
+        model = load_model(self.shared_path)
+        if model is not None and (self.model is None or model.built_at > self.model.built_at):
+            self.model = None if model.empty else model
+        return self.model
+
+    def _build(self, db: Session) -> Optional[ItemSimilarityModel]:
+        started = time.perf_counter()
+        model = build_model(db, self.neighbors)
+        if model is not None:
+            logger.info(
+                f"Item similarity model built: materials={len(model.material_ids)} "
+                f"pairs={model.pairs} nnz={model.similarity.nnz} "
+                f"in {(time.perf_counter() - started) * 1000:.0f}ms"
+            )
+        return model
+
+    def rebuild(self, db: Session) -> Optional[ItemSimilarityModel]:
+        """
+        Пересобрать модель (job для start_periodic). С общим файлом строит тот worker,
+        который взял блокировку, когда файл устарел; остальные загружают файл.
+        """
+        if not self.available:
+            return None
+        if self.shared_path is None:
+            self.model = self._build(db)
+            return self.model
+
+        if self._shared_is_fresh():
+            return self._load_shared()
+
+        self.shared_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.shared_path.with_name(f"{self.shared_path.name}.lock"), "a") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # Строит другой worker — пока берём предыдущую версию файла
+                return self._load_shared()
+            try:
+                if self._shared_is_fresh():  # успел другой worker
+                    return self._load_shared()
+                model = self._build(db)
+                save_model(model or empty_model(), self.shared_path)
+                self.model = model
+                return model
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+# Глобальная модель (на процесс)
+item_similarity = ItemSimilarity(
+    neighbors=settings.RECOMMENDATIONS_NEIGHBORS,
+    interval_seconds=settings.RECOMMENDATIONS_MODEL_INTERVAL_SECONDS,
+    shared_path=settings.RECOMMENDATIONS_MODEL_PATH,
+)
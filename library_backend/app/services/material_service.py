@@ -4,17 +4,24 @@
 """
 
 import logging
+import time
 from typing import List, Optional, Dict, Any
 from math import ceil
 from datetime import datetime
 
 from sqlalchemy.orm import Session, selectinload
-from sqlalchemy import select, func, or_, text
+from sqlalchemy import select, func, or_, and_, text, String, type_coerce
 
 from app.models.library_models import (
-    LibraryMaterial, LibraryCategory, LibraryView, 
+    LibraryMaterial, LibraryCategory, 
     LibraryFavorite, AdminActivityLog
 )
+from app.services.search_service import SearchService
+from app.services.catalog_cache import catalog_cache
+from app.services.cover_storage import CoverStorage, InvalidCover
+from app.services.counters import recount_category_materials
+from app.services.material_stats import trending_material_ids, views_total_column
+from app.services.pagination import SORT_FIELDS, decode_cursor, encode_cursor, sort_value
 
 # Логгер
 logger = logging.getLogger(__name__)
@@ -23,13 +30,22 @@ logger = logging.getLogger(__name__)
 ADMIN_IDS = [534740911, 44054166]  # Полина и Всеволод
 API_BASE_URL = "https://api.librarymomsclub.ru/api"
 
+# Кэш count(*) для списка материалов: ключ фильтров -> (время, total)
+COUNT_CACHE_TTL_SECONDS = 30
+COUNT_CACHE_MAX_SIZE = 1024
+_count_cache: Dict[tuple, tuple] = {}
+
 
 def add_cover_url(item: dict) -> dict:
     """
     Добавляет cover_url и убирает base64 из cover_image для оптимизации.
     Вызывать для каждого материала перед отправкой клиенту.
+    URL обложки из хранилища содержит версию (хэш) — браузер кэширует его навсегда.
     """
-    if item.get("cover_image"):
+    if item.get("cover_hash"):
+        item["cover_url"] = f"{API_BASE_URL}/materials/{item['id']}/cover?v={item['cover_hash'][:16]}"
+        item["cover_image"] = None
+    elif item.get("cover_image") or item.get("has_cover"):
         item["cover_url"] = f"{API_BASE_URL}/materials/{item['id']}/cover"
         item["cover_image"] = None  # Не передаём тяжёлый base64
     return item
@@ -40,6 +56,26 @@ def check_admin(user: dict) -> bool:
     return user.get("telegram_id") in ADMIN_IDS
 
 
+def on_material_saved(db: Session, material: LibraryMaterial) -> None:
+    """Вынос обложки в хранилище, пересчёт счётчиков категорий, синхронизация поиска и кэша каталога после commit материала"""
+    recount_category_materials(db)
+    try:
+        CoverStorage(db).assign(material)
+    except InvalidCover as e:
+        logger.warning(f"Material {material.id}: cover kept as is: {e}")
+    db.commit()
+    SearchService(db).index_material(material)
+    catalog_cache.refresh_material(db, material.id)
+
+
+def on_material_deleted(db: Session, material_id: int) -> None:
+    """Синхронизация счётчиков, поискового индекса и кэша каталога после удаления материала"""
+    recount_category_materials(db)
+    db.commit()
+    SearchService(db).remove_material(material_id)
+    catalog_cache.remove_material(material_id)
+
+
 class MaterialService:
     """Сервис для работы с материалами"""
     
@@ -59,31 +95,60 @@ class MaterialService:
         is_admin: bool = False,
         page: int = 1,
         page_size: int = 50,
-        sort: str = "created_desc"
+        sort: str = "created_desc",
+        cursor: Optional[str] = None,
+        with_total: bool = False
     ) -> Dict[str, Any]:
         """
         Получить список материалов с фильтрацией и пагинацией.
         
+        cursor=None — постраничный режим (page/page_size).
+        cursor="" или значение next_cursor — keyset-режим: без OFFSET,
+        total считается только для первой страницы или при with_total.
+        
         Returns:
-            dict с items, total, page, page_size, total_pages
+            dict с items, total, page, page_size, total_pages (+ next_cursor в keyset-режиме)
+        
+        Raises:
+            InvalidCursor: курсор повреждён или выдан для другой сортировки
         """
-        # Базовый запрос с eager loading
-        query = select(LibraryMaterial).options(
-            selectinload(LibraryMaterial.categories),
-            selectinload(LibraryMaterial.favorites)
-        )
+        # Без поиска и черновиков — отдаём из кэша каталога в памяти
+        if not search and not (include_drafts and is_admin):
+            return catalog_cache.list_materials(
+                self.db,
+                category_id=category_id,
+                format=format,
+                level=level,
+                topic=topic,
+                niche=niche,
+                is_featured=is_featured,
+                page=page,
+                page_size=page_size,
+                sort=sort,
+                cursor=cursor,
+                with_total=with_total
+            )
+        
+        # Базовый запрос: только колонки списка, связи — selectin
+        query = select(LibraryMaterial).options(*LibraryMaterial.list_load_options())
         
         # Фильтр по публикации
         if not (include_drafts and is_admin):
             query = query.where(LibraryMaterial.is_published == True)
         
         # Применяем фильтры
+        fts = None
         if search:
-            search_filter = or_(
-                LibraryMaterial.title.ilike(f"%{search}%"),
-                LibraryMaterial.description.ilike(f"%{search}%")
-            )
-            query = query.where(search_filter)
+            # Полнотекстовый индекс FTS5, при его отсутствии — ILIKE
+            fts = SearchService(self.db).match_subquery(search)
+            if fts is not None:
+                query = query.join(fts, fts.c.material_id == LibraryMaterial.id)
+            else:
+                search_filter = or_(
+                    LibraryMaterial.title.ilike(f"%{search}%"),
+                    LibraryMaterial.description.ilike(f"%{search}%")
+                )
+                query = query.where(search_filter)
         
         if category_id:
             query = query.where(LibraryMaterial.category_id == category_id)
@@ -103,18 +168,30 @@ class MaterialService:
         if is_featured is not None:
             query = query.where(LibraryMaterial.is_featured == is_featured)
         
+        count_key = (
+            search, category_id, format, level, topic, niche, is_featured,
+            include_drafts and is_admin, catalog_cache.version
+        )
+        
+        if cursor is not None:
+            return self._get_materials_page_by_cursor(
+                query, fts, count_key, page, page_size, sort, cursor, with_total
+            )
+        
         # Подсчёт общего количества
-        total_query = select(func.count()).select_from(query.subquery())
-        total = self.db.execute(total_query).scalar()
+        total = self._count_materials(query, count_key)
         
         # Сортировка
         sort_map = {
             "created_desc": LibraryMaterial.created_at.desc(),
             "created_asc": LibraryMaterial.created_at.asc(),
-            "views_desc": LibraryMaterial.views.desc(),
+            "views_desc": views_total_column().desc(),
             "title_asc": LibraryMaterial.title.asc(),
         }
-        if sort in sort_map:
+        if fts is not None and sort in ("relevance", "created_desc"):
+            # При поиске по умолчанию сортируем по релевантности (bm25)
+            query = query.order_by(fts.c.rank)
+        elif sort in sort_map:
             query = query.order_by(sort_map[sort])
         
         # Пагинация
@@ -125,7 +202,7 @@ class MaterialService:
         materials = self.db.execute(query).scalars().all()
         
         # Конвертируем и добавляем cover_url
-        items = [add_cover_url(m.to_dict()) for m in materials]
+        items = [add_cover_url(m.to_list_dict()) for m in materials]
         
         return {
             "items": items,
@@ -135,6 +212,84 @@ class MaterialService:
             "total_pages": ceil(total / page_size) if total > 0 else 0
         }
     
+    def _count_materials(self, query, count_key: tuple) -> int:
+        """count(*) по запросу с кэшированием на COUNT_CACHE_TTL_SECONDS"""
+        now = time.monotonic()
+        cached = _count_cache.get(count_key)
+        if cached is not None and now - cached[0] < COUNT_CACHE_TTL_SECONDS:
+            return cached[1]
+        
+        id_query = query.with_only_columns(LibraryMaterial.id, maintain_column_froms=True)
+        total = self.db.execute(select(func.count()).select_from(id_query.subquery())).scalar()
+        if len(_count_cache) >= COUNT_CACHE_MAX_SIZE:
+            _count_cache.clear()
+        _count_cache[count_key] = (now, total)
+        return total
+    
+    def _get_materials_page_by_cursor(
+        self, query, fts, count_key: tuple, page: int, page_size: int,
+        sort: str, cursor: str, with_total: bool
+    ) -> Dict[str, Any]:
+        """Keyset-страница: WHERE (ключ, id) после курсора ORDER BY ключ, id LIMIT page_size + 1"""
+        if fts is not None and sort in ("relevance", "created_desc"):
+            sort = "relevance"
+        elif sort not in SORT_FIELDS or sort == "relevance":
+            sort = "created_desc"
+        field, descending = SORT_FIELDS[sort]
+        
+        # Ключи нормализуются так же, как в pagination.sort_value (NULL -> ''/0)
+        sort_columns = {
+            "rank": fts.c.rank if fts is not None else None,
+            "created_at": func.coalesce(type_coerce(LibraryMaterial.created_at, String), ""),
+            "views": views_total_column(),
+            "title": func.coalesce(LibraryMaterial.title, ""),
+        }
+        key_column = sort_columns[field]
+        
+        position = decode_cursor(cursor, sort)
+        
+        # Общее количество — только для первой страницы или по запросу (из кэша)
+        total = None
+        if with_total or position is None:
+            total = self._count_materials(query, count_key)
+        
+        if position is not None:
+            key, last_id = position
+            if descending:
+                query = query.where(or_(
+                    key_column < key,
+                    and_(key_column == key, LibraryMaterial.id < last_id)
+                ))
+            else:
+                query = query.where(or_(
+                    key_column > key,
+                    and_(key_column == key, LibraryMaterial.id > last_id)
+                ))
+        
+        if descending:
+            query = query.order_by(key_column.desc(), LibraryMaterial.id.desc())
+        else:
+            query = query.order_by(key_column.asc(), LibraryMaterial.id.asc())
+        
+        rows = self.db.execute(
+            query.add_columns(key_column.label("sort_key")).limit(page_size + 1)
+        ).all()
+        
+        next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            last = rows[-1]
+            next_cursor = encode_cursor(sort, sort_value(field, last.sort_key), last[0].id)
+        
+        return {
+            "items": [add_cover_url(row[0].to_list_dict()) for row in rows],
+            "total": total,
+            "page": page,
+            "page_size": page_size,
+            "total_pages": (ceil(total / page_size) if total > 0 else 0) if total is not None else None,
+            "next_cursor": next_cursor
+        }
+    
     def get_material_by_id(self, material_id: int, include_content: bool = True) -> Optional[dict]:
         """Получить материал по ID"""
         material = self.db.execute(
@@ -149,57 +304,20 @@ class MaterialService:
         if not material:
             return None
         
-        return material.to_dict(include_content=include_content)
-    
-    def record_view(self, material_id: int, user_id: int, duration_seconds: Optional[int] = None) -> bool:
-        """Записать просмотр материала"""
-        material = self.db.execute(
-            select(LibraryMaterial).where(LibraryMaterial.id == material_id)
-        ).scalar_one_or_none()
-        
-        if not material:
-            logger.warning(f"Material {material_id} not found for view recording")
-            return False
-        
-        # Создаём запись просмотра
-        view = LibraryView(
-            material_id=material_id,
-            user_id=user_id,
-            duration_seconds=duration_seconds
-        )
-        self.db.add(view)
-        
-        # Увеличиваем счётчик
-        material.views += 1
-        
-        self.db.commit()
-        logger.debug(f"View recorded: material={material_id}, user={user_id}")
-        return True
+        return add_cover_url(material.to_dict(include_content=include_content))
     
     def get_featured(self, limit: int = 10) -> List[dict]:
         """Получить избранные материалы (Выбор Полины)"""
-        materials = self.db.execute(
-            select(LibraryMaterial)
-            .where(
-                LibraryMaterial.is_published == True,
-                LibraryMaterial.is_featured == True
-            )
-            .order_by(LibraryMaterial.created_at.desc())
-            .limit(limit)
-        ).scalars().all()
-        
-        return [add_cover_url(m.to_dict()) for m in materials]
+        return catalog_cache.top(self.db, "created_desc", limit, featured_only=True)
     
     def get_popular(self, limit: int = 10) -> List[dict]:
-        """Получить популярные материалы"""
-        materials = self.db.execute(
-            select(LibraryMaterial)
-            .where(LibraryMaterial.is_published == True)
-            .order_by(LibraryMaterial.views.desc())
-            .limit(limit)
-        ).scalars().all()
-        
-        return [add_cover_url(m.to_dict()) for m in materials]
+        """Получить популярные материалы (по views_total из library_material_stats)"""
+        return catalog_cache.top(self.db, "views_desc", limit)
+    
+    def get_trending(self, limit: int = 10) -> List[dict]:
+        """Получить материалы, набирающие просмотры (trending_score из library_material_stats)"""
+        entries = catalog_cache.get_snapshot(self.db).entries
+        return [entries[mid]["item"] for mid in trending_material_ids(self.db, limit) if mid in entries]
 
 
 def log_admin_action(
@@ -0,0 +1,331 @@
+"""
+Статистика популярности материалов: library_material_stats.
+
+Одна строка на материал: просмотры всего, уникальные зрители, просмотры за 7 и 30 дней,
+лайки и trending_score. Строки обновляются в транзакциях записи просмотров
+(view_ingest.write_views) и избранного (adjust_favorites_count), поэтому выборки
+«популярное» не считают library_views. Сортировка каталога views_desc (и get_popular)
+идёт по views_total: в отличие от счётчика library_materials.views, его исправляет сверка.
+
+Окна 7/30 дней при записи только растут — сдвигаются они сверкой
+reconcile_material_stats (раз в MATERIAL_STATS_RECONCILE_INTERVAL_SECONDS, по умолчанию сутки),
+она же исправляет любые расхождения с library_views и library_favorites.
+Таблицу создаёт и заполняет миграция (migrations/add_material_stats.py); API при старте
+только проверяет её (check_material_stats).
+
+trending_score — просмотры с экспоненциальным затуханием (период полураспада
+TRENDING_HALF_LIFE_HOURS), хранится как log2(Σ 2^((viewed_at - TRENDING_EPOCH) / half_life)).
+Вклад просмотра зависит только от его времени, поэтому новые просмотры прибавляются
+к сохранённому значению, а порядок материалов по trending_score совпадает с порядком
+по затухшему числу просмотров на любой момент — индекс по колонке работает без пересчёта.
+"""
+
+import logging
+import math
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import func, inspect, select, text
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import engine
+from app.models.library_models import LibraryMaterial, LibraryMaterialStats
+
+logger = logging.getLogger(__name__)
+
+# Начало отсчёта trending_score (UTC)
+TRENDING_EPOCH = datetime(2026, 1, 1, tzinfo=timezone.utc).timestamp()
+# При сверке trending считается по просмотрам за столько периодов полураспада
+# (более старые меняют значение меньше чем на 0.01%)
+TRENDING_WINDOW_HALF_LIVES = 14
+
+_UPSERT_SQL = """
+    INSERT INTO library_material_stats
+        (material_id, views_total, unique_viewers, views_7d, views_30d, favorites, trending_score)
+    VALUES (:material_id, :views, :unique_viewers, :views, :views, 0, :trending_score)
+    ON CONFLICT(material_id) DO UPDATE SET
+        views_total = views_total + excluded.views_total,
+        unique_viewers = unique_viewers + excluded.unique_viewers,
+        views_7d = views_7d + excluded.views_7d,
+        views_30d = views_30d + excluded.views_30d,
+        trending_score = excluded.trending_score
+"""
+
+
+def check_material_stats() -> List[str]:
+    """
+    Проверить таблицу статистики без DDL (при старте API и перед сверкой).
+    Returns:
+        недостающие таблицы
+    """
+    if LibraryMaterialStats.__tablename__ in inspect(engine).get_table_names():
+        return []
+    logger.warning(f"Table {LibraryMaterialStats.__tablename__} missing (run python migrations/add_material_stats.py)")
+    return [LibraryMaterialStats.__tablename__]
+
+
+def ensure_material_stats() -> bool:
+    """
+    Создать таблицу, если её нет (из миграции).
+    Returns:
+        True, если таблица была создана (её заполнит reconcile_material_stats)
+    """
+    created = LibraryMaterialStats.__tablename__ not in inspect(engine).get_table_names()
+    LibraryMaterialStats.__table__.create(bind=engine, checkfirst=True)
+    if created:
+        logger.info("Material stats table created")
+    return created
+
+
+def _half_life_seconds() -> float:
+    return settings.TRENDING_HALF_LIFE_HOURS * 3600
+
+
+def _timestamp(viewed_at) -> float:
+    """viewed_at из library_views ('YYYY-MM-DD HH:MM:SS[.ffffff]', UTC) -> unix time"""
+    if isinstance(viewed_at, str):
+        viewed_at = datetime.fromisoformat(viewed_at)
+    if viewed_at.tzinfo is None:
+        viewed_at = viewed_at.replace(tzinfo=timezone.utc)
+    return viewed_at.timestamp()
+
+
+def _log2_sum(exponents: Iterable[float]) -> Optional[float]:
+    """log2(Σ 2^x) без переполнения"""
+    exponents = list(exponents)
+    if not exponents:
+        return None
+    top = max(exponents)
+    return top + math.log2(sum(2.0 ** (x - top) for x in exponents))
+
+
+def trending_exponent(timestamp: float, count: int = 1) -> float:
+    """Вклад count просмотров в момент timestamp (в шкале trending_score)"""
+    return (timestamp - TRENDING_EPOCH) / _half_life_seconds() + math.log2(count)
+
+
+def decayed_views(trending_score: Optional[float], now: Optional[float] = None) -> float:
+    """Затухшее число просмотров на момент now (для отображения)"""
+    if trending_score is None:
+        return 0.0
+    now = time.time() if now is None else now
+    return 2.0 ** (trending_score - (now - TRENDING_EPOCH) / _half_life_seconds())
+
+
+def _in_params(prefix: str, values: Sequence) -> Tuple[str, dict]:
+    params = {f"{prefix}{i}": value for i, value in enumerate(values)}
+    return ",".join(":" + key for key in params), params
+
+
+def record_views(db: Session, views: Sequence[tuple]) -> None:
+    """
+    Учесть пачку просмотров (material_id, user_id, duration_seconds, viewed_at), без commit.
+    Вызывается после INSERT пачки в library_views той же транзакцией: запись в SQLite
+    уже держит блокировку, поэтому чтение trending_score и уникальных зрителей
+    не пересекается с другими писателями.
+    """
+    if not views:
+        return
+
+    batch_pairs: Dict[Tuple[int, int], int] = defaultdict(int)
+    exponents: Dict[int, List[float]] = defaultdict(list)
+    for material_id, user_id, _, viewed_at in views:
+        batch_pairs[(material_id, user_id)] += 1
+        exponents[material_id].append(trending_exponent(_timestamp(viewed_at)))
+
+    # Зритель новый, если все его просмотры материала — из этой пачки
+    material_ids = sorted(exponents)
+    user_ids = sorted({user_id for _, user_id in batch_pairs})
+    material_in, material_params = _in_params("m", material_ids)
+    user_in, user_params = _in_params("u", user_ids)
+    new_viewers: Dict[int, int] = defaultdict(int)
+    for material_id, user_id, total in db.execute(
+        text(f"""
+            SELECT material_id, user_id, COUNT(*) FROM library_views
+            WHERE user_id IN ({user_in}) AND material_id IN ({material_in})
+            GROUP BY material_id, user_id
+        """),
+        {**user_params, **material_params}
+    ):
+        if total == batch_pairs.get((material_id, user_id)):
+            new_viewers[material_id] += 1
+
+    stored = dict(db.execute(
+        text(f"SELECT material_id, trending_score FROM library_material_stats WHERE material_id IN ({material_in})"),
+        material_params
+    ).fetchall())
+
+    db.execute(
+        text(_UPSERT_SQL),
+        [
+            {
+                "material_id": material_id,
+                "views": len(exponents[material_id]),
+                "unique_viewers": new_viewers[material_id],
+                "trending_score": _log2_sum(
+                    exponents[material_id] + ([stored[material_id]] if stored.get(material_id) is not None else [])
+                ),
+            }
+            for material_id in material_ids
+        ]
+    )
+
+
+def views_total_column():
+    """views_total материала для запросов по library_materials (0 — строки статистики нет)"""
+    return func.coalesce(
+        select(LibraryMaterialStats.views_total)
+        .where(LibraryMaterialStats.material_id == LibraryMaterial.id)
+        .scalar_subquery(),
+        0
+    )
+
+
+def views_totals(db: Session, material_ids: Optional[Sequence[int]] = None) -> Dict[int, int]:
+    """material_id -> views_total (все строки или только material_ids)"""
+    query = select(LibraryMaterialStats.material_id, LibraryMaterialStats.views_total)
+    if material_ids is not None:
+        query = query.where(LibraryMaterialStats.material_id.in_(material_ids))
+    return dict(db.execute(query).all())
+
+
+def adjust_material_favorites(db: Session, material_id: int, delta: int) -> None:
+    """Изменить число лайков в статистике материала (без commit)"""
+    db.execute(
+        text("""
+            INSERT INTO library_material_stats
+                (material_id, views_total, unique_viewers, views_7d, views_30d, favorites)
+            VALUES (:material_id, 0, 0, 0, 0, MAX(:delta, 0))
+            ON CONFLICT(material_id) DO UPDATE SET favorites = MAX(favorites + :delta, 0)
+        """),
+        {"material_id": material_id, "delta": delta}
+    )
+
+
+def _expected_stats(db: Session) -> Dict[int, dict]:
+    """Статистика, посчитанная заново по library_views и library_favorites"""
+    expected: Dict[int, dict] = {}
+
+    def row(material_id: int) -> dict:
+        return expected.setdefault(material_id, {
+            "material_id": material_id, "views_total": 0, "unique_viewers": 0,
+            "views_7d": 0, "views_30d": 0, "favorites": 0, "trending_score": None,
+        })
+
+    for material_id, total, unique, last_7d, last_30d in db.execute(text("""
+        /* full-scan */
+        SELECT material_id, COUNT(*), COUNT(DISTINCT user_id),
+               SUM(viewed_at >= datetime('now', '-7 days')),
+               SUM(viewed_at >= datetime('now', '-30 days'))
+        FROM library_views
+        GROUP BY material_id
+    """)):
+        row(material_id).update(
+            views_total=total, unique_viewers=unique, views_7d=last_7d or 0, views_30d=last_30d or 0
+        )
+
+    for material_id, favorites in db.execute(text("""
+        /* full-scan */
+        SELECT material_id, COUNT(*) FROM library_favorites GROUP BY material_id
+    """)):
+        row(material_id)["favorites"] = favorites
+
+    # trending: просмотры окна, сгруппированные по времени просмотра
+    since = time.time() - TRENDING_WINDOW_HALF_LIVES * _half_life_seconds()
+    exponents: Dict[int, List[float]] = defaultdict(list)
+    for material_id, viewed_at, count in db.execute(
+        text("""
+            SELECT material_id, viewed_at, COUNT(*) FROM library_views
+            WHERE viewed_at >= :since
+            GROUP BY material_id, viewed_at
+        """),
+        {"since": datetime.fromtimestamp(since, timezone.utc).strftime("%Y-%m-%d %H:%M:%S")}
+    ):
+        exponents[material_id].append(trending_exponent(_timestamp(viewed_at), count))
+    for material_id, values in exponents.items():
+        row(material_id)["trending_score"] = _log2_sum(values)
+
+    return expected
+
+
+def _differs(stored: dict, expected: dict) -> bool:
+    for key, value in expected.items():
+        if key == "trending_score":
+            if (stored[key] is None) != (value is None):
+                return True
+            if value is not None and abs(stored[key] - value) > 1e-6:
+                return True
+        elif stored[key] != value:
+            return True
+    return False
+
+
+def reconcile_material_stats(db: Session) -> Dict[str, int]:
+    """
+    Пересчитать статистику по library_views и library_favorites (с commit):
+    сдвигает окна 7/30 дней и исправляет расхождения. Без таблицы (миграция не запускалась)
+    сверка пропускается.
+    Returns:
+        сколько строк было исправлено
+    """
+    if check_material_stats():
+        return {"rows": 0}
+
+    # DELETE первым: берёт блокировку записи, пачки просмотров не проскочат между чтением и записью
+    removed = db.execute(text("""
+        DELETE FROM library_material_stats
+        WHERE material_id NOT IN (SELECT id FROM library_materials)
+    """)).rowcount
+
+    expected = _expected_stats(db)
+    stored = {
+        r["material_id"]: dict(r)
+        for r in db.execute(text("/* full-scan */ SELECT * FROM library_material_stats")).mappings()
+    }
+    existing_ids = set(db.execute(text("SELECT id FROM library_materials")).scalars())
+
+    changed = [
+        values for material_id, values in expected.items()
+        if material_id in existing_ids and (material_id not in stored or _differs(stored[material_id], values))
+    ]
+    # Строки без просмотров и лайков (всё удалили)
+    emptied = [material_id for material_id in stored if material_id not in expected]
+
+    if changed:
+        db.execute(
+            text("""
+                INSERT OR REPLACE INTO library_material_stats
+                    (material_id, views_total, unique_viewers, views_7d, views_30d, favorites, trending_score)
+                VALUES (:material_id, :views_total, :unique_viewers, :views_7d, :views_30d, :favorites, :trending_score)
+            """),
+            changed
+        )
+    if emptied:
+        db.execute(
+            text("DELETE FROM library_material_stats WHERE material_id = :material_id"),
+            [{"material_id": material_id} for material_id in emptied]
+        )
+    db.commit()
+
+    fixed = removed + len(changed) + len(emptied)
+    if fixed:
+        logger.info(f"Material stats reconciled: rows={fixed}")
+    return {"rows": fixed}
+
+
+def trending_material_ids(db: Session, limit: int) -> List[int]:
+    """Опубликованные материалы по убыванию trending_score (по индексу)"""
+    return list(db.execute(
+        text("""
+            SELECT s.material_id
+            FROM library_material_stats s
+            CROSS JOIN library_materials m  -- s первой: идём по индексу trending_score без сортировки
+            WHERE m.id = s.material_id AND s.trending_score IS NOT NULL AND m.is_published = 1
+            ORDER BY s.trending_score DESC
+            LIMIT :limit
+        """),
+        {"limit": limit}
+    ).scalars())
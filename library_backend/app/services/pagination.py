@@ -0,0 +1,82 @@
+"""
+Курсорная (keyset) пагинация списка материалов.
+Курсор — непрозрачная строка с ключом сортировки и id последнего элемента.
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, Optional, Tuple
+
+
+# Типы ключей сортировки в курсоре
+_KEY_TYPES = {
+    "created_at": str,
+    "views": int,
+    "title": str,
+    "rank": (int, float),
+}
+
+# Поддерживаемые сортировки: sort -> (поле, по убыванию)
+SORT_FIELDS = {
+    "created_desc": ("created_at", True),
+    "created_asc": ("created_at", False),
+    "views_desc": ("views", True),
+    "title_asc": ("title", False),
+    "relevance": ("rank", False),  # bm25 при полнотекстовом поиске
+}
+
+
+class InvalidCursor(ValueError):
+    """Курсор повреждён или не соответствует сортировке"""
+
+
+def sort_value(field: str, value: Any) -> Any:
+    """
+    Нормализует значение ключа сортировки.
+    Даты сравниваются как строки в формате хранения SQLite ('YYYY-MM-DD HH:MM:SS[.ffffff]'),
+    чтобы курсор одинаково работал в SQL и в кэше каталога.
+    """
+    if field == "created_at":
+        if value is None:
+            return ""
+        if isinstance(value, datetime):
+            return value.isoformat(sep=" ")
+        return str(value)
+    if field == "views":
+        return value or 0
+    if field == "title":
+        return value or ""
+    return value
+
+
+def encode_cursor(sort: str, key: Any, item_id: int) -> str:
+    raw = json.dumps([sort, key, item_id], ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> Optional[Tuple[Any, int]]:
+    """
+    Возвращает (ключ, id) или None для пустого курсора (первая страница).
+    Raises:
+        InvalidCursor: если курсор не читается или выдан для другой сортировки
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort, key, item_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise InvalidCursor("Невалидный курсор")
+    if cursor_sort != sort or not isinstance(item_id, int):
+        raise InvalidCursor("Курсор не соответствует сортировке")
+    if not isinstance(key, _KEY_TYPES[SORT_FIELDS[sort][0]]) or isinstance(key, bool):
+        raise InvalidCursor("Невалидный курсор")
+    return key, item_id
+
+
+def is_after(key: Any, item_id: int, cursor: Tuple[Any, int], descending: bool) -> bool:
+    """Лежит ли элемент строго после курсора в порядке сортировки"""
+    if descending:
+        return (key, item_id) < cursor
+    return (key, item_id) > cursor
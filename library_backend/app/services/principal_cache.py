@@ -0,0 +1,109 @@
+"""
+Кэш пользователей и статуса подписки для auth-зависимостей.
+
+get_current_user / get_current_user_with_subscription на каждый запрос читали users
+и subscriptions. Теперь результат живёт AUTH_CACHE_TTL_SECONDS (но не дольше конца
+подписки) и сбрасывается при force-logout, входе через Telegram, изменениях из админки
+и при /auth/check-subscription (фронтенд вызывает его после оплаты).
+
+Кэш свой у каждого worker, поэтому изменения из бота и соседних workers видны
+не позже чем через TTL. Отсутствие подписки не кэшируется — оплата видна сразу.
+Access-токены с claims (token_service) сюда не ходят: кэш нужен старым токенам
+и подпискам, оформленным после выдачи токена.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from app.config import settings
+
+
+def seconds_until(end_date: Any) -> Optional[float]:
+    """Сколько секунд осталось до end_date (UTC, как datetime('now') в SQLite)"""
+    if isinstance(end_date, str):
+        try:
+            end_date = datetime.fromisoformat(end_date)
+        except ValueError:
+            return None
+    if not isinstance(end_date, datetime):
+        return None
+    if end_date.tzinfo is not None:
+        end_date = end_date.replace(tzinfo=None) - end_date.utcoffset()
+    return (end_date - datetime.utcnow()).total_seconds()
+
+
+class PrincipalCache:
+    """TTL + LRU кэш по telegram_id: {"user": ..., "subscription": ...}"""
+
+    def __init__(self, ttl_seconds: int, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, Dict[str, tuple]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, telegram_id: int, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(telegram_id)
+            if entry is None or key not in entry:
+                return None
+            value, expires_at = entry[key]
+            if time.monotonic() >= expires_at:
+                del entry[key]
+                return None
+            self._entries.move_to_end(telegram_id)
+            return value
+
+    def _put(self, telegram_id: int, key: str, value: dict, ttl: float) -> None:
+        if ttl <= 0:
+            return
+        with self._lock:
+            entry = self._entries.setdefault(telegram_id, {})
+            entry[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(telegram_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_user(self, telegram_id: int) -> Optional[dict]:
+        """Пользователь из кэша (копия — зависимости дописывают в неё поля)"""
+        user = self._get(telegram_id, "user")
+        return dict(user) if user is not None else None
+
+    def put_user(self, telegram_id: int, user: dict) -> None:
+        self._put(telegram_id, "user", dict(user), self.ttl_seconds)
+
+    def get_subscription(self, telegram_id: int) -> Optional[dict]:
+        """Активная подписка из кэша (None — нет в кэше)"""
+        return self._get(telegram_id, "subscription")
+
+    def put_subscription(self, telegram_id: int, subscription: dict) -> None:
+        """Запомнить активную подписку, но не дольше её end_date"""
+        ttl = self.ttl_seconds
+        remaining = seconds_until(subscription.get("end_date"))
+        if remaining is not None:
+            ttl = min(ttl, remaining)
+        self._put(telegram_id, "subscription", subscription, ttl)
+
+    def invalidate(self, telegram_id: int) -> None:
+        """Сбросить пользователя и подписку (force-logout, изменения из админки)"""
+        with self._lock:
+            self._entries.pop(telegram_id, None)
+
+    def invalidate_subscription(self, telegram_id: int) -> None:
+        with self._lock:
+            entry = self._entries.get(telegram_id)
+            if entry is not None:
+                entry.pop("subscription", None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+# Глобальный кэш (на процесс)
+principal_cache = PrincipalCache(
+    ttl_seconds=settings.AUTH_CACHE_TTL_SECONDS,
+    max_entries=settings.AUTH_CACHE_MAX_ENTRIES,
+)
@@ -4,11 +4,12 @@
 """
 
 import logging
-from typing import Dict, Any, List, Set
+from typing import Dict, Any, List, Set, Tuple
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-from collections import defaultdict
 
+from app.services.content_scorer import content_scorer
+from app.services.item_similarity import item_similarity
 from app.services.material_service import add_cover_url
 
 logger = logging.getLogger(__name__)
@@ -19,9 +20,10 @@ class RecommendationService:
     Сервис персональных рекомендаций.
     
     Алгоритм (гибридный):
-    1. Collaborative Filtering — находим пользователей с похожими просмотрами,
-       рекомендуем то, что смотрели они, но не смотрел текущий пользователь.
-    2. Content-Based — материалы из тех же категорий.
+    1. Collaborative Filtering — материалы, похожие на просмотренные по совместным
+       просмотрам (модель item_similarity), кроме уже просмотренных.
+    2. Content-Based — материалы, близкие по категориям, тегам, формату, уровню,
+       теме и нише к просмотренным (content_scorer, вес — время просмотра).
     3. Popularity Fallback — если мало данных, добавляем популярные.
     """
     
@@ -35,8 +37,9 @@ class RecommendationService:
         Returns:
             dict с type, title, materials
         """
-        # 1. Получаем просмотренные материалы пользователя
-        viewed_ids = self._get_user_viewed_materials(user_id)
+        # 1. Получаем историю просмотров пользователя
+        history = self._get_user_history(user_id)
+        viewed_ids = [material_id for material_id, _, _ in history]
         
         # Если нет истории — возвращаем популярные
         if not viewed_ids:
@@ -52,17 +55,15 @@ class RecommendationService:
                 recommendations.append(item)
                 used_ids.add(item["id"])
         
-        # 3. Content-Based — материалы из тех же категорий
+        # 3. Content-Based — материалы, похожие по содержанию на просмотренные
         if len(recommendations) < limit:
-            category_ids = self._get_user_categories(user_id)
-            if category_ids:
-                content_results = self._get_category_recommendations(
-                    category_ids, list(used_ids), limit - len(recommendations)
-                )
-                for item in content_results:
-                    if item["id"] not in used_ids:
-                        recommendations.append(item)
-                        used_ids.add(item["id"])
+            content_results = self._get_content_recommendations(
+                user_id, history, list(used_ids), limit - len(recommendations)
+            )
+            for item in content_results:
+                if item["id"] not in used_ids:
+                    recommendations.append(item)
+                    used_ids.add(item["id"])
         
         # 4. Popularity Fallback
         if len(recommendations) < limit:
@@ -81,28 +82,90 @@ class RecommendationService:
             "materials": recommendations[:limit]
         }
     
-    def _get_user_viewed_materials(self, user_id: int) -> List[int]:
-        """Получить список ID просмотренных материалов"""
+    def _get_user_history(self, user_id: int) -> List[Tuple[int, int, int]]:
+        """История просмотров: [(material_id, просмотров, сумма duration_seconds)], сначала недавние"""
         result = self.db.execute(text("""
-            SELECT DISTINCT material_id FROM library_views WHERE user_id = :user_id
+            SELECT material_id, COUNT(*), COALESCE(SUM(duration_seconds), 0)
+            FROM library_views WHERE user_id = :user_id
+            GROUP BY material_id
+            ORDER BY MAX(viewed_at) DESC
         """), {"user_id": user_id}).fetchall()
-        return [r[0] for r in result]
+        return [(r[0], r[1], r[2]) for r in result]
     
     def _get_user_categories(self, user_id: int) -> List[int]:
-        """Получить категории просмотренных материалов"""
+        """Получить категории просмотренных материалов (materials_categories и старое category_id)"""
         result = self.db.execute(text("""
-            SELECT DISTINCT m.category_id 
+            SELECT mc.category_id
+            FROM library_views v
+            JOIN materials_categories mc ON mc.material_id = v.material_id
+            WHERE v.user_id = :user_id
+            UNION
+            SELECT m.category_id
             FROM library_views v
             JOIN library_materials m ON m.id = v.material_id
             WHERE v.user_id = :user_id AND m.category_id IS NOT NULL
         """), {"user_id": user_id}).fetchall()
         return [r[0] for r in result]
     
+    def _get_content_recommendations(
+        self,
+        user_id: int,
+        history: List[Tuple[int, int, int]],
+        excluded_ids: List[int],
+        limit: int
+    ) -> List[dict]:
+        """
+        Content-based по матрице признаков каталога (без запросов к БД).
+        Без numpy — материалы из тех же категорий через SQL.
+        """
+        if not content_scorer.available:
+            category_ids = self._get_user_categories(user_id)
+            return self._get_category_recommendations(category_ids, excluded_ids, limit)
+        
+        items = content_scorer.recommend(self.db, history[:50], exclude=excluded_ids, limit=limit)
+        return [self._item_to_dict(item) for item in items]
+    
     def _get_collaborative_recommendations(
         self, 
         user_id: int, 
         viewed_ids: List[int], 
         limit: int
+    ) -> List[dict]:
+        """
+        Collaborative Filtering по модели item_similarity: материалы, которые чаще всего
+        смотрят вместе с недавно просмотренными. Пока модель не построена
+        (или нет numpy/scipy) — прежний SQL-запрос.
+        """
+        model = item_similarity.model
+        if model is None:
+            return self._get_collaborative_recommendations_sql(user_id, viewed_ids, limit)
+        
+        # Запас на неопубликованные материалы, которые отсеет запрос
+        ranked = model.recommend(viewed_ids[:20], exclude=viewed_ids, limit=limit * 2)
+        if not ranked:
+            return []
+        
+        params = {f"m{i}": mid for i, (mid, _) in enumerate(ranked)}
+        placeholders = ",".join(f":{key}" for key in params)
+        rows = self.db.execute(text(f"""
+            SELECT m.id, m.title, m.description, m.cover_hash,
+                   (m.cover_hash IS NOT NULL OR m.cover_image IS NOT NULL) as has_cover, c.icon,
+                   m.external_url, m.category_id, c.name as category_name,
+                   COALESCE(s.views_total, 0) as views_count
+            FROM library_materials m
+            LEFT JOIN library_categories c ON c.id = m.category_id
+            LEFT JOIN library_material_stats s ON s.material_id = m.id
+            WHERE m.is_published = 1 AND m.id IN ({placeholders})
+        """), params).fetchall()
+        
+        by_id = {row.id: row for row in rows}
+        return [self._row_to_dict(by_id[mid]) for mid, _ in ranked if mid in by_id][:limit]
+    
+    def _get_collaborative_recommendations_sql(
+        self, 
+        user_id: int, 
+        viewed_ids: List[int], 
+        limit: int
     ) -> List[dict]:
         """
         Collaborative Filtering: находим пользователей с похожими просмотрами,
@@ -153,13 +216,15 @@ class RecommendationService:
                 LIMIT :limit
             )
             SELECT 
-                m.id, m.title, m.description, m.cover_image, c.icon,
+                m.id, m.title, m.description, m.cover_hash,
+                (m.cover_hash IS NOT NULL OR m.cover_image IS NOT NULL) as has_cover, c.icon,
                 m.external_url, m.category_id, c.name as category_name,
-                (SELECT COUNT(*) FROM library_views WHERE material_id = m.id) as views_count,
+                COALESCE(s.views_total, 0) as views_count,
                 rm.score
             FROM recommended_materials rm
             JOIN library_materials m ON m.id = rm.material_id
             LEFT JOIN library_categories c ON c.id = m.category_id
+            LEFT JOIN library_material_stats s ON s.material_id = m.id
             WHERE m.is_published = 1
             ORDER BY rm.score DESC, views_count DESC
             LIMIT :limit
@@ -177,11 +242,13 @@ class RecommendationService:
     def _get_popular_recommendations(self, limit: int) -> Dict[str, Any]:
         """Получить популярные материалы (fallback)"""
         popular = self.db.execute(text("""
-            SELECT m.id, m.title, m.description, m.cover_image, c.icon, 
+            SELECT m.id, m.title, m.description, m.cover_hash,
+                   (m.cover_hash IS NOT NULL OR m.cover_image IS NOT NULL) as has_cover, c.icon, 
                    m.external_url, m.category_id, c.name as category_name,
-                   (SELECT COUNT(*) FROM library_views WHERE material_id = m.id) as views_count
+                   COALESCE(s.views_total, 0) as views_count
             FROM library_materials m
             LEFT JOIN library_categories c ON c.id = m.category_id
+            LEFT JOIN library_material_stats s ON s.material_id = m.id
             WHERE m.is_published = 1
             ORDER BY views_count DESC
             LIMIT :limit
@@ -214,13 +281,18 @@ class RecommendationService:
         params = {**cat_params, **exc_params, "limit": limit}
         
         results = self.db.execute(text(f"""
-            SELECT m.id, m.title, m.description, m.cover_image, c.icon, 
+            SELECT m.id, m.title, m.description, m.cover_hash,
+                   (m.cover_hash IS NOT NULL OR m.cover_image IS NOT NULL) as has_cover, c.icon, 
                    m.external_url, m.category_id, c.name as category_name,
-                   (SELECT COUNT(*) FROM library_views WHERE material_id = m.id) as views_count
+                   COALESCE(s.views_total, 0) as views_count
             FROM library_materials m
             LEFT JOIN library_categories c ON c.id = m.category_id
+            LEFT JOIN library_material_stats s ON s.material_id = m.id
             WHERE m.is_published = 1
-              AND m.category_id IN ({cat_placeholders})
+              AND (
+                  m.category_id IN ({cat_placeholders})
+                  OR m.id IN (SELECT material_id FROM materials_categories WHERE category_id IN ({cat_placeholders}))
+              )
               AND m.id NOT IN ({exc_placeholders})
             ORDER BY views_count DESC
             LIMIT :limit
@@ -235,11 +307,13 @@ class RecommendationService:
         exc_placeholders = ",".join([f":exc{i}" for i in range(len(excluded_ids))]) if excluded_ids else "0"
         
         results = self.db.execute(text(f"""
-            SELECT m.id, m.title, m.description, m.cover_image, c.icon, 
+            SELECT m.id, m.title, m.description, m.cover_hash,
+                   (m.cover_hash IS NOT NULL OR m.cover_image IS NOT NULL) as has_cover, c.icon, 
                    m.external_url, m.category_id, c.name as category_name,
-                   (SELECT COUNT(*) FROM library_views WHERE material_id = m.id) as views_count
+                   COALESCE(s.views_total, 0) as views_count
             FROM library_materials m
             LEFT JOIN library_categories c ON c.id = m.category_id
+            LEFT JOIN library_material_stats s ON s.material_id = m.id
             WHERE m.is_published = 1 AND m.id NOT IN ({exc_placeholders})
             ORDER BY views_count DESC
             LIMIT :limit
@@ -248,15 +322,33 @@ class RecommendationService:
         return [self._row_to_dict(r) for r in results]
     
     def _row_to_dict(self, row) -> dict:
-        """Конвертировать строку в dict с cover_url"""
+        """Конвертировать строку в dict с cover_url (сама обложка не читается)"""
+        return add_cover_url({
+            "id": row.id, 
+            "title": row.title, 
+            "description": row.description, 
+            "cover_hash": row.cover_hash, 
+            "has_cover": bool(row.has_cover), 
+            "icon": row.icon, 
+            "external_url": row.external_url,
+            "category_id": row.category_id, 
+            "category_name": row.category_name, 
+            "views": row.views_count
+        })
+    
+    @staticmethod
+    def _item_to_dict(item: dict) -> dict:
+        """Элемент снимка каталога в формате _row_to_dict"""
+        category = item.get("category") or {}
         return add_cover_url({
-            "id": row[0], 
-            "title": row[1], 
-            "description": row[2], 
-            "cover_image": row[3], 
-            "icon": row[4], 
-            "external_url": row[5],
-            "category_id": row[6], 
-            "category_name": row[7], 
-            "views": row[8]
+            "id": item["id"],
+            "title": item["title"],
+            "description": item["description"],
+            "cover_hash": item["cover_hash"],
+            "has_cover": item["has_cover"],
+            "icon": category.get("icon"),
+            "external_url": item["external_url"],
+            "category_id": item["category_id"],
+            "category_name": category.get("name"),
+            "views": item["views"]
         })
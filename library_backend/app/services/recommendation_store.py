@@ -0,0 +1,265 @@
+"""
+Готовые рекомендации пользователей: LRU в памяти + таблица library_recommendations.
+
+/materials/feed/recommendations отдаёт сохранённый результат RecommendationService
+вместе с generated_at. Считаем заново только:
+- при первом запросе пользователя (синхронно);
+- в фоне (refresh_changed, раз в RECOMMENDATIONS_REFRESH_INTERVAL_SECONDS) — для
+  пользователей, у которых появились просмотры: новые строки library_views ищутся
+  по id больше запомненной отметки (view_watermark);
+- в фоне — для записей старше RECOMMENDATIONS_MAX_AGE_SECONDS (модель и каталог
+  меняются): пока пересчёта нет, отдаётся старый результат (stale-while-revalidate).
+
+Таблица общая для всех workers: LRU перечитывает строку не реже чем раз в
+RECOMMENDATIONS_CACHE_TTL_SECONDS, а фоновый пересчёт пропускает пользователей,
+которых уже пересчитал другой worker. RECOMMENDATIONS_PERSIST=False — только LRU.
+Таблицу создаёт миграция (migrations/add_recommendation_store.py); API при старте
+только проверяет её (check_recommendation_store) и без неё работает на одном LRU.
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import engine
+from app.models.library_models import LibraryRecommendation
+from app.services.catalog_cache import catalog_cache
+from app.services.recommendation_service import RecommendationService
+
+logger = logging.getLogger(__name__)
+
+# Сколько материалов хранить (limit больше — считается без кэша)
+STORED_LIMIT = 12
+# Пользователей за один фоновый проход (остальные — в следующий)
+REFRESH_BATCH = 500
+
+
+def check_recommendation_store() -> List[str]:
+    """
+    Проверить таблицу library_recommendations без DDL (при старте API).
+    Returns:
+        недостающие таблицы
+    """
+    if LibraryRecommendation.__tablename__ in inspect(engine).get_table_names():
+        return []
+    logger.warning(
+        f"Table {LibraryRecommendation.__tablename__} missing (run python migrations/add_recommendation_store.py)"
+    )
+    return [LibraryRecommendation.__tablename__]
+
+
+def ensure_recommendation_store() -> None:
+    """Создать таблицу library_recommendations, если её нет (из миграции)"""
+    LibraryRecommendation.__table__.create(bind=engine, checkfirst=True)
+
+
+def _max_view_id(db: Session) -> int:
+    return db.execute(text("SELECT COALESCE(MAX(id), 0) FROM library_views")).scalar()
+
+
+def _chunks(items: List[int], size: int = 500) -> Iterable[List[int]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class RecommendationStore:
+    """LRU (user_id -> запись) поверх library_recommendations и фоновый пересчёт"""
+
+    def __init__(self, max_entries: int, cache_ttl_seconds: int, max_age_seconds: int, persist: bool):
+        self.max_entries = max_entries
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self.max_age_seconds = max_age_seconds
+        self.persist = persist
+        # user_id -> ({"result", "generated_at", "generated_ts", "view_watermark"}, когда положили в LRU)
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._pending: Set[int] = set()  # ждут фонового пересчёта
+        self.watermark: Optional[int] = None  # library_views.id, до которого просмотры учтены
+
+    # ---------- LRU ----------
+
+    def _cache_get(self, user_id: int) -> Optional[dict]:
+        with self._lock:
+            cached = self._entries.get(user_id)
+            if cached is None:
+                return None
+            entry, cached_at = cached
+            if time.monotonic() - cached_at >= self.cache_ttl_seconds:
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return entry
+
+    def _cache_put(self, user_id: int, entry: dict) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[user_id] = (entry, time.monotonic())
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._pending.clear()
+
+    # ---------- таблица ----------
+
+    def _load(self, db: Session, user_id: int) -> Optional[dict]:
+        if not self.persist:
+            return None
+        row = db.execute(
+            text("SELECT payload, generated_at, view_watermark FROM library_recommendations WHERE user_id = :user_id"),
+            {"user_id": user_id}
+        ).fetchone()
+        if not row:
+            return None
+        return self._entry(json.loads(row[0]), row[1], row[2])
+
+    def _save(self, db: Session, user_id: int, entry: dict) -> None:
+        if not self.persist:
+            return
+        db.execute(
+            text("""
+                INSERT INTO library_recommendations (user_id, payload, generated_at, view_watermark)
+                VALUES (:user_id, :payload, :generated_at, :view_watermark)
+                ON CONFLICT(user_id) DO UPDATE SET
+                    payload = excluded.payload,
+                    generated_at = excluded.generated_at,
+                    view_watermark = excluded.view_watermark
+            """),
+            {
+                "user_id": user_id,
+                "payload": json.dumps(entry["result"], ensure_ascii=False, default=str),
+                "generated_at": entry["generated_at"],
+                "view_watermark": entry["view_watermark"],
+            }
+        )
+        db.commit()
+
+    @staticmethod
+    def _entry(result: dict, generated_at: str, view_watermark: int) -> dict:
+        return {
+            "result": result,
+            "generated_at": generated_at,
+            "generated_ts": datetime.fromisoformat(generated_at).timestamp(),
+            "view_watermark": view_watermark,
+        }
+
+    # ---------- расчёт ----------
+
+    def _compute(self, db: Session, user_id: int, view_watermark: Optional[int] = None) -> dict:
+        """Посчитать рекомендации, сохранить в таблицу и LRU"""
+        if view_watermark is None:
+            view_watermark = _max_view_id(db)
+        result = RecommendationService(db).get_recommendations(user_id, STORED_LIMIT)
+        generated_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        entry = self._entry(result, generated_at, view_watermark)
+        self._save(db, user_id, entry)
+        self._cache_put(user_id, entry)
+        return entry
+
+    def get(self, db: Session, user_id: int, limit: int) -> Dict[str, Any]:
+        """Ответ /materials/feed/recommendations: {type, title, materials, generated_at}"""
+        if limit > STORED_LIMIT:
+            entry = self._entry(
+                RecommendationService(db).get_recommendations(user_id, limit),
+                datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                0
+            )
+        else:
+            entry = self._cache_get(user_id)
+            if entry is None:
+                entry = self._load(db, user_id)
+                if entry is not None:
+                    self._cache_put(user_id, entry)
+            if entry is None:
+                entry = self._compute(db, user_id)
+            elif time.time() - entry["generated_ts"] >= self.max_age_seconds:
+                with self._lock:
+                    self._pending.add(user_id)
+
+        # Материал могли снять с публикации после расчёта
+        published = catalog_cache.get_snapshot(db).entries
+        result = entry["result"]
+        return {
+            "type": result["type"],
+            "title": result["title"],
+            "materials": [m for m in result["materials"] if m["id"] in published][:limit],
+            "generated_at": entry["generated_at"],
+        }
+
+    def _changed_users(self, db: Session, since: int, until: int) -> List[int]:
+        """Пользователи с новыми просмотрами и сохранёнными рекомендациями (ещё не пересчитанные)"""
+        users = [row[0] for row in db.execute(
+            text("SELECT DISTINCT user_id FROM library_views WHERE id > :since AND id <= :until"),
+            {"since": since, "until": until}
+        )]
+        if not self.persist:
+            with self._lock:
+                return [uid for uid in users if uid in self._entries]
+
+        stale = []
+        for chunk in _chunks(users):
+            params = {f"u{i}": uid for i, uid in enumerate(chunk)}
+            stale += [row[0] for row in db.execute(
+                text(f"""
+                    SELECT user_id FROM library_recommendations
+                    WHERE user_id IN ({','.join(':' + key for key in params)}) AND view_watermark < :until
+                """),
+                {**params, "until": until}
+            )]
+        return stale
+
+    def refresh_changed(self, db: Session) -> Dict[str, int]:
+        """
+        Фоновый пересчёт (job для start_periodic): пользователи с новыми просмотрами
+        и устаревшие записи, которые запрашивали.
+        """
+        until = _max_view_id(db)
+        if self.watermark is None:
+            self.watermark = db.execute(
+                text("SELECT COALESCE(MAX(view_watermark), 0) FROM library_recommendations")
+            ).scalar() if self.persist else until
+
+        with self._lock:
+            pending = set(self._pending)
+        if until > self.watermark:
+            pending.update(self._changed_users(db, self.watermark, until))
+        self.watermark = until
+
+        batch = sorted(pending)[:REFRESH_BATCH]
+        for user_id in batch:
+            try:
+                self._compute(db, user_id, until)
+            except Exception:
+                db.rollback()
+                logger.exception(f"Recommendations refresh failed for user_id={user_id}")
+        with self._lock:
+            self._pending = (self._pending | pending) - set(batch)
+
+        if batch:
+            logger.info(f"Recommendations refreshed: users={len(batch)} left={len(pending) - len(batch)}")
+        return {"refreshed": len(batch), "left": len(pending) - len(batch)}
+
+
+# Глобальное хранилище (LRU на процесс, таблица общая)
+recommendation_store = RecommendationStore(
+    max_entries=settings.RECOMMENDATIONS_CACHE_MAX_ENTRIES,
+    cache_ttl_seconds=settings.RECOMMENDATIONS_CACHE_TTL_SECONDS,
+    max_age_seconds=settings.RECOMMENDATIONS_MAX_AGE_SECONDS,
+    persist=settings.RECOMMENDATIONS_PERSIST,
+)
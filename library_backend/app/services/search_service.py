@@ -0,0 +1,482 @@
+"""
+Полнотекстовый поиск по материалам библиотеки.
+Инвертированный индекс на SQLite FTS5 с русским стеммингом и ранжированием bm25.
+
+Индекс обновляется после сохранения/удаления материала и после удаления тега
+(материалы тега переиндексируются). Сбой такой записи только логируется —
+reconcile_search_index раз в SEARCH_INDEX_RECONCILE_INTERVAL_SECONDS сверяет индекс
+с library_materials и исправляет расхождения.
+
+Таблицу FTS5 создаёт и заполняет migrations/rebuild_search_index.py; API при старте
+только проверяет её (check_search_index) и без неё ищет через ILIKE.
+"""
+
+import logging
+import re
+from html import unescape
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import Float, Integer, select, text
+from sqlalchemy.orm import Session
+
+from app.models.library_models import LibraryMaterial, LibraryTag, materials_tags
+
+logger = logging.getLogger(__name__)
+
+# Имя виртуальной таблицы FTS5 (rowid = library_materials.id)
+FTS_TABLE = "library_materials_fts"
+
+# Веса колонок для bm25: title, description, content, tags
+BM25_WEIGHTS = (10.0, 4.0, 1.0, 6.0)
+
+# Флаг доступности FTS5 (выставляется в check_search_index / ensure_search_index)
+_fts_available: Optional[bool] = None
+
+_INSERT_SQL = f"""
+    INSERT INTO {FTS_TABLE} (rowid, title, description, content, tags)
+    VALUES (:id, :title, :description, :content, :tags)
+"""
+
+
+# ============================================
+# РУССКИЙ СТЕММЕР (Snowball)
+# ============================================
+
+_VOWELS = "аеиоуыэюя"
+
+_PERFECTIVE_GERUND_1 = ("вшись", "вши", "в")
+_PERFECTIVE_GERUND_2 = ("ившись", "ывшись", "ивши", "ывши", "ив", "ыв")
+_REFLEXIVE = ("ся", "сь")
+_ADJECTIVE = (
+    "ими", "ыми", "его", "ого", "ему", "ому",
+    "ее", "ие", "ые", "ое", "ей", "ий", "ый", "ой", "ем", "им", "ым", "ом",
+    "их", "ых", "ую", "юю", "ая", "яя", "ою", "ею",
+)
+_PARTICIPLE_1 = ("ем", "нн", "вш", "ющ", "щ")
+_PARTICIPLE_2 = ("ивш", "ывш", "ующ")
+_VERB_1 = (
+    "ете", "йте", "ешь", "нно",
+    "ла", "на", "ли", "ем", "ло", "но", "ет", "ют", "ны", "ть", "й", "л", "н",
+)
+_VERB_2 = (
+    "ейте", "уйте",
+    "ила", "ыла", "ена", "ите", "или", "ыли", "ило", "ыло", "ено", "ует", "уют",
+    "ены", "ить", "ыть", "ишь",
+    "ей", "уй", "ил", "ыл", "им", "ым", "ен", "ят", "ит", "ыт", "ую", "ю",
+)
+_NOUN = (
+    "иями", "ями", "ами", "ией", "иям", "ием", "иях",
+    "ев", "ов", "ие", "ье", "еи", "ии", "ей", "ой", "ий", "ям", "ем", "ам", "ом",
+    "ах", "ях", "ию", "ью", "ия", "ья",
+    "а", "е", "и", "й", "о", "у", "ы", "ь", "ю", "я",
+)
+_SUPERLATIVE = ("ейше", "ейш")
+_DERIVATIONAL = ("ость", "ост")
+
+
+def _sorted_by_length(endings: Iterable[str]) -> tuple:
+    return tuple(sorted(endings, key=len, reverse=True))
+
+
+_PERFECTIVE_GERUND_1 = _sorted_by_length(_PERFECTIVE_GERUND_1)
+_PERFECTIVE_GERUND_2 = _sorted_by_length(_PERFECTIVE_GERUND_2)
+_ADJECTIVE = _sorted_by_length(_ADJECTIVE)
+_PARTICIPLE_1 = _sorted_by_length(_PARTICIPLE_1)
+_PARTICIPLE_2 = _sorted_by_length(_PARTICIPLE_2)
+_VERB_1 = _sorted_by_length(_VERB_1)
+_VERB_2 = _sorted_by_length(_VERB_2)
+_NOUN = _sorted_by_length(_NOUN)
+
+
+def _regions(word: str):
+    """Вычисляет начала областей RV и R2 (по Snowball)"""
+    rv = len(word)
+    for i, ch in enumerate(word):
+        if ch in _VOWELS:
+            rv = i + 1
+            break
+
+    def next_region(start: int) -> int:
+        for i in range(start + 1, len(word)):
+            if word[i] not in _VOWELS and word[i - 1] in _VOWELS:
+                return i + 1
+        return len(word)
+
+    r1 = next_region(0)
+    r2 = next_region(r1)
+    return rv, r2
+
+
+def _strip(rv_part: str, endings: tuple, preceded_by: str = "") -> Optional[str]:
+    """Отрезает самое длинное окончание (с учётом предшествующей а/я для групп 1)"""
+    for ending in endings:
+        if rv_part.endswith(ending):
+            rest = rv_part[: -len(ending)]
+            if preceded_by:
+                if rest and rest[-1] in preceded_by:
+                    return rest
+                continue
+            return rest
+    return None
+
+
+def stem(word: str) -> str:
+    """Стемминг русского слова (алгоритм Snowball). Прочие слова возвращаются как есть"""
+    word = word.lower().replace("ё", "е")
+    if not re.search(r"[а-я]", word):
+        return word
+
+    rv, r2 = _regions(word)
+    prefix, part = word[:rv], word[rv:]
+
+    # Шаг 1
+    rest = _strip(part, _PERFECTIVE_GERUND_1, "ая")
+    if rest is None:
+        rest = _strip(part, _PERFECTIVE_GERUND_2)
+    if rest is not None:
+        part = rest
+    else:
+        rest = _strip(part, _REFLEXIVE)
+        if rest is not None:
+            part = rest
+
+        rest = _strip(part, _ADJECTIVE)
+        if rest is not None:
+            part = rest
+            participle = _strip(part, _PARTICIPLE_1, "ая")
+            if participle is None:
+                participle = _strip(part, _PARTICIPLE_2)
+            if participle is not None:
+                part = participle
+        else:
+            rest = _strip(part, _VERB_1, "ая")
+            if rest is None:
+                rest = _strip(part, _VERB_2)
+            if rest is None:
+                rest = _strip(part, _NOUN)
+            if rest is not None:
+                part = rest
+
+    # Шаг 2
+    if part.endswith("и"):
+        part = part[:-1]
+
+    # Шаг 3: словообразовательные суффиксы только в R2
+    r2_offset = max(0, r2 - rv)
+    for ending in _DERIVATIONAL:
+        if part.endswith(ending) and len(part) - len(ending) >= r2_offset:
+            part = part[: -len(ending)]
+            break
+
+    # Шаг 4
+    if part.endswith("нн"):
+        part = part[:-1]
+    else:
+        rest = _strip(part, _SUPERLATIVE)
+        if rest is not None:
+            part = rest
+            if part.endswith("нн"):
+                part = part[:-1]
+        elif part.endswith("ь"):
+            part = part[:-1]
+
+    return prefix + part
+
+
+# ============================================
+# НОРМАЛИЗАЦИЯ ТЕКСТА
+# ============================================
+
+_TAG_RE = re.compile(r"<[^>]+>")
+
+# Служебные слова не обязательны в запросе (иначе «идеи для reels» требует «для»)
+_STOP_WORDS = {
+    "и", "в", "во", "на", "с", "со", "к", "ко", "о", "об", "от", "по", "для", "из",
+    "за", "до", "у", "а", "но", "или", "не", "как", "что", "это", "the", "a", "of",
+}
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(value: Optional[str]) -> List[str]:
+    """HTML -> список нормализованных основ слов"""
+    if not value:
+        return []
+    plain = unescape(_TAG_RE.sub(" ", value))
+    return [stem(token) for token in _TOKEN_RE.findall(plain.casefold())]
+
+
+def normalize_text(value: Optional[str]) -> str:
+    """Текст для индекса: основы слов через пробел"""
+    return " ".join(tokenize(value))
+
+
+def build_match_query(search: str) -> Optional[str]:
+    """
+    Строит выражение MATCH для FTS5.
+    Каждое слово ищется как префикс основы (для поиска «на лету» при наборе).
+    """
+    words = _TOKEN_RE.findall(search.casefold())
+    terms = [stem(w) for w in words if w not in _STOP_WORDS] or [stem(w) for w in words]
+    if not terms:
+        return None
+    return " ".join(f'"{t.replace(chr(34), "")}"*' for t in terms)
+
+
+# ============================================
+# СОЗДАНИЕ ИНДЕКСА
+# ============================================
+
+def check_search_index(db: Session) -> bool:
+    """
+    Проверить таблицу FTS5 без DDL (при старте API).
+    Возвращает False, если таблицы нет — тогда поиск работает через ILIKE.
+    """
+    global _fts_available
+    _fts_available = db.bind.dialect.name == "sqlite" and db.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {"name": FTS_TABLE}
+    ).fetchone() is not None
+    if not _fts_available:
+        logger.warning(f"Table {FTS_TABLE} missing, search uses ILIKE (run python migrations/rebuild_search_index.py)")
+    return _fts_available
+
+
+def ensure_search_index(db: Session) -> bool:
+    """
+    Создаёт виртуальную таблицу FTS5, если её нет, и заполняет её при первом создании (из миграции).
+    Возвращает False, если SQLite собран без FTS5 — тогда поиск работает через ILIKE.
+    """
+    global _fts_available
+    if db.bind.dialect.name != "sqlite":
+        _fts_available = False
+        return False
+    try:
+        exists = db.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": FTS_TABLE}
+        ).fetchone()
+        db.execute(text(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+                title, description, content, tags,
+                tokenize = 'unicode61 remove_diacritics 2',
+                prefix = '2 3'
+            )
+        """))
+        db.commit()
+        _fts_available = True
+        if not exists:
+            SearchService(db).rebuild()
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"FTS5 недоступен, поиск будет через ILIKE: {e}")
+        _fts_available = False
+    return _fts_available
+
+
+def is_search_index_available() -> bool:
+    return bool(_fts_available)
+
+
+# ============================================
+# СЕРВИС
+# ============================================
+
+class SearchService:
+    """Сервис полнотекстового поиска по материалам"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def match_subquery(self, search: str):
+        """
+        Подзапрос (material_id, rank) для JOIN с library_materials.
+        rank — значение bm25 (меньше = релевантнее).
+        Отдаёт все совпадения: фильтры, сортировка и total считаются в основном запросе.
+        Возвращает None, если индекс недоступен или запрос пуст.
+        """
+        if not is_search_index_available():
+            return None
+        match = build_match_query(search)
+        if not match:
+            return None
+        weights = ", ".join(str(w) for w in BM25_WEIGHTS)
+        return (
+            text(f"""
+                SELECT rowid AS material_id, bm25({FTS_TABLE}, {weights}) AS rank
+                FROM {FTS_TABLE}
+                WHERE {FTS_TABLE} MATCH :fts_query
+            """)
+            .bindparams(fts_query=match)
+            .columns(material_id=Integer, rank=Float)
+            .subquery("fts")
+        )
+
+    def _tags_text(self, material_id: int) -> str:
+        names = self.db.execute(
+            select(LibraryTag.name)
+            .join(materials_tags, materials_tags.c.tag_id == LibraryTag.id)
+            .where(materials_tags.c.material_id == material_id)
+        ).scalars().all()
+        return " ".join(names)
+
+    def index_material(self, material: LibraryMaterial) -> None:
+        """Добавить/обновить материал в индексе (вызывать после commit материала)"""
+        if not is_search_index_available():
+            return
+        try:
+            self.db.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {"id": material.id})
+            self.db.execute(
+                text(_INSERT_SQL),
+                _index_row(material, self._tags_text(material.id))
+            )
+            self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            logger.warning(f"Не удалось обновить поисковый индекс для материала {material.id} (исправит сверка): {e}")
+
+    def index_materials(self, material_ids: Iterable[int]) -> None:
+        """Переиндексировать материалы по id (после изменения их тегов); удалённых — убрать из индекса"""
+        ids = sorted(set(material_ids))
+        if not ids or not is_search_index_available():
+            return
+        try:
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                params = {f"id{i}": material_id for i, material_id in enumerate(batch)}
+                placeholders = ",".join(":" + key for key in params)
+                self.db.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})"), params)
+                rows = list(self._rows(self.db.execute(
+                    select(
+                        LibraryMaterial.id, LibraryMaterial.title,
+                        LibraryMaterial.description, LibraryMaterial.content
+                    ).where(LibraryMaterial.id.in_(batch))
+                ).all()))
+                if rows:
+                    self.db.execute(text(_INSERT_SQL), rows)
+            self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            logger.warning(f"Не удалось переиндексировать {len(ids)} материалов (исправит сверка): {e}")
+
+    def remove_material(self, material_id: int) -> None:
+        """Удалить материал из индекса"""
+        if not is_search_index_available():
+            return
+        try:
+            self.db.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {"id": material_id})
+            self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            logger.warning(f"Не удалось удалить материал {material_id} из поискового индекса (исправит сверка): {e}")
+
+    def _tags_by_material(self, material_ids: Optional[List[int]] = None) -> Dict[int, List[str]]:
+        query = (
+            select(materials_tags.c.material_id, LibraryTag.name)
+            .join(LibraryTag, LibraryTag.id == materials_tags.c.tag_id)
+        )
+        if material_ids is not None:
+            query = query.where(materials_tags.c.material_id.in_(material_ids))
+        tags_by_material: Dict[int, List[str]] = {}
+        for material_id, name in self.db.execute(query):
+            tags_by_material.setdefault(material_id, []).append(name)
+        return tags_by_material
+
+    def _rows(self, materials, tags_by_material: Optional[Dict[int, List[str]]] = None):
+        """Строки индекса для (id, title, description, content); теги — из tags_by_material или из БД"""
+        if tags_by_material is None:
+            tags_by_material = self._tags_by_material([m.id for m in materials])
+        for material in materials:
+            yield _index_row(material, " ".join(tags_by_material.get(material.id, [])))
+
+    def _material_batches(self, batch_size: int):
+        """Материалы пачками по id: (id, title, description, content)"""
+        last_id = 0
+        while True:
+            rows = self.db.execute(
+                select(
+                    LibraryMaterial.id, LibraryMaterial.title,
+                    LibraryMaterial.description, LibraryMaterial.content
+                )
+                .where(LibraryMaterial.id > last_id)
+                .order_by(LibraryMaterial.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                return
+            yield rows
+            last_id = rows[-1].id
+
+    def rebuild(self, batch_size: int = 500) -> int:
+        """Полностью перестроить индекс. Возвращает количество проиндексированных материалов"""
+        self.db.execute(text(f"DELETE FROM {FTS_TABLE}"))
+        tags_by_material = self._tags_by_material()
+
+        count = 0
+        for rows in self._material_batches(batch_size):
+            self.db.execute(text(_INSERT_SQL), list(self._rows(rows, tags_by_material)))
+            count += len(rows)
+
+        self.db.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')"))
+        self.db.commit()
+        logger.info(f"Поисковый индекс перестроен: {count} материалов")
+        return count
+
+    def reconcile(self, batch_size: int = 500) -> int:
+        """
+        Сверить индекс с library_materials (с commit): переписать отличающиеся
+        и недостающие строки, удалить строки удалённых материалов.
+        Returns:
+            сколько строк индекса было исправлено
+        """
+        tags_by_material = self._tags_by_material()
+        fixed = 0
+        for rows in self._material_batches(batch_size):
+            params = {f"id{i}": row.id for i, row in enumerate(rows)}
+            indexed = {
+                row[0]: tuple(row[1:])
+                for row in self.db.execute(
+                    text(f"""
+                        SELECT rowid, title, description, content, tags FROM {FTS_TABLE}
+                        WHERE rowid IN ({",".join(":" + key for key in params)})
+                    """),
+                    params
+                )
+            }
+            stale = [
+                row for row in self._rows(rows, tags_by_material)
+                if indexed.get(row["id"]) != (row["title"], row["description"], row["content"], row["tags"])
+            ]
+            for row in stale:
+                self.db.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {"id": row["id"]})
+            if stale:
+                self.db.execute(text(_INSERT_SQL), stale)
+            fixed += len(stale)
+
+        fixed += self.db.execute(text(f"""
+            /* full-scan */
+            DELETE FROM {FTS_TABLE}
+            WHERE rowid NOT IN (SELECT id FROM library_materials)
+        """)).rowcount
+        self.db.commit()
+        return fixed
+
+
+def _index_row(material, tags: str) -> dict:
+    """Строка индекса: нормализованные title/description/content/tags"""
+    return {
+        "id": material.id,
+        "title": normalize_text(material.title),
+        "description": normalize_text(material.description),
+        "content": normalize_text(material.content),
+        "tags": normalize_text(tags),
+    }
+
+
+def reconcile_search_index(db: Session) -> int:
+    """Периодическая сверка поискового индекса (job для start_periodic)"""
+    if not is_search_index_available():
+        return 0
+    fixed = SearchService(db).reconcile()
+    if fixed:
+        logger.info(f"Search index reconciled: rows={fixed}")
+    return fixed
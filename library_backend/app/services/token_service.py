@@ -0,0 +1,161 @@
+"""
+Выдача и обновление JWT.
+
+Access-токен живёт ACCESS_TOKEN_EXPIRE_MINUTES и несёт всё, что нужно
+auth-зависимостям: user_id, имя, admin_group/is_admin, версию токена (ver)
+и конец подписки (sub_end) — запросы к БД на каждый вызов не нужны.
+Refresh-токен (REFRESH_TOKEN_EXPIRE_DAYS) меняется на новую пару через /auth/refresh;
+только там сверяется users.token_version и перечитывается подписка.
+
+force-logout поднимает token_version в БД и кладёт новую версию в revocations:
+access-токены со старой версией отклоняются сразу (в этом worker), в остальных —
+не позже чем истечёт access-токен, потому что refresh сверяется с БД.
+"""
+
+import secrets
+import threading
+import time
+from datetime import timedelta
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.services.active_subscriptions import get_active_subscription
+from app.services.material_service import ADMIN_IDS
+from app.services.principal_cache import seconds_until
+from app.utils.auth import ACCESS_TOKEN, REFRESH_TOKEN, create_token, decode_access_token
+
+
+class TokenRevocations:
+    """
+    Отозванные версии токенов: telegram_id -> минимальная допустимая ver.
+    Запись нужна, пока живы access-токены старой версии, потом удаляется.
+    """
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[int, Tuple[int, float]] = {}
+        self._lock = threading.Lock()
+
+    def revoke(self, telegram_id: int, min_version: int) -> None:
+        with self._lock:
+            self._entries[telegram_id] = (min_version, time.monotonic() + self.ttl_seconds)
+            if len(self._entries) > 1000:
+                now = time.monotonic()
+                self._entries = {k: v for k, v in self._entries.items() if v[1] > now}
+
+    def is_revoked(self, telegram_id: int, version: int) -> bool:
+        entry = self._entries.get(telegram_id)
+        if entry is None:
+            return False
+        min_version, expires_at = entry
+        if time.monotonic() >= expires_at:
+            with self._lock:
+                self._entries.pop(telegram_id, None)
+            return False
+        return version < min_version
+
+
+revocations = TokenRevocations(ttl_seconds=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+def load_claims(db: Session, telegram_id: int) -> Optional[dict]:
+    """Собрать claims из users и активной подписки (None — пользователя нет)"""
+    user = db.execute(
+        text("""
+            SELECT id, telegram_id, first_name, username, photo_url,
+                   current_loyalty_level, admin_group, COALESCE(token_version, 1)
+            FROM users WHERE telegram_id = :tg_id
+        """),
+        {"tg_id": telegram_id}
+    ).fetchone()
+    if not user:
+        return None
+
+    subscription = get_active_subscription(db, user[0])
+
+    return {
+        "telegram_id": user[1],
+        "user_id": user[0],
+        "first_name": user[2],
+        "username": user[3],
+        "photo_url": user[4],
+        "loyalty_level": user[5] or "none",
+        "admin_group": user[6],
+        "is_admin": user[1] in ADMIN_IDS or bool(user[6]),
+        "ver": user[7],
+        "sub_id": subscription["id"] if subscription else None,
+        "sub_end": str(subscription["end_date"]) if subscription else None,
+    }
+
+
+def issue_tokens(claims: dict) -> dict:
+    """Пара access + refresh для claims из load_claims"""
+    access_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    refresh_claims = {
+        "telegram_id": claims["telegram_id"],
+        "ver": claims["ver"],
+        "jti": secrets.token_urlsafe(12),
+    }
+    return {
+        "access_token": create_token(claims, ACCESS_TOKEN, access_expires),
+        "refresh_token": create_token(
+            refresh_claims, REFRESH_TOKEN, timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+        ),
+        "expires_in": int(access_expires.total_seconds()),
+    }
+
+
+def refresh_tokens(db: Session, refresh_token: str) -> dict:
+    """
+    Обменять refresh-токен на новую пару (claims перечитываются из БД).
+    Raises:
+        HTTPException 401: токен невалидный, не refresh, или версия отозвана
+    """
+    payload = decode_access_token(refresh_token)
+    if payload.get("typ") != REFRESH_TOKEN:
+        raise _unauthorized("Нужен refresh-токен")
+
+    telegram_id = payload.get("telegram_id")
+    claims = load_claims(db, telegram_id) if telegram_id else None
+    if claims is None or payload.get("ver") != claims["ver"]:
+        raise _unauthorized("Сессия завершена, войдите снова")
+
+    return issue_tokens(claims)
+
+
+def principal_from_claims(payload: dict) -> dict:
+    """
+    Пользователь из access-токена в формате get_current_user.
+    Если подписка по claims ещё активна — сразу с ключом "subscription".
+    Raises:
+        HTTPException 401: версия токена отозвана (force-logout)
+    """
+    if revocations.is_revoked(payload["telegram_id"], payload.get("ver", 0)):
+        raise _unauthorized("Сессия завершена, войдите снова")
+
+    user = {
+        "user_id": payload["user_id"],
+        "telegram_id": payload["telegram_id"],
+        "first_name": payload.get("first_name"),
+        "username": payload.get("username"),
+        "photo_url": payload.get("photo_url"),
+        "loyalty_level": payload.get("loyalty_level") or "none",
+        "admin_group": payload.get("admin_group"),
+    }
+    sub_end = payload.get("sub_end")
+    remaining = seconds_until(sub_end) if sub_end else None
+    if remaining is not None and remaining > 0:
+        user["subscription"] = {"id": payload.get("sub_id"), "is_active": True, "end_date": sub_end}
+    return user
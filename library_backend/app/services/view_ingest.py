@@ -0,0 +1,381 @@
+"""
+Буферизованная запись просмотров материалов.
+
+POST /materials/{id}/view только кладёт просмотр в очередь в памяти (без дисковых
+операций в цикле событий); строки журнала на диске дописывает отдельный поток
+(write + flush, fsync при VIEW_JOURNAL_FSYNC — одной группой на пачку). Фоновая
+задача раз в VIEW_FLUSH_INTERVAL_MS (или при наборе VIEW_FLUSH_BATCH_SIZE) пишет
+пачку одним executemany INSERT в library_views и одним UPDATE views на каждый
+материал (плюс строки library_material_stats).
+
+Журнал — сегменты views-<pid>-<n>.log. Перед записью в БД поток журнала по метке
+из очереди атомарно переименовывает сегмент в .flushing (в нём ровно просмотры
+пачки); сегмент удаляется после commit (при ошибке записи пачка повторяется на
+следующем тике); сегменты упавших процессов подхватываются при старте
+(переименованием в .replay-<pid>). Доставка at-least-once: при падении между commit
+и удалением сегмента пачка запишется повторно; просмотры, которые поток журнала ещё
+не успел дописать, при падении процесса теряются.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.services.material_stats import record_views
+
+logger = logging.getLogger(__name__)
+
+# (material_id, user_id, duration_seconds, viewed_at)
+ViewRecord = Tuple[int, int, Optional[int], str]
+
+
+class ViewIngestOverloaded(Exception):
+    """Очередь просмотров переполнена — клиенту стоит повторить позже"""
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def write_views(db: Session, views: List[ViewRecord]) -> int:
+    """
+    Записать пачку просмотров (с commit). Просмотры удалённых материалов отбрасываются.
+    Returns:
+        количество записанных просмотров
+    """
+    if not views:
+        return 0
+
+    material_ids = sorted({v[0] for v in views})
+    params = {f"m{i}": mid for i, mid in enumerate(material_ids)}
+    existing = set(db.execute(
+        text(f"SELECT id FROM library_materials WHERE id IN ({','.join(':' + k for k in params)})"),
+        params
+    ).scalars())
+    views = [v for v in views if v[0] in existing]
+    if not views:
+        return 0
+
+    db.execute(
+        text("""
+            INSERT INTO library_views (material_id, user_id, duration_seconds, viewed_at)
+            VALUES (:material_id, :user_id, :duration_seconds, :viewed_at)
+        """),
+        [
+            {"material_id": m, "user_id": u, "duration_seconds": d, "viewed_at": at}
+            for m, u, d, at in views
+        ]
+    )
+    db.execute(
+        text("UPDATE library_materials SET views = COALESCE(views, 0) + :n WHERE id = :material_id"),
+        [{"n": n, "material_id": m} for m, n in Counter(v[0] for v in views).items()]
+    )
+    record_views(db, views)
+    db.commit()
+    return len(views)
+
+
+class _Seal:
+    """Метка в очереди журнала: закрыть активный сегмент и переименовать в .flushing"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.path: Optional[Path] = None
+
+    def wait(self) -> Optional[Path]:
+        self.done.wait()
+        return self.path
+
+
+# Метка остановки потока журнала
+_STOP = object()
+
+
+class ViewIngest:
+    """Очередь просмотров с журналом на диске и пакетной записью в БД"""
+
+    def __init__(self, journal_dir: Path, batch_size: int, flush_interval: float, max_pending: int):
+        self.journal_dir = journal_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        self._pending: List[ViewRecord] = []
+        # Пачки, не записанные в БД, и метки их сегментов .flushing — повторяются при следующем flush
+        self._unwritten: List[Tuple[List[ViewRecord], Optional[_Seal]]] = []
+        self._lock = threading.Lock()  # только очередь в памяти: без дисковых операций
+        self._flush_lock = threading.Lock()  # одна запись в БД за раз
+        # Очередь потока журнала: просмотры и метки _Seal/_STOP в порядке поступления
+        self._journal: Optional[queue.SimpleQueue] = None
+        self._journal_thread: Optional[threading.Thread] = None
+        self._segment = None  # активный сегмент — только в потоке журнала
+        self._segment_no = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    # ---------- журнал (поток журнала) ----------
+
+    def _segment_path(self, suffix: str) -> Path:
+        return self.journal_dir / f"views-{os.getpid()}-{self._segment_no}{suffix}"
+
+    def _open_segment(self) -> None:
+        self._segment_no += 1
+        self._segment = open(self._segment_path(".log"), "a", encoding="utf-8")
+
+    def _seal_segment(self) -> Path:
+        """Закрыть активный сегмент, переименовать в .flushing и открыть следующий"""
+        self._segment.close()
+        sealed = self._segment_path(".flushing")
+        os.replace(self._segment_path(".log"), sealed)
+        self._open_segment()
+        return sealed
+
+    def _close_segment(self) -> None:
+        """Закрыть активный сегмент при остановке (пустой — удалить)"""
+        self._segment.close()
+        self._segment = None
+        active = self._segment_path(".log")
+        if active.exists() and active.stat().st_size == 0:
+            active.unlink()
+
+    def _append(self, lines: List[str]) -> None:
+        if not lines:
+            return
+        try:
+            self._segment.write("".join(lines))
+            self._segment.flush()
+            if settings.VIEW_JOURNAL_FSYNC:
+                os.fsync(self._segment.fileno())
+        except Exception:
+            # Просмотры остаются в памяти и запишутся в БД; теряется только защита от падения
+            logger.exception(f"View journal write failed, {len(lines)} views not journaled")
+
+    def _write_journal(self) -> None:
+        """Поток журнала: дописывает просмотры пачками, по меткам запечатывает сегменты"""
+        self._open_segment()
+        while True:
+            items = [self._journal.get()]
+            while True:
+                try:
+                    items.append(self._journal.get_nowait())
+                except queue.Empty:
+                    break
+
+            lines: List[str] = []
+            for item in items:
+                if isinstance(item, tuple):
+                    lines.append(json.dumps(item, separators=(",", ":")) + "\n")
+                    continue
+                self._append(lines)
+                lines = []
+                if item is _STOP:
+                    self._close_segment()
+                    return
+                try:
+                    item.path = self._seal_segment()
+                except Exception:
+                    logger.exception("View journal seal failed")
+                    if self._segment is None or self._segment.closed:
+                        self._open_segment()
+                finally:
+                    item.done.set()
+            self._append(lines)
+
+    def _start_journal(self) -> None:
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+        self._journal = queue.SimpleQueue()
+        self._journal_thread = threading.Thread(target=self._write_journal, name="view-journal", daemon=True)
+        self._journal_thread.start()
+
+    def _stop_journal(self) -> None:
+        """Дописать очередь журнала и закрыть сегмент (после последнего flush)"""
+        if self._journal_thread is None:
+            return
+        self._journal.put(_STOP)
+        self._journal_thread.join()
+        self._journal_thread = None
+        self._journal = None
+
+    @staticmethod
+    def _read_segment(path: Path) -> List[ViewRecord]:
+        views = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    m, u, d, at = json.loads(line)
+                    views.append((int(m), int(u), d, at))
+                except (ValueError, TypeError):
+                    # Недописанная строка при падении процесса
+                    continue
+        return views
+
+    # ---------- приём ----------
+
+    def enqueue(self, material_id: int, user_id: int, duration_seconds: Optional[int] = None) -> None:
+        """
+        Принять просмотр (не ходит ни в БД, ни на диск — журнал пишет свой поток).
+        Raises:
+            ViewIngestOverloaded: если в очереди уже max_pending просмотров
+        """
+        record = (material_id, user_id, duration_seconds, time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime()))
+        with self._lock:
+            if len(self._pending) + self.retrying >= self.max_pending:
+                raise ViewIngestOverloaded()
+            self._pending.append(record)
+            if self._journal is not None:
+                self._journal.put(record)
+            full = len(self._pending) >= self.batch_size
+
+        if full and self._wakeup is not None:
+            self._wakeup.set()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    @property
+    def retrying(self) -> int:
+        """Просмотров в пачках, ждущих повторной записи"""
+        return sum(len(views) for views, _ in self._unwritten)
+
+    # ---------- запись ----------
+
+    def flush(self) -> int:
+        """
+        Записать накопленные просмотры в БД (синхронно, вызывать из threadpool).
+        Пачки, которые не удалось записать (например, "database is locked"), остаются
+        в памяти вместе со своими сегментами и повторяются первыми при следующем вызове.
+        """
+        with self._flush_lock:
+            with self._lock:
+                views, self._pending = self._pending, []
+                if views:
+                    # Метка встаёт в очередь журнала сразу за последним просмотром пачки
+                    seal = None
+                    if self._journal is not None:
+                        seal = _Seal()
+                        self._journal.put(seal)
+                    self._unwritten.append((views, seal))
+                batches = self._unwritten
+            if not batches:
+                return 0
+
+            written = 0
+            while batches:
+                views, seal = batches[0]
+                # Сегмент пачки должен быть запечатан до commit, иначе удалять будет нечего
+                sealed = seal.wait() if seal is not None else None
+                db = SessionLocal()
+                try:
+                    written += write_views(db, views)
+                except Exception:
+                    db.rollback()
+                    # Повтор на следующем flush; сегмент .flushing — на случай падения процесса
+                    logger.exception(f"View flush failed, {len(views)} views kept for retry ({sealed})")
+                    break
+                finally:
+                    db.close()
+                with self._lock:
+                    batches.pop(0)
+                if sealed is not None:
+                    sealed.unlink(missing_ok=True)
+
+            logger.debug(f"Views flushed: {written}")
+            return written
+
+    def replay(self) -> int:
+        """Дописать в БД сегменты завершившихся процессов (при старте)"""
+        replayed = 0
+        for path in sorted(self.journal_dir.glob("views-*")):
+            try:
+                owner = int(path.name.split("-")[1])
+            except (IndexError, ValueError):
+                continue
+            if owner != os.getpid() and _pid_alive(owner):
+                continue
+            if ".replay-" in path.name:
+                # Чужой незавершённый replay — забираем, только если процесс-владелец мёртв
+                replay_owner = int(path.name.rsplit("-", 1)[1])
+                if _pid_alive(replay_owner):
+                    continue
+            claimed = path.with_name(f"{path.name.split('.')[0]}.replay-{os.getpid()}")
+            try:
+                os.replace(path, claimed)
+            except FileNotFoundError:
+                continue  # уже забрал другой worker
+
+            views = self._read_segment(claimed)
+            db = SessionLocal()
+            try:
+                replayed += write_views(db, views)
+                claimed.unlink(missing_ok=True)
+            except Exception:
+                db.rollback()
+                logger.exception(f"View journal replay failed: {claimed}")
+            finally:
+                db.close()
+
+        if replayed:
+            logger.info(f"View journal replayed: {replayed} views")
+        return replayed
+
+    # ---------- жизненный цикл ----------
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._pending or self._unwritten:
+                try:
+                    await loop.run_in_executor(None, self.flush)
+                except Exception:
+                    logger.exception("View flush loop error")
+
+    async def start(self) -> None:
+        """Подхватить журнал упавших процессов и запустить фоновую запись"""
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+        await asyncio.get_running_loop().run_in_executor(None, self.replay)
+        self._start_journal()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="view_ingest")
+
+    async def stop(self) -> None:
+        """Остановить фоновую запись и дописать остаток"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.flush)
+        await loop.run_in_executor(None, self._stop_journal)
+
+
+# Глобальная очередь просмотров (на процесс)
+view_ingest = ViewIngest(
+    journal_dir=settings.VIEW_JOURNAL_DIR,
+    batch_size=settings.VIEW_FLUSH_BATCH_SIZE,
+    flush_interval=settings.VIEW_FLUSH_INTERVAL_MS / 1000,
+    max_pending=settings.VIEW_QUEUE_MAX,
+)
@@ -2,16 +2,25 @@
 Утилиты для авторизации и работы с JWT токенами
 """
 
+import base64
 import hashlib
 import hmac
+import json
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 
 from jose import JWTError, jwt
 from fastapi import HTTPException, status
 
 from app.config import settings
 
+# Тип токена (claim "typ"); у старых токенов его нет
+ACCESS_TOKEN = "access"
+REFRESH_TOKEN = "refresh"
+
 
 def verify_telegram_auth(auth_data: Dict[str, Any]) -> bool:
     """
@@ -79,6 +88,132 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
+def create_token(claims: dict, token_type: str, expires_delta: timedelta) -> str:
+    """
+    Создание JWT токена с типом (access/refresh)
+    
+    Args:
+        claims: Данные для токена
+        token_type: ACCESS_TOKEN или REFRESH_TOKEN
+        expires_delta: Время жизни токена
+    
+    Returns:
+        JWT токен
+    """
+    now = datetime.utcnow()
+    to_encode = {**claims, "typ": token_type, "iat": now, "exp": now + expires_delta}
+    return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+
+
+# ==================== Проверка JWT ====================
+
+_HMAC_DIGESTS = {"HS256": hashlib.sha256, "HS384": hashlib.sha384, "HS512": hashlib.sha512}
+
+
+def _b64decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+def _decode_jose(token: str) -> Dict[str, Any]:
+    return jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+
+
+def _decode_hmac(token: str) -> Dict[str, Any]:
+    """
+    Проверка HS256/384/512 на hashlib/hmac без python-jose.
+    Те же проверки, что у jose для наших токенов: alg из настроек, подпись, exp, nbf, aud.
+    """
+    try:
+        header_b64, payload_b64, signature_b64 = token.split(".")
+        header = json.loads(_b64decode(header_b64))
+        if not isinstance(header, dict) or header.get("alg") != settings.ALGORITHM:
+            raise JWTError("Неверный алгоритм")
+        expected = hmac.new(
+            settings.SECRET_KEY.encode(),
+            f"{header_b64}.{payload_b64}".encode("ascii"),
+            _HMAC_DIGESTS[settings.ALGORITHM]
+        ).digest()
+        if not hmac.compare_digest(expected, _b64decode(signature_b64)):
+            raise JWTError("Неверная подпись")
+        payload = json.loads(_b64decode(payload_b64))
+    except (ValueError, UnicodeEncodeError) as e:  # binascii.Error и JSONDecodeError — подклассы ValueError
+        raise JWTError(str(e))
+
+    if not isinstance(payload, dict):
+        raise JWTError("Неверный payload")
+    now = time.time()
+    for claim in ("exp", "nbf", "iat"):
+        if claim in payload and not isinstance(payload[claim], (int, float)):
+            raise JWTError(f"Неверный {claim}")
+    if "exp" in payload and payload["exp"] < now:
+        raise JWTError("Токен истёк")
+    if "nbf" in payload and payload["nbf"] > now:
+        raise JWTError("Токен ещё не действует")
+    if "aud" in payload:
+        raise JWTError("Неожиданный aud")
+    return payload
+
+
+_DECODERS = {"jose": _decode_jose, "hmac": _decode_hmac}
+
+
+class TokenCache:
+    """LRU проверенных токенов: сырой токен -> payload, до его exp"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(token)
+        if entry is None:
+            return None
+        payload, expires_at = entry
+        with self._lock:
+            if time.time() >= expires_at:
+                self._entries.pop(token, None)
+                return None
+            if token in self._entries:
+                self._entries.move_to_end(token)
+        return payload
+
+    def put(self, token: str, payload: Dict[str, Any]) -> None:
+        if self.max_size <= 0:
+            return
+        exp = payload.get("exp")
+        expires_at = float(exp) if isinstance(exp, (int, float)) else float("inf")
+        with self._lock:
+            self._entries[token] = (payload, expires_at)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache(settings.JWT_CACHE_SIZE)
+
+
+def verify_token(token: str) -> Optional[Dict[str, Any]]:
+    """
+    Проверить JWT (сначала LRU, потом JWT_BACKEND)
+    
+    Returns:
+        Копия payload или None, если токен невалидный
+    """
+    payload = token_cache.get(token)
+    if payload is None:
+        try:
+            payload = _DECODERS[settings.JWT_BACKEND](token)
+        except JWTError:
+            return None
+        token_cache.put(token, payload)
+    return dict(payload)
+
+
 def decode_access_token(token: str) -> Dict[str, Any]:
     """
     Декодирование JWT токена
@@ -92,16 +227,11 @@ def decode_access_token(token: str) -> Dict[str, Any]:
     Raises:
         HTTPException: Если токен невалидный
     """
-    try:
-        payload = jwt.decode(
-            token,
-            settings.SECRET_KEY,
-            algorithms=[settings.ALGORITHM]
-        )
-        return payload
-    except JWTError:
+    payload = verify_token(token)
+    if payload is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Невалидный токен авторизации",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    return payload
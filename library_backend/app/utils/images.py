@@ -0,0 +1,56 @@
+"""
+Обработка изображений (Pillow).
+Функции выполняются в пуле процессов, поэтому принимают и возвращают только простые типы.
+"""
+
+from io import BytesIO
+
+try:
+    from PIL import Image, ImageOps, features
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+
+# Формат -> (имя в Pillow, MIME, параметры сохранения)
+IMAGE_FORMATS = {
+    "avif": ("AVIF", "image/avif", {"quality": 55, "speed": 6}),
+    "webp": ("WEBP", "image/webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "image/jpeg", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+
+def format_supported(fmt: str) -> bool:
+    """Умеет ли установленный Pillow кодировать формат"""
+    if not PIL_AVAILABLE or fmt not in IMAGE_FORMATS:
+        return False
+    if fmt == "jpeg":
+        return True
+    return bool(features.check(fmt))
+
+
+def render_thumbnail(source_path: str, width: int, fmt: str) -> bytes:
+    """
+    Уменьшить картинку до ширины width (без увеличения) и закодировать в fmt.
+    Returns:
+        байты готового файла
+    """
+    pil_format, _, save_params = IMAGE_FORMATS[fmt]
+
+    with Image.open(source_path) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.LANCZOS)
+
+        if fmt == "jpeg" and image.mode != "RGB":
+            # JPEG без альфа-канала — подкладываем белый фон
+            rgba = image.convert("RGBA")
+            image = Image.new("RGB", rgba.size, (255, 255, 255))
+            image.paste(rgba, mask=rgba.getchannel("A"))
+        elif image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+
+        buffer = BytesIO()
+        image.save(buffer, format=pil_format, **save_params)
+        return buffer.getvalue()
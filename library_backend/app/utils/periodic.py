@@ -0,0 +1,59 @@
+"""
+Периодические фоновые задачи внутри процесса API.
+Задача — синхронная функция job(db), выполняется в threadpool со своей сессией БД.
+"""
+
+import asyncio
+import logging
+from typing import Callable, List
+
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+_tasks: List[asyncio.Task] = []
+
+
+def _run_job(job: Callable[[Session], object]):
+    db = SessionLocal()
+    try:
+        return job(db)
+    finally:
+        db.close()
+
+
+async def _loop(name: str, interval_seconds: float, job: Callable[[Session], object], run_at_start: bool):
+    if not run_at_start:
+        await asyncio.sleep(interval_seconds)
+    while True:
+        try:
+            await run_in_threadpool(_run_job, job)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception(f"Periodic job '{name}' failed")
+        await asyncio.sleep(interval_seconds)
+
+
+def start_periodic(
+    name: str,
+    interval_seconds: float,
+    job: Callable[[Session], object],
+    run_at_start: bool = False
+) -> None:
+    """Запустить задачу каждые interval_seconds (0 или меньше — не запускать)"""
+    if interval_seconds <= 0:
+        return
+    _tasks.append(asyncio.create_task(_loop(name, interval_seconds, job, run_at_start), name=name))
+    logger.info(f"Periodic job '{name}' every {interval_seconds}s")
+
+
+async def stop_periodic() -> None:
+    """Остановить все периодические задачи (при shutdown)"""
+    for task in _tasks:
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
@@ -0,0 +1,196 @@
+"""
+Перехват SQL, который выполняет API, и проверка планов запросов (EXPLAIN QUERY PLAN).
+
+capture_sql — контекстный менеджер: пока он открыт, все запросы через указанные движки
+складываются в StatementLog (уникальные по тексту, с первым набором параметров).
+Если задан SQL_CAPTURE_PATH, install_capture_log пишет те же запросы из работающего
+API в JSONL-файл — его потом проверяет tools/check_query_plans.py --capture.
+"""
+
+import json
+import re
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from sqlalchemy import event
+from sqlalchemy.engine import Connection, Engine
+
+# Что имеет смысл пропускать через EXPLAIN QUERY PLAN
+_EXPLAINABLE = re.compile(
+    r"^\s*(/\*.*?\*/\s*)*(SELECT|WITH|UPDATE|DELETE|INSERT\s+INTO\s+\S+(\s*\([^)]*\))?\s+SELECT)\b",
+    re.IGNORECASE | re.DOTALL
+)
+# FROM/JOIN <таблица> [AS] <алиас> — чтобы сопоставить алиас из плана с таблицей
+_TABLE_REF = re.compile(r"\b(?:FROM|JOIN|UPDATE|INTO)\s+([A-Za-z_]\w*)(?:\s+(?:AS\s+)?([A-Za-z_]\w*))?", re.IGNORECASE)
+_SQL_KEYWORDS = {
+    "where", "join", "left", "inner", "outer", "cross", "on", "group", "order", "limit",
+    "set", "using", "natural", "union", "except", "intersect", "having", "values", "select",
+}
+# Полный проход по таблице: "SCAN m" / "SCAN library_views" без USING INDEX
+_FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+# Пометка в тексте запроса: полный проход задуман (сверки, пересчёты по всей таблице)
+FULL_SCAN_MARK = "/* full-scan */"
+_FILTERED = re.compile(r"\b(WHERE|LIMIT)\b", re.IGNORECASE)
+
+
+class StatementLog:
+    """Уникальные SQL-запросы (по тексту) с первым набором параметров"""
+
+    def __init__(self):
+        self.statements: Dict[str, Any] = {}
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def add(self, statement: str, parameters: Any, executemany: bool) -> bool:
+        if executemany:
+            parameters = parameters[0] if parameters else ()
+        with self._lock:
+            self.calls += 1
+            if statement in self.statements:
+                return False
+            self.statements[statement] = parameters
+            return True
+
+    def __len__(self) -> int:
+        return len(self.statements)
+
+
+def _listen(engines: Iterable[Engine], log: StatementLog, on_new=None):
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if log.add(statement, parameters, executemany) and on_new is not None:
+            on_new(statement, log.statements[statement])
+
+    engines = list(engines)
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    return engines, before_cursor_execute
+
+
+@contextmanager
+def capture_sql(engines: Iterable[Engine]) -> Iterator[StatementLog]:
+    """
+    Собирать SQL, выполненный через engines (для async-движка — его .sync_engine)
+    """
+    log = StatementLog()
+    engines, listener = _listen(engines, log)
+    try:
+        yield log
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", listener)
+
+
+def install_capture_log(engines: Iterable[Engine], path: str) -> None:
+    """Дописывать новые (по тексту) запросы API в JSONL-файл: {"sql": ..., "params": ...}"""
+    file_lock = threading.Lock()
+
+    def on_new(statement: str, parameters: Any) -> None:
+        line = json.dumps({"sql": statement, "params": parameters}, ensure_ascii=False, default=str)
+        with file_lock, open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    _listen(engines, StatementLog(), on_new)
+
+
+def read_capture_log(path: str) -> StatementLog:
+    """Прочитать файл install_capture_log"""
+    log = StatementLog()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                params = entry.get("params")
+                log.add(entry["sql"], tuple(params) if isinstance(params, list) else params, False)
+    return log
+
+
+def is_explainable(statement: str) -> bool:
+    return bool(_EXPLAINABLE.match(statement))
+
+
+def _table_aliases(statement: str) -> Dict[str, str]:
+    aliases = {}
+    for table, alias in _TABLE_REF.findall(statement):
+        aliases[table] = table
+        if alias and alias.lower() not in _SQL_KEYWORDS:
+            aliases[alias] = table
+    return aliases
+
+
+def explain(conn: Connection, statement: str, parameters: Any) -> List[str]:
+    """Строки плана (detail) для запроса"""
+    rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters or ()).fetchall()
+    return [row[-1] for row in rows]
+
+
+def full_scans(
+    plan: Sequence[str],
+    statement: str,
+    tables: Iterable[str],
+    allowed: Iterable[str] = ()
+) -> List[str]:
+    """
+    Таблицы, которые план читает целиком (SCAN без индекса).
+    tables — реальные таблицы БД (CTE и подзапросы не считаются), allowed — разрешённые.
+    Не проверяются запросы с FULL_SCAN_MARK и запросы без WHERE и LIMIT
+    (COUNT(*) по всей таблице индекс не ускорит).
+    """
+    if FULL_SCAN_MARK in statement or not _FILTERED.search(statement):
+        return []
+    aliases = _table_aliases(statement)
+    tables = set(tables)
+    allowed = set(allowed)
+    scanned = []
+    for detail in plan:
+        match = _FULL_SCAN.match(detail)
+        if not match:
+            continue
+        table = aliases.get(match.group(1), match.group(1))
+        if table in tables and table not in allowed and table not in scanned:
+            scanned.append(table)
+    return scanned
+
+
+def real_tables(conn: Connection) -> List[str]:
+    return [row[0] for row in conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'table'")]
+
+
+def check_statements(
+    conn: Connection,
+    log: StatementLog,
+    allowed: Iterable[str] = ()
+) -> List[Dict[str, Any]]:
+    """
+    Проверить все запросы из log.
+    Returns:
+        [{"sql", "plan", "full_scans", "error"}] — только проблемные запросы
+    """
+    tables = real_tables(conn)
+    problems = []
+    for statement, parameters in log.statements.items():
+        if not is_explainable(statement):
+            continue
+        try:
+            plan = explain(conn, statement, parameters)
+        except Exception as e:
+            error = getattr(e, "orig", None) or e  # без текста запроса из обёртки SQLAlchemy
+            problems.append({"sql": statement, "plan": [], "full_scans": [], "error": str(error)})
+            continue
+        scanned = full_scans(plan, statement, tables, allowed)
+        if scanned:
+            problems.append({"sql": statement, "plan": plan, "full_scans": scanned, "error": None})
+    return problems
+
+
+def format_problem(problem: Dict[str, Any], max_sql: Optional[int] = 600) -> str:
+    sql = " ".join(problem["sql"].split())
+    if max_sql and len(sql) > max_sql:
+        sql = sql[:max_sql] + " …"
+    lines = [sql]
+    if problem["error"]:
+        lines.append(f"  ошибка EXPLAIN: {problem['error']}")
+    else:
+        lines.append(f"  полный проход: {', '.join(problem['full_scans'])}")
+        lines.extend(f"    {detail}" for detail in problem["plan"])
+    return "\n".join(lines)
@@ -0,0 +1,300 @@
+"""
+Нагрузочный тест горячих эндпоинтов API в одном процессе (httpx через ASGI, без сети).
+
+Для каждого сценария: прогрев, --requests запросов в --concurrency корутинах
+(p50/p95/p99/max задержки, пропускная способность, ошибки), затем отдельный
+последовательный проход с tracemalloc (пик памяти на запрос и что осталось занято).
+Результат — JSON-отчёт с коммитом и параметрами запуска; --compare печатает
+изменения относительно отчёта другого коммита.
+
+Сценарии:
+    materials_list      GET  /api/materials (страницы 1–5)
+    materials_cursor    GET  /api/materials?cursor= (первая страница ленты)
+    material_detail     GET  /api/materials/{id}
+    material_view       POST /api/materials/{id}/view
+    favorite_add        POST /api/materials/{id}/favorite
+    favorite_remove     DELETE /api/materials/{id}/favorite (те же пары — БД возвращается к исходной)
+    favorites_my        GET  /api/materials/favorites/my
+    recommendations     GET  /api/materials/feed/recommendations
+    ws_presence         WebSocket /ws/presence: подключение, ping → pong, отключение (нужен Redis)
+
+БД не меняется: тест работает с копией во временной папке (--in-place — на самой БД).
+Данные — benchmarks/datagen.py; для сравнения коммитов берите одну и ту же БД.
+
+Запуск из library_backend/:
+    python benchmarks/datagen.py /tmp/bench.db
+    python benchmarks/bench_api.py /tmp/bench.db --output /tmp/bench-before.json
+    python benchmarks/bench_api.py /tmp/bench.db --output /tmp/bench-after.json --compare /tmp/bench-before.json
+    python benchmarks/bench_api.py /tmp/bench.db --scenarios material_detail recommendations --concurrency 64
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from harness import (
+    AsgiWebSocket, compare_reports, load_report, measure_allocations, report_meta, run_load, write_report
+)
+
+SCENARIOS = [
+    "materials_list",
+    "materials_cursor",
+    "material_detail",
+    "material_view",
+    "favorite_add",
+    "favorite_remove",
+    "favorites_my",
+    "recommendations",
+    "ws_presence",
+]
+
+
+def prepare_environment(args) -> Path:
+    """Копия БД и рабочие папки во временной директории; настройки — до импорта app"""
+    workdir = Path(tempfile.mkdtemp(prefix="library-bench-"))
+    db_path = Path(args.db).resolve()
+    if not args.in_place:
+        shutil.copy(db_path, workdir / db_path.name)
+        db_path = workdir / db_path.name
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ.setdefault("UPLOAD_DIR", str(workdir / "uploads"))
+    os.environ.setdefault("VIEW_JOURNAL_DIR", str(workdir / "view_journal"))
+    os.environ["SQL_CAPTURE_PATH"] = ""
+    return workdir
+
+
+def load_fixture(db, users: int, seed: int) -> dict:
+    """Пользователи с активной подпиской (и их токены), опубликованные материалы, пары для избранного"""
+    from sqlalchemy import text
+    from app.services import issue_tokens, load_claims
+
+    rng = random.Random(seed)
+    telegram_ids = [row[0] for row in db.execute(text("""
+        SELECT u.telegram_id FROM users u
+        JOIN subscriptions s ON s.user_id = u.id
+        WHERE s.is_active = 1 AND s.end_date > datetime('now')
+        GROUP BY u.id ORDER BY u.id LIMIT :limit
+    """), {"limit": users})]
+    material_ids = [row[0] for row in db.execute(
+        text("SELECT id FROM library_materials WHERE is_published = 1 ORDER BY id")
+    )]
+    if not telegram_ids or not material_ids:
+        sys.exit("❌ В БД нужны пользователи с активной подпиской и опубликованные материалы (benchmarks/datagen.py)")
+
+    principals = []
+    for telegram_id in telegram_ids:
+        claims = load_claims(db, telegram_id)
+        token = issue_tokens(claims)["access_token"]
+        principals.append({
+            "user_id": claims["user_id"],
+            "headers": {"Authorization": f"Bearer {token}"},
+            "token": token,
+        })
+
+    favorites = {tuple(row) for row in db.execute(text("SELECT user_id, material_id FROM library_favorites"))}
+    free_pairs = []
+    for index in range(len(principals) * len(material_ids)):
+        principal = principals[index % len(principals)]
+        material_id = material_ids[(index // len(principals) + index) % len(material_ids)]
+        if (principal["user_id"], material_id) not in favorites:
+            free_pairs.append((principal, material_id))
+    rng.shuffle(free_pairs)
+    return {"principals": principals, "materials": material_ids, "free_pairs": free_pairs, "rng": rng}
+
+
+def build_operations(app, client, fixture: dict) -> dict:
+    """name -> async operation(i) -> bool"""
+    principals, materials, rng = fixture["principals"], fixture["materials"], fixture["rng"]
+    pairs = fixture["free_pairs"]
+
+    def principal(i):
+        return principals[i % len(principals)]
+
+    def material(i):
+        return materials[rng.randrange(len(materials))]
+
+    async def request(method, url, i, expected=(200,), **kwargs) -> bool:
+        response = await client.request(method, url, headers=principal(i)["headers"], **kwargs)
+        return response.status_code in expected
+
+    async def favorite(method, i) -> bool:
+        owner, material_id = pairs[i % len(pairs)]
+        response = await client.request(method, f"/api/materials/{material_id}/favorite", headers=owner["headers"])
+        return response.status_code == 200
+
+    async def ws_presence(i) -> bool:
+        ws = AsgiWebSocket(app, "/ws/presence", f"token={principal(i)['token']}&page=library")
+        await ws.connect()
+        try:
+            await ws.send_text("ping")
+            await ws.receive_until(lambda frame: frame == "pong")
+        finally:
+            await ws.close()
+        return True
+
+    return {
+        "materials_list": lambda i: request("GET", f"/api/materials?page={1 + i % 5}&page_size=30", i),
+        "materials_cursor": lambda i: request("GET", "/api/materials?cursor=&page_size=30", i),
+        "material_detail": lambda i: request("GET", f"/api/materials/{material(i)}", i),
+        "material_view": lambda i: request(
+            "POST", f"/api/materials/{material(i)}/view?duration_seconds={rng.randint(5, 600)}", i, expected=(202,)
+        ),
+        "favorite_add": lambda i: favorite("POST", i),
+        "favorite_remove": lambda i: favorite("DELETE", i),
+        "favorites_my": lambda i: request("GET", "/api/materials/favorites/my", i),
+        "recommendations": lambda i: request("GET", "/api/materials/feed/recommendations", i),
+        "ws_presence": ws_presence,
+    }
+
+
+async def redis_available() -> bool:
+    import redis.asyncio as redis
+    from app.api.websocket import REDIS_URL
+
+    client = redis.from_url(REDIS_URL)
+    try:
+        await asyncio.wait_for(client.ping(), 2)
+        return True
+    except Exception:
+        return False
+    finally:
+        await client.aclose()
+
+
+async def run(args) -> dict:
+    import httpx
+    import main
+    from app.config import settings
+    from app.database import SessionLocal
+    from app.services import (
+        ensure_active_subscriptions, ensure_counter_columns, ensure_cover_storage, ensure_indexes,
+        ensure_material_stats, ensure_recommendation_store, ensure_search_index, item_similarity,
+        reconcile_material_stats, view_ingest
+    )
+
+    # Схему (индексы, проекции) создают миграции, API при старте её не трогает — на копии БД делаем это сами
+    if not args.in_place:
+        ensure_indexes(analyze=True)
+        ensure_active_subscriptions()
+        ensure_counter_columns()
+        ensure_cover_storage()
+        ensure_recommendation_store()
+        db = SessionLocal()
+        try:
+            ensure_search_index(db)
+            if ensure_material_stats():
+                reconcile_material_stats(db)
+        finally:
+            db.close()
+
+    app = main.app
+    await app.router.startup()
+    try:
+        # Первая сборка модели рекомендаций идёт в фоне — ждём, чтобы не мерить её
+        if item_similarity.available and settings.RECOMMENDATIONS_MODEL_INTERVAL_SECONDS > 0:
+            for _ in range(600):
+                if item_similarity.model is not None:
+                    break
+                await asyncio.sleep(0.1)
+
+        db = SessionLocal()
+        try:
+            fixture = load_fixture(db, args.users, args.seed)
+        finally:
+            db.close()
+
+        results = {}
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            operations = build_operations(app, client, fixture)
+            # Пары избранного: add и remove идут по одним и тем же парам
+            pair_count = min(len(fixture["free_pairs"]), args.requests)
+            for name in args.scenarios:
+                if name == "ws_presence" and not await redis_available():
+                    results[name] = {"skipped": "Redis недоступен (REDIS_URL)"}
+                    print(f"⏭  {name}: Redis недоступен")
+                    continue
+
+                operation = operations[name]
+                total = args.requests
+                if name.startswith("favorite_"):
+                    total = pair_count
+                    warmup = 0
+                else:
+                    warmup = min(args.warmup, total)
+                    await run_load(operation, warmup, min(args.concurrency, warmup or 1))
+
+                result = await run_load(operation, total, args.concurrency)
+                if args.alloc_requests and not name.startswith("favorite_"):
+                    result["alloc"] = await measure_allocations(operation, args.alloc_requests, offset=total)
+                results[name] = result
+                print_result(name, result)
+
+            view_ingest.flush()
+    finally:
+        await app.router.shutdown()
+    return results
+
+
+def print_result(name: str, result: dict) -> None:
+    latency = result["latency_ms"]
+    alloc = result.get("alloc", {})
+    print(
+        f"{name:<18} {result['rps'] or 0:>9.1f} rps   p50 {latency.get('p50', 0):8.2f}   "
+        f"p95 {latency.get('p95', 0):8.2f}   p99 {latency.get('p99', 0):8.2f} мс   "
+        f"ошибок {result['errors']:>4}"
+        + (f"   пик {alloc['peak_kb_p50']:.0f} КБ/запрос" if alloc else "")
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("db", help="Файл SQLite (из benchmarks/datagen.py или копия боевой)")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--requests", type=int, default=1000, help="Запросов на сценарий")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--alloc-requests", type=int, default=100, help="Запросов в проходе tracemalloc (0 — без него)")
+    parser.add_argument("--users", type=int, default=500, help="Сколько пользователей чередовать в запросах")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Куда записать JSON-отчёт")
+    parser.add_argument("--compare", help="JSON-отчёт для сравнения (например, с прошлого коммита)")
+    parser.add_argument("--in-place", action="store_true", help="Работать с самой БД, а не с копией")
+    args = parser.parse_args()
+
+    workdir = prepare_environment(args)
+    logging.disable(logging.INFO)  # логи API не мешают выводу
+    try:
+        print(f"📊 {args.db}: {args.requests} запросов, concurrency {args.concurrency}\n")
+        results = asyncio.run(run(args))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": report_meta(
+            db=str(Path(args.db).resolve()),
+            requests=args.requests,
+            concurrency=args.concurrency,
+            users=args.users,
+            seed=args.seed,
+        ),
+        "results": results,
+    }
+    if args.output:
+        write_report(args.output, report)
+        print(f"\n💾 Отчёт: {args.output}")
+    if args.compare:
+        print()
+        print("\n".join(compare_reports(report, load_report(args.compare))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Микробенчмарк проверки JWT и auth-зависимостей (мкс на вызов).
+
+Замеры:
+- проверка подписи: python-jose и hmac-бэкенд (без LRU)
+- verify_token с попаданием в LRU
+- get_current_user_with_subscription для access-токена с claims и для старого токена
+  (пользователь и подписка из principal_cache — БД не нужна)
+
+Запуск из library_backend/:
+    python benchmarks/bench_auth.py
+    python benchmarks/bench_auth.py --number 50000
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.security import HTTPAuthorizationCredentials
+
+from app.api.dependencies import get_current_user, get_current_user_with_subscription
+from app.services import principal_cache
+from app.utils import auth
+from app.utils.auth import ACCESS_TOKEN, create_access_token, create_token
+
+TELEGRAM_ID = 534740911
+CLAIMS = {
+    "telegram_id": TELEGRAM_ID,
+    "user_id": 1,
+    "first_name": "Полина",
+    "username": "polina",
+    "photo_url": "https://t.me/i/userpic/320/polina.jpg",
+    "loyalty_level": "gold",
+    "admin_group": "creator",
+    "is_admin": True,
+    "ver": 1,
+    "sub_id": 10,
+    "sub_end": str(datetime.utcnow() + timedelta(days=30)),
+}
+
+
+def bench(name: str, func, number: int) -> None:
+    func()  # прогрев
+    started = time.perf_counter()
+    for _ in range(number):
+        func()
+    per_call = (time.perf_counter() - started) / number * 1e6
+    print(f"{name:<48} {per_call:>9.2f} мкс")
+
+
+def bench_async(name: str, factory, number: int) -> None:
+    async def run():
+        await factory()
+        started = time.perf_counter()
+        for _ in range(number):
+            await factory()
+        return (time.perf_counter() - started) / number * 1e6
+
+    print(f"{name:<48} {asyncio.run(run()):>9.2f} мкс")
+
+
+async def full_dependency(token: str):
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    user = await get_current_user(credentials, db=None)
+    return await get_current_user_with_subscription(user, db=None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=20000, help="Вызовов на замер")
+    args = parser.parse_args()
+
+    claims_token = create_token(CLAIMS, ACCESS_TOKEN, timedelta(minutes=15))
+    legacy_token = create_access_token({"telegram_id": TELEGRAM_ID})
+    print(f"Длина токена: с claims {len(claims_token)}, старого {len(legacy_token)}\n")
+
+    bench("python-jose jwt.decode", lambda: auth._decode_jose(claims_token), args.number)
+    bench("hmac-бэкенд", lambda: auth._decode_hmac(claims_token), args.number)
+    bench("verify_token, попадание в LRU", lambda: auth.verify_token(claims_token), args.number)
+
+    # Старый токен: пользователь и подписка — из principal_cache, как в установившемся режиме
+    principal_cache.put_user(TELEGRAM_ID, {
+        "user_id": 1, "telegram_id": TELEGRAM_ID, "first_name": "Полина", "username": "polina",
+        "photo_url": None, "loyalty_level": "gold", "admin_group": "creator",
+    })
+    principal_cache.put_subscription(TELEGRAM_ID, {"id": 10, "is_active": True, "end_date": CLAIMS["sub_end"]})
+
+    for backend in ("jose", "hmac"):
+        auth.settings.JWT_BACKEND = backend
+        for cache_size in (0, auth.settings.JWT_CACHE_SIZE or 10000):
+            auth.token_cache.clear()
+            auth.token_cache.max_size = cache_size
+            suffix = f"{backend}, LRU {'вкл' if cache_size else 'выкл'}"
+            bench_async(f"зависимость, claims ({suffix})", lambda: full_dependency(claims_token), args.number)
+            bench_async(f"зависимость, старый токен ({suffix})", lambda: full_dependency(legacy_token), args.number)
+
+
+if __name__ == "__main__":
+    main()
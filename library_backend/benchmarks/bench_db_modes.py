@@ -0,0 +1,130 @@
+"""
+Сравнение синхронного (threadpool + Session) и асинхронного (AsyncSession/aiosqlite) доступа к БД.
+
+Оба эндпоинта делают одно и то же, что и GET /api/materials/{id}:
+пользователь + подписка (как в dependencies) и карточка материала через MaterialService.
+Запросы идут через ASGI-транспорт httpx без сети, так что меряется сам API.
+
+Запуск из library_backend/ (БД — копия боевой или тестовая):
+    DATABASE_URL=sqlite:////path/to/momsclub.db python benchmarks/bench_db_modes.py
+    python benchmarks/bench_db_modes.py --requests 2000 --concurrency 1 16 64 256
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal, dispose_engines, get_async_db, get_db
+from app.services import MaterialService
+
+USER_QUERY = text("SELECT id, telegram_id, first_name FROM users WHERE telegram_id = :tg_id")
+SUBSCRIPTION_QUERY = text("""
+    SELECT id FROM subscriptions
+    WHERE user_id = :user_id AND is_active = 1 AND end_date > datetime('now')
+    ORDER BY end_date DESC LIMIT 1
+""")
+
+app = FastAPI()
+
+
+@app.get("/sync/{telegram_id}/{material_id}")
+def sync_material(telegram_id: int, material_id: int, db: Session = Depends(get_db)):
+    user = db.execute(USER_QUERY, {"tg_id": telegram_id}).fetchone()
+    db.execute(SUBSCRIPTION_QUERY, {"user_id": user[0]}).fetchone()
+    return MaterialService(db).get_material_by_id(material_id)
+
+
+@app.get("/async/{telegram_id}/{material_id}")
+async def async_material(telegram_id: int, material_id: int, db: AsyncSession = Depends(get_async_db)):
+    user = (await db.execute(USER_QUERY, {"tg_id": telegram_id})).fetchone()
+    (await db.execute(SUBSCRIPTION_QUERY, {"user_id": user[0]})).fetchone()
+    return await db.run_sync(lambda session: MaterialService(session).get_material_by_id(material_id))
+
+
+def pick_fixture():
+    """Пользователь с активной подпиской и опубликованный материал"""
+    db = SessionLocal()
+    try:
+        telegram_id = db.execute(text("""
+            SELECT u.telegram_id FROM users u JOIN subscriptions s ON s.user_id = u.id
+            WHERE s.is_active = 1 AND s.end_date > datetime('now') LIMIT 1
+        """)).scalar()
+        material_id = db.execute(
+            text("SELECT id FROM library_materials WHERE is_published = 1 ORDER BY id LIMIT 1")
+        ).scalar()
+    finally:
+        db.close()
+    if telegram_id is None or material_id is None:
+        sys.exit("❌ В БД нужен пользователь с активной подпиской и опубликованный материал")
+    return telegram_id, material_id
+
+
+async def run_mode(client: httpx.AsyncClient, url: str, total: int, concurrency: int) -> dict:
+    latencies = []
+    errors = 0
+    queue = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for _ in queue:
+            started = time.perf_counter()
+            response = await client.get(url)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    quantiles = statistics.quantiles(latencies, n=100)
+    return {
+        "rps": total / elapsed,
+        "p50": quantiles[49] * 1000,
+        "p95": quantiles[94] * 1000,
+        "p99": quantiles[98] * 1000,
+        "errors": errors,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000, help="Запросов на каждый замер")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64, 256])
+    args = parser.parse_args()
+
+    telegram_id, material_id = pick_fixture()
+    print(f"📊 БД: {settings.DATABASE_URL}")
+    print(f"   пользователь {telegram_id}, материал {material_id}, {args.requests} запросов на замер\n")
+    print(f"{'режим':<6} {'conc':>5} {'rps':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'ошибки':>7}")
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for mode in ("sync", "async"):
+            url = f"/{mode}/{telegram_id}/{material_id}"
+            await run_mode(client, url, min(args.requests, 50), 4)  # прогрев пулов и кэшей
+            for concurrency in args.concurrency:
+                result = await run_mode(client, url, args.requests, concurrency)
+                print(
+                    f"{mode:<6} {concurrency:>5} {result['rps']:>9.0f} {result['p50']:>8.2f} "
+                    f"{result['p95']:>8.2f} {result['p99']:>8.2f} {result['errors']:>7}"
+                )
+
+    await dispose_engines()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,123 @@
+"""
+Рекомендации: модели в памяти против прежних SQL-запросов.
+
+Замеры:
+- сборка модели по library_views
+- _get_collaborative_recommendations (модель) и _get_collaborative_recommendations_sql
+  для пользователей с историей просмотров: p50/p95 в мс
+- совпадение выдачи (доля общих материалов в top-N)
+- content-based: content_scorer (матрица признаков) и подбор по категориям через SQL
+
+Запуск из library_backend/ (БД — копия боевой или тестовая):
+    DATABASE_URL=sqlite:////path/to/momsclub.db python benchmarks/bench_recommendations.py
+    python benchmarks/bench_recommendations.py --users 500 --limit 6
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import text
+
+from app.database import SessionLocal
+from app.services import RecommendationService, content_scorer, item_similarity
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def measure(func, user_ids, viewed):
+    latencies, results = [], {}
+    for user_id in user_ids:
+        started = time.perf_counter()
+        results[user_id] = [item["id"] for item in func(user_id, viewed[user_id])]
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200, help="Сколько пользователей с историей проверить")
+    parser.add_argument("--limit", type=int, default=6, help="Размер выдачи")
+    args = parser.parse_args()
+
+    if not item_similarity.available:
+        sys.exit("❌ Нужны numpy и scipy (requirements.txt)")
+
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        model = item_similarity.rebuild(db)
+        if model is None:
+            sys.exit("❌ В library_views нет просмотров")
+        print(
+            f"Сборка модели: {(time.perf_counter() - started) * 1000:.0f} мс "
+            f"({len(model.material_ids)} материалов, {model.pairs} пар пользователь-материал, "
+            f"{model.similarity.nnz} связей)\n"
+        )
+
+        user_ids = [row[0] for row in db.execute(text("""
+            SELECT user_id FROM library_views GROUP BY user_id
+            HAVING COUNT(DISTINCT material_id) >= 2
+            ORDER BY COUNT(*) DESC LIMIT :limit
+        """), {"limit": args.users})]
+        if not user_ids:
+            sys.exit("❌ Нет пользователей с 2+ просмотренными материалами")
+
+        service = RecommendationService(db)
+        viewed = {
+            user_id: [material_id for material_id, _, _ in service._get_user_history(user_id)]
+            for user_id in user_ids
+        }
+
+        modes = {
+            "модель item-item": lambda uid, ids: service._get_collaborative_recommendations(uid, ids, args.limit),
+            "SQL (как раньше)": lambda uid, ids: service._get_collaborative_recommendations_sql(uid, ids, args.limit),
+        }
+        results = {}
+        for name, func in modes.items():
+            measure(func, user_ids[:5], viewed)  # прогрев
+            latencies, results[name] = measure(func, user_ids, viewed)
+            print(
+                f"{name:<18} p50 {statistics.median(latencies):7.2f} мс   "
+                f"p95 {percentile(latencies, 0.95):7.2f} мс   max {max(latencies):7.2f} мс"
+            )
+
+        model_results, sql_results = results.values()
+        overlap = [
+            len(set(model_results[uid]) & set(sql_results[uid])) / len(sql_results[uid])
+            for uid in user_ids if sql_results[uid]
+        ]
+        if overlap:
+            print(f"\nОбщих материалов с SQL-выдачей: {statistics.mean(overlap) * 100:.0f}% (в среднем на пользователя)")
+
+        # Content-based: история с весами по duration_seconds против категорий через SQL
+        started = time.perf_counter()
+        content_scorer.features(db)
+        print(f"\nМатрица признаков: {(time.perf_counter() - started) * 1000:.1f} мс")
+        history = {user_id: service._get_user_history(user_id) for user_id in user_ids}
+        content_modes = {
+            "content_scorer": lambda uid, ids: service._get_content_recommendations(uid, history[uid], ids, args.limit),
+            "SQL по категориям": lambda uid, ids: service._get_category_recommendations(
+                service._get_user_categories(uid), ids, args.limit
+            ),
+        }
+        for name, func in content_modes.items():
+            measure(func, user_ids[:5], viewed)
+            latencies, _ = measure(func, user_ids, viewed)
+            print(
+                f"{name:<18} p50 {statistics.median(latencies):7.2f} мс   "
+                f"p95 {percentile(latencies, 0.95):7.2f} мс   max {max(latencies):7.2f} мс"
+            )
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+Стоимость одной WebSocket-рассылки в зависимости от формата кадров и числа подписчиков.
+
+Рассылка идёт настоящим путём ConnectionManager._fan_out -> ClientConnection (очередь
+и задача-писатель) в сокеты-заглушки. Заглушка делает то, что ASGI-сервер делает с кадром:
+текстовый кадр кодирует в UTF-8 (на каждый сокет), бинарный передаёт как есть.
+Redis и сеть не участвуют.
+
+Форматы (?format=):
+    json     текстовые кадры — строка кодируется в каждом сокете
+    bin      JSON бинарными кадрами — UTF-8 один раз на рассылку
+    msgpack  msgpack один раз на рассылку (если установлен)
+
+Сообщения:
+    snapshot  снимок онлайн-списка (--online пользователей с photo_url)
+    delta     одна дельта join
+
+Замеры на рассылку (все сокеты получили кадр): p50/p95/p99 и рассылок в секунду,
+затем отдельный проход с tracemalloc — пик памяти на рассылку.
+Результат — JSON-отчёт (--output), --compare — изменения относительно другого отчёта.
+
+Запуск из library_backend/:
+    python benchmarks/bench_ws_frames.py
+    python benchmarks/bench_ws_frames.py --connections 100 1000 5000 --online 2000 --output /tmp/ws.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from harness import compare_reports, load_report, measure_allocations, report_meta, run_load, write_report
+
+MESSAGES = ["snapshot", "delta"]
+
+
+class Delivery:
+    """Сколько сокетов ещё не получили текущий кадр"""
+
+    def __init__(self):
+        self.remaining = 0
+        self.done = asyncio.Event()
+
+    def expect(self, count: int):
+        self.remaining = count
+        self.done.clear()
+
+    def delivered(self):
+        self.remaining -= 1
+        if self.remaining == 0:
+            self.done.set()
+
+
+class StubSocket:
+    """Сокет глазами ASGI-сервера: текст кодируется в UTF-8 на каждый сокет, байты — как есть"""
+
+    def __init__(self, delivery: Delivery):
+        self.delivery = delivery
+
+    async def send_text(self, data: str):
+        data.encode("utf-8")
+        self.delivery.delivered()
+
+    async def send_bytes(self, data: bytes):
+        self.delivery.delivered()
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        pass
+
+
+def online_user(rng: random.Random, telegram_id: int) -> dict:
+    return {
+        "telegram_id": telegram_id,
+        "first_name": rng.choice(["Анна", "Мария", "Екатерина", "Ольга", "Наталья", "Юлия"]),
+        "username": f"user{telegram_id}",
+        "photo_url": f"https://t.me/i/userpic/320/{rng.getrandbits(128):032x}.jpg",
+        "admin_group": None,
+        "connected_at": datetime(2026, 10, 16, 12, rng.randrange(60), rng.randrange(60)).isoformat(),
+    }
+
+
+def build_messages(online: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    users = [online_user(rng, 700000000 + i) for i in range(online)]
+    snapshot = {
+        "type": "presence_snapshot",
+        "seq": 1000,
+        "data": {"library": users[len(users) // 10:], "admin": users[:len(users) // 10]},
+        "library_count": online - online // 10,
+        "admin_count": online // 10,
+    }
+    delta = {
+        "type": "presence_delta",
+        "seq": 1001,
+        "op": "join",
+        "page": "library",
+        "user": online_user(rng, 800000000),
+        "library_count": online - online // 10 + 1,
+        "admin_count": online // 10,
+    }
+    return {
+        "snapshot": json.dumps(snapshot, ensure_ascii=False),
+        "delta": json.dumps(delta, ensure_ascii=False),
+    }
+
+
+async def run(args) -> dict:
+    from app.api.websocket import ClientConnection, ConnectionManager, Frame, frame_format_supported
+
+    messages = build_messages(args.online, args.seed)
+    for name in args.messages:
+        print(f"{name}: {len(messages[name].encode('utf-8')) / 1024:.1f} КБ JSON")
+    print()
+
+    manager = ConnectionManager()
+    results = {}
+    for frame_format in args.formats:
+        if not frame_format_supported(frame_format):
+            print(f"⏭  {frame_format}: не установлен")
+            continue
+        for count in args.connections:
+            delivery = Delivery()
+            connections = [
+                ClientConnection(StubSocket(delivery), "admin", i, frozenset({"presence"}), frame_format)
+                for i in range(count)
+            ]
+            try:
+                for name in args.messages:
+                    text = messages[name]
+
+                    async def broadcast(i, text=text, connections=connections, delivery=delivery) -> bool:
+                        delivery.expect(len(connections))
+                        manager._fan_out(connections, Frame(text))
+                        await delivery.done.wait()
+                        return True
+
+                    await run_load(broadcast, args.warmup, 1)
+                    result = await run_load(broadcast, args.broadcasts, 1)
+                    if args.alloc_broadcasts:
+                        result["alloc"] = await measure_allocations(broadcast, args.alloc_broadcasts)
+                    key = f"{name}/{frame_format}/{count}"
+                    results[key] = result
+                    print_result(key, result)
+            finally:
+                for connection in connections:
+                    connection.stop()
+                # Дождаться отмены писателей, пока на них есть ссылки
+                await asyncio.gather(*(connection._writer for connection in connections), return_exceptions=True)
+    return results
+
+
+def print_result(name: str, result: dict) -> None:
+    latency = result["latency_ms"]
+    alloc = result.get("alloc", {})
+    print(
+        f"{name:<26} {result['rps'] or 0:>9.1f} рассылок/с   p50 {latency.get('p50', 0):8.2f}   "
+        f"p95 {latency.get('p95', 0):8.2f}   p99 {latency.get('p99', 0):8.2f} мс"
+        + (f"   пик {alloc['peak_kb_p50']:.0f} КБ/рассылку" if alloc else "")
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connections", type=int, nargs="+", default=[100, 1000, 5000], help="Подписчиков")
+    parser.add_argument("--formats", nargs="+", choices=["json", "bin", "msgpack"], default=["json", "bin", "msgpack"])
+    parser.add_argument("--messages", nargs="+", choices=MESSAGES, default=MESSAGES)
+    parser.add_argument("--online", type=int, default=1000, help="Пользователей в снимке")
+    parser.add_argument("--broadcasts", type=int, default=50, help="Рассылок на замер")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--alloc-broadcasts", type=int, default=10, help="Рассылок в проходе tracemalloc (0 — без него)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Куда записать JSON-отчёт")
+    parser.add_argument("--compare", help="JSON-отчёт для сравнения (например, с прошлого коммита)")
+    args = parser.parse_args()
+
+    # Настройки читаются при импорте app: рабочие папки — во временной директории
+    workdir = Path(tempfile.mkdtemp(prefix="library-bench-ws-"))
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir / 'bench.db'}"
+    os.environ.setdefault("UPLOAD_DIR", str(workdir / "uploads"))
+    # Очередь сокета должна вместить кадр рассылки, отправка не ограничена по времени
+    os.environ["WS_SEND_QUEUE_SIZE"] = "16"
+    os.environ["WS_SEND_TIMEOUT_SECONDS"] = "60"
+    try:
+        results = asyncio.run(run(args))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": report_meta(
+            connections=args.connections,
+            online=args.online,
+            broadcasts=args.broadcasts,
+            seed=args.seed,
+        ),
+        "results": results,
+    }
+    if args.output:
+        write_report(args.output, report)
+        print(f"\n💾 Отчёт: {args.output}")
+    if args.compare:
+        print()
+        print("\n".join(compare_reports(report, load_report(args.compare))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Шторм переподключений к /ws/presence (как после рестарта API или сбоя сети у клиентов).
+
+--clients пользователей подключаются одновременно (--concurrency корутин), затем все
+отключаются — и так --rounds раз. Первый раунд идёт с холодным кэшем профилей, следующие —
+с прогретым. Часть клиентов (--legacy-share) приходит со старыми токенами без claims —
+их профиль ищется в principal_cache / БД, остальным хватает access-токена.
+
+На раунд: задержка подключения (до accept) p50/p95/p99, подключений в секунду, ошибки
+и задержка цикла событий (насколько опаздывает sleep(5 мс) во время шторма —
+синхронные запросы к БД в обработчике подключения видны здесь).
+В отчёте также счётчики /api/ws/metrics.
+
+Нужен Redis (REDIS_URL). Приложение работает в том же процессе (ASGI, без сети) с копией БД.
+
+Запуск из library_backend/:
+    python benchmarks/datagen.py /tmp/bench.db
+    python benchmarks/bench_ws_reconnect.py /tmp/bench.db --clients 2000 --output /tmp/storm.json
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import shutil
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench_api import prepare_environment, redis_available
+from harness import (
+    AsgiWebSocket, compare_reports, latency_summary, load_report, report_meta, run_load, write_report
+)
+
+
+def load_tokens(db, clients: int, legacy_share: float, seed: int) -> list:
+    """Токены для clients пользователей: access с claims и старые {"telegram_id"}"""
+    from sqlalchemy import text
+    from app.services import issue_tokens, load_claims
+    from app.utils.auth import create_access_token
+
+    rng = random.Random(seed)
+    telegram_ids = [row[0] for row in db.execute(
+        text("SELECT telegram_id FROM users ORDER BY id LIMIT :limit"), {"limit": clients}
+    )]
+    if not telegram_ids:
+        sys.exit("❌ В БД нет пользователей (benchmarks/datagen.py)")
+
+    tokens = []
+    for telegram_id in telegram_ids:
+        if rng.random() < legacy_share:
+            tokens.append(create_access_token({"telegram_id": telegram_id}))
+        else:
+            tokens.append(issue_tokens(load_claims(db, telegram_id))["access_token"])
+    return tokens
+
+
+async def watch_loop_lag(stop: asyncio.Event, lags: list, interval: float = 0.005):
+    """Насколько позже срока просыпается sleep(interval), пока идёт шторм"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lags.append(max(loop.time() - started - interval, 0.0))
+
+
+async def storm_round(app, tokens: list, concurrency: int) -> dict:
+    sockets = [None] * len(tokens)
+
+    async def connect(i) -> bool:
+        ws = AsgiWebSocket(app, "/ws/presence", f"token={tokens[i]}&page=library&topics=")
+        await ws.connect()
+        sockets[i] = ws
+        return True
+
+    stop, lags = asyncio.Event(), []
+    watcher = asyncio.create_task(watch_loop_lag(stop, lags))
+    try:
+        result = await run_load(connect, len(tokens), concurrency)
+    finally:
+        stop.set()
+        await watcher
+        await asyncio.gather(*(ws.close() for ws in sockets if ws is not None))
+    result["loop_lag_ms"] = latency_summary(lags)
+    return result
+
+
+async def run(args) -> dict:
+    import main
+    from app.api.websocket import connect_metrics
+    from app.database import SessionLocal
+    from app.services import principal_cache
+
+    app = main.app
+    await app.router.startup()
+    try:
+        if not await redis_available():
+            sys.exit("❌ Redis недоступен (REDIS_URL) — /ws/presence без него не подключает")
+
+        db = SessionLocal()
+        try:
+            tokens = load_tokens(db, args.clients, args.legacy_share, args.seed)
+        finally:
+            db.close()
+        principal_cache.clear()
+
+        results = {}
+        for number in range(1, args.rounds + 1):
+            result = await storm_round(app, tokens, args.concurrency)
+            results[f"round_{number}"] = result
+            print_result(f"раунд {number}", result)
+
+        results["metrics"] = connect_metrics.snapshot()
+        counters = results["metrics"]["counters"]
+        print(
+            f"\nпрофиль: из токена {counters.get('profile_from_token', 0)}, "
+            f"кэш {counters.get('profile_cache_hit', 0)}, БД {counters.get('profile_db', 0)}; "
+            f"авторизация p95 {results['metrics']['auth_ms'].get('p95', 0):.2f} мс"
+        )
+    finally:
+        await app.router.shutdown()
+    return results
+
+
+def print_result(name: str, result: dict) -> None:
+    latency, lag = result["latency_ms"], result["loop_lag_ms"]
+    print(
+        f"{name:<10} {result['rps'] or 0:>9.1f} подкл/с   p50 {latency.get('p50', 0):8.2f}   "
+        f"p95 {latency.get('p95', 0):8.2f}   p99 {latency.get('p99', 0):8.2f} мс   "
+        f"ошибок {result['errors']:>4}   задержка цикла p99 {lag.get('p99', 0):.1f} / max {lag.get('max', 0):.1f} мс"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("db", help="Файл SQLite (из benchmarks/datagen.py или копия боевой)")
+    parser.add_argument("--clients", type=int, default=1000, help="Клиентов в шторме")
+    parser.add_argument("--concurrency", type=int, default=200, help="Одновременных подключений")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--legacy-share", type=float, default=0.5, help="Доля старых токенов без claims")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Куда записать JSON-отчёт")
+    parser.add_argument("--compare", help="JSON-отчёт для сравнения (например, с прошлого коммита)")
+    parser.add_argument("--in-place", action="store_true", help="Работать с самой БД, а не с копией")
+    args = parser.parse_args()
+
+    workdir = prepare_environment(args)
+    logging.disable(logging.INFO)
+    try:
+        print(f"🌩  {args.db}: {args.clients} клиентов × {args.rounds} раунда, concurrency {args.concurrency}\n")
+        results = asyncio.run(run(args))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": report_meta(
+            db=str(Path(args.db).resolve()),
+            clients=args.clients,
+            concurrency=args.concurrency,
+            legacy_share=args.legacy_share,
+            seed=args.seed,
+        ),
+        "results": results,
+    }
+    if args.output:
+        write_report(args.output, report)
+        print(f"\n💾 Отчёт: {args.output}")
+    if args.compare:
+        print()
+        print("\n".join(compare_reports(report, load_report(args.compare))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+"""
+Генератор синтетической БД для бенчмарков и нагрузочных тестов.
+
+Создаёт SQLite-файл со схемой библиотеки (модели app/models) и минимальными таблицами
+бота, которые читает API (users, subscriptions, activity_log, library_notifications),
+и заполняет их:
+- пользователи и подписки (доля активных — --active-share);
+- категории, теги, материалы с обложками base64 в cover_image (как до выноса
+  обложек в хранилище; API вынесет их сам при старте/первом запросе);
+- просмотры с «длинным хвостом» популярности (закон Ципфа), duration_seconds и датами
+  за --days дней;
+- избранное.
+
+При одинаковом --seed получается одинаковая БД — отчёты bench_api.py сравнимы между коммитами.
+
+Запуск из library_backend/:
+    python benchmarks/datagen.py /tmp/bench.db
+    python benchmarks/datagen.py /tmp/bench-big.db --users 50000 --materials 2000 --views 5000000
+"""
+
+import argparse
+import base64
+import io
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import create_engine
+
+from app.models.library_models import Base
+
+# Таблицы бота в том объёме, в котором их читает API
+BOT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    telegram_id INTEGER UNIQUE NOT NULL,
+    first_name TEXT,
+    last_name TEXT,
+    username TEXT,
+    photo_url TEXT,
+    phone TEXT,
+    current_loyalty_level TEXT,
+    admin_group TEXT,
+    token_version INTEGER DEFAULT 1,
+    referrer_id INTEGER,
+    is_recurring_active INTEGER DEFAULT 0,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS subscriptions (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    start_date TEXT,
+    end_date TEXT,
+    is_active INTEGER DEFAULT 1,
+    price INTEGER
+);
+CREATE TABLE IF NOT EXISTS activity_log (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER,
+    action_type TEXT,
+    material_id INTEGER,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS library_notifications (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER,
+    type TEXT,
+    title TEXT,
+    text TEXT,
+    link TEXT,
+    is_read INTEGER DEFAULT 0,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+# Первый telegram_id синтетических пользователей (bench_api.py берёт пользователей из БД)
+TELEGRAM_ID_BASE = 700_000_000
+
+CATEGORIES = [
+    ("Reels", "reels", "🎬"), ("Сторис", "stories", "📱"), ("Блогинг", "blogging", "✍️"),
+    ("Продажи", "selling", "💰"), ("Личный бренд", "personal-brand", "⭐"), ("Визуал", "visual", "🎨"),
+    ("Материнство", "motherhood", "👶"), ("Психология", "psychology", "🧠"),
+]
+FORMATS = ["reels", "post", "story", "guide", "podcast", "challenge", "template"]
+LEVELS = ["beginner", "intermediate", "advanced"]
+TOPICS = ["expertise", "storytelling", "lifestyle", "selling", "personal_brand"]
+NICHES = ["motherhood", "beauty", "business", "lifestyle", "psychology"]
+TAG_KINDS = ["format", "niche", "topic", "trend"]
+WORDS = (
+    "идеи reels сторис продажи блог мама эксперт контент охваты сценарий вирусный звук "
+    "личный бренд прогрев запуск аудитория воронка визуал монтаж тренд подкаст гайд"
+).split()
+
+CHUNK = 50_000
+
+
+def make_cover(rng: random.Random, size: int, quality: int) -> str:
+    """Обложка-шум JPEG в виде data URL (уникальная для каждого материала)"""
+    from PIL import Image
+
+    image = Image.effect_noise((size, size), rng.randint(20, 80)).convert("RGB")
+    tint = Image.new("RGB", image.size, tuple(rng.randrange(256) for _ in range(3)))
+    buffer = io.BytesIO()
+    Image.blend(image, tint, 0.5).save(buffer, format="JPEG", quality=quality)
+    return "data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+def sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def fmt(moment: datetime) -> str:
+    return moment.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def generate(args) -> dict:
+    rng = random.Random(args.seed)
+    path = Path(args.path)
+    if path.exists():
+        if not args.force:
+            sys.exit(f"❌ {path} уже существует (--force — перезаписать)")
+        path.unlink()
+
+    Base.metadata.create_all(create_engine(f"sqlite:///{path}"))
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.executescript(BOT_SCHEMA)
+
+    now = datetime.utcnow().replace(microsecond=0)
+    counts = {}
+
+    # Пользователи и подписки
+    users = [
+        (uid, TELEGRAM_ID_BASE + uid, f"Мама{uid}", f"bench_user{uid}", rng.choice([None, "silver", "gold"]))
+        for uid in range(1, args.users + 1)
+    ]
+    conn.executemany(
+        "INSERT INTO users (id, telegram_id, first_name, username, current_loyalty_level) VALUES (?, ?, ?, ?, ?)",
+        users
+    )
+    subscriptions = []
+    for uid in range(1, args.users + 1):
+        active = rng.random() < args.active_share
+        start = now - timedelta(days=rng.randint(1, 365))
+        end = now + timedelta(days=rng.randint(1, 60)) if active else now - timedelta(days=rng.randint(1, 90))
+        subscriptions.append((uid, fmt(start), fmt(end), 1 if active else 0, 990))
+    conn.executemany(
+        "INSERT INTO subscriptions (user_id, start_date, end_date, is_active, price) VALUES (?, ?, ?, ?, ?)",
+        subscriptions
+    )
+    counts["users"] = len(users)
+
+    # Справочники
+    conn.executemany(
+        "INSERT INTO library_categories (id, name, slug, icon, position, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+        [(i + 1, name, slug, icon, i, fmt(now)) for i, (name, slug, icon) in enumerate(CATEGORIES)]
+    )
+    conn.executemany(
+        "INSERT INTO library_tags (id, name, slug, category, created_at) VALUES (?, ?, ?, ?, ?)",
+        [(i, f"Тег {i}", f"tag-{i}", rng.choice(TAG_KINDS), fmt(now)) for i in range(1, args.tags + 1)]
+    )
+
+    # Материалы с обложками base64
+    started = time.perf_counter()
+    for mid in range(1, args.materials + 1):
+        category_ids = rng.sample(range(1, len(CATEGORIES) + 1), rng.randint(1, 2))
+        created = now - timedelta(days=rng.randint(0, args.days), minutes=rng.randint(0, 1440))
+        conn.execute(
+            """
+            INSERT INTO library_materials
+                (id, title, description, content, external_url, category_id, format, level, duration,
+                 topic, niche, viral_score, author, cover_image, is_published, is_featured, views,
+                 created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0, ?, ?)
+            """,
+            (
+                mid, f"{sentence(rng, 4)} #{mid}", sentence(rng, 20),
+                "<p>" + "</p><p>".join(sentence(rng, 40) for _ in range(rng.randint(3, 12))) + "</p>",
+                f"https://example.com/m/{mid}" if rng.random() < 0.5 else None,
+                category_ids[0], rng.choice(FORMATS), rng.choice(LEVELS), rng.randint(1, 30),
+                rng.choice(TOPICS), rng.choice(NICHES), rng.randint(0, 10), "Полина",
+                make_cover(rng, args.cover_size, args.cover_quality) if rng.random() < args.cover_share else None,
+                1 if rng.random() < args.published_share else 0, 1 if rng.random() < 0.1 else 0,
+                fmt(created), fmt(created),
+            )
+        )
+        conn.executemany(
+            "INSERT INTO materials_categories (material_id, category_id) VALUES (?, ?)",
+            [(mid, cid) for cid in category_ids]
+        )
+        conn.executemany(
+            "INSERT INTO materials_tags (material_id, tag_id) VALUES (?, ?)",
+            [(mid, tid) for tid in rng.sample(range(1, args.tags + 1), min(args.tags, rng.randint(1, 4)))]
+        )
+    counts["materials"] = args.materials
+    print(f"   материалы: {args.materials} за {time.perf_counter() - started:.1f} с")
+
+    # Просмотры: популярность материалов по Ципфу, активность пользователей тоже неравномерна
+    started = time.perf_counter()
+    material_order = list(range(1, args.materials + 1))
+    rng.shuffle(material_order)
+    material_weights = [1 / (rank + 1) ** args.zipf for rank in range(args.materials)]
+    user_weights = [1 / (rank + 1) ** 0.5 for rank in range(args.users)]
+    window = args.days * 86400
+    written = 0
+    views_per_material = [0] * (args.materials + 1)
+    while written < args.views:
+        size = min(CHUNK, args.views - written)
+        materials = rng.choices(material_order, weights=material_weights, k=size)
+        users_chunk = rng.choices(range(1, args.users + 1), weights=user_weights, k=size)
+        rows = []
+        for material_id, user_id in zip(materials, users_chunk):
+            viewed_at = now - timedelta(seconds=int(window * rng.random() ** 2))  # свежих больше
+            duration = None if rng.random() < 0.3 else int(rng.expovariate(1 / 180))
+            rows.append((material_id, user_id, duration, fmt(viewed_at)))
+            views_per_material[material_id] += 1
+        conn.executemany(
+            "INSERT INTO library_views (material_id, user_id, duration_seconds, viewed_at) VALUES (?, ?, ?, ?)",
+            rows
+        )
+        written += size
+    conn.executemany(
+        "UPDATE library_materials SET views = ? WHERE id = ?",
+        [(count, mid) for mid, count in enumerate(views_per_material) if mid]
+    )
+    counts["views"] = written
+    print(f"   просмотры: {written} за {time.perf_counter() - started:.1f} с")
+
+    # Избранное
+    favorites = set()
+    for user_id in range(1, args.users + 1):
+        for material_id in rng.choices(material_order, weights=material_weights, k=rng.randint(0, 2 * args.favorites)):
+            favorites.add((user_id, material_id))
+    conn.executemany(
+        "INSERT INTO library_favorites (user_id, material_id, created_at) VALUES (?, ?, ?)",
+        [(u, m, fmt(now - timedelta(days=rng.randint(0, args.days)))) for u, m in sorted(favorites)]
+    )
+    conn.execute("""
+        UPDATE library_materials SET favorites_count = (
+            SELECT COUNT(*) FROM library_favorites f WHERE f.material_id = library_materials.id
+        )
+    """)
+    counts["favorites"] = len(favorites)
+
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="Файл SQLite")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--materials", type=int, default=500)
+    parser.add_argument("--views", type=int, default=1_000_000)
+    parser.add_argument("--favorites", type=int, default=5, help="Избранных на пользователя (в среднем)")
+    parser.add_argument("--tags", type=int, default=30)
+    parser.add_argument("--days", type=int, default=180, help="За сколько дней просмотры и материалы")
+    parser.add_argument("--zipf", type=float, default=1.0, help="Показатель Ципфа для популярности материалов")
+    parser.add_argument("--active-share", type=float, default=0.8, help="Доля пользователей с активной подпиской")
+    parser.add_argument("--published-share", type=float, default=0.95)
+    parser.add_argument("--cover-share", type=float, default=0.9, help="Доля материалов с обложкой")
+    parser.add_argument("--cover-size", type=int, default=400, help="Сторона обложки, px")
+    parser.add_argument("--cover-quality", type=int, default=80, help="Качество JPEG обложки")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--force", action="store_true", help="Перезаписать существующий файл")
+    args = parser.parse_args()
+
+    print(f"📦 Генерация {args.path} (seed={args.seed})")
+    started = time.perf_counter()
+    counts = generate(args)
+    print(
+        f"✅ Готово за {time.perf_counter() - started:.1f} с: "
+        + ", ".join(f"{name}={value}" for name, value in counts.items())
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""
+Общие части бенчмарков: статистика задержек, замер памяти, WebSocket через ASGI,
+JSON-отчёты и их сравнение.
+"""
+
+import asyncio
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+# Метрики в сравнении отчётов: (путь в результате, больше — лучше)
+COMPARED_METRICS = [
+    (("latency_ms", "p50"), False),
+    (("latency_ms", "p95"), False),
+    (("latency_ms", "p99"), False),
+    (("rps",), True),
+    (("alloc", "peak_kb_p50"), False),
+]
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """q-й перцентиль (0..1) по ближайшему рангу"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def latency_summary(latencies: Sequence[float]) -> Dict[str, float]:
+    """Задержки в секундах -> p50/p95/p99/max/mean в мс"""
+    if not latencies:
+        return {}
+    ms = [value * 1000 for value in latencies]
+    return {
+        "p50": round(percentile(ms, 0.50), 3),
+        "p95": round(percentile(ms, 0.95), 3),
+        "p99": round(percentile(ms, 0.99), 3),
+        "max": round(max(ms), 3),
+        "mean": round(statistics.fmean(ms), 3),
+    }
+
+
+async def run_load(
+    operation: Callable[[int], Awaitable[bool]],
+    total: int,
+    concurrency: int
+) -> dict:
+    """
+    Выполнить operation(i) total раз в concurrency корутинах.
+    operation возвращает True при успехе.
+    """
+    latencies: List[float] = []
+    errors = 0
+    indexes = iter(range(total))
+    loop = asyncio.get_running_loop()
+
+    async def worker():
+        nonlocal errors
+        for index in indexes:
+            started = loop.time()
+            try:
+                ok = await operation(index)
+            except Exception:
+                ok = False
+            latencies.append(loop.time() - started)
+            if not ok:
+                errors += 1
+
+    started = loop.time()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = loop.time() - started
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "rps": round(total / elapsed, 1) if elapsed else None,
+        "latency_ms": latency_summary(latencies),
+    }
+
+
+async def measure_allocations(operation: Callable[[int], Awaitable[bool]], total: int, offset: int = 0) -> dict:
+    """
+    Память на запрос через tracemalloc (отдельным проходом, последовательно —
+    tracemalloc сильно замедляет код, задержки в этом проходе не считаются):
+    пик сверх текущего объёма на запрос и сколько осталось занято после прохода.
+    """
+    peaks = []
+    tracemalloc.start()
+    try:
+        before_all = tracemalloc.get_traced_memory()[0]
+        for index in range(offset, offset + total):
+            current = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            await operation(index)
+            peaks.append(tracemalloc.get_traced_memory()[1] - current)
+        retained = tracemalloc.get_traced_memory()[0] - before_all
+    finally:
+        tracemalloc.stop()
+    return {
+        "requests": total,
+        "peak_kb_p50": round(percentile(peaks, 0.50) / 1024, 1),
+        "peak_kb_p95": round(percentile(peaks, 0.95) / 1024, 1),
+        "retained_kb": round(retained / 1024, 1),
+    }
+
+
+# ---------- WebSocket через ASGI ----------
+
+class WebSocketRejected(Exception):
+    """Сервер закрыл соединение при подключении"""
+
+    def __init__(self, code: int, reason: str = ""):
+        super().__init__(f"WebSocket closed with {code} {reason}".strip())
+        self.code = code
+
+
+class AsgiWebSocket:
+    """
+    Клиент WebSocket поверх ASGI-приложения в том же процессе (без сети и сервера):
+    приложение вызывается как задача asyncio, кадры ходят через очереди.
+    """
+
+    def __init__(self, app, path: str, query_string: str = ""):
+        self.app = app
+        self.path = path
+        self.query_string = query_string
+        self._to_app: asyncio.Queue = asyncio.Queue()
+        self._from_app: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    async def connect(self, timeout: float = 10.0) -> None:
+        scope = {
+            "type": "websocket",
+            "asgi": {"version": "3.0"},
+            "scheme": "ws",
+            "path": self.path,
+            "raw_path": self.path.encode(),
+            "query_string": self.query_string.encode(),
+            "headers": [(b"host", b"bench")],
+            "client": ("127.0.0.1", 0),
+            "server": ("bench", 80),
+            "subprotocols": [],
+        }
+        self._to_app.put_nowait({"type": "websocket.connect"})
+        self._task = asyncio.create_task(self.app(scope, self._to_app.get, self._from_app.put))
+        message = await self._next(timeout)
+        if message["type"] == "websocket.close":
+            raise WebSocketRejected(message.get("code", 1000), message.get("reason", ""))
+        if message["type"] != "websocket.accept":
+            raise RuntimeError(f"Unexpected ASGI message {message['type']}")
+
+    async def _next(self, timeout: float) -> dict:
+        getter = asyncio.ensure_future(self._from_app.get())
+        done, _ = await asyncio.wait({getter, self._task}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        if getter in done:
+            return getter.result()
+        getter.cancel()
+        if self._task in done:
+            self._task.result()  # исключение приложения
+            return {"type": "websocket.close", "code": 1006}
+        raise asyncio.TimeoutError()
+
+    async def send_text(self, data: str) -> None:
+        await self._to_app.put({"type": "websocket.receive", "text": data})
+
+    async def receive(self, timeout: float = 10.0):
+        """Следующий кадр (str или bytes)"""
+        message = await self._next(timeout)
+        if message["type"] == "websocket.close":
+            raise WebSocketRejected(message.get("code", 1000), message.get("reason", ""))
+        return message.get("text") if message.get("text") is not None else message.get("bytes")
+
+    async def receive_until(self, predicate: Callable[[object], bool], timeout: float = 10.0):
+        """Пропускать кадры (рассылки), пока не придёт подходящий"""
+        while True:
+            frame = await self.receive(timeout)
+            if predicate(frame):
+                return frame
+
+    async def close(self, code: int = 1000, timeout: float = 10.0) -> None:
+        if self._task is None:
+            return
+        await self._to_app.put({"type": "websocket.disconnect", "code": code})
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except Exception:
+            pass
+
+
+# ---------- отчёты ----------
+
+def git_revision() -> dict:
+    """Коммит и наличие незакоммиченных изменений (если это git-репозиторий)"""
+    def git(*args) -> str:
+        return subprocess.run(
+            ["git", *args], cwd=REPO_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+
+    try:
+        return {
+            "commit": git("rev-parse", "HEAD"),
+            "subject": git("log", "-1", "--format=%s"),
+            "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        }
+    except (OSError, subprocess.CalledProcessError):
+        return {}
+
+
+def report_meta(**extra) -> dict:
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git": git_revision(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        **extra,
+    }
+
+
+def write_report(path: str, report: dict) -> None:
+    Path(path).write_text(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+def load_report(path: str) -> dict:
+    return json.loads(Path(path).read_text())
+
+
+def _metric(result: dict, keys: Sequence[str]):
+    for key in keys:
+        if not isinstance(result, dict) or key not in result:
+            return None
+        result = result[key]
+    return result
+
+
+def compare_reports(current: dict, baseline: dict) -> List[str]:
+    """Строки таблицы «было → стало» по общим сценариям"""
+    lines = []
+    base_commit = (baseline.get("meta", {}).get("git", {}).get("commit") or "?")[:10]
+    lines.append(f"Сравнение с {base_commit} ({baseline.get('meta', {}).get('created_at', '?')}):")
+    for name, result in current.get("results", {}).items():
+        old = baseline.get("results", {}).get(name)
+        if not old:
+            continue
+        cells = []
+        for keys, higher_is_better in COMPARED_METRICS:
+            now, before = _metric(result, keys), _metric(old, keys)
+            if not now or not before:
+                continue
+            change = (now - before) / before * 100
+            worse = change < 0 if higher_is_better else change > 0
+            marker = "🔴" if worse and abs(change) >= 10 else ""
+            cells.append(f"{keys[-1]} {before:.4g}→{now:.4g} ({change:+.0f}%){marker}")
+        if cells:
+            lines.append(f"  {name:<22} " + "   ".join(cells))
+    return lines
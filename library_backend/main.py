@@ -51,7 +51,14 @@ logger = logging.getLogger("library_backend")
 for uvicorn_logger_name in ("uvicorn", "uvicorn.access", "uvicorn.error"):
     logging.getLogger(uvicorn_logger_name).addHandler(file_handler)
 
-from app.database import init_db
+from app.database import init_db, SessionLocal, dispose_engines, engine, read_engine, async_engine, async_read_engine
+from app.services import check_search_index, reconcile_search_index, check_cover_storage, check_counter_columns, reconcile_counters
+from app.services import check_active_subscriptions, reconcile_active_subscriptions, check_indexes, item_similarity
+from app.services import recommendation_store, check_recommendation_store, check_material_stats, reconcile_material_stats
+from app.services.cover_storage import shutdown_thumbnail_pool
+from app.services.view_ingest import view_ingest
+from app.utils.periodic import start_periodic, stop_periodic
+from app.utils.query_plans import install_capture_log
 from app.api import auth, materials, categories, favorites, admin, websocket, activity, push
 
 
@@ -98,9 +105,92 @@ async def startup_event():
     # Инициализация БД (создание таблиц, если их нет)
     # init_db()  # Закомментировано, т.к. таблицы уже созданы через миграцию
     
+    # Запись SQL для проверки планов запросов (tools/check_query_plans.py --capture)
+    if settings.SQL_CAPTURE_PATH:
+        install_capture_log(
+            [engine, read_engine, async_engine.sync_engine, async_read_engine.sync_engine],
+            settings.SQL_CAPTURE_PATH
+        )
+    
+    # Индексы под горячие запросы создаёт migrations/add_hot_indexes.py; здесь — только предупреждение
+    check_indexes()
+    
+    # Схему хранилища обложек создаёт migrations/add_cover_storage.py (сами обложки выносятся
+    # миграцией или лениво), здесь — только проверка
+    check_cover_storage()
+    
+    # Счётчики лайков/материалов: колонки добавляет migrations/add_counters.py, здесь — проверка
+    # и периодическая сверка (первая — сразу при старте)
+    check_counter_columns()
+    start_periodic("reconcile_counters", settings.COUNTERS_RECONCILE_INTERVAL_SECONDS, reconcile_counters, run_at_start=True)
+    
+    # Статистика популярности: таблицу создаёт и заполняет migrations/add_material_stats.py,
+    # здесь — проверка и суточная сверка
+    check_material_stats()
+    start_periodic(
+        "reconcile_material_stats",
+        settings.MATERIAL_STATS_RECONCILE_INTERVAL_SECONDS,
+        reconcile_material_stats,
+    )
+    
+    # Проекция активных подписок: таблицу и триггеры создаёт migrations/add_active_subscriptions.py,
+    # здесь — проверка и периодическая сверка
+    check_active_subscriptions()
+    start_periodic(
+        "reconcile_active_subscriptions",
+        settings.ACTIVE_SUBSCRIPTIONS_RECONCILE_INTERVAL_SECONDS,
+        reconcile_active_subscriptions,
+    )
+    
+    # Модель рекомендаций item-item (первая сборка — сразу при старте, в фоне)
+    if item_similarity.available:
+        start_periodic(
+            "item_similarity",
+            settings.RECOMMENDATIONS_MODEL_INTERVAL_SECONDS,
+            item_similarity.rebuild,
+            run_at_start=True
+        )
+    else:
+        logger.warning("numpy/scipy not installed, recommendations use SQL")
+    
+    # Готовые рекомендации: таблицу создаёт migrations/add_recommendation_store.py,
+    # без неё — только LRU в процессе; фоном — пересчёт пользователей с новыми просмотрами
+    if check_recommendation_store():
+        recommendation_store.persist = False
+    start_periodic(
+        "recommendations_refresh",
+        settings.RECOMMENDATIONS_REFRESH_INTERVAL_SECONDS,
+        recommendation_store.refresh_changed,
+    )
+    
+    # Очередь просмотров: дописать журнал прошлых запусков и запустить пакетную запись
+    await view_ingest.start()
+    
+    # Полнотекстовый индекс материалов (FTS5): создаёт migrations/rebuild_search_index.py, здесь — проверка и сверка
+    db = SessionLocal()
+    try:
+        if check_search_index(db):
+            print("🔎 Поисковый индекс FTS5 готов")
+    finally:
+        db.close()
+    start_periodic(
+        "reconcile_search_index",
+        settings.SEARCH_INDEX_RECONCILE_INTERVAL_SECONDS,
+        reconcile_search_index,
+    )
+    
     print("✅ API готов к работе!")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Действия при остановке приложения"""
+    await view_ingest.stop()
+    await stop_periodic()
+    shutdown_thumbnail_pool()
+    await dispose_engines()
+
+
 @app.get("/")
 def root():
     """Корневой endpoint"""
@@ -0,0 +1,43 @@
+"""
+Миграция: Проекция активных подписок user_active_subscriptions
+Дата: 2026-10-16
+Описание: Создаёт таблицу (user_id, subscription_id, active_until), индекс по active_until,
+индекс subscriptions(user_id, is_active, end_date) и триггеры, которые держат таблицу
+в актуальном состоянии при любых изменениях subscriptions (из API и из бота).
+Повторный запуск — сверка с subscriptions (то же делает периодическая задача API).
+Запуск из library_backend/: python migrations/add_active_subscriptions.py
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.database import SessionLocal
+from app.services.active_subscriptions import ensure_active_subscriptions, reconcile_active_subscriptions
+
+
+def run_migration():
+    """Создаёт проекцию активных подписок и сверяет её с subscriptions"""
+    
+    ensure_active_subscriptions()
+    print("✅ Таблица user_active_subscriptions и триггеры готовы")
+    
+    db = SessionLocal()
+    
+    try:
+        fixed = reconcile_active_subscriptions(db)
+        print(f"✅ Проекция сверена: исправлено строк {fixed['rows']}")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Ошибка миграции: {e}")
+        db.rollback()
+        return False
+        
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,41 @@
+"""
+Миграция: Счётчики favorites_count (library_materials) и materials_count (library_categories)
+Дата: 2026-10-16
+Описание: Добавляет колонки и заполняет их по library_favorites / materials_categories.
+Повторный запуск — сверка счётчиков (то же делает периодическая задача API).
+Запуск из library_backend/: python migrations/add_counters.py
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.database import SessionLocal
+from app.services.counters import ensure_counter_columns, reconcile_counters
+
+
+def run_migration():
+    """Добавляет колонки счётчиков и пересчитывает их"""
+    
+    ensure_counter_columns()
+    print("✅ Колонки favorites_count и materials_count готовы")
+    
+    db = SessionLocal()
+    
+    try:
+        fixed = reconcile_counters(db)
+        print(f"✅ Счётчики пересчитаны: материалов {fixed['materials']}, категорий {fixed['categories']}")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Ошибка миграции: {e}")
+        db.rollback()
+        return False
+        
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run_migration()
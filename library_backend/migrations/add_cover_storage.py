@@ -0,0 +1,59 @@
+"""
+Миграция: Хранилище обложек (library_covers, library_cover_thumbnails)
+Дата: 2026-10-16
+Описание: Создаёт таблицы хранилища, колонку library_materials.cover_hash
+и выносит base64 data URL из cover_image в файлы COVERS_DIR.
+Запуск из library_backend/: python migrations/add_cover_storage.py
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import select
+
+from app.database import SessionLocal
+from app.models.library_models import LibraryMaterial
+from app.services.cover_storage import CoverStorage, ensure_cover_storage
+
+
+def run_migration():
+    """Создаёт таблицы хранилища и переносит обложки"""
+
+    ensure_cover_storage()
+    print("✅ Таблицы хранилища и колонка library_materials.cover_hash готовы")
+
+    db = SessionLocal()
+
+    try:
+        # Берём только id — сами data URL читаем по одному
+        material_ids = db.execute(
+            select(LibraryMaterial.id).where(LibraryMaterial.cover_image.like("data:%"))
+        ).scalars().all()
+
+        storage = CoverStorage(db)
+        migrated = failed = 0
+        for material_id in material_ids:
+            if storage.migrate_material(material_id):
+                migrated += 1
+            else:
+                failed += 1
+            db.expunge_all()
+
+        print(f"✅ Обложек перенесено в хранилище: {migrated}, с ошибками: {failed}")
+        if migrated:
+            print("ℹ️  Место в файле БД освободится после VACUUM (выполнить в окно обслуживания)")
+        return failed == 0
+
+    except Exception as e:
+        print(f"❌ Ошибка миграции: {e}")
+        db.rollback()
+        return False
+
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,39 @@
+"""
+Миграция: Составные индексы под горячие запросы API
+Дата: 2026-10-16
+Описание: library_views (user_id, viewed_at) / (material_id) / (viewed_at),
+library_favorites (user_id, created_at), library_notifications (user_id, is_read, created_at),
+activity_log (created_at), library_materials (is_published, created_at / views / is_featured)
+и индексы таблиц бота, которые читает API. Устаревшие одноколоночные индексы удаляются,
+статистика планировщика обновляется (ANALYZE). Список — app/services/indexes.py.
+Проверка планов после миграции: python tools/check_query_plans.py
+Запуск из library_backend/: python migrations/add_hot_indexes.py
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.indexes import ensure_indexes
+
+
+def run_migration():
+    """Создаёт индексы и обновляет статистику"""
+    
+    try:
+        created = ensure_indexes(analyze=True)
+        if created:
+            print(f"✅ Созданы индексы: {', '.join(created)}")
+        else:
+            print("✅ Все индексы уже есть")
+        print("✅ Статистика планировщика обновлена (ANALYZE)")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Ошибка миграции: {e}")
+        return False
+
+
+if __name__ == "__main__":
+    run_migration()
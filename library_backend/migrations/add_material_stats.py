@@ -0,0 +1,43 @@
+"""
+Миграция: Статистика популярности материалов library_material_stats
+Дата: 2026-10-16
+Описание: Создаёт таблицу (material_id, views_total, unique_viewers, views_7d, views_30d,
+favorites, trending_score) и заполняет её по library_views и library_favorites.
+Дальше строки обновляются при записи просмотров и избранного, а API сверяет их раз в сутки.
+Повторный запуск — внеочередная сверка.
+Запуск из library_backend/: python migrations/add_material_stats.py
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.database import SessionLocal
+from app.services.material_stats import ensure_material_stats, reconcile_material_stats
+
+
+def run_migration():
+    """Создаёт library_material_stats и сверяет её с просмотрами и избранным"""
+    
+    ensure_material_stats()
+    print("✅ Таблица library_material_stats готова")
+    
+    db = SessionLocal()
+    
+    try:
+        fixed = reconcile_material_stats(db)
+        print(f"✅ Статистика пересчитана: исправлено строк {fixed['rows']}")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Ошибка миграции: {e}")
+        db.rollback()
+        return False
+        
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run_migration()
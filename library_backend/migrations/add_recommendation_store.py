@@ -0,0 +1,32 @@
+"""
+Миграция: Таблица готовых рекомендаций library_recommendations
+Дата: 2026-10-16
+Описание: Создаёт таблицу (user_id, payload, generated_at, view_watermark), из которой
+/materials/feed/recommendations отдаёт посчитанные рекомендации. Строки появляются при
+первом запросе пользователя и обновляются фоновым пересчётом API.
+Запуск из library_backend/: python migrations/add_recommendation_store.py
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.recommendation_store import ensure_recommendation_store
+
+
+def run_migration():
+    """Создаёт таблицу library_recommendations"""
+    
+    try:
+        ensure_recommendation_store()
+        print("✅ Таблица library_recommendations готова")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Ошибка миграции: {e}")
+        return False
+
+
+if __name__ == "__main__":
+    run_migration()
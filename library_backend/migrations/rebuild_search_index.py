@@ -0,0 +1,41 @@
+"""
+Команда: Перестроение полнотекстового индекса материалов (FTS5)
+Дата: 2026-10-16
+Описание: Создаёт таблицу library_materials_fts (если нет) и заново индексирует все материалы.
+Запуск из library_backend/: python migrations/rebuild_search_index.py
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.database import SessionLocal
+from app.services.search_service import SearchService, ensure_search_index
+
+
+def run_migration():
+    """Перестраивает поисковый индекс"""
+    
+    db = SessionLocal()
+    
+    try:
+        if not ensure_search_index(db):
+            print("❌ SQLite собран без FTS5, индекс не создан")
+            return False
+        
+        count = SearchService(db).rebuild()
+        print(f"✅ Поисковый индекс перестроен: {count} материалов")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Ошибка перестроения индекса: {e}")
+        db.rollback()
+        return False
+        
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run_migration()
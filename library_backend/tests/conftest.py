@@ -0,0 +1,160 @@
+"""
+Общие фикстуры тестов.
+
+Настройки читаются при импорте app, поэтому окружение (временная БД, папки загрузок
+и журнала просмотров) выставляется здесь, до первого импорта. Схема — модели библиотеки
+и минимальные таблицы бота (как в benchmarks/datagen.py); после каждого теста таблицы
+очищаются, кэши процесса сбрасываются.
+
+Запуск из library_backend/:
+    python -m pytest -q tests
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+WORKDIR = Path(tempfile.mkdtemp(prefix="library-tests-"))
+
+os.environ["DATABASE_URL"] = f"sqlite:///{WORKDIR / 'test.db'}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ.pop("READ_DATABASE_URL", None)
+os.environ["UPLOAD_DIR"] = str(WORKDIR / "uploads")
+os.environ["COVERS_DIR"] = str(WORKDIR / "uploads" / "covers")
+os.environ["VIEW_JOURNAL_DIR"] = str(WORKDIR / "view_journal")
+os.environ["RECOMMENDATIONS_MODEL_PATH"] = str(WORKDIR / "item_similarity.npz")
+os.environ["SQL_CAPTURE_PATH"] = ""
+
+sys.path.insert(0, str(BACKEND_DIR))
+sys.path.insert(0, str(BACKEND_DIR / "benchmarks"))
+
+from datagen import BOT_SCHEMA  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+
+from app.database import SessionLocal, engine  # noqa: E402
+from app.models.library_models import Base  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    from app.services import (
+        ensure_active_subscriptions, ensure_counter_columns, ensure_cover_storage, ensure_material_stats,
+        ensure_recommendation_store
+    )
+
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.connection.executescript(BOT_SCHEMA)
+    # Таблицы, колонки и триггеры из migrations/ (API при старте их только проверяет)
+    ensure_cover_storage()
+    ensure_counter_columns()
+    ensure_material_stats()
+    ensure_active_subscriptions()
+    ensure_recommendation_store()
+    yield
+    engine.dispose()
+    shutil.rmtree(WORKDIR, ignore_errors=True)
+
+
+def _clear_tables() -> None:
+    from app.services import search_service
+
+    with engine.begin() as conn:
+        tables = [name for (name,) in conn.execute(text(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+        ))]
+        # Служебные таблицы FTS5 очищаются вместе с самой виртуальной таблицей
+        for name in tables:
+            if not name.startswith(f"{search_service.FTS_TABLE}_"):
+                conn.execute(text(f'DELETE FROM "{name}"'))
+
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    yield
+    from app.services import catalog_cache, principal_cache, revocations
+    from app.services import material_service
+    from app.utils.auth import token_cache
+
+    _clear_tables()
+    catalog_cache.invalidate()
+    principal_cache.clear()
+    material_service._count_cache.clear()
+    token_cache.clear()
+    with revocations._lock:
+        revocations._entries.clear()
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def make_user(db):
+    """Пользователь бота (users) с активной подпиской по желанию"""
+    def make(telegram_id: int, first_name: str = "Анна", active: bool = True, **fields) -> int:
+        user_id = db.execute(
+            text("""
+                INSERT INTO users (telegram_id, first_name, username, admin_group, token_version)
+                VALUES (:telegram_id, :first_name, :username, :admin_group, :token_version)
+            """),
+            {
+                "telegram_id": telegram_id,
+                "first_name": first_name,
+                "username": fields.get("username", f"user{telegram_id}"),
+                "admin_group": fields.get("admin_group"),
+                "token_version": fields.get("token_version", 1),
+            }
+        ).lastrowid
+        if active:
+            db.execute(
+                text("""
+                    INSERT INTO subscriptions (user_id, start_date, end_date, is_active)
+                    VALUES (:user_id, datetime('now', '-1 day'), datetime('now', '+30 days'), 1)
+                """),
+                {"user_id": user_id}
+            )
+        db.commit()
+        return user_id
+    return make
+
+
+@pytest.fixture
+def make_material(db):
+    """Опубликованный материал (без индексации в FTS — это делает сам тест)"""
+    from app.models.library_models import LibraryMaterial
+
+    def make(title: str, **fields) -> LibraryMaterial:
+        material = LibraryMaterial(
+            title=title,
+            description=fields.pop("description", ""),
+            content=fields.pop("content", ""),
+            format=fields.pop("format", "guide"),
+            is_published=fields.pop("is_published", True),
+            **fields
+        )
+        db.add(material)
+        db.commit()
+        return material
+    return make
+
+
+@pytest.fixture
+def set_views_total(db):
+    """views_total материала в library_material_stats (по нему сортирует views_desc)"""
+    from app.models.library_models import LibraryMaterialStats
+
+    def set_views(material_id: int, views_total: int) -> None:
+        db.merge(LibraryMaterialStats(material_id=material_id, views_total=views_total))
+        db.commit()
+    return set_views
@@ -0,0 +1,47 @@
+"""Проекция активных подписок: триггеры, сверка и проверка схемы при старте без DDL"""
+
+from sqlalchemy import text
+
+from app.database import engine
+from app.services import (
+    check_active_subscriptions, ensure_active_subscriptions, get_active_subscription, reconcile_active_subscriptions
+)
+
+
+def schema_sql() -> list:
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT type, name, sql FROM sqlite_master ORDER BY name")).all()
+
+
+def test_triggers_keep_projection_in_sync(db, make_user):
+    user_id = make_user(700000010)
+    assert get_active_subscription(db, user_id) is not None
+
+    db.execute(text("UPDATE subscriptions SET is_active = 0 WHERE user_id = :uid"), {"uid": user_id})
+    db.commit()
+
+    assert get_active_subscription(db, user_id) is None
+
+
+def test_reconcile_fixes_drifted_rows(db, make_user):
+    user_id = make_user(700000011)
+    db.execute(text("DELETE FROM user_active_subscriptions"))
+    db.commit()
+
+    assert reconcile_active_subscriptions(db) == {"rows": 1}
+    assert get_active_subscription(db, user_id) is not None
+    assert reconcile_active_subscriptions(db) == {"rows": 0}
+
+
+def test_startup_check_reports_missing_trigger_without_ddl():
+    with engine.begin() as conn:
+        conn.execute(text("DROP TRIGGER trg_subscriptions_active_update"))
+    try:
+        before = schema_sql()
+
+        assert check_active_subscriptions() == ["trg_subscriptions_active_update"]
+        assert schema_sql() == before
+    finally:
+        ensure_active_subscriptions()  # то, что делает миграция
+
+    assert check_active_subscriptions() == []
@@ -0,0 +1,143 @@
+"""Access-токены с claims, refresh и отзыв сессий (force-logout)"""
+
+import asyncio
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+from sqlalchemy import text
+
+from app.api.dependencies import get_current_user, get_current_user_with_subscription
+from app.database import AsyncReadSessionLocal
+from app.services import issue_tokens, load_claims, refresh_tokens, revocations
+from app.utils.auth import ACCESS_TOKEN, create_access_token, create_token
+
+TELEGRAM_ID = 700000001
+
+
+def authenticate(token: str, with_subscription: bool = False) -> dict:
+    async def run():
+        async with AsyncReadSessionLocal() as db:
+            credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+            user = await get_current_user(credentials, db)
+            if with_subscription:
+                user = await get_current_user_with_subscription(user, db)
+            return user
+    return asyncio.run(run())
+
+
+def force_logout(db, telegram_id: int) -> None:
+    """То же, что POST /api/push/force-logout/{telegram_id}"""
+    db.execute(
+        text("UPDATE users SET token_version = COALESCE(token_version, 1) + 1 WHERE telegram_id = :tid"),
+        {"tid": telegram_id}
+    )
+    db.commit()
+    version = db.execute(text("SELECT token_version FROM users WHERE telegram_id = :tid"), {"tid": telegram_id}).scalar()
+    revocations.revoke(telegram_id, version)
+
+
+def assert_unauthorized(call, *args, **kwargs):
+    with pytest.raises(HTTPException) as error:
+        call(*args, **kwargs)
+    assert error.value.status_code == 401
+
+
+def test_claims_carry_user_and_subscription(db, make_user):
+    user_id = make_user(TELEGRAM_ID, "Мария")
+
+    claims = load_claims(db, TELEGRAM_ID)
+
+    assert claims["user_id"] == user_id
+    assert claims["first_name"] == "Мария"
+    assert claims["ver"] == 1
+    assert claims["sub_end"] is not None
+    assert claims["is_admin"] is False
+
+
+def test_access_token_authenticates_without_database(db, make_user):
+    make_user(TELEGRAM_ID)
+    token = issue_tokens(load_claims(db, TELEGRAM_ID))["access_token"]
+    # Пользователь и подписка — из токена: строки в БД больше не нужны
+    db.execute(text("DELETE FROM subscriptions"))
+    db.execute(text("DELETE FROM users"))
+    db.commit()
+
+    user = authenticate(token, with_subscription=True)
+
+    assert user["telegram_id"] == TELEGRAM_ID
+    assert user["subscription"]["is_active"] is True
+
+
+def test_expired_subscription_in_claims_is_checked_in_database(db, make_user):
+    make_user(TELEGRAM_ID, active=False)
+    token = issue_tokens(load_claims(db, TELEGRAM_ID))["access_token"]
+
+    user = authenticate(token)
+    assert "subscription" not in user
+    with pytest.raises(HTTPException) as error:
+        authenticate(token, with_subscription=True)
+    assert error.value.status_code == 403
+
+
+def test_refresh_token_is_not_accepted_as_access_token(db, make_user):
+    make_user(TELEGRAM_ID)
+    tokens = issue_tokens(load_claims(db, TELEGRAM_ID))
+
+    assert_unauthorized(authenticate, tokens["refresh_token"])
+    assert_unauthorized(refresh_tokens, db, tokens["access_token"])
+
+
+def test_refresh_returns_new_pair_with_fresh_claims(db, make_user):
+    make_user(TELEGRAM_ID, "Анна")
+    refresh = issue_tokens(load_claims(db, TELEGRAM_ID))["refresh_token"]
+    db.execute(text("UPDATE users SET first_name = 'Анна-Мария' WHERE telegram_id = :tid"), {"tid": TELEGRAM_ID})
+    db.commit()
+
+    tokens = refresh_tokens(db, refresh)
+
+    assert authenticate(tokens["access_token"])["first_name"] == "Анна-Мария"
+
+
+def test_force_logout_revokes_access_and_refresh_tokens(db, make_user):
+    make_user(TELEGRAM_ID)
+    old = issue_tokens(load_claims(db, TELEGRAM_ID))
+    authenticate(old["access_token"])  # токен попал в LRU проверенных
+
+    force_logout(db, TELEGRAM_ID)
+
+    assert_unauthorized(authenticate, old["access_token"])
+    assert_unauthorized(refresh_tokens, db, old["refresh_token"])
+
+    # Новый вход выдаёт токены новой версии
+    new = issue_tokens(load_claims(db, TELEGRAM_ID))
+    assert authenticate(new["access_token"])["telegram_id"] == TELEGRAM_ID
+    assert refresh_tokens(db, new["refresh_token"])["access_token"]
+
+
+def test_forged_claims_are_rejected(db, make_user):
+    make_user(TELEGRAM_ID)
+    *_, signature = issue_tokens(load_claims(db, TELEGRAM_ID))["access_token"].split(".")
+    other_header, other_payload, _ = create_token(
+        {**load_claims(db, TELEGRAM_ID), "is_admin": True, "admin_group": "owner"},
+        ACCESS_TOKEN, timedelta(minutes=5)
+    ).split(".")
+
+    assert_unauthorized(authenticate, f"{other_header}.{other_payload}.{signature}")
+
+
+def test_expired_access_token_is_rejected(db, make_user):
+    make_user(TELEGRAM_ID)
+    token = create_token(load_claims(db, TELEGRAM_ID), ACCESS_TOKEN, timedelta(seconds=-1))
+
+    assert_unauthorized(authenticate, token)
+
+
+def test_legacy_token_resolves_user_from_database(db, make_user):
+    user_id = make_user(TELEGRAM_ID)
+
+    user = authenticate(create_access_token({"telegram_id": TELEGRAM_ID}), with_subscription=True)
+
+    assert user["user_id"] == user_id
+    assert user["subscription"]["is_active"]
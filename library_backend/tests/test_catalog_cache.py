@@ -0,0 +1,58 @@
+"""Кэш каталога: версии снимков и выдача из памяти"""
+
+from app.services.catalog_cache import CatalogCache
+
+
+def test_version_changes_only_when_snapshot_is_published(db, make_material):
+    make_material("Сторис для мам")
+    cache = CatalogCache(ttl_seconds=60)
+
+    first = cache.get_snapshot(db)
+    assert first.version == cache.version == 1
+    assert cache.get_snapshot(db) is first
+
+    # Пока другой запрос держит блокировку, разовая сборка не трогает версию
+    cache._snapshot = None
+    with cache._lock:
+        fallback = cache.get_snapshot(db)
+        assert fallback.version == cache.version == 1
+    assert cache._snapshot is None
+
+    published = cache.get_snapshot(db)
+    assert published.version == cache.version == 2
+
+
+def test_patches_and_invalidation_bump_version(db, make_material):
+    material = make_material("Reels за 5 минут")
+    cache = CatalogCache(ttl_seconds=60)
+    cache.get_snapshot(db)
+
+    material.title = "Reels за 10 минут"
+    db.commit()
+    cache.refresh_material(db, material.id)
+    snapshot = cache.get_snapshot(db)
+    assert snapshot.version == cache.version == 2
+    assert snapshot.entries[material.id]["item"]["title"] == "Reels за 10 минут"
+
+    cache.remove_material(material.id)
+    assert cache.version == 3
+    assert material.id not in cache.get_snapshot(db).entries
+
+    cache.invalidate()
+    assert cache.version == 4
+    assert cache.get_snapshot(db).version == 5
+
+
+def test_list_filters_sorts_and_pages_in_memory(db, make_material, set_views_total):
+    set_views_total(make_material("Старый гайд", format="guide").id, 5)
+    popular = make_material("Популярные reels", format="reels")
+    set_views_total(popular.id, 50)
+    set_views_total(make_material("Новые reels", format="reels").id, 10)
+    make_material("Черновик", format="reels", is_published=False)
+    cache = CatalogCache(ttl_seconds=60)
+
+    result = cache.list_materials(db, format="reels", sort="views_desc", page_size=1)
+
+    assert result["total"] == 2
+    assert result["total_pages"] == 2
+    assert [item["id"] for item in result["items"]] == [popular.id]
@@ -0,0 +1,34 @@
+"""Счётчики лайков и материалов в категориях: сверка и проверка колонок при старте"""
+
+from sqlalchemy import text
+
+from app.database import engine
+from app.services import adjust_favorites_count, check_counter_columns, reconcile_counters
+from app.services import counters
+
+
+def test_reconcile_fixes_drifted_counters(db, make_material):
+    material = make_material("Гайд")
+    db.execute(
+        text("INSERT INTO library_favorites (user_id, material_id, created_at) VALUES (1, :id, CURRENT_TIMESTAMP)"),
+        {"id": material.id}
+    )
+    adjust_favorites_count(db, material.id, 5)  # счётчик разошёлся с избранным
+    db.commit()
+
+    assert reconcile_counters(db) == {"materials": 1, "categories": 0}
+    favorites = db.execute(text("SELECT favorites_count FROM library_materials WHERE id = :id"), {"id": material.id})
+    assert favorites.scalar() == 1
+    assert reconcile_counters(db) == {"materials": 0, "categories": 0}
+
+
+def test_startup_check_reports_missing_columns_without_ddl(monkeypatch):
+    assert check_counter_columns() == []
+
+    monkeypatch.setattr(counters, "COUNTER_COLUMNS", [*counters.COUNTER_COLUMNS, ("library_tags", "uses_count", "INTEGER")])
+    with engine.connect() as conn:
+        before = conn.execute(text("SELECT sql FROM sqlite_master WHERE name = 'library_tags'")).scalar()
+
+    assert check_counter_columns() == ["library_tags.uses_count"]
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT sql FROM sqlite_master WHERE name = 'library_tags'")).scalar() == before
@@ -0,0 +1,54 @@
+"""Обложки в хранилище: вынос data URL и URL обложки в ответах"""
+
+import base64
+import io
+
+from PIL import Image
+from sqlalchemy import text
+
+from app.database import engine
+from app.models.library_models import LibraryCover
+from app.services.cover_storage import CoverStorage, check_cover_storage
+from app.services.material_service import MaterialService
+
+
+def png_data_url(color=(200, 80, 120)) -> str:
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), color).save(buffer, format="PNG")
+    return "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+def test_migrated_cover_is_served_by_url_in_detail(db, make_material):
+    material = make_material("Гайд с обложкой", cover_image=png_data_url())
+
+    cover_hash = CoverStorage(db).migrate_material(material.id)
+
+    assert cover_hash
+    detail = MaterialService(db).get_material_by_id(material.id)
+    assert detail["cover_image"] is None
+    assert detail["cover_url"].endswith(f"/materials/{material.id}/cover?v={cover_hash[:16]}")
+
+
+def test_external_cover_goes_through_cover_endpoint(db, make_material):
+    material = make_material("Гайд со ссылкой", cover_image="https://example.com/cover.jpg")
+
+    detail = MaterialService(db).get_material_by_id(material.id)
+
+    assert detail["cover_image"] is None
+    assert detail["cover_url"].endswith(f"/materials/{material.id}/cover")
+
+
+def test_material_without_cover_has_no_cover_url(db, make_material):
+    material = make_material("Без обложки")
+
+    assert "cover_url" not in MaterialService(db).get_material_by_id(material.id)
+
+
+def test_startup_check_creates_nothing(monkeypatch):
+    assert check_cover_storage() == []
+
+    # Без таблицы хранилища — только предупреждение, DDL не выполняется
+    monkeypatch.setattr(LibraryCover, "__tablename__", "library_covers_missing")
+    assert check_cover_storage() == ["library_covers_missing"]
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM sqlite_master WHERE name = 'library_covers_missing'")).scalar() == 0
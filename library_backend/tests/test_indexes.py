@@ -0,0 +1,36 @@
+"""Индексы под горячие запросы: проверка при старте без DDL, создание миграцией"""
+
+from sqlalchemy import text
+
+from app.database import engine
+from app.services import check_indexes, ensure_indexes
+from app.services.indexes import HOT_INDEXES
+
+
+def schema_sql() -> list:
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT type, name, sql FROM sqlite_master ORDER BY name")).all()
+
+
+def test_startup_check_reports_missing_indexes_without_ddl():
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX IF EXISTS idx_views_user_viewed"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_views_user ON library_views (user_id)"))
+    before = schema_sql()
+
+    missing = check_indexes()
+
+    assert "idx_views_user_viewed" in missing
+    assert schema_sql() == before
+
+
+def test_migration_creates_hot_indexes_and_drops_superseded():
+    with engine.begin() as conn:
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_views_user ON library_views (user_id)"))
+
+    ensure_indexes()
+
+    names = {name for _, name, _ in schema_sql()}
+    assert "idx_views_user" not in names
+    assert {name for name, table, _ in HOT_INDEXES if table == "library_views"} <= names
+    assert check_indexes() == []
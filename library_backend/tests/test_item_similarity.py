@@ -0,0 +1,84 @@
+"""Модель похожих материалов: сборка по просмотрам и общий файл для workers"""
+
+import importlib
+
+import pytest
+from sqlalchemy import text
+
+pytest.importorskip("numpy")
+pytest.importorskip("scipy")
+
+from app.services.item_similarity import ItemSimilarity, build_model  # noqa: E402
+
+item_similarity_module = importlib.import_module("app.services.item_similarity")
+
+
+def add_views(db, views):
+    db.execute(
+        text("INSERT INTO library_views (material_id, user_id, viewed_at) VALUES (:material_id, :user_id, CURRENT_TIMESTAMP)"),
+        [{"material_id": material_id, "user_id": user_id} for user_id, material_id in views]
+    )
+    db.commit()
+
+
+def neighbors(model, material_id: int) -> dict:
+    row = model.similarity.getrow(model.columns[material_id])
+    return {int(model.material_ids[col]): round(float(value), 3) for col, value in zip(row.indices, row.data)}
+
+
+@pytest.fixture
+def views(db, make_material):
+    first, second, third = (make_material(f"Гайд #{number}") for number in range(3))
+    # Пользователь 1 смотрел первый материал трижды — это одна пара
+    add_views(db, [(1, first.id), (1, first.id), (1, first.id), (1, second.id), (2, first.id), (2, third.id)])
+    return first.id, second.id, third.id
+
+
+def test_build_model_counts_each_user_once(db, views, monkeypatch):
+    first, second, third = views
+    monkeypatch.setattr(item_similarity_module, "FETCH_BATCH", 1)
+
+    model = build_model(db, neighbors=5)
+
+    assert model.pairs == 4
+    # |U1 ∩ U2| / sqrt(|U1| · |U2|) = 1 / sqrt(2 · 1)
+    assert neighbors(model, first) == {second: 0.707, third: 0.707}
+    assert neighbors(model, second) == {first: 0.707}
+
+
+def test_build_model_without_views(db):
+    assert build_model(db, neighbors=5) is None
+
+
+def test_shared_model_is_built_once(db, tmp_path, views, monkeypatch):
+    path = tmp_path / "model.npz"
+    builder = ItemSimilarity(neighbors=5, interval_seconds=60, shared_path=str(path))
+    built = builder.rebuild(db)
+    assert path.exists()
+
+    # Другой worker читает файл, а не строит модель заново
+    monkeypatch.setattr(item_similarity_module, "build_model", lambda *args: pytest.fail("модель построена второй раз"))
+    reader = ItemSimilarity(neighbors=5, interval_seconds=60, shared_path=str(path))
+    loaded = reader.rebuild(db)
+
+    assert loaded.built_at == built.built_at
+    assert list(loaded.material_ids) == list(built.material_ids)
+    assert (loaded.similarity != built.similarity).nnz == 0
+    assert loaded.recommend([views[1]], [views[1]], limit=5) == built.recommend([views[1]], [views[1]], limit=5)
+
+
+def test_empty_shared_model_resets_other_workers(db, tmp_path, views):
+    path = tmp_path / "model.npz"
+    builder = ItemSimilarity(neighbors=5, interval_seconds=0, shared_path=str(path))
+    reader = ItemSimilarity(neighbors=5, interval_seconds=60, shared_path=str(path))
+    builder.rebuild(db)
+    assert reader.rebuild(db) is not None
+
+    db.execute(text("DELETE FROM library_views"))
+    db.commit()
+    assert builder.rebuild(db) is None
+
+    # Файл остаётся (пустая модель), и другой worker сбрасывает свою
+    assert path.exists()
+    assert reader.rebuild(db) is None
+    assert reader.model is None
@@ -0,0 +1,98 @@
+"""Проверка JWT: бэкенды jose/hmac и LRU проверенных токенов"""
+
+import base64
+import json
+import time
+from datetime import timedelta
+
+import pytest
+from jose import jwt
+
+from app.config import settings
+from app.utils import auth
+from app.utils.auth import ACCESS_TOKEN, TokenCache, create_access_token, create_token, verify_token
+
+BACKENDS = ["jose", "hmac"]
+
+
+def b64(data: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).rstrip(b"=").decode()
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request, monkeypatch):
+    monkeypatch.setattr(settings, "JWT_BACKEND", request.param)
+    auth.token_cache.clear()
+    return request.param
+
+
+def test_backends_decode_same_payload():
+    token = create_token({"telegram_id": 1, "first_name": "Анна"}, ACCESS_TOKEN, timedelta(minutes=5))
+
+    assert auth._decode_hmac(token) == auth._decode_jose(token)
+
+
+def test_valid_token_is_accepted(backend):
+    payload = verify_token(create_access_token({"telegram_id": 42}))
+
+    assert payload["telegram_id"] == 42
+
+
+@pytest.mark.parametrize("mutate", [
+    pytest.param(lambda h, p, s: f"{h}.{b64({'telegram_id': 1, 'exp': 9999999999})}.{s}", id="payload"),
+    pytest.param(lambda h, p, s: f"{h}.{p}.{s[:-4]}AAAA", id="signature"),
+    pytest.param(lambda h, p, s: f"{b64({'alg': 'none', 'typ': 'JWT'})}.{p}.", id="alg-none"),
+    pytest.param(lambda h, p, s: f"{b64({'alg': 'HS512', 'typ': 'JWT'})}.{p}.{s}", id="alg-switch"),
+    pytest.param(lambda h, p, s: f"{h}.{p}", id="two-segments"),
+    pytest.param(lambda h, p, s: "мусор", id="garbage"),
+])
+def test_tampered_token_is_rejected(backend, mutate):
+    header, payload, signature = create_access_token({"telegram_id": 42}).split(".")
+
+    assert verify_token(mutate(header, payload, signature)) is None
+
+
+def test_expired_token_is_rejected(backend):
+    assert verify_token(create_access_token({"telegram_id": 42}, timedelta(seconds=-1))) is None
+
+
+def test_token_signed_with_other_key_is_rejected(backend):
+    token = jwt.encode({"telegram_id": 42, "exp": time.time() + 60}, "другой ключ", algorithm=settings.ALGORITHM)
+
+    assert verify_token(token) is None
+
+
+def test_cached_payload_is_a_copy(backend):
+    token = create_access_token({"telegram_id": 42})
+
+    verify_token(token)["telegram_id"] = 1
+
+    assert verify_token(token)["telegram_id"] == 42
+
+
+def test_cache_drops_expired_entries():
+    cache = TokenCache(max_size=10)
+    cache.put("fresh", {"telegram_id": 1, "exp": time.time() + 60})
+    cache.put("expired", {"telegram_id": 1, "exp": time.time() - 1})
+
+    assert cache.get("fresh") is not None
+    assert cache.get("expired") is None
+
+
+def test_cache_evicts_least_recently_used():
+    cache = TokenCache(max_size=2)
+    cache.put("a", {"n": 1})
+    cache.put("b", {"n": 2})
+    cache.get("a")
+    cache.put("c", {"n": 3})
+
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+
+
+def test_cache_can_be_disabled():
+    cache = TokenCache(max_size=0)
+    cache.put("a", {"n": 1})
+
+    assert cache.get("a") is None
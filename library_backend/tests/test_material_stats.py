@@ -0,0 +1,95 @@
+"""Статистика популярности: запись просмотров, сверка, «популярное» и проверка таблицы при старте"""
+
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+
+from app.database import engine
+from app.models.library_models import LibraryMaterialStats
+from app.services import check_material_stats, reconcile_material_stats
+from app.services.material_service import MaterialService
+from app.services.view_ingest import write_views
+
+
+def viewed_at(days_ago: float = 0) -> str:
+    return (datetime.now(timezone.utc) - timedelta(days=days_ago)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def stats(db, material_id: int) -> dict:
+    row = db.execute(
+        text("SELECT * FROM library_material_stats WHERE material_id = :material_id"), {"material_id": material_id}
+    ).mappings().first()
+    return dict(row) if row else None
+
+
+def test_startup_check_and_reconcile_skip_missing_table(db, monkeypatch):
+    assert check_material_stats() == []
+
+    monkeypatch.setattr(LibraryMaterialStats, "__tablename__", "library_material_stats_missing")
+    assert check_material_stats() == ["library_material_stats_missing"]
+    assert reconcile_material_stats(db) == {"rows": 0}
+    with engine.connect() as conn:
+        created = conn.execute(text("SELECT COUNT(*) FROM sqlite_master WHERE name = 'library_material_stats_missing'"))
+        assert created.scalar() == 0
+
+
+def test_record_views_counts_each_viewer_once(db, make_material):
+    material = make_material("Гайд")
+
+    # Повторные просмотры в одной пачке — один зритель
+    write_views(db, [(material.id, 1, 10, viewed_at())] * 3 + [(material.id, 2, 10, viewed_at())])
+    assert stats(db, material.id)["views_total"] == 4
+    assert stats(db, material.id)["unique_viewers"] == 2
+
+    # ... и в следующих пачках: зритель 1 уже учтён
+    write_views(db, [(material.id, 1, 10, viewed_at()), (material.id, 3, 10, viewed_at())])
+    row = stats(db, material.id)
+    assert (row["views_total"], row["unique_viewers"], row["views_7d"], row["views_30d"]) == (6, 3, 6, 6)
+    assert row["trending_score"] is not None
+
+
+def test_reconcile_fixes_drift_windows_and_orphans(db, make_material):
+    material, unviewed = make_material("Гайд"), make_material("Без просмотров")
+    db.execute(
+        text("INSERT INTO library_views (material_id, user_id, viewed_at) VALUES (:material_id, :user_id, :viewed_at)"),
+        [
+            {"material_id": material.id, "user_id": 1, "viewed_at": viewed_at()},
+            {"material_id": material.id, "user_id": 2, "viewed_at": viewed_at(days_ago=10)},
+            {"material_id": material.id, "user_id": 1, "viewed_at": viewed_at(days_ago=40)},
+        ]
+    )
+    db.execute(
+        text("INSERT INTO library_favorites (user_id, material_id) VALUES (1, :material_id)"), {"material_id": material.id}
+    )
+    # Расхождение, строка без просмотров и строка удалённого материала
+    db.add_all([
+        LibraryMaterialStats(material_id=material.id, views_total=1, unique_viewers=1, views_7d=3, views_30d=3),
+        LibraryMaterialStats(material_id=unviewed.id, views_total=2),
+        LibraryMaterialStats(material_id=unviewed.id + 1000, views_total=7),
+    ])
+    db.commit()
+
+    assert reconcile_material_stats(db) == {"rows": 3}
+
+    row = stats(db, material.id)
+    # 7 дней — только сегодняшний просмотр, 30 дней — ещё и 10-дневный
+    assert (row["views_total"], row["unique_viewers"], row["views_7d"], row["views_30d"]) == (3, 2, 1, 2)
+    assert row["favorites"] == 1
+    assert stats(db, unviewed.id) is None
+    assert stats(db, unviewed.id + 1000) is None
+    # Повторная сверка ничего не меняет
+    assert reconcile_material_stats(db) == {"rows": 0}
+
+
+def test_popular_ranks_by_views_total(db, make_material, set_views_total):
+    # Счётчик library_materials.views разошёлся со статистикой — верна статистика
+    drifted = make_material("Разошёлся счётчик", views=100)
+    popular = make_material("Популярный", views=0)
+    set_views_total(drifted.id, 1)
+    set_views_total(popular.id, 5)
+    service = MaterialService(db)
+
+    assert [item["id"] for item in service.get_popular(limit=2)] == [popular.id, drifted.id]
+    for cursor in (None, ""):
+        result = service.get_materials(sort="views_desc", cursor=cursor, include_drafts=True, is_admin=True)
+        assert [item["id"] for item in result["items"]] == [popular.id, drifted.id]
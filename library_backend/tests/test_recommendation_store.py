@@ -0,0 +1,124 @@
+"""Готовые рекомендации: расчёт при первом запросе, фоновый пересчёт и проверка таблицы при старте"""
+
+import importlib
+
+import pytest
+from sqlalchemy import text
+
+from app.database import engine
+from app.models.library_models import LibraryRecommendation
+from app.services import check_recommendation_store
+from app.services.recommendation_store import RecommendationStore
+
+store_module = importlib.import_module("app.services.recommendation_store")
+
+
+def test_startup_check_reports_missing_table_without_ddl(monkeypatch):
+    assert check_recommendation_store() == []
+
+    monkeypatch.setattr(LibraryRecommendation, "__tablename__", "library_recommendations_missing")
+    assert check_recommendation_store() == ["library_recommendations_missing"]
+    with engine.connect() as conn:
+        created = conn.execute(text("SELECT COUNT(*) FROM sqlite_master WHERE name = 'library_recommendations_missing'"))
+        assert created.scalar() == 0
+
+
+@pytest.fixture
+def computed(monkeypatch):
+    """Подменяет RecommendationService: список пользователей, для которых считали рекомендации"""
+    calls = []
+
+    class FakeService:
+        def __init__(self, db):
+            self.db = db
+
+        def get_recommendations(self, user_id, limit):
+            calls.append(user_id)
+            materials = [{"id": row[0]} for row in self.db.execute(text("SELECT id FROM library_materials ORDER BY id"))]
+            return {"type": "similar", "title": "Похожие", "materials": materials[:limit]}
+
+    monkeypatch.setattr(store_module, "RecommendationService", FakeService)
+    return calls
+
+
+def make_store(max_age_seconds: int = 3600) -> RecommendationStore:
+    return RecommendationStore(max_entries=100, cache_ttl_seconds=3600, max_age_seconds=max_age_seconds, persist=True)
+
+
+def add_view(db, user_id: int, material_id: int) -> int:
+    view_id = db.execute(
+        text("INSERT INTO library_views (material_id, user_id, viewed_at) VALUES (:material_id, :user_id, CURRENT_TIMESTAMP)"),
+        {"material_id": material_id, "user_id": user_id}
+    ).lastrowid
+    db.commit()
+    return view_id
+
+
+def stored_watermark(db, user_id: int) -> int:
+    return db.execute(
+        text("SELECT view_watermark FROM library_recommendations WHERE user_id = :user_id"), {"user_id": user_id}
+    ).scalar()
+
+
+def test_first_request_computes_and_stores(db, make_material, computed):
+    material = make_material("Гайд")
+    store = make_store()
+
+    response = store.get(db, user_id=1, limit=5)
+
+    assert computed == [1]
+    assert [m["id"] for m in response["materials"]] == [material.id]
+    assert response["generated_at"]
+    # Повторный запрос — из LRU, другой worker — из таблицы
+    assert store.get(db, user_id=1, limit=5) == response
+    assert make_store().get(db, user_id=1, limit=5) == response
+    assert computed == [1]
+
+
+def test_stale_entry_is_served_and_queued(db, make_material, computed):
+    make_material("Гайд")
+    make_store().get(db, user_id=1, limit=5)
+    store = make_store(max_age_seconds=0)
+
+    response = store.get(db, user_id=1, limit=5)
+
+    # Старый результат отдан сразу, пересчёт — в фоне
+    assert computed == [1]
+    assert store._pending == {1}
+    assert response["materials"]
+
+    assert store.refresh_changed(db) == {"refreshed": 1, "left": 0}
+    assert computed == [1, 1]
+    assert store._pending == set()
+
+
+def test_refresh_changed_advances_watermark(db, make_material, computed):
+    material = make_material("Гайд")
+    store = make_store()
+    store.get(db, user_id=1, limit=5)
+    store.get(db, user_id=2, limit=5)
+    assert store.refresh_changed(db) == {"refreshed": 0, "left": 0}
+
+    view_id = add_view(db, user_id=1, material_id=material.id)
+    assert store.refresh_changed(db) == {"refreshed": 1, "left": 0}
+    assert computed == [1, 2, 1]
+    assert store.watermark == view_id
+    assert stored_watermark(db, 1) == view_id
+
+    # Новых просмотров нет — пересчитывать некого
+    assert store.refresh_changed(db) == {"refreshed": 0, "left": 0}
+    assert computed == [1, 2, 1]
+
+
+def test_refresh_skips_users_recomputed_by_another_worker(db, make_material, computed):
+    material = make_material("Гайд")
+    first, second = make_store(), make_store()
+    first.get(db, user_id=1, limit=5)
+    first.refresh_changed(db)
+    second.refresh_changed(db)
+
+    view_id = add_view(db, user_id=1, material_id=material.id)
+    assert first.refresh_changed(db) == {"refreshed": 1, "left": 0}
+    assert second.refresh_changed(db) == {"refreshed": 0, "left": 0}
+    assert computed == [1, 1]
+    assert second.watermark == view_id
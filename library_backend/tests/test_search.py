@@ -0,0 +1,164 @@
+"""Полнотекстовый поиск: стеммер, нормализация, индекс FTS5 и фильтры поиска"""
+
+import pytest
+from sqlalchemy import text
+
+from app.services import search_service
+from app.services.material_service import MaterialService
+from app.services.search_service import (
+    SearchService, build_match_query, check_search_index, ensure_search_index, normalize_text, stem
+)
+
+
+@pytest.fixture
+def search_index(db):
+    if not ensure_search_index(db):
+        pytest.skip("SQLite собран без FTS5")
+
+
+def index(db, *materials):
+    service = SearchService(db)
+    for material in materials:
+        service.index_material(material)
+
+
+@pytest.mark.parametrize("forms", [
+    ("материнство", "материнства", "материнству"),
+    ("продажи", "продажа", "продаж"),
+    ("сценарий", "сценария", "сценарии"),
+    ("сторис", "сторис"),
+])
+def test_stem_merges_word_forms(forms):
+    assert len({stem(word) for word in forms}) == 1
+
+
+def test_stem_keeps_non_cyrillic_words():
+    assert stem("Reels") == "reels"
+    assert stem("2025") == "2025"
+
+
+def test_normalize_text_strips_html_and_entities():
+    assert normalize_text("<p>Продающие&nbsp;<b>сторис</b></p>") == f"{stem('продающие')} {stem('сторис')}"
+
+
+def test_match_query_drops_stop_words_and_uses_prefixes():
+    assert build_match_query("идеи для reels") == f'"{stem("идеи")}"* "reels"*'
+    # Запрос из одних служебных слов не превращается в пустой
+    assert build_match_query("для") == f'"{stem("для")}"*'
+    assert build_match_query("!!!") is None
+
+
+def test_search_finds_other_word_forms_and_ranks_title_first(db, search_index, make_material):
+    in_title = make_material("Продажи в сторис")
+    in_content = make_material("Гайд для мам", content="<p>Как устроены продажи</p>")
+    unrelated = make_material("Вирусные звуки недели")
+    index(db, in_title, in_content, unrelated)
+
+    result = MaterialService(db).get_materials(search="продажа", sort="relevance")
+
+    assert [item["id"] for item in result["items"]] == [in_title.id, in_content.id]
+    assert result["total"] == 2
+
+
+def test_search_index_follows_material_updates(db, search_index, make_material):
+    material = make_material("Сценарий для Reels")
+    index(db, material)
+
+    material.title = "Личный бренд эксперта"
+    db.commit()
+    index(db, material)
+
+    service = MaterialService(db)
+    assert service.get_materials(search="сценарий")["total"] == 0
+    assert service.get_materials(search="бренд")["total"] == 1
+
+    SearchService(db).remove_material(material.id)
+    assert service.get_materials(search="бренд")["items"] == []
+
+
+def test_filtered_search_returns_every_match(db, search_index, make_material):
+    # Совпадений больше, чем помещается на страницу; нужный формат — у самых нерелевантных
+    for number in range(12):
+        index(db, make_material(f"Сторис сторис сторис #{number}", format="reels"))
+    guides = [make_material(f"Гайд #{number}", content="сторис", format="guide") for number in range(3)]
+    index(db, *guides)
+
+    service = MaterialService(db)
+    result = service.get_materials(search="сторис", format="guide", page_size=2)
+    assert result["total"] == 3
+    assert {item["id"] for item in result["items"]} <= {material.id for material in guides}
+
+    by_date = service.get_materials(search="сторис", sort="created_asc", page_size=100)
+    assert by_date["total"] == 15
+    assert len(by_date["items"]) == 15
+
+
+def test_search_subquery_is_not_truncated(db, search_index):
+    # Отбор кандидатов по релевантности терял совпадения до фильтров и сортировок
+    subquery = SearchService(db).match_subquery("сторис")
+    assert "LIMIT" not in str(subquery.element).upper()
+
+
+def test_search_falls_back_to_ilike_without_index(db, make_material, monkeypatch):
+    monkeypatch.setattr(search_service, "_fts_available", False)
+    make_material("Продажи в сторис")
+    make_material("Вирусные звуки")
+
+    result = MaterialService(db).get_materials(search="сторис")
+
+    assert [item["title"] for item in result["items"]] == ["Продажи в сторис"]
+
+
+def test_startup_check_reports_missing_index_without_ddl(db, search_index, monkeypatch):
+    monkeypatch.setattr(search_service, "_fts_available", search_service._fts_available)
+    assert check_search_index(db) is True
+
+    monkeypatch.setattr(search_service, "FTS_TABLE", "library_materials_fts_missing")
+    assert check_search_index(db) is False
+    assert search_service.is_search_index_available() is False
+    created = db.execute(text("SELECT COUNT(*) FROM sqlite_master WHERE name = 'library_materials_fts_missing'"))
+    assert created.scalar() == 0
+
+
+def test_deleted_tag_is_removed_from_index(db, search_index, make_material):
+    from app.api.admin import delete_tag
+    from app.models.library_models import LibraryTag, materials_tags
+
+    material = make_material("Гайд для мам")
+    tag = LibraryTag(name="Монтаж", slug="montazh")
+    db.add(tag)
+    db.commit()
+    db.execute(materials_tags.insert().values(material_id=material.id, tag_id=tag.id))
+    db.commit()
+    index(db, material)
+    service = MaterialService(db)
+    assert service.get_materials(search="монтаж")["total"] == 1
+
+    delete_tag(tag.id, db=db, admin={})
+
+    assert service.get_materials(search="монтаж")["items"] == []
+    assert service.get_materials(search="гайд")["total"] == 1
+
+
+def test_reconcile_repairs_missed_index_writes(db, search_index, make_material):
+    indexed = make_material("Сторис для мам")
+    missing = make_material("Продажи в reels")
+    index(db, indexed)
+    # Запись в индекс не удалась: новое название не попало, второй материал не проиндексирован,
+    # а удалённый материал остался в индексе
+    indexed.title = "Личный бренд"
+    db.commit()
+    db.execute(
+        text(f"INSERT INTO {search_service.FTS_TABLE} (rowid, title) VALUES (:id, 'удален')"),
+        {"id": missing.id + 100}
+    )
+    db.commit()
+
+    assert search_service.reconcile_search_index(db) == 3
+    assert search_service.reconcile_search_index(db) == 0
+
+    service = MaterialService(db)
+    assert [item["id"] for item in service.get_materials(search="бренд")["items"]] == [indexed.id]
+    assert service.get_materials(search="сторис")["items"] == []
+    assert [item["id"] for item in service.get_materials(search="продажи")["items"]] == [missing.id]
+    assert service.get_materials(search="удален")["items"] == []
@@ -0,0 +1,142 @@
+"""Очередь просмотров: журнал на диске, повтор неудачной записи и replay"""
+
+import importlib
+import json
+import os
+import threading
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app.config import settings
+from app.services.view_ingest import ViewIngest, ViewIngestOverloaded
+
+# app.services.view_ingest в пакете — глобальная очередь, модуль берём из sys.modules
+view_ingest_module = importlib.import_module("app.services.view_ingest")
+
+
+def database_locked(*args):
+    raise OperationalError("INSERT INTO library_views", {}, Exception("database is locked"))
+
+
+@pytest.fixture
+def ingest(tmp_path):
+    queue = ViewIngest(journal_dir=tmp_path, batch_size=100, flush_interval=60, max_pending=5)
+    # Как в start(), но без фоновой задачи: flush вызывает сам тест
+    queue._start_journal()
+    yield queue
+    queue._stop_journal()
+
+
+def stored_views(db) -> list:
+    return db.execute(text("SELECT material_id, user_id FROM library_views ORDER BY id")).all()
+
+
+def material_views(db, material_id: int) -> int:
+    return db.execute(text("SELECT views FROM library_materials WHERE id = :id"), {"id": material_id}).scalar()
+
+
+def journal(tmp_path, pattern: str = "*") -> list:
+    return sorted(path.name.split("-", 2)[2] for path in tmp_path.glob(f"views-{pattern}"))
+
+
+def test_flush_writes_batch_and_removes_segment(db, tmp_path, ingest, make_material):
+    material = make_material("Гайд", views=0)
+    ingest.enqueue(material.id, 1, 30)
+    ingest.enqueue(material.id, 2)
+
+    assert ingest.flush() == 2
+
+    assert stored_views(db) == [(material.id, 1), (material.id, 2)]
+    assert material_views(db, material.id) == 2
+    assert journal(tmp_path) == ["2.log"]  # только новый активный сегмент
+
+
+def test_failed_flush_is_retried_on_next_flush(db, tmp_path, ingest, make_material, monkeypatch):
+    material = make_material("Гайд", views=0)
+    write_views = view_ingest_module.write_views
+    calls = []
+
+    def locked_once(session, views):
+        calls.append(len(views))
+        if len(calls) == 1:
+            database_locked()
+        return write_views(session, views)
+
+    monkeypatch.setattr(view_ingest_module, "write_views", locked_once)
+    ingest.enqueue(material.id, 1)
+    ingest.enqueue(material.id, 2)
+
+    assert ingest.flush() == 0
+    assert stored_views(db) == []
+    assert ingest.retrying == 2
+    assert journal(tmp_path, "*.flushing") == ["1.flushing"]
+
+    # Следующий тик: сначала старая пачка, затем новые просмотры
+    ingest.enqueue(material.id, 3)
+    assert ingest.flush() == 3
+
+    assert calls == [2, 2, 1]
+    assert stored_views(db) == [(material.id, 1), (material.id, 2), (material.id, 3)]
+    assert material_views(db, material.id) == 3
+    assert ingest.retrying == 0
+    assert journal(tmp_path, "*.flushing") == []
+
+
+def test_enqueue_leaves_journal_io_to_journal_thread(tmp_path, ingest, monkeypatch):
+    monkeypatch.setattr(settings, "VIEW_JOURNAL_FSYNC", True)
+    monkeypatch.setattr(view_ingest_module, "write_views", database_locked)
+    fsync, fsync_threads = os.fsync, []
+
+    def recording_fsync(fd):
+        fsync_threads.append(threading.current_thread().name)
+        fsync(fd)
+
+    monkeypatch.setattr(os, "fsync", recording_fsync)
+    ingest.enqueue(1, 1)
+    ingest.enqueue(1, 2)
+    ingest.flush()
+
+    assert fsync_threads and set(fsync_threads) == {"view-journal"}
+    # В запечатанном сегменте — ровно просмотры пачки
+    sealed = tmp_path / f"views-{os.getpid()}-1.flushing"
+    assert [view[:2] for view in ViewIngest._read_segment(sealed)] == [(1, 1), (1, 2)]
+
+
+def test_retrying_views_count_towards_queue_limit(ingest, monkeypatch):
+    monkeypatch.setattr(view_ingest_module, "write_views", database_locked)
+    for user_id in range(4):
+        ingest.enqueue(1, user_id)
+    ingest.flush()
+
+    ingest.enqueue(1, 10)
+    with pytest.raises(ViewIngestOverloaded):
+        ingest.enqueue(1, 11)
+
+
+def test_views_of_deleted_materials_are_dropped(db, ingest, make_material):
+    material = make_material("Гайд", views=0)
+    ingest.enqueue(material.id, 1)
+    ingest.enqueue(material.id + 100, 1)
+
+    assert ingest.flush() == 1
+    assert stored_views(db) == [(material.id, 1)]
+
+
+def test_replay_writes_segments_of_dead_processes(db, tmp_path, make_material):
+    material = make_material("Гайд", views=0)
+    dead_pid = 2 ** 22 + 1  # выше pid_max по умолчанию — такого процесса нет
+    segment = tmp_path / f"views-{dead_pid}-3.flushing"
+    segment.write_text(
+        json.dumps([material.id, 7, 15, "2026-10-01 10:00:00"]) + "\n"
+        + json.dumps([material.id, 8, None, "2026-10-01 10:00:05"]) + "\n"
+        + '[1, 2, "недописан'  # строка, оборванная падением процесса
+    )
+
+    replayed = ViewIngest(journal_dir=tmp_path, batch_size=100, flush_interval=60, max_pending=10).replay()
+
+    assert replayed == 2
+    assert stored_views(db) == [(material.id, 7), (material.id, 8)]
+    assert not segment.exists()
+    assert journal(tmp_path) == []
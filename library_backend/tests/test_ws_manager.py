@@ -0,0 +1,88 @@
+"""ConnectionManager: регистрация соединения и её откат при ошибке Redis"""
+
+import asyncio
+
+import pytest
+
+from app.api.websocket import ConnectionManager
+
+USER = {"telegram_id": 1, "first_name": "Анна"}
+
+
+class StubSocket:
+    async def accept(self):
+        pass
+
+    async def send_text(self, data: str):
+        pass
+
+    async def close(self, code: int, reason: str):
+        pass
+
+
+def manager_with(join, snapshot=None):
+    """Менеджер без настоящего Redis: скрипты и снимок подменены"""
+    manager = ConnectionManager()
+    manager.redis = object()  # init_redis() не подключается
+    manager.leaves = []
+    manager._join_script = join
+
+    async def leave(keys, args):
+        manager.leaves.append(args[2])
+    manager._leave_script = leave
+
+    if snapshot is not None:
+        manager.snapshot_message = snapshot
+    return manager
+
+
+async def ok(*args, **kwargs):
+    return '{"type": "presence_snapshot"}'
+
+
+async def redis_down(*args, **kwargs):
+    raise ConnectionError("Redis недоступен")
+
+
+def writers() -> set:
+    return {task for task in asyncio.all_tasks() if task.get_coro().__name__ == "_write"}
+
+
+def test_connect_and_disconnect_register_connection():
+    async def scenario():
+        manager = manager_with(join=ok, snapshot=ok)
+        connection = await manager.connect(StubSocket(), USER, "admin", frozenset({"presence"}))
+        registered = (
+            {user_id: set(connections) for user_id, connections in manager.local_connections["admin"].items()},
+            {topics: set(connections) for topics, connections in manager._audiences.items()},
+        )
+        await manager.disconnect(connection)
+        return manager, connection, registered
+
+    manager, connection, (local, audiences) = asyncio.run(scenario())
+
+    assert local == {1: {connection}}
+    assert audiences == {frozenset({"presence"}): {connection}}
+    assert manager.local_connections["admin"] == {} and manager._audiences == {}
+    assert manager.leaves == [1]
+
+
+@pytest.mark.parametrize("join, snapshot, leaves", [
+    pytest.param(redis_down, ok, [], id="join-fails"),
+    pytest.param(ok, redis_down, [1], id="snapshot-fails"),
+])
+def test_failed_connect_is_rolled_back(join, snapshot, leaves):
+    async def scenario():
+        manager = manager_with(join=join, snapshot=snapshot)
+        with pytest.raises(ConnectionError):
+            await manager.connect(StubSocket(), USER, "admin", frozenset({"presence"}))
+        await asyncio.sleep(0)  # отменённый писатель завершается
+        return manager, writers()
+
+    manager, running = asyncio.run(scenario())
+
+    assert manager.local_connections["admin"] == {}
+    assert manager._audiences == {}
+    assert manager._profiles == {}
+    assert manager.leaves == leaves
+    assert running == set()
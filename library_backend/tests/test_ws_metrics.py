@@ -0,0 +1,63 @@
+"""Счётчики подключений WebSocket: GET /api/ws/metrics только админам, исходы подключений"""
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app.api import websocket
+from app.services import ADMIN_IDS, issue_tokens, load_claims
+
+TELEGRAM_ID = 700000003
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # Свежие счётчики на тест; только роутер WS — без startup-событий main и без Redis
+    monkeypatch.setattr(websocket, "connect_metrics", websocket.ConnectMetrics())
+    app = FastAPI()
+    app.include_router(websocket.router)
+    return TestClient(app)
+
+
+def access_token(db, make_user, telegram_id: int) -> str:
+    make_user(telegram_id)
+    return issue_tokens(load_claims(db, telegram_id))["access_token"]
+
+
+def connect(client, query: str) -> int:
+    with pytest.raises(WebSocketDisconnect) as closed:
+        with client.websocket_connect(f"/ws/presence?{query}") as connection:
+            connection.receive_text()
+    return closed.value.code
+
+
+def test_metrics_require_admin(db, make_user, client):
+    assert client.get("/api/ws/metrics").status_code == 403
+
+    token = access_token(db, make_user, TELEGRAM_ID)
+    assert client.get("/api/ws/metrics", headers={"Authorization": f"Bearer {token}"}).status_code == 403
+
+
+def test_metrics_count_connect_outcomes(db, make_user, client):
+    admin_token = access_token(db, make_user, ADMIN_IDS[0])
+    token = access_token(db, make_user, TELEGRAM_ID)
+
+    assert connect(client, "token=мусор") == 4001
+    assert connect(client, f"token={token}&page=unknown") == 4000
+    assert connect(client, f"token={token}&page=admin") == 4003
+
+    response = client.get("/api/ws/metrics", headers={"Authorization": f"Bearer {admin_token}"})
+
+    assert response.status_code == 200
+    metrics = response.json()
+    assert metrics["counters"] == {
+        "attempts": 3,
+        "rejected_invalid_token": 1,
+        "rejected_bad_request": 1,
+        "rejected_forbidden": 1,
+        "profile_from_token": 1,
+    }
+    assert metrics["connects_last_minute"] == 3
+    assert set(metrics["auth_ms"]) == {"p50", "p95", "max"}
+    assert metrics["open_connections"] == {"library": 0, "admin": 0}
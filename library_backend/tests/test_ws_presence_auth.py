@@ -0,0 +1,57 @@
+"""Авторизация /ws/presence: отказ до подключения к Redis"""
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app.api import websocket
+from app.services import ADMIN_IDS, issue_tokens, load_claims
+
+TELEGRAM_ID = 700000002
+
+
+@pytest.fixture
+def client():
+    # Только роутер WS: без startup-событий main и без Redis
+    app = FastAPI()
+    app.include_router(websocket.router)
+    return TestClient(app)
+
+
+def close_code(client, token: str) -> int:
+    with pytest.raises(WebSocketDisconnect) as closed:
+        with client.websocket_connect(f"/ws/presence?token={token}") as connection:
+            connection.receive_text()
+    return closed.value.code
+
+
+def test_refresh_token_is_rejected(db, make_user, client):
+    make_user(TELEGRAM_ID)
+    tokens = issue_tokens(load_claims(db, TELEGRAM_ID))
+
+    assert close_code(client, tokens["refresh_token"]) == 4001
+
+
+def test_invalid_token_is_rejected(client):
+    assert close_code(client, "мусор") == 4001
+
+
+def test_admin_page_requires_admin(db, make_user, client):
+    make_user(TELEGRAM_ID)
+    token = issue_tokens(load_claims(db, TELEGRAM_ID))["access_token"]
+
+    with pytest.raises(WebSocketDisconnect) as closed:
+        with client.websocket_connect(f"/ws/presence?token={token}&page=admin&topics=admin_actions") as connection:
+            connection.receive_text()
+
+    assert closed.value.code == 4003
+
+
+@pytest.mark.parametrize("telegram_id, admin_group, allowed", [
+    pytest.param(ADMIN_IDS[0], None, True, id="admin-ids"),
+    pytest.param(TELEGRAM_ID, "moderator", True, id="admin-group"),
+    pytest.param(TELEGRAM_ID, None, False, id="subscriber"),
+])
+def test_admin_page_access(telegram_id, admin_group, allowed):
+    assert websocket.can_watch_admin(telegram_id, {"admin_group": admin_group}) is allowed
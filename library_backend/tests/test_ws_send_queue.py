@@ -0,0 +1,93 @@
+"""Очередь отправки WebSocket: медленный клиент отключается, не задерживая рассылку"""
+
+import asyncio
+
+import pytest
+
+from app.api.websocket import ClientConnection, Frame
+from app.config import settings
+
+
+class StubSocket:
+    """WebSocket, который пишет кадры в список или зависает на отправке"""
+
+    def __init__(self, stalled: bool = False):
+        self.stalled = stalled
+        self.sent = []
+        self.closed_with = None
+
+    async def send_text(self, data: str):
+        await self._send(data)
+
+    async def send_bytes(self, data: bytes):
+        await self._send(data)
+
+    async def _send(self, data):
+        if self.stalled:
+            await asyncio.sleep(3600)
+        self.sent.append(data)
+
+    async def close(self, code: int, reason: str):
+        self.closed_with = (code, reason)
+
+
+def run(scenario):
+    return asyncio.run(scenario())
+
+
+def connect(socket: StubSocket, frame_format: str = "json") -> ClientConnection:
+    return ClientConnection(socket, "library", 1, frozenset({"presence"}), frame_format)
+
+
+def test_frames_are_sent_in_connection_format():
+    async def scenario():
+        text_socket, bin_socket = StubSocket(), StubSocket()
+        frame = Frame('{"type": "presence"}')
+        connections = [connect(text_socket), connect(bin_socket, "bin")]
+        for connection in connections:
+            assert connection.send(frame)
+            assert connection.send("pong")
+        await asyncio.sleep(0.01)
+        for connection in connections:
+            connection.stop()
+        return text_socket.sent, bin_socket.sent
+
+    text_sent, bin_sent = run(scenario)
+
+    assert text_sent == ['{"type": "presence"}', "pong"]
+    assert bin_sent == [b'{"type": "presence"}', "pong"]
+
+
+def test_full_queue_evicts_client(monkeypatch):
+    monkeypatch.setattr(settings, "WS_SEND_QUEUE_SIZE", 2)
+
+    async def scenario():
+        socket = StubSocket(stalled=True)
+        connection = connect(socket)
+        # Рассылка идёт подряд, без await: писатель не успевает разобрать очередь
+        results = [connection.send(Frame(str(number))) for number in range(4)]
+        await asyncio.sleep(0)
+        return connection, socket, results
+
+    connection, socket, results = run(scenario)
+
+    assert results == [True, True, False, False]
+    assert connection.closed
+    assert socket.closed_with == (1013, "Slow consumer")
+
+
+def test_send_timeout_evicts_client(monkeypatch):
+    monkeypatch.setattr(settings, "WS_SEND_TIMEOUT_SECONDS", 0.01)
+
+    async def scenario():
+        socket = StubSocket(stalled=True)
+        connection = connect(socket)
+        connection.send(Frame("1"))
+        await asyncio.sleep(0.1)
+        return connection, socket
+
+    connection, socket = run(scenario)
+
+    assert connection.closed
+    assert socket.closed_with == (1013, "Slow consumer")
+    assert not connection.send(Frame("2"))
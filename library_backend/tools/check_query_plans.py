@@ -0,0 +1,127 @@
+"""
+Проверка планов SQL-запросов API: EXPLAIN QUERY PLAN для каждого запроса,
+код выхода 1, если какой-то запрос читает таблицу целиком (SCAN без индекса).
+
+Откуда берутся запросы:
+- по умолчанию — вызываются все GET-эндпоинты приложения (через ASGI, без сервера)
+  от имени --telegram-id, SQL перехватывается на sync- и async-движках;
+- --capture FILE — JSONL, записанный работающим API с SQL_CAPTURE_PATH=FILE
+  (там есть и запросы POST/PUT/DELETE).
+
+Запускать на копии боевой БД: часть GET-эндпоинтов пишет (приветственное уведомление).
+
+Запуск из library_backend/:
+    DATABASE_URL=sqlite:////tmp/library-copy.db python tools/check_query_plans.py
+    python tools/check_query_plans.py --capture /tmp/sql.jsonl --allow users
+"""
+
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Маленькие справочники: полный проход по ним дешевле индекса
+DEFAULT_ALLOWED = ["library_categories", "library_tags", "materials_categories", "materials_tags"]
+
+# Значения для path-параметров, если их не удалось взять из БД
+PATH_DEFAULTS = {"material_id": 1, "category_id": 1}
+
+
+def _sample_path_params(telegram_id: int) -> dict:
+    from sqlalchemy import text
+    from app.database import SessionLocal
+
+    params = dict(PATH_DEFAULTS, telegram_id=telegram_id)
+    db = SessionLocal()
+    try:
+        material_id = db.execute(text("SELECT MIN(id) FROM library_materials WHERE is_published = 1")).scalar()
+        category_id = db.execute(text("SELECT MIN(id) FROM library_categories")).scalar()
+    finally:
+        db.close()
+    if material_id:
+        params["material_id"] = material_id
+    if category_id:
+        params["category_id"] = category_id
+    return params
+
+
+def _get_routes(app, path_params: dict):
+    """GET-маршруты приложения с подставленными path- и обязательными query-параметрами"""
+    from fastapi.routing import APIRoute
+
+    for route in app.routes:
+        if not isinstance(route, APIRoute) or "GET" not in route.methods:
+            continue
+        names = [param.name for param in route.dependant.path_params]
+        if any(name not in path_params for name in names):
+            print(f"⚠️  Пропуск {route.path}: нет значения для path-параметра")
+            continue
+        query = {
+            param.name: 1 if param.type_ in (int, float) else "a"
+            for param in route.dependant.query_params
+            if param.required
+        }
+        yield route.path.format(**{name: path_params[name] for name in names}), query
+
+
+async def _drive(app, telegram_id: int) -> int:
+    import httpx
+    from app.utils.auth import create_access_token
+
+    headers = {"Authorization": f"Bearer {create_access_token({'telegram_id': telegram_id})}"}
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    failed = 0
+    await app.router.startup()  # startup-события: схема, фоновые задачи (их запросы тоже проверяются)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://check") as client:
+            for url, query in _get_routes(app, _sample_path_params(telegram_id)):
+                response = await client.get(url, params=query, headers=headers)
+                if response.status_code >= 500:
+                    failed += 1
+                    print(f"❌ GET {url} -> {response.status_code}")
+    finally:
+        await app.router.shutdown()
+    return failed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--capture", help="JSONL с запросами (SQL_CAPTURE_PATH работающего API)")
+    parser.add_argument("--telegram-id", type=int, help="От чьего имени вызывать эндпоинты (по умолчанию — первый админ)")
+    parser.add_argument("--allow", nargs="*", default=[], help="Таблицы, полный проход по которым допустим")
+    parser.add_argument("--no-default-allow", action="store_true", help=f"Не разрешать {', '.join(DEFAULT_ALLOWED)}")
+    args = parser.parse_args()
+
+    from app.database import async_engine, async_read_engine, engine, read_engine
+    from app.utils.query_plans import capture_sql, check_statements, format_problem, read_capture_log
+
+    if args.capture:
+        log = read_capture_log(args.capture)
+    else:
+        import main as api
+        from app.services import ADMIN_IDS
+
+        engines = [engine, read_engine, async_engine.sync_engine, async_read_engine.sync_engine]
+        with capture_sql(engines) as log:
+            failed = asyncio.run(_drive(api.app, args.telegram_id or ADMIN_IDS[0]))
+        if failed:
+            print(f"⚠️  Эндпоинтов с ошибкой 5xx: {failed}")
+    print(f"Запросов: {len(log)} уникальных, {log.calls} выполнено")
+
+    allowed = ([] if args.no_default_allow else DEFAULT_ALLOWED) + args.allow
+    with engine.connect() as conn:
+        problems = check_statements(conn, log, allowed)
+
+    for problem in problems:
+        print(f"\n❌ {format_problem(problem)}")
+    if problems:
+        print(f"\n❌ Запросов с полным проходом по таблице: {len(problems)}")
+        return 1
+    print("✅ Полных проходов по таблицам нет")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -229,8 +229,10 @@ export default function AdminPage() {
       }
       
       if (editingMaterial) {
-        // Редактирование
-        await api.put(`/materials/${editingMaterial.id}`, formData)
+        // Редактирование (неизменённую обложку не отправляем — она уже в хранилище)
+        const { cover_image, ...rest } = formData
+        const payload = cover_image === editingMaterial.cover_url ? rest : formData
+        await api.put(`/materials/${editingMaterial.id}`, payload)
         alert('✅ Материал обновлён!')
       } else {
         // Создание
@@ -286,7 +288,7 @@ export default function AdminPage() {
       content: material.content || '',
       category_ids: material.category_ids || (material.category_id ? [material.category_id] : []),
       format: material.format || 'article',
-      cover_image: material.cover_image || '',
+      cover_image: material.cover_image || material.cover_url || '',
       is_published: material.is_published,
       is_featured: material.is_featured
     })
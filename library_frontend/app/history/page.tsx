@@ -8,6 +8,7 @@ import { useScrollVisibility } from '@/hooks/useScrollVisibility'
 import { useAuthContext } from '@/contexts/AuthContext'
 import { LoadingSpinner, EmptyState } from '@/components/shared'
 import { useTheme } from '@/contexts/ThemeContext'
+import { getCoverSrcSet } from '@/lib/utils'
 
 export default function HistoryPage() {
   // Авторизация из контекста
@@ -135,7 +136,7 @@ export default function HistoryPage() {
                 </button>
                 <div onClick={() => openMaterial(material)} className="cursor-pointer">
                   {(material.cover_url || material.cover_image) ? (
-                    <img src={material.cover_url || material.cover_image} alt={material.title} className="w-full h-24 object-cover rounded-xl mb-3" />
+                    <img src={material.cover_url || material.cover_image} srcSet={getCoverSrcSet(material.cover_url)} sizes="(max-width: 640px) 50vw, 240px" loading="lazy" alt={material.title} className="w-full h-24 object-cover rounded-xl mb-3" />
                   ) : (
                     <div className="w-full h-24 bg-gradient-to-br from-[#C9A882] to-[#B08968] rounded-xl mb-3 flex items-center justify-center text-3xl">
                       {material.category?.icon || '📄'}
@@ -36,7 +36,8 @@ export default function LibraryPage() {
   } = useLibraryData()
   
   // WebSocket для отслеживания онлайн — включается только при активной подписке
-  usePresence('library', { enabled: hasSubscription })
+  // Рассылки странице не нужны (topics: []) — сокет только отмечает присутствие
+  usePresence('library', { enabled: hasSubscription, topics: [] })
   
   // Push уведомления
   const { isSupported: pushSupported, isSubscribed: pushSubscribed, toggle: togglePush, isLoading: pushLoading } = usePushNotifications()
@@ -165,6 +166,7 @@ export default function LibraryPage() {
         onMarkAllAsRead={markAllAsRead}
         onLogout={() => {
           localStorage.removeItem('access_token')
+          localStorage.removeItem('refresh_token')
           localStorage.removeItem('user')
           sessionStorage.removeItem('auth_error')
           router.push('/login')
@@ -70,6 +70,9 @@ export default function LoginPage() {
       // Успешная авторизация — очищаем флаг ошибки
       sessionStorage.removeItem('auth_error')
       localStorage.setItem('access_token', response.data.access_token)
+      if (response.data.refresh_token) {
+        localStorage.setItem('refresh_token', response.data.refresh_token)
+      }
       // Сохраняем user данные включая photo_url из Telegram
       const userToSave = {
         ...response.data.user,
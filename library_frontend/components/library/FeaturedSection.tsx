@@ -1,6 +1,7 @@
 'use client'
 
 import { useTheme } from '@/contexts/ThemeContext'
+import { getCoverSrcSet } from '@/lib/utils'
 
 interface MaterialItem {
   id: number
@@ -61,7 +62,7 @@ export function FeaturedSection({
             className={`flex-shrink-0 w-40 bg-gradient-to-br ${isDark ? darkGradient : `${gradientFrom} ${gradientTo}`} rounded-xl p-3 border ${isDark ? darkBorder : borderColor} hover:shadow-lg hover:-translate-y-0.5 transition-all cursor-pointer`}
           >
             {(material.cover_url || material.cover_image) ? (
-              <img src={material.cover_url || material.cover_image} alt={material.title} className="w-full h-20 object-cover rounded-lg mb-2" />
+              <img src={material.cover_url || material.cover_image} srcSet={getCoverSrcSet(material.cover_url)} sizes="160px" loading="lazy" alt={material.title} className="w-full h-20 object-cover rounded-lg mb-2" />
             ) : (
               <div className={`w-full h-20 bg-gradient-to-br ${isDark ? 'from-[#3D3D3D] to-[#2A2A2A]' : `${gradientFrom.replace('50', '200')} ${gradientTo.replace('50', '300')}`} rounded-lg mb-2 flex items-center justify-center text-2xl`}>
                 {material.categories?.[0]?.icon || material.category?.icon || icon}
@@ -2,6 +2,7 @@
 
 import { memo } from 'react'
 import { Badge } from '@/components/shared'
+import { getCoverSrcSet } from '@/lib/utils'
 
 // Локальный тип для материала (совместим с разными источниками)
 interface MaterialData {
@@ -85,6 +86,9 @@ export const MaterialCard = memo(function MaterialCard({
         {(material.cover_url || material.cover_image) ? (
           <img
             src={material.cover_url || material.cover_image}
+            srcSet={getCoverSrcSet(material.cover_url)}
+            sizes="(max-width: 640px) 50vw, 240px"
+            loading="lazy"
             alt={material.title}
             className="w-full h-24 object-cover rounded-xl mb-3"
           />
@@ -36,6 +36,7 @@ export function useAuth(): UseAuthReturn {
 
   const logout = useCallback(() => {
     localStorage.removeItem('access_token')
+    localStorage.removeItem('refresh_token')
     localStorage.removeItem('user')
     sessionStorage.removeItem('auth_error')
     setUser(null)
@@ -4,7 +4,7 @@ import { useEffect, useState, useCallback, useRef } from 'react'
 import { useRouter } from 'next/navigation'
 import { api } from '@/lib/api'
 import { ADMIN_IDS, DEFAULT_USER } from '@/lib/constants'
-import { Notification, Material, Category } from '@/lib/types'
+import { Notification, Material, Category, Recommendations } from '@/lib/types'
 
 const PAGE_SIZE = 30
 
@@ -22,13 +22,13 @@ export function useLibraryData() {
   const [isAdmin, setIsAdmin] = useState(false)
   const [materials, setMaterials] = useState<Material[]>([])
   const [apiCategories, setApiCategories] = useState<Category[]>([])
-  const [page, setPage] = useState(1)
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
   const [hasMore, setHasMore] = useState(true)
   const [loadingMore, setLoadingMore] = useState(false)
   const loadingMoreRef = useRef(false)
   const [favoriteIds, setFavoriteIds] = useState<Set<number>>(new Set())
   const [notifications, setNotifications] = useState<Notification[]>([])
-  const [recommendations, setRecommendations] = useState<{type: string, title: string, materials: Material[]}>({type: '', title: '', materials: []})
+  const [recommendations, setRecommendations] = useState<Recommendations>({type: '', title: '', materials: []})
   const [searchResults, setSearchResults] = useState<Material[] | null>(null)
   const [searching, setSearching] = useState(false)
 
@@ -100,6 +100,7 @@ export function useLibraryData() {
         console.error('Error loading subscription:', error)
         // При ошибке авторизации — кикаем
         localStorage.removeItem('access_token')
+        localStorage.removeItem('refresh_token')
         localStorage.removeItem('user')
         router.push('/login')
         return
@@ -113,14 +114,14 @@ export function useLibraryData() {
         console.error('Error loading categories:', error)
       }
 
-      // Загружаем материалы (первая страница)
+      // Загружаем материалы (первая страница курсорной ленты, total приходит только здесь)
       try {
-        const matResponse = await api.get('/materials', { params: { page: 1, page_size: PAGE_SIZE } })
+        const matResponse = await api.get('/materials', { params: { cursor: '', page_size: PAGE_SIZE } })
         const items = matResponse.data.items || []
         const total = matResponse.data.total || 0
         setMaterials(items)
-        setPage(2)
-        setHasMore(items.length === PAGE_SIZE && items.length < total)
+        setNextCursor(matResponse.data.next_cursor || null)
+        setHasMore(!!matResponse.data.next_cursor)
         setUser(prev => ({
           ...prev,
           totalMaterials: total,
@@ -258,25 +259,24 @@ export function useLibraryData() {
 
   // Загрузить ещё материалы
   const loadMoreMaterials = useCallback(async () => {
-    if (loadingMoreRef.current || !hasMore) return
+    if (loadingMoreRef.current || !hasMore || !nextCursor) return
     loadingMoreRef.current = true
     setLoadingMore(true)
     
     try {
-      const matResponse = await api.get('/materials', { params: { page, page_size: PAGE_SIZE } })
+      const matResponse = await api.get('/materials', { params: { cursor: nextCursor, page_size: PAGE_SIZE } })
       const items = matResponse.data.items || []
-      const total = matResponse.data.total || 0
       
       setMaterials(prev => [...prev, ...items])
-      setPage(prev => prev + 1)
-      setHasMore(items.length === PAGE_SIZE && materials.length + items.length < total)
+      setNextCursor(matResponse.data.next_cursor || null)
+      setHasMore(!!matResponse.data.next_cursor)
     } catch (error) {
       console.error('Error loading more materials:', error)
     } finally {
       setLoadingMore(false)
       loadingMoreRef.current = false
     }
-  }, [page, hasMore, materials.length])
+  }, [nextCursor, hasMore])
 
   // Серверный поиск материалов
   const searchMaterials = useCallback(async (query: string) => {
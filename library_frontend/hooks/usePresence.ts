@@ -43,31 +43,69 @@ export interface AdminAction {
   created_at: string
 }
 
-interface PresenceData {
-  type: string
-  data: OnlineUsers | Activity
-  library_count?: number
-  admin_count?: number
+// Темы рассылки: presence — онлайн-списки, presence_count — только числа,
+// activity — лента активности, admin_actions — действия админов (две последние и presence — только админке)
+export type PresenceTopic = 'presence' | 'presence_count' | 'activity' | 'admin_actions'
+
+interface PresenceSnapshot {
+  type: 'presence_snapshot'
+  seq: number
+  data: OnlineUsers
+  library_count: number
+  admin_count: number
+}
+
+interface PresenceDelta {
+  type: 'presence_delta'
+  seq: number
+  op: 'join' | 'leave'
+  page: keyof OnlineUsers
+  user?: OnlineUser
+  telegram_id?: number
+  library_count: number
+  admin_count: number
+}
+
+// Сколько последних дельт помнить, чтобы доиграть их поверх более старого снимка
+const DELTA_BUFFER_SIZE = 100
+
+function applyDelta(users: OnlineUsers, delta: PresenceDelta): OnlineUsers {
+  const id = delta.op === 'join' ? delta.user?.telegram_id : delta.telegram_id
+  const rest = users[delta.page].filter((user) => user.telegram_id !== id)
+  return {
+    ...users,
+    [delta.page]: delta.op === 'join' && delta.user ? [...rest, delta.user] : rest
+  }
 }
 
 const WS_URL = process.env.NEXT_PUBLIC_WS_URL || 'wss://api.librarymomsclub.ru'
 
+// Рассылки приходят JSON в бинарных кадрах (format=bin): сервер кодирует кадр один раз для всех
+const utf8 = new TextDecoder()
+
 /**
  * Хук для отслеживания онлайн пользователей через WebSocket
  * @param page - страница для подключения ('library' | 'admin')
- * @param options - опции: enabled (по умолчанию true), callbacks
+ * @param options - опции: enabled (по умолчанию true), topics (темы рассылки, по умолчанию — все темы страницы), callbacks
  */
 export function usePresence(
   page: 'library' | 'admin', 
   options?: {
     enabled?: boolean
+    topics?: PresenceTopic[]
     onNewActivity?: (activity: Activity) => void
     onAdminAction?: (action: AdminAction) => void
   }
 ) {
   const { enabled = true, onNewActivity, onAdminAction } = options || {}
+  // Строкой — чтобы новый массив в каждом рендере не переподключал сокет
+  const topics = options?.topics?.join(',')
   const [onlineUsers, setOnlineUsers] = useState<OnlineUsers>({ library: [], admin: [] })
+  const [counts, setCounts] = useState({ library: 0, admin: 0 })
   const [isConnected, setIsConnected] = useState(false)
+  // Последний применённый seq и недавние дельты (сверка со снимками)
+  const seqRef = useRef<number | null>(null)
+  const deltasRef = useRef<PresenceDelta[]>([])
   const wsRef = useRef<WebSocket | null>(null)
   const reconnectTimeoutRef = useRef<NodeJS.Timeout | null>(null)
   const pingIntervalRef = useRef<NodeJS.Timeout | null>(null)
@@ -96,12 +134,17 @@ export function usePresence(
     }
 
     try {
-      const ws = new WebSocket(`${WS_URL}/ws/presence?token=${token}&page=${page}`)
+      const topicsQuery = topics === undefined ? '' : `&topics=${topics}`
+      const ws = new WebSocket(`${WS_URL}/ws/presence?token=${token}&page=${page}&format=bin${topicsQuery}`)
+      ws.binaryType = 'arraybuffer'
       wsRef.current = ws
 
       ws.onopen = () => {
         console.log(`🟢 WebSocket connected (${page})`)
         setIsConnected(true)
+        // Новое соединение начинается со снимка
+        seqRef.current = null
+        deltasRef.current = []
         
         // Ping каждые 30 секунд для поддержания соединения
         pingIntervalRef.current = setInterval(() => {
@@ -111,17 +154,50 @@ export function usePresence(
         }, 30000)
       }
 
+      // Одно событие протокола (сервер может прислать несколько в кадре "batch")
+      const handleMessage = (data: any) => {
+        if (data.type === 'presence_snapshot') {
+          const snapshot = data as PresenceSnapshot
+          // Дельты новее снимка могли прийти раньше него — доигрываем
+          const newer = deltasRef.current.filter((delta) => delta.seq > snapshot.seq)
+          setOnlineUsers(newer.reduce(applyDelta, snapshot.data))
+          const last = newer[newer.length - 1] || snapshot
+          setCounts({ library: last.library_count, admin: last.admin_count })
+          seqRef.current = Math.max(snapshot.seq, seqRef.current ?? 0)
+        } else if (data.type === 'presence_delta') {
+          const delta = data as PresenceDelta
+          const lastSeq = seqRef.current
+          if (lastSeq !== null && delta.seq <= lastSeq) return  // уже в снимке
+          deltasRef.current = [...deltasRef.current.slice(-(DELTA_BUFFER_SIZE - 1)), delta]
+          setOnlineUsers((users) => applyDelta(users, delta))
+          setCounts({ library: delta.library_count, admin: delta.admin_count })
+          // Пропущены изменения — просим свежий снимок
+          if (lastSeq !== null && delta.seq > lastSeq + 1 && ws.readyState === WebSocket.OPEN) {
+            ws.send('sync')
+          }
+          seqRef.current = delta.seq
+        } else if (data.type === 'presence_count') {
+          setCounts({ library: data.library_count, admin: data.admin_count })
+        } else if (data.type === 'online_users') {
+          // Полный список (старый протокол)
+          setOnlineUsers(data.data as OnlineUsers)
+          setCounts({ library: data.library_count, admin: data.admin_count })
+        } else if (data.type === 'new_activity' && onNewActivityRef.current) {
+          onNewActivityRef.current(data.data as Activity)
+        } else if (data.type === 'admin_action' && onAdminActionRef.current) {
+          onAdminActionRef.current(data.data as AdminAction)
+        }
+      }
+
       ws.onmessage = (event) => {
         if (event.data === 'pong') return
         
         try {
-          const data = JSON.parse(event.data)
-          if (data.type === 'online_users') {
-            setOnlineUsers(data.data as OnlineUsers)
-          } else if (data.type === 'new_activity' && onNewActivityRef.current) {
-            onNewActivityRef.current(data.data as Activity)
-          } else if (data.type === 'admin_action' && onAdminActionRef.current) {
-            onAdminActionRef.current(data.data as AdminAction)
+          const data = JSON.parse(typeof event.data === 'string' ? event.data : utf8.decode(event.data))
+          if (data.type === 'batch') {
+            data.events.forEach(handleMessage)
+          } else {
+            handleMessage(data)
           }
         } catch (e) {
           console.error('Failed to parse WebSocket message:', e)
@@ -152,7 +228,7 @@ export function usePresence(
     } catch (e) {
       console.error('Failed to create WebSocket:', e)
     }
-  }, [page, enabled])
+  }, [page, enabled, topics])
 
   useEffect(() => {
     // Небольшая задержка для загрузки токена
@@ -179,7 +255,7 @@ export function usePresence(
   return {
     onlineUsers,
     isConnected,
-    libraryCount: onlineUsers.library.length,
-    adminCount: onlineUsers.admin.length
+    libraryCount: counts.library,
+    adminCount: counts.admin
   }
 }
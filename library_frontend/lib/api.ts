@@ -54,11 +54,44 @@ api.interceptors.request.use((config) => {
   return config;
 });
 
+// Обновление пары токенов: один запрос /auth/refresh на все параллельные 401
+let refreshPromise: Promise<string | null> | null = null;
+
+function refreshAccessToken(): Promise<string | null> {
+  const refreshToken = localStorage.getItem('refresh_token');
+  if (!refreshToken) return Promise.resolve(null);
+  if (!refreshPromise) {
+    // Голый axios — без интерсепторов, чтобы 401 от refresh не зациклился
+    refreshPromise = axios
+      .post(`${API_URL}/auth/refresh`, { refresh_token: refreshToken })
+      .then((response) => {
+        localStorage.setItem('access_token', response.data.access_token);
+        localStorage.setItem('refresh_token', response.data.refresh_token);
+        return response.data.access_token as string;
+      })
+      .catch(() => null)
+      .finally(() => {
+        refreshPromise = null;
+      });
+  }
+  return refreshPromise;
+}
+
 // Обработка ошибок с retry
 api.interceptors.response.use(
   (response) => response,
   async (error: AxiosError) => {
-    const config = error.config as { _retry?: boolean } & typeof error.config;
+    const config = error.config as { _retry?: boolean; _refreshed?: boolean } & typeof error.config;
+    
+    // 401 — access-токен истёк: один раз обновляем пару и повторяем запрос
+    if (error.response?.status === 401 && config && !config._refreshed && typeof window !== 'undefined') {
+      config._refreshed = true;
+      const token = await refreshAccessToken();
+      if (token) {
+        config.headers.Authorization = `Bearer ${token}`;
+        return api(config);
+      }
+    }
     
     // Не ретраим если уже ретраили или 401/403
     if (config?._retry || error.response?.status === 401 || error.response?.status === 403) {
@@ -66,6 +99,7 @@ api.interceptors.response.use(
       if (error.response?.status === 401) {
         console.log('🔐 Токен невалидный, перенаправляем на вход...');
         localStorage.removeItem('access_token');
+        localStorage.removeItem('refresh_token');
         localStorage.removeItem('user');
         cache.clear();
         if (typeof window !== 'undefined' && !window.location.pathname.includes('/login')) {
@@ -148,10 +182,11 @@ export interface Attachment {
 
 export interface PaginatedResponse<T> {
   items: T[];
-  total: number;
+  total: number | null;  // в курсорном режиме — только на первой странице
   page: number;
   page_size: number;
-  total_pages: number;
+  total_pages: number | null;
+  next_cursor?: string | null;
 }
 
 // ============================================
@@ -161,7 +196,7 @@ export interface PaginatedResponse<T> {
 export const authAPI = {
   // Авторизация через Telegram
   telegramLogin: (authData: { id: number; first_name?: string; last_name?: string; username?: string; photo_url?: string; auth_date: number; hash: string }) => 
-    api.post<{ access_token: string; user: User }>('/auth/telegram', authData),
+    api.post<{ access_token: string; refresh_token?: string; expires_in?: number; user: User }>('/auth/telegram', authData),
   
   // Текущий пользователь
   me: () => 
@@ -182,6 +217,8 @@ export const materialsAPI = {
     is_featured?: boolean;
     page?: number;
     page_size?: number;
+    cursor?: string;  // '' — первая страница ленты, далее next_cursor
+    with_total?: boolean;
     sort?: string;
   }) => 
     api.get<PaginatedResponse<Material>>('/materials', { params }),
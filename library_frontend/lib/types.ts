@@ -31,6 +31,7 @@ export interface Material {
   format: string
   cover_image?: string
   cover_url?: string // Оптимизированный URL обложки
+  has_cover?: boolean
   is_published: boolean
   is_featured: boolean
   views: number
@@ -85,6 +86,8 @@ export interface Recommendations {
   type: string
   title: string
   materials: Material[]
+  /** Когда посчитаны (ISO, UTC); пересчитываются в фоне */
+  generated_at?: string
 }
 
 // ==================== СТАТИСТИКА ====================
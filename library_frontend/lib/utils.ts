@@ -24,3 +24,13 @@ export const getLinkType = (url: string): LinkTypeInfo => {
     return { type: 'instagram', icon: '📸', label: 'Instagram', color: 'text-pink-600' }
   return { type: 'link', icon: '🌐', label: 'Ссылка', color: 'text-gray-600' }
 }
+
+/**
+ * srcSet для обложки из API (миниатюры ?w=, формат сервер выбирает по Accept).
+ * Для внешних ссылок и base64 — undefined (отдаём как есть)
+ */
+export const getCoverSrcSet = (url?: string, widths: number[] = [160, 320, 480]): string | undefined => {
+  if (!url || !/\/materials\/\d+\/cover/.test(url)) return undefined
+  const sep = url.includes('?') ? '&' : '?'
+  return widths.map(w => `${url}${sep}w=${w} ${w}w`).join(', ')
+}